@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Resource-aware Admission Control for task dispatch
+Every task has a resource class (cpu-heavy, memory-heavy, browser, network).
+Before claiming work, the daemon and scheduler ask how many more tasks of each
+class the host can take given live psutil load, so bursts stay queued instead
+of thrashing the machine.
+"""
+
+import os
+import sys
+import time
+import logging
+import itertools
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import psutil
+
+logger = logging.getLogger('admission_control')
+
+RESOURCE_CLASSES = ('cpu-heavy', 'memory-heavy', 'browser', 'network')
+DEFAULT_CLASS = 'network'
+
+# Ceilings on host load (cpu/memory percent, 1-min load per core) a class may
+# be started into; same critical/warning levels as unified_dashboard.py
+DEFAULT_THRESHOLDS = {
+    'cpu-heavy': {'cpu': 75, 'memory': 90, 'load': 1.5},
+    'memory-heavy': {'cpu': 90, 'memory': 75, 'load': 2.0},
+    'browser': {'cpu': 85, 'memory': 80, 'load': 2.0},
+    'network': {'cpu': 95, 'memory': 90, 'load': 2.0},
+}
+
+# Expected added load of one newly started task (load in runnable processes),
+# counted until it finishes or the live samples have had time to reflect it
+CLASS_COSTS = {
+    'cpu-heavy': {'cpu': 25, 'memory': 2, 'load': 1.0},
+    'memory-heavy': {'cpu': 10, 'memory': 10, 'load': 0.5},
+    'browser': {'cpu': 15, 'memory': 8, 'load': 1.0},
+    'network': {'cpu': 2, 'memory': 1, 'load': 0.1},
+}
+
+# Past this fraction of a ceiling a class still runs, but only once no
+# lighter task is waiting
+SOFT_FRACTION = 0.85
+
+
+def parse_thresholds(spec: Optional[str]) -> Dict[str, Dict[str, float]]:
+    """Parse a 'class.metric=N,...' override string (e.g. 'browser.memory=70')"""
+    overrides: Dict[str, Dict[str, float]] = {}
+    if not spec:
+        return overrides
+    for part in spec.split(','):
+        try:
+            key, value = part.split('=', 1)
+            resource_class, metric = key.strip().split('.', 1)
+            overrides.setdefault(resource_class, {})[metric] = float(value)
+        except ValueError:
+            logger.warning(f"Ignoring invalid admission threshold: {part}")
+    return overrides
+
+
+def resource_class_of(task: Dict) -> str:
+    """Declared resource class of a task or template"""
+    resource_class = task.get('resource_class') or DEFAULT_CLASS
+    return resource_class if resource_class in RESOURCE_CLASSES else DEFAULT_CLASS
+
+
+class AdmissionController:
+    """Decides how many tasks of each resource class may start right now"""
+
+    def __init__(self, thresholds: Optional[Dict[str, Dict[str, float]]] = None,
+                 sample_interval: float = 2.0, settle_seconds: float = 30.0):
+        self.thresholds = {c: dict(limits) for c, limits in DEFAULT_THRESHOLDS.items()}
+        overrides = thresholds if thresholds is not None else parse_thresholds(
+            os.environ.get('TASK_ADMISSION_THRESHOLDS'))
+        for resource_class, limits in overrides.items():
+            if resource_class not in self.thresholds:
+                logger.warning(f"Unknown resource class in thresholds: {resource_class}")
+                continue
+            self.thresholds[resource_class].update(limits)
+
+        self.sample_interval = sample_interval
+        self.settle_seconds = settle_seconds
+        self.cpu_count = psutil.cpu_count() or 1
+        # Admitted tasks still settling: token -> (admitted_at, class)
+        self.recent: Dict[Any, Tuple[float, str]] = {}
+        self._tokens = itertools.count()
+        self.deferred: List[str] = []  # Classes with no headroom at the last claim
+        self._sample: Optional[Dict[str, float]] = None
+        self._sampled_at = 0.0
+        psutil.cpu_percent(interval=None)  # Prime the non-blocking CPU counter
+
+    def sample(self) -> Dict[str, float]:
+        """Live host load, cached for sample_interval seconds"""
+        now = time.monotonic()
+        if self._sample is None or now - self._sampled_at >= self.sample_interval:
+            self._sample = {
+                'cpu': psutil.cpu_percent(interval=None),
+                'memory': psutil.virtual_memory().percent,
+                'load': psutil.getloadavg()[0] / self.cpu_count,
+            }
+            self._sampled_at = now
+        return self._sample
+
+    def _cost(self, resource_class: str) -> Dict[str, float]:
+        cost = dict(CLASS_COSTS[resource_class])
+        cost['load'] = cost['load'] / self.cpu_count
+        return cost
+
+    def projected(self) -> Dict[str, float]:
+        """Sampled load plus the expected cost of recently admitted tasks"""
+        cutoff = time.monotonic() - self.settle_seconds
+        self.recent = {token: (at, c) for token, (at, c) in self.recent.items() if at > cutoff}
+        projected = dict(self.sample())
+        for _, resource_class in self.recent.values():
+            for metric, cost in self._cost(resource_class).items():
+                projected[metric] += cost
+        return projected
+
+    def assess(self) -> Dict[str, Tuple[int, bool]]:
+        """Per class: (tasks that still fit, whether it is past the soft limit)"""
+        projected = self.projected()
+        assessment = {}
+        for resource_class, limits in self.thresholds.items():
+            cost = self._cost(resource_class)
+            room = sys.maxsize
+            soft = False
+            for metric, ceiling in limits.items():
+                current = projected.get(metric, 0.0)
+                if current >= ceiling * SOFT_FRACTION:
+                    soft = True
+                if current >= ceiling:
+                    room = 0
+                elif cost.get(metric):
+                    room = min(room, int((ceiling - current) / cost[metric]))
+            assessment[resource_class] = (room, soft)
+        return assessment
+
+    def admitted(self, task: Dict) -> Any:
+        """Count a started task against its class until it finishes or samples
+        catch up; returns the token finished() takes (the task ID if it has one)"""
+        token = task.get('id')
+        if token is None:
+            token = ('admitted', next(self._tokens))
+        self.recent[token] = (time.monotonic(), resource_class_of(task))
+        return token
+
+    def finished(self, token: Any):
+        """Stop counting a task whose execution is over (a no-op once settled)"""
+        self.recent.pop(token, None)
+
+    def claim(self, claimer, limit: int, exclude_types: Iterable[str] = ()) -> List[Dict]:
+        """Claim up to limit due tasks the host has room for, lighter classes first
+
+        Batches are sized to the tightest remaining headroom and re-assessed
+        after each one, so a burst can never overshoot a ceiling. Tasks of a
+        deferred class are never claimed, so they stay due and queued.
+        """
+        exclude_types = list(exclude_types)
+        claimed: List[Dict] = []
+        light_first = True
+        deferred: List[str] = []
+
+        while len(claimed) < limit:
+            assessment = self.assess()
+            deferred = sorted(c for c, (room, _) in assessment.items() if room <= 0)
+            excluded = set(deferred)
+            if light_first:
+                excluded.update(c for c, (_, soft) in assessment.items() if soft)
+            allowed = [room for c, (room, _) in assessment.items() if c not in excluded]
+            if not allowed:
+                if light_first and len(excluded) > len(deferred):
+                    light_first = False
+                    continue
+                break
+
+            batch = min(limit - len(claimed), min(allowed))
+            tasks = claimer.claim(batch, exclude_types=exclude_types,
+                                  exclude_classes=sorted(excluded))
+            for task in tasks:
+                self.admitted(task)
+            claimed.extend(tasks)
+
+            if len(tasks) < batch:
+                # Nothing lighter is waiting: let down-prioritized classes run
+                if light_first and len(excluded) > len(deferred):
+                    light_first = False
+                    continue
+                break
+
+        if deferred != self.deferred:
+            if deferred:
+                load = self.projected()
+                logger.warning(
+                    f"Deferring {', '.join(deferred)} tasks (cpu {load['cpu']:.0f}%, "
+                    f"memory {load['memory']:.0f}%, load {load['load']:.2f}/core)")
+            else:
+                logger.info("Host load back under thresholds, admitting all resource classes")
+            self.deferred = deferred
+        return claimed
+
+    def status(self) -> Dict:
+        """Current sample, thresholds and headroom per class"""
+        assessment = self.assess()
+        return {
+            'sample': self.sample(),
+            'projected': self.projected(),
+            'classes': {
+                c: {
+                    'thresholds': self.thresholds[c],
+                    'room': room,
+                    'down_prioritized': soft and room > 0,
+                }
+                for c, (room, soft) in assessment.items()
+            },
+        }
+
+
+def main():
+    """CLI: show admission status or sync template classes into the database"""
+    if len(sys.argv) < 2:
+        print("Usage: admission_control.py <command>")
+        print("Commands:")
+        print("  status - Show host load and headroom per resource class")
+        print("  sync-classes - Set scheduled_tasks.resource_class from the templates")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    if command == "status":
+        controller = AdmissionController(sample_interval=0)
+        time.sleep(0.5)  # Give the CPU counter an interval to measure
+        status = controller.status()
+        load = status['sample']
+        print(f"CPU {load['cpu']:.0f}%  memory {load['memory']:.0f}%  "
+              f"load {load['load']:.2f}/core")
+        for resource_class, info in status['classes'].items():
+            room = info['room']
+            state = ('deferred' if room <= 0 else
+                     'down-prioritized' if info['down_prioritized'] else 'admitting')
+            room_text = 'unlimited' if room == sys.maxsize else str(room)
+            print(f"{resource_class:<14} {state:<17} room={room_text}")
+    elif command == "sync-classes":
+        import db
+        from task_templates import TaskTemplates
+        conn = db.shared_connection()
+        updated = 0
+        with conn.cursor() as cur:
+            for template in TaskTemplates.get_all_templates():
+                cur.execute("""
+                    UPDATE scheduled_tasks SET resource_class = %s
+                    WHERE task_name = %s AND resource_class IS DISTINCT FROM %s
+                """, (resource_class_of(template), template['task_name'],
+                      resource_class_of(template)))
+                updated += cur.rowcount
+        conn.commit()
+        print(f"Updated resource class of {updated} tasks")
+    else:
+        print("Invalid command")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -25,12 +25,10 @@ done
 
 # Check database backup
 LAST_BACKUP=$(psql -U claudemini -d claudemini -t -c "
-SELECT MAX(started_at) 
-FROM task_executions te
-JOIN scheduled_tasks st ON te.task_id = st.id
-WHERE st.task_name LIKE '%backup%' 
-AND te.status = 'success';
-")
+SELECT MAX(last_success_at)
+FROM scheduled_tasks
+WHERE task_name LIKE '%backup%';
+" | tr -d '[:space:]')
 
 if [ -z "$LAST_BACKUP" ]; then
     echo "WARNING: No successful backup tasks found"
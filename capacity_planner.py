@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Capacity Planner for scheduled tasks
+Expands every active recurring and cron task's fire times over the next 24h
+(or 7d), estimates how long each run takes, and builds a per-minute histogram
+of concurrent runs against the available workers and what each resource
+class can take (admission_control.py ceilings over per-task costs).
+
+It then proposes per-task schedule offsets that flatten the peaks: tasks are
+shifted a few minutes later, heaviest first, wherever the extra load costs
+least. Offsets and jitter live in task metadata (schedule_offset_seconds,
+schedule_jitter_seconds), which the scheduler honours when rescheduling.
+Metadata stagger_max_minutes caps a task's shift (0 opts it out).
+"""
+
+import os
+import sys
+import math
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from admission_control import CLASS_COSTS, DEFAULT_THRESHOLDS, RESOURCE_CLASSES, resource_class_of
+from cron_expression import compile_cron, schedule_shift
+
+logger = logging.getLogger('capacity_planner')
+
+HORIZONS = {'24h': 24 * 60, '7d': 7 * 24 * 60}  # In minutes
+DEFAULT_MAX_SHIFT_MINUTES = 15
+DEFAULT_JITTER_SECONDS = 30
+PASSES = 2
+
+
+def available_workers() -> int:
+    """Concurrent runs the daemon allows (same default as task_daemon.py)"""
+    return int(os.environ.get('TASK_DAEMON_MAX_WORKERS', 0)) or os.cpu_count() or 1
+
+
+def class_capacity(cpu_count: Optional[int] = None) -> Dict[str, int]:
+    """Concurrent runs of each resource class the admission ceilings allow
+
+    Thresholds over per-task costs on an idle host, so an upper bound; load
+    ceilings are per core while load costs are per task.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    capacity = {}
+    for resource_class in RESOURCE_CLASSES:
+        limits = DEFAULT_THRESHOLDS[resource_class]
+        cost = CLASS_COSTS[resource_class]
+        fits = [limits[m] * (cpu_count if m == 'load' else 1) / cost[m]
+                for m in limits if cost.get(m)]
+        capacity[resource_class] = max(int(min(fits)), 1)
+    return capacity
+
+
+def run_minutes(task: Dict, durations: Dict[int, float]) -> int:
+    """Minutes one run of the task is expected to occupy a worker"""
+    seconds = durations.get(task.get('id'))
+    if seconds is None:
+        # Never ran: assume half its timeout
+        seconds = (task.get('timeout_seconds') or 300) / 2
+    return max(math.ceil(seconds / 60), 1)
+
+
+def max_shift(task: Dict, default: int = DEFAULT_MAX_SHIFT_MINUTES) -> int:
+    """Largest offset (minutes) the task may be moved by"""
+    metadata = task.get('metadata') or {}
+    try:
+        limit = int(metadata.get('stagger_max_minutes', default))
+    except (TypeError, ValueError):
+        limit = default
+    if task['schedule_type'] == 'recurring' and task.get('interval_minutes'):
+        # Shifting by a whole interval changes nothing
+        limit = min(limit, task['interval_minutes'] - 1)
+    return max(limit, 0)
+
+
+def base_fire_minutes(task: Dict, start: datetime, horizon: int) -> List[int]:
+    """Unshifted fire times in [start, start + horizon), as minutes from start"""
+    end = start + timedelta(minutes=horizon)
+    offset = timedelta(seconds=schedule_shift(task)[0])
+    times = []
+    if task['schedule_type'] == 'cron' and task.get('cron_expression'):
+        for fire in compile_cron(task['cron_expression']).iter_fire_times(start - timedelta(minutes=1)):
+            if fire >= end:
+                break
+            times.append(fire)
+    elif task['schedule_type'] == 'recurring' and task.get('interval_minutes'):
+        step = timedelta(minutes=task['interval_minutes'])
+        fire = (task.get('next_run_at') or start) - offset
+        if fire < start:
+            fire += step * math.ceil((start - fire) / step)
+        while fire < end:
+            times.append(fire)
+            fire += step
+    return [int((t - start).total_seconds() // 60) for t in times]
+
+
+class Plan:
+    """Per-minute concurrency of a set of task placements"""
+
+    def __init__(self, size: int):
+        self.total = [0] * size
+        self.by_class = {c: [0] * size for c in RESOURCE_CLASSES}
+
+    def place(self, runs: List[int], length: int, resource_class: str, shift: int, delta: int = 1):
+        per_class = self.by_class[resource_class]
+        for start in runs:
+            for minute in range(start + shift, start + shift + length):
+                self.total[minute] += delta
+                per_class[minute] += delta
+
+    def cost(self, runs: List[int], length: int, resource_class: str, shift: int,
+             workers: int, capacity: int) -> float:
+        """Increase in squared utilisation from adding these runs at shift"""
+        per_class = self.by_class[resource_class]
+        cost = 0.0
+        for start in runs:
+            for minute in range(start + shift, start + shift + length):
+                cost += (2 * self.total[minute] + 1) / workers ** 2
+                cost += (2 * per_class[minute] + 1) / capacity ** 2
+        return cost
+
+    def peaks(self) -> Dict[str, int]:
+        peaks = {'total': max(self.total, default=0)}
+        peaks.update({c: max(load, default=0) for c, load in self.by_class.items()})
+        return peaks
+
+    def minutes_over(self, workers: int) -> int:
+        return sum(1 for load in self.total if load > workers)
+
+
+def plan_offsets(tasks: List[Dict], durations: Dict[int, float], horizon: int = HORIZONS['24h'],
+                 workers: Optional[int] = None, default_max_shift: int = DEFAULT_MAX_SHIFT_MINUTES,
+                 start: Optional[datetime] = None) -> Dict:
+    """Propose offsets (minutes) that flatten the concurrency histogram
+
+    Greedy: tasks are placed heaviest first (runs x run length), each at the
+    offset within its max shift that adds the least squared utilisation of
+    workers and of its resource class; ties go to the smallest offset. A
+    second pass re-places every task against the others' final positions.
+    """
+    start = (start or datetime.now().astimezone()).replace(second=0, microsecond=0)
+    workers = workers or available_workers()
+    capacity = class_capacity()
+
+    entries = []
+    for task in tasks:
+        runs = base_fire_minutes(task, start, horizon)
+        if runs:
+            entries.append({
+                'task': task,
+                'runs': runs,
+                'length': run_minutes(task, durations),
+                'class': resource_class_of(task),
+                'current': int(schedule_shift(task)[0] // 60),
+                'max_shift': max_shift(task, default_max_shift),
+            })
+    size = horizon + max(default_max_shift, max((e['max_shift'] for e in entries), default=0)) + \
+        max((e['length'] for e in entries), default=0) + max((e['current'] for e in entries), default=0)
+
+    before = Plan(size)
+    for entry in entries:
+        before.place(entry['runs'], entry['length'], entry['class'], entry['current'])
+
+    after = Plan(size)
+    entries.sort(key=lambda e: -len(e['runs']) * e['length'])
+    for entry in entries:
+        entry['offset'] = 0
+        after.place(entry['runs'], entry['length'], entry['class'], 0)
+    for _ in range(PASSES):
+        for entry in entries:
+            after.place(entry['runs'], entry['length'], entry['class'], entry['offset'], -1)
+            entry['offset'] = min(
+                range(entry['max_shift'] + 1),
+                key=lambda shift: (after.cost(entry['runs'], entry['length'], entry['class'], shift,
+                                              workers, capacity[entry['class']]), shift))
+            after.place(entry['runs'], entry['length'], entry['class'], entry['offset'])
+
+    return {
+        'start': start,
+        'horizon': horizon,
+        'workers': workers,
+        'capacity': capacity,
+        'before': before,
+        'after': after,
+        'offsets': {e['task']['id']: (e['current'], e['offset'], e['max_shift']) for e in entries},
+        'tasks': {e['task']['id']: e['task'] for e in entries},
+    }
+
+
+def shifted_next_run(task: Dict, offset_seconds: float, now: datetime) -> Optional[datetime]:
+    """next_run_at once the task moves to offset_seconds, or None to leave it
+
+    Due tasks keep their slot; the new offset applies from their next run.
+    """
+    next_run = task.get('next_run_at')
+    if next_run is None or next_run <= now:
+        return None
+    if task['schedule_type'] == 'cron':
+        offset = timedelta(seconds=offset_seconds)
+        return compile_cron(task['cron_expression']).next_fire(now - offset) + offset
+    return next_run - timedelta(seconds=schedule_shift(task)[0] - offset_seconds)
+
+
+def apply_plan(store, plan: Dict, jitter_seconds: float = DEFAULT_JITTER_SECONDS) -> int:
+    """Store the proposed offsets (and jitter on staggerable tasks)"""
+    now = datetime.now().astimezone()
+    shifts = {}
+    for task_id, (current, offset, limit) in plan['offsets'].items():
+        task = plan['tasks'][task_id]
+        jitter = jitter_seconds if limit else 0
+        if (offset * 60, jitter) == schedule_shift(task):
+            continue
+        shifts[task_id] = (offset * 60, jitter, shifted_next_run(task, offset * 60, now))
+    updated = store.set_schedule_shift(shifts) if shifts else 0
+    logger.info(f"Applied schedule offsets to {updated} tasks")
+    return updated
+
+
+def template_tasks() -> List[Dict]:
+    """The task templates as if freshly initialised (ids are template positions)"""
+    from cron_expression import next_run_time
+    from task_templates import TaskTemplates
+    tasks = []
+    for i, template in enumerate(TaskTemplates.get_all_templates(), 1):
+        if template['schedule_type'] not in ('recurring', 'cron'):
+            continue
+        next_run = next_run_time(template['schedule_type'], template.get('cron_expression'),
+                                 template.get('interval_minutes'),
+                                 offset_seconds=schedule_shift(template)[0])
+        tasks.append({**template, 'id': i, 'next_run_at': next_run})
+    return tasks
+
+
+def print_plan(plan: Dict):
+    """Predicted peaks before and after staggering, then the proposed offsets"""
+    before, after = plan['before'].peaks(), plan['after'].peaks()
+    label = next((k for k, v in HORIZONS.items() if v == plan['horizon']), f"{plan['horizon']}m")
+    print(f"Horizon {label} from {plan['start']:%Y-%m-%d %H:%M}, "
+          f"{len(plan['offsets'])} scheduled tasks")
+    print(f"{'peak concurrency':<24} {'before':>7} {'after':>7} {'capacity':>9}")
+    print(f"{'all tasks':<24} {before['total']:>7} {after['total']:>7} {plan['workers']:>9}")
+    for resource_class in RESOURCE_CLASSES:
+        if before[resource_class]:
+            print(f"  {resource_class:<22} {before[resource_class]:>7} {after[resource_class]:>7} "
+                  f"{plan['capacity'][resource_class]:>9}")
+    print(f"{'minutes over workers':<24} {plan['before'].minutes_over(plan['workers']):>7} "
+          f"{plan['after'].minutes_over(plan['workers']):>7}")
+
+    moved = [(task_id, current, offset) for task_id, (current, offset, _) in plan['offsets'].items()
+             if offset != current]
+    if moved:
+        print("\nProposed offsets:")
+        for task_id, current, offset in sorted(moved, key=lambda m: -m[2]):
+            name = plan['tasks'][task_id]['task_name']
+            print(f"  {name[:44]:<44} +{current}m -> +{offset}m")
+    else:
+        print("\nNo offsets to change")
+
+
+def main():
+    """CLI: predict peak concurrency and stagger schedules"""
+    if len(sys.argv) < 2 or sys.argv[1] not in ('plan', 'apply'):
+        print("Usage: capacity_planner.py <command> [options]")
+        print("Commands:")
+        print("  plan - Print predicted peak concurrency before and after staggering")
+        print("  apply - Store the proposed offsets and jitter on the tasks")
+        print("Options:")
+        print("  --horizon 24h|7d    Window to expand fire times over (default 24h)")
+        print("  --workers N         Available workers (default TASK_DAEMON_MAX_WORKERS or CPUs)")
+        print(f"  --max-shift N       Default largest offset in minutes (default {DEFAULT_MAX_SHIFT_MINUTES})")
+        print(f"  --jitter N          Jitter seconds stored with applied offsets (default {DEFAULT_JITTER_SECONDS})")
+        print("  --templates         Plan the task templates instead of the store (plan only)")
+        sys.exit(1)
+
+    def option(name, default):
+        if name in sys.argv:
+            return sys.argv[sys.argv.index(name) + 1]
+        return default
+
+    command = sys.argv[1]
+    horizon = option('--horizon', '24h')
+    if horizon not in HORIZONS:
+        print(f"Unknown horizon {horizon} (use {' or '.join(HORIZONS)})")
+        sys.exit(1)
+    workers = int(option('--workers', 0)) or None
+    shift = int(option('--max-shift', DEFAULT_MAX_SHIFT_MINUTES))
+    jitter = float(option('--jitter', DEFAULT_JITTER_SECONDS))
+
+    if '--templates' in sys.argv:
+        if command == 'apply':
+            print("apply needs a task store, not --templates")
+            sys.exit(1)
+        store, tasks, durations = None, template_tasks(), {}
+    else:
+        from task_store import get_task_store
+        store = get_task_store()
+        tasks, durations = store.scheduled_tasks(), store.mean_durations()
+
+    plan = plan_offsets(tasks, durations, HORIZONS[horizon], workers, shift)
+    print_plan(plan)
+    if command == 'apply':
+        print(f"\nUpdated {apply_plan(store, plan, jitter)} tasks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Cross-process Circuit Breakers for external dependencies
+Breaker state lives in a small mmap'd file (logs/.circuit_breakers), so every
+process sees a dependency go down. Checking a closed or open circuit is a
+memory read; only state changes take a file lock.
+"""
+
+import os
+import sys
+import mmap
+import time
+import fcntl
+import struct
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+logger = logging.getLogger('circuit_breaker')
+
+REGISTRY_FILE = Path(__file__).parent / "logs" / ".circuit_breakers"
+SLOTS = 64
+
+# Slot: seq (odd while being written), name, state, failures, opened_at, probe_at
+SLOT_FORMAT = '<I32sB3xIdd'
+SLOT_SIZE = 64
+assert struct.calcsize(SLOT_FORMAT) <= SLOT_SIZE
+
+# Lock-free read attempts before assuming the writer died mid-update
+SPIN_LIMIT = 10000
+
+# Thresholds for known dependencies; others use the CircuitBreaker defaults
+DEPENDENCIES = {
+    'twitter': {'failure_threshold': 3, 'recovery_timeout': 300},
+    'coingecko': {'failure_threshold': 5, 'recovery_timeout': 120},
+    'solana_rpc': {'failure_threshold': 5, 'recovery_timeout': 120},
+    'etherscan': {'failure_threshold': 5, 'recovery_timeout': 120},
+    'gmail': {'failure_threshold': 3, 'recovery_timeout': 300},
+}
+
+CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+STATE_NAMES = {CLOSED: 'closed', OPEN: 'open', HALF_OPEN: 'half-open'}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit '{name}' is open; skipping call")
+        self.name = name
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream answered with a status that means it is unhealthy"""
+
+
+# Errors meaning the dependency itself is unreachable or unhealthy (socket
+# errors and timeouts are OSErrors, as are requests and smtplib errors)
+NETWORK_ERRORS = (OSError, UpstreamUnavailable)
+
+
+def check_http_status(status: int):
+    """Treat 5xx and 429 as dependency failures"""
+    if status >= 500 or status == 429:
+        raise UpstreamUnavailable(f"HTTP {status}")
+
+
+class BreakerRegistry:
+    """Fixed-size table of breaker slots in a shared memory-mapped file"""
+
+    def __init__(self, path: Path = REGISTRY_FILE, slots: int = SLOTS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.slots = slots
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        # flock doesn't exclude threads sharing the fd; the RLock does, and
+        # makes locked() re-entrant so a read can repair a slot under it
+        self.thread_lock = threading.RLock()
+        self.lock_depth = 0
+        if os.fstat(self.fd).st_size < slots * SLOT_SIZE:
+            with self.locked():
+                if os.fstat(self.fd).st_size < slots * SLOT_SIZE:
+                    os.ftruncate(self.fd, slots * SLOT_SIZE)
+        self.map = mmap.mmap(self.fd, slots * SLOT_SIZE)
+        self.index: Dict[str, int] = {}
+
+    @contextmanager
+    def locked(self):
+        with self.thread_lock:
+            if self.lock_depth == 0:
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+            self.lock_depth += 1
+            try:
+                yield
+            finally:
+                self.lock_depth -= 1
+                if self.lock_depth == 0:
+                    fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def _unpack(self, slot: int) -> Tuple:
+        return struct.unpack_from(SLOT_FORMAT, self.map, slot * SLOT_SIZE)
+
+    def slot_for(self, name: str) -> int:
+        """Slot index for a breaker, allocating one on first use"""
+        if name in self.index:
+            return self.index[name]
+        encoded = name.encode('utf-8')[:32]
+
+        with self.locked():
+            free = None
+            for slot in range(self.slots):
+                slot_name = self._unpack(slot)[1].rstrip(b'\0')
+                if slot_name == encoded:
+                    self.index[name] = slot
+                    return slot
+                if not slot_name and free is None:
+                    free = slot
+            if free is None:
+                raise RuntimeError(f"Circuit breaker registry full ({self.slots} slots)")
+            self._write(free, encoded, CLOSED, 0, 0.0, 0.0)
+            self.index[name] = free
+            return free
+
+    def read(self, slot: int) -> Tuple[int, int, float, float]:
+        """(state, failures, opened_at, probe_at), taking the lock only if a
+        write seems stuck"""
+        for _ in range(SPIN_LIMIT):
+            seq, _, state, failures, opened_at, probe_at = self._unpack(slot)
+            if seq % 2 == 0 and self._unpack(slot)[0] == seq:
+                return state, failures, opened_at, probe_at
+        return self._repair(slot)
+
+    def _repair(self, slot: int) -> Tuple[int, int, float, float]:
+        """Under the lock no write is in progress: an odd seq means the writer
+        died mid-update (e.g. SIGKILL), so reset the slot to closed"""
+        with self.locked():
+            seq, name, state, failures, opened_at, probe_at = self._unpack(slot)
+            if seq % 2 == 0:
+                return state, failures, opened_at, probe_at
+            logger.warning(f"Repairing circuit breaker slot {slot} left mid-write; closing it")
+            offset = slot * SLOT_SIZE
+            struct.pack_into(SLOT_FORMAT, self.map, offset, seq, name, CLOSED, 0, 0.0, 0.0)
+            struct.pack_into('<I', self.map, offset, (seq + 1) & 0xFFFFFFFF)
+            return CLOSED, 0, 0.0, 0.0
+
+    def _write(self, slot: int, name: bytes, state: int, failures: int,
+               opened_at: float, probe_at: float):
+        """Write a slot (lock must be held); readers retry while seq is odd"""
+        offset = slot * SLOT_SIZE
+        seq = struct.unpack_from('<I', self.map, offset)[0]
+        struct.pack_into('<I', self.map, offset, (seq + 1) & 0xFFFFFFFF)
+        struct.pack_into(SLOT_FORMAT, self.map, offset, (seq + 1) & 0xFFFFFFFF,
+                         name, state, failures, opened_at, probe_at)
+        struct.pack_into('<I', self.map, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def update(self, slot: int, **fields):
+        """Replace some fields of a slot (lock must be held)"""
+        _, name, state, failures, opened_at, probe_at = self._unpack(slot)
+        current = {'state': state, 'failures': failures,
+                   'opened_at': opened_at, 'probe_at': probe_at}
+        current.update(fields)
+        self._write(slot, name, current['state'], current['failures'],
+                    current['opened_at'], current['probe_at'])
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Every allocated breaker and its state"""
+        breakers = []
+        for slot in range(self.slots):
+            _, name, _, _, _, _ = self._unpack(slot)
+            name = name.rstrip(b'\0').decode('utf-8', errors='replace')
+            if name:
+                state, failures, opened_at, probe_at = self.read(slot)
+                breakers.append({'name': name, 'state': STATE_NAMES.get(state, '?'),
+                                 'failures': failures, 'opened_at': opened_at})
+        return breakers
+
+
+_registry: Optional[BreakerRegistry] = None
+
+
+def get_registry() -> BreakerRegistry:
+    global _registry
+    if _registry is None:
+        _registry = BreakerRegistry()
+    return _registry
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker for one dependency, shared by all processes
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail fast for recovery_timeout seconds. Then a single caller (across all
+    processes) is let through as a probe: success closes the circuit, failure
+    reopens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 60,
+                 failure_exceptions: Tuple[Type[BaseException], ...] = (Exception,),
+                 registry: Optional[BreakerRegistry] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failure_exceptions = failure_exceptions
+        self.registry = registry or get_registry()
+        self.slot = self.registry.slot_for(name)
+
+    @property
+    def state(self) -> str:
+        return STATE_NAMES[self.registry.read(self.slot)[0]]
+
+    def _blocked(self, state: int, opened_at: float, probe_at: float, now: float) -> bool:
+        if state == OPEN:
+            return now - opened_at < self.recovery_timeout
+        if state == HALF_OPEN:
+            # A probe is in flight; give it recovery_timeout before trying another
+            return now - probe_at < self.recovery_timeout
+        return False
+
+    def allow(self) -> bool:
+        """Whether a call may proceed; claims the probe when recovery is due"""
+        state, _, opened_at, probe_at = self.registry.read(self.slot)
+        if state == CLOSED:
+            return True
+        now = time.time()
+        if self._blocked(state, opened_at, probe_at, now):
+            return False
+
+        with self.registry.locked():
+            state, _, opened_at, probe_at = self.registry.read(self.slot)
+            if state == CLOSED:
+                return True
+            if self._blocked(state, opened_at, probe_at, now):
+                return False
+            self.registry.update(self.slot, state=HALF_OPEN, probe_at=now)
+        logger.info(f"Circuit '{self.name}' half-open, probing")
+        return True
+
+    def record_success(self):
+        state, failures, _, _ = self.registry.read(self.slot)
+        if state == CLOSED and failures == 0:
+            return
+        with self.registry.locked():
+            self.registry.update(self.slot, state=CLOSED, failures=0)
+        if state != CLOSED:
+            logger.info(f"Circuit '{self.name}' closed")
+
+    def record_failure(self):
+        with self.registry.locked():
+            state, failures, _, _ = self.registry.read(self.slot)
+            failures += 1
+            if state == HALF_OPEN or failures >= self.failure_threshold:
+                self.registry.update(self.slot, state=OPEN, failures=failures,
+                                     opened_at=time.time())
+                if state != OPEN:
+                    logger.warning(f"Circuit '{self.name}' opened after {failures} failures")
+            else:
+                self.registry.update(self.slot, failures=failures)
+
+    def reset(self):
+        with self.registry.locked():
+            self.registry.update(self.slot, state=CLOSED, failures=0, opened_at=0.0, probe_at=0.0)
+
+    @contextmanager
+    def guard(self):
+        """Run the block through the breaker; works around awaits too
+
+        Raises CircuitOpenError without running the block when the circuit
+        is open. Exceptions outside failure_exceptions mean the dependency
+        answered, so they count as a success.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        try:
+            yield self
+        except self.failure_exceptions:
+            self.record_failure()
+            raise
+        except Exception:
+            self.record_success()
+            raise
+        else:
+            self.record_success()
+
+    def call(self, func, *args, **kwargs):
+        with self.guard():
+            return func(*args, **kwargs)
+
+
+class GuardedClient:
+    """Proxy that routes every method call on a client through a breaker"""
+
+    def __init__(self, client: Any, breaker: CircuitBreaker):
+        self._client = client
+        self._breaker = breaker
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def guarded(*args, **kwargs):
+            return self._breaker.call(attr, *args, **kwargs)
+        return guarded
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """Process-wide breaker for a dependency (options apply on first use)"""
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name, **{**DEPENDENCIES.get(name, {}), **kwargs})
+    return _breakers[name]
+
+
+def main():
+    """CLI: inspect, check or reset breakers"""
+    if len(sys.argv) < 2:
+        print("Usage: circuit_breaker.py <command> [name]")
+        print("Commands:")
+        print("  status - Show every breaker")
+        print("  check <name> - Exit 0 if calls may proceed, 1 if the circuit is open")
+        print("  reset <name> - Close a breaker")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    if command == "status":
+        breakers = get_registry().all()
+        if not breakers:
+            print("No circuit breakers registered")
+        for b in breakers:
+            opened = time.strftime('%H:%M:%S', time.localtime(b['opened_at'])) if b['opened_at'] else '-'
+            print(f"{b['name']:<20} {b['state']:<10} failures={b['failures']:<4} opened={opened}")
+    elif command == "check" and len(sys.argv) >= 3:
+        breaker = get_breaker(sys.argv[2])
+        state, _, opened_at, probe_at = breaker.registry.read(breaker.slot)
+        blocked = breaker._blocked(state, opened_at, probe_at, time.time())
+        print(f"{sys.argv[2]}: {STATE_NAMES[state]}")
+        sys.exit(1 if blocked else 0)
+    elif command == "reset" and len(sys.argv) >= 3:
+        get_breaker(sys.argv[2]).reset()
+        print(f"Reset circuit '{sys.argv[2]}'")
+    else:
+        print("Invalid command")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,6 @@ import time
 import tempfile
 from typing import Optional, Dict, List, Tuple
 from datetime import datetime
-import psycopg2
 from psycopg2.extras import RealDictCursor
 import sys
 import signal
@@ -21,74 +20,132 @@ from pathlib import Path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from response_parser import ResponseParser
 from memory_manager import MemoryManager
+from claude_session_pool import get_session_pool
+from output_capture import OutputCapture, execution_log_path
+from task_resources import TaskResources, limits_from_metadata
+from result_cache import cache_key, cache_ttl, get_result_cache
+import db
 
 class ClaudeExecutor:
-    def __init__(self):
+    def __init__(self, use_session_pool: Optional[bool] = None):
         self.parser = ResponseParser()
-        self.memory_manager = MemoryManager()
+        self._memory_manager = None
         self.brain_path = "/Users/claudemini/Claude/Code/claude-brain/brain.sh"
         self.claude_home = "/Users/claudemini/Claude"
         
-        # Database connection
-        self.conn = psycopg2.connect(
-            dbname="claudemini",
-            user="claudemini",
-            host="localhost"
-        )
+        # Warm session pool for claude -p tasks (opt in with CLAUDE_SESSION_POOL=1)
+        if use_session_pool is None:
+            use_session_pool = os.environ.get('CLAUDE_SESSION_POOL') == '1'
+        self.use_session_pool = use_session_pool
     
-    def __del__(self):
-        if hasattr(self, 'conn') and self.conn:
-            self.conn.close()
+    @property
+    def conn(self):
+        """Shared database connection, opened on first use so runs on the
+        in-memory task store without memory context never touch Postgres"""
+        return db.shared_connection()
     
-    def execute_claude_command(self, command: str, timeout: int = 300) -> Dict:
-        """Execute a command using claude -p"""
+    @property
+    def memory_manager(self) -> MemoryManager:
+        """Created on first use so runs that store no memories skip the embedding model"""
+        if self._memory_manager is None:
+            self._memory_manager = MemoryManager()
+        return self._memory_manager
+    
+    def execute_claude_command(self, command: str, timeout: int = 300,
+                               execution_id: Optional[int] = None,
+                               limits: Optional[Dict] = None) -> Dict:
+        """Execute a command using claude -p, streaming output to a log file
+
+        The process runs under the given resource limits (see task_resources)
+        and the result carries its usage under 'resources'. Pooled sessions
+        can't be limited, so tasks with limits always get a fresh process.
+        """
         start_time = time.time()
+        log_path = execution_log_path(execution_id or f"claude-{int(start_time * 1000)}", start_time)
+        
+        if self.use_session_pool and not limits:
+            try:
+                result = get_session_pool().execute(command, timeout=timeout)
+            except Exception as e:
+                print(f"Session pool failed, falling back to a fresh claude process: {e}")
+            else:
+                return self._record_pooled_run(result, log_path)
+        
+        capture = None
+        resources = TaskResources(execution_id or log_path.stem, limits, timeout=timeout)
         
         try:
+            capture = OutputCapture(log_path)
+            
             # Run claude with the command
             process = subprocess.Popen(
-                ["claude", "--dangerously-skip-permissions", "-p", command],
+                resources.wrap(["claude", "--dangerously-skip-permissions", "-p", command]),
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
                 cwd=self.claude_home
             )
+            resources.started(process.pid)
             
-            # Wait for completion with timeout
-            stdout, stderr = process.communicate(timeout=timeout)
+            # Stream output until completion, with timeout
+            returncode = capture.pump(process, timeout=timeout)
             execution_time = int((time.time() - start_time) * 1000)
+            stdout, stderr = capture.stdout.strip(), capture.stderr.strip()
             
-            if process.returncode == 0:
+            if returncode == 0:
                 return {
                     'status': 'success',
-                    'output': stdout.strip(),
+                    'output': stdout,
                     'error': None,
-                    'execution_time_ms': execution_time
+                    'execution_time_ms': execution_time,
+                    'log_file_path': str(log_path),
+                    'resources': resources.report()
                 }
             else:
                 return {
                     'status': 'failed',
-                    'output': stdout.strip() if stdout else None,
-                    'error': stderr.strip() if stderr else 'Command failed',
-                    'execution_time_ms': execution_time
+                    'output': stdout or None,
+                    'error': stderr or 'Command failed',
+                    'execution_time_ms': execution_time,
+                    'log_file_path': str(log_path),
+                    'resources': resources.report()
                 }
                 
         except subprocess.TimeoutExpired:
             process.kill()
+            process.wait()
+            capture.close()
             return {
                 'status': 'timeout',
-                'output': None,
+                'output': capture.stdout.strip() or None,
                 'error': f'Command timed out after {timeout} seconds',
-                'execution_time_ms': timeout * 1000
+                'execution_time_ms': timeout * 1000,
+                'log_file_path': str(log_path),
+                'resources': resources.report()
             }
         except Exception as e:
+            if capture:
+                capture.close()
             return {
                 'status': 'failed',
                 'output': None,
                 'error': str(e),
-                'execution_time_ms': int((time.time() - start_time) * 1000)
+                'execution_time_ms': int((time.time() - start_time) * 1000),
+                'resources': resources.report()
             }
     
+    def _record_pooled_run(self, result: Dict, log_path: Path) -> Dict:
+        """Write a pooled run's output to log_path; the session runs outside
+        any cgroup, so the result records no limits or usage"""
+        try:
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+            log_path.write_text('\n'.join(part for part in (result.get('output'), result.get('error'))
+                                          if part))
+            result['log_file_path'] = str(log_path)
+        except OSError as e:
+            print(f"Could not write {log_path}: {e}")
+        result['resources'] = {'resource_mode': 'unlimited', 'resource_limits': {}}
+        return result
+    
     def execute_brain_command(self, command: str, timeout: int = 300) -> Dict:
         """Execute a command using brain.sh"""
         start_time = time.time()
@@ -219,8 +276,27 @@ class ClaudeExecutor:
             return "Context from memories:\n" + "\n".join(context_parts) + "\n\n"
         return ""
     
-    def execute_task(self, task: Dict) -> Dict:
+    def execute_task(self, task: Dict, execution_id: Optional[int] = None) -> Dict:
         """Execute a task with appropriate method"""
+        # Templates with a cache_ttl_seconds reuse a fresh result (see result_cache.py)
+        ttl = cache_ttl(task)
+        key = None
+        if ttl:
+            start_time = time.time()
+            method = 'brain' if task.get('requires_brain', False) else 'claude'
+            key = cache_key(task['command'], task.get('context_memory_ids'), method)
+            template = task.get('task_name', 'Unknown')
+            cached = get_result_cache().get(key, template)
+            if cached is not None:
+                # Its memory, if any, was stored when the result was produced
+                return {
+                    'status': 'success',
+                    'output': cached['output'],
+                    'error': None,
+                    'execution_time_ms': int((time.time() - start_time) * 1000),
+                    'cached': True
+                }
+        
         # Add memory context to command if specified
         command = task['command']
         if task.get('context_memory_ids'):
@@ -236,12 +312,16 @@ class ClaudeExecutor:
         else:
             result = self.execute_claude_command(
                 command,
-                timeout=task.get('timeout_seconds', 300)
+                timeout=task.get('timeout_seconds', 300),
+                execution_id=execution_id,
+                limits=limits_from_metadata(task.get('metadata'))
             )
         
         # Store output as memory if successful and significant
         if result['status'] == 'success' and result.get('output'):
             output = result['output']
+            if key:
+                get_result_cache().put(key, template, output, ttl, result.get('execution_time_ms') or 0)
             
             # Determine if output should be stored as memory
             should_store = False
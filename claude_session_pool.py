@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Claude Session Pool
+Keeps `claude` processes started ahead of time (stream-json over stdin/stdout)
+so tasks skip the CLI cold start. A session keeps conversation context between
+prompts, so by default each one serves a single prompt: when a session is
+checked out for its last use, its replacement is spawned in the background
+while the prompt runs. Sessions are also health checked and recycled when
+their memory grows past a threshold.
+"""
+
+import os
+import json
+import queue
+import socket
+import atexit
+import logging
+import threading
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import psutil
+
+logger = logging.getLogger('claude_session_pool')
+
+POOL_CONFIG_FILE = Path(__file__).parent / "data" / "claude_pool.json"
+DEFAULT_POOL_SIZE = 2
+
+
+def configured_pool_size() -> int:
+    """Pool size from CLAUDE_POOL_SIZE, else data/claude_pool.json for this host"""
+    if os.environ.get('CLAUDE_POOL_SIZE'):
+        return int(os.environ['CLAUDE_POOL_SIZE'])
+
+    if POOL_CONFIG_FILE.exists():
+        try:
+            with open(POOL_CONFIG_FILE, 'r') as f:
+                config = json.load(f)
+            hosts = config.get('hosts', {})
+            return int(hosts.get(socket.gethostname(), config.get('default', DEFAULT_POOL_SIZE)))
+        except Exception as e:
+            logger.error(f"Error reading {POOL_CONFIG_FILE}: {e}")
+    return DEFAULT_POOL_SIZE
+
+
+class ClaudeSession:
+    """A single long-lived claude process accepting prompts over a pipe"""
+
+    def __init__(self, cwd: str):
+        self.cwd = cwd
+        self.uses = 0
+        self.started_at = None
+        self.process: Optional[subprocess.Popen] = None
+        self.lines: "queue.Queue[Optional[str]]" = queue.Queue()
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [
+                "claude", "--dangerously-skip-permissions", "-p",
+                "--input-format", "stream-json",
+                "--output-format", "stream-json",
+                "--verbose"
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+            cwd=self.cwd
+        )
+        self.started_at = time.time()
+        # A reader thread lets send() wait on a queue with a timeout
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+        logger.info(f"Started claude session (pid {self.process.pid})")
+
+    def _read_stdout(self):
+        for line in self.process.stdout:
+            self.lines.put(line)
+        self.lines.put(None)  # EOF
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def rss_bytes(self) -> int:
+        """Resident memory of the session and its children"""
+        try:
+            proc = psutil.Process(self.process.pid)
+            return proc.memory_info().rss + sum(
+                child.memory_info().rss for child in proc.children(recursive=True)
+            )
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return 0
+
+    def send(self, prompt: str, timeout: int) -> Dict:
+        """Send one prompt and wait for its result message"""
+        message = {"type": "user", "message": {"role": "user", "content": prompt}}
+        self.process.stdin.write(json.dumps(message) + "\n")
+        self.process.stdin.flush()
+        self.uses += 1
+
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError(f"No result within {timeout} seconds")
+            try:
+                line = self.lines.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError(f"No result within {timeout} seconds")
+            if line is None:
+                raise RuntimeError("Claude session exited unexpectedly")
+
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if event.get('type') == 'result':
+                return event
+
+    def close(self):
+        if not self.process:
+            return
+        try:
+            self.process.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.process.terminate()
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        except Exception:
+            pass
+
+
+class ClaudeSessionPool:
+    """A fixed-size pool of warm claude sessions"""
+
+    def __init__(self, size: Optional[int] = None, max_uses: int = 1,
+                 max_rss_mb: int = 1024, cwd: str = "/Users/claudemini/Claude"):
+        self.size = size or configured_pool_size()
+        self.max_uses = max_uses  # Above 1, later prompts see earlier ones
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self.cwd = cwd
+        self.idle: "queue.LifoQueue[ClaudeSession]" = queue.LifoQueue()
+        self.sessions: List[ClaudeSession] = []
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def warm(self):
+        """Start every session up front"""
+        with self.lock:
+            while len(self.sessions) < self.size:
+                self.idle.put(self._start_session())
+
+    def _start_session(self) -> ClaudeSession:
+        session = ClaudeSession(self.cwd)
+        session.start()
+        self.sessions.append(session)
+        return session
+
+    def _checkout(self, session: ClaudeSession) -> ClaudeSession:
+        """Hand out a session, pre-spawning its replacement if this is its last use"""
+        if session.uses + 1 >= self.max_uses and not self.closed:
+            with self.lock:
+                if session in self.sessions:
+                    self.sessions.remove(session)
+            threading.Thread(target=self._replenish, daemon=True).start()
+        return session
+
+    def _replenish(self):
+        """Start a session into the idle queue if the pool has room"""
+        with self.lock:
+            if self.closed or len(self.sessions) >= self.size:
+                return
+            try:
+                session = self._start_session()
+            except Exception as e:
+                logger.error(f"Could not start claude session: {e}")
+                return
+        self.idle.put(session)
+
+    def _retire(self, session: ClaudeSession, reason: str):
+        logger.info(f"Recycling claude session {session.pid} ({reason})")
+        session.close()
+        with self.lock:
+            if session in self.sessions:
+                self.sessions.remove(session)
+
+    def is_healthy(self, session: ClaudeSession) -> Optional[str]:
+        """Return a reason the session should be recycled, or None if healthy"""
+        if not session.is_alive():
+            return "process exited"
+        if session.uses >= self.max_uses:
+            return f"reached {self.max_uses} uses"
+        rss = session.rss_bytes()
+        if rss > self.max_rss_bytes:
+            return f"using {rss // (1024 * 1024)}MB"
+        return None
+
+    def acquire(self, timeout: Optional[float] = None) -> ClaudeSession:
+        """Check out a healthy session, starting one if the pool isn't full"""
+        deadline = time.time() + timeout if timeout else None
+        while True:
+            try:
+                session = self.idle.get_nowait()
+            except queue.Empty:
+                with self.lock:
+                    session = self._start_session() if len(self.sessions) < self.size else None
+                if session is not None:
+                    return self._checkout(session)
+                remaining = deadline - time.time() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No claude session available")
+                try:
+                    session = self.idle.get(timeout=remaining)
+                except queue.Empty:
+                    raise TimeoutError("No claude session available")
+
+            reason = self.is_healthy(session)
+            if reason is None:
+                return self._checkout(session)
+            self._retire(session, reason)
+
+    def release(self, session: ClaudeSession, broken: bool = False):
+        """Return a session to the pool, recycling it if it is no longer healthy"""
+        reason = "broken" if broken else self.is_healthy(session)
+        with self.lock:
+            if reason is None and session not in self.sessions:
+                reason = "replaced"  # Its slot went to a pre-spawned successor
+        if reason or self.closed:
+            self._retire(session, reason or "pool closed")
+        else:
+            self.idle.put(session)
+
+    def health_check(self):
+        """Recycle idle sessions that died or outgrew their limits"""
+        healthy = []
+        while True:
+            try:
+                session = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            reason = self.is_healthy(session)
+            if reason:
+                self._retire(session, reason)
+            else:
+                healthy.append(session)
+        for session in healthy:
+            self.idle.put(session)
+
+    def execute(self, prompt: str, timeout: int = 300) -> Dict:
+        """Run a prompt on a warm session; returns the execute_task result dict"""
+        start_time = time.time()
+        session = self.acquire(timeout=timeout)
+        try:
+            event = session.send(prompt, timeout=timeout)
+        except TimeoutError:
+            # The session is mid-response; it can't be reused
+            self.release(session, broken=True)
+            return {
+                'status': 'timeout',
+                'output': None,
+                'error': f'Command timed out after {timeout} seconds',
+                'execution_time_ms': timeout * 1000
+            }
+        except Exception:
+            self.release(session, broken=True)
+            raise
+
+        self.release(session)
+        execution_time = int((time.time() - start_time) * 1000)
+        output = (event.get('result') or '').strip()
+
+        if event.get('is_error') or event.get('subtype') != 'success':
+            return {
+                'status': 'failed',
+                'output': output or None,
+                'error': output or f"Claude session returned {event.get('subtype')}",
+                'execution_time_ms': execution_time
+            }
+        return {
+            'status': 'success',
+            'output': output,
+            'error': None,
+            'execution_time_ms': execution_time
+        }
+
+    def shutdown(self):
+        self.closed = True
+        with self.lock:
+            sessions = list(self.sessions)
+            self.sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+_pool: Optional[ClaudeSessionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> ClaudeSessionPool:
+    """Process-wide session pool, shut down at exit"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ClaudeSessionPool()
+            atexit.register(_pool.shutdown)
+        return _pool
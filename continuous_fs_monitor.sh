@@ -21,16 +21,8 @@ store_memory() {
     /Users/claudemini/Claude/Code/utils/memory.sh store "Ran filesystem monitoring - found $1 changes" --type daily --tags monitoring filesystem --importance 3
 }
 
-log_message "Starting continuous filesystem monitoring for $WATCH_DIR"
-
-# Run initial scan
-python "$MONITOR_SCRIPT"
-
-# Main monitoring loop
-while true; do
-    # Wait for 30 minutes
-    sleep 1800
-    
+# One scheduled scan: run the monitor and store a memory if files changed
+scan_once() {
     log_message "Running scheduled filesystem scan"
     
     # Run the monitor and capture output
@@ -52,4 +44,23 @@ while true; do
     else
         log_message "No significant changes detected"
     fi
-done
\ No newline at end of file
+}
+
+# --once: a single scan for an external scheduler (scheduling_engine.py)
+if [ "$1" = "--once" ]; then
+    scan_once
+    exit 0
+fi
+
+log_message "Starting continuous filesystem monitoring for $WATCH_DIR"
+
+# Run initial scan
+python "$MONITOR_SCRIPT"
+
+# Main monitoring loop
+while true; do
+    # Wait for 30 minutes
+    sleep 1800
+    
+    scan_once
+done
@@ -16,10 +16,10 @@ CREATE TABLE IF NOT EXISTS scheduled_tasks (
     )),
     description TEXT,
     command TEXT NOT NULL,
-    schedule_type VARCHAR(20) NOT NULL CHECK (schedule_type IN ('once', 'recurring', 'cron')),
+    schedule_type VARCHAR(20) NOT NULL CHECK (schedule_type IN ('once', 'recurring', 'cron', 'dependent')),
     cron_expression VARCHAR(100), -- For cron-based scheduling
     interval_minutes INTEGER, -- For recurring tasks
-    next_run_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    next_run_at TIMESTAMP WITH TIME ZONE, -- NULL = not scheduled (e.g. waiting on dependencies)
     last_run_at TIMESTAMP WITH TIME ZONE,
     last_success_at TIMESTAMP WITH TIME ZONE,
     status VARCHAR(20) DEFAULT 'active' CHECK (status IN ('active', 'paused', 'completed', 'failed')),
@@ -29,16 +29,17 @@ CREATE TABLE IF NOT EXISTS scheduled_tasks (
     timeout_seconds INTEGER DEFAULT 300, -- 5 minute default timeout
     requires_brain BOOLEAN DEFAULT FALSE, -- Whether to use brain.sh vs claude -p
     context_memory_ids INTEGER[], -- Related memory IDs for context
-    depends_on_task_id INTEGER REFERENCES scheduled_tasks(id),
+    depends_on_task_id INTEGER REFERENCES scheduled_tasks(id), -- Legacy single parent, see task_dependencies
     metadata JSONB DEFAULT '{}',
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     is_active BOOLEAN DEFAULT TRUE
 );
 
--- Task execution history table
+-- Task execution history table, range-partitioned by month on started_at.
+-- Existing unpartitioned installs: run migrate_task_executions_partitioned.sql
 CREATE TABLE IF NOT EXISTS task_executions (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     task_id INTEGER NOT NULL REFERENCES scheduled_tasks(id),
     execution_id UUID DEFAULT uuid_generate_v4(),
     started_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -49,8 +50,9 @@ CREATE TABLE IF NOT EXISTS task_executions (
     execution_time_ms INTEGER,
     memory_ids INTEGER[], -- Memories created during execution
     log_file_path VARCHAR(500),
-    metadata JSONB DEFAULT '{}'
-);
+    metadata JSONB DEFAULT '{}',
+    PRIMARY KEY (id, started_at)
+) PARTITION BY RANGE (started_at);
 
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_scheduled_tasks_next_run ON scheduled_tasks(next_run_at) WHERE is_active = TRUE AND status = 'active';
@@ -76,6 +78,73 @@ CREATE TRIGGER update_scheduled_tasks_updated_at
     FOR EACH ROW 
     EXECUTE FUNCTION update_scheduled_tasks_updated_at();
 
+-- Task dependency DAG: a task may have any number of parents
+CREATE TABLE IF NOT EXISTS task_dependencies (
+    task_id INTEGER NOT NULL REFERENCES scheduled_tasks(id) ON DELETE CASCADE,
+    depends_on_task_id INTEGER NOT NULL REFERENCES scheduled_tasks(id) ON DELETE CASCADE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (task_id, depends_on_task_id),
+    CHECK (task_id <> depends_on_task_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_task_dependencies_parent ON task_dependencies(depends_on_task_id);
+
+-- Upgrade existing databases: 'dependent' schedules, nullable next_run_at,
+-- and single-parent dependencies moved into the edge table
+ALTER TABLE scheduled_tasks DROP CONSTRAINT IF EXISTS scheduled_tasks_schedule_type_check;
+ALTER TABLE scheduled_tasks ADD CONSTRAINT scheduled_tasks_schedule_type_check
+    CHECK (schedule_type IN ('once', 'recurring', 'cron', 'dependent'));
+ALTER TABLE scheduled_tasks ALTER COLUMN next_run_at DROP NOT NULL;
+
+INSERT INTO task_dependencies (task_id, depends_on_task_id)
+SELECT id, depends_on_task_id FROM scheduled_tasks WHERE depends_on_task_id IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+-- A task is ready when every parent has succeeded since the task last ran
+-- (the current run window). Uses last_success_at on the parent rows, so it
+-- never scans task_executions.
+CREATE OR REPLACE FUNCTION task_dependencies_met(
+    check_task_id INTEGER,
+    check_last_run_at TIMESTAMP WITH TIME ZONE
+)
+RETURNS BOOLEAN AS $$
+    SELECT NOT EXISTS (
+        SELECT 1
+        FROM task_dependencies d
+        JOIN scheduled_tasks p ON p.id = d.depends_on_task_id
+        WHERE d.task_id = check_task_id
+            AND (p.last_success_at IS NULL
+                 OR p.last_success_at <= COALESCE(check_last_run_at, '-infinity'::timestamptz))
+    );
+$$ LANGUAGE sql STABLE;
+
+-- When a task succeeds, make every 'dependent' child whose parents have all
+-- succeeded due immediately. Independent branches are released together and
+-- run in parallel on the worker pool.
+CREATE OR REPLACE FUNCTION release_dependent_tasks()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE scheduled_tasks c
+    SET next_run_at = CURRENT_TIMESTAMP
+    FROM task_dependencies d
+    WHERE d.depends_on_task_id = NEW.id
+        AND c.id = d.task_id
+        AND c.schedule_type = 'dependent'
+        AND c.is_active = TRUE
+        AND c.status = 'active'
+        AND (c.next_run_at IS NULL OR c.next_run_at > CURRENT_TIMESTAMP)
+        AND task_dependencies_met(c.id, c.last_run_at);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS release_dependent_tasks ON scheduled_tasks;
+CREATE TRIGGER release_dependent_tasks
+    AFTER UPDATE OF last_success_at ON scheduled_tasks
+    FOR EACH ROW
+    WHEN (NEW.last_success_at IS DISTINCT FROM OLD.last_success_at)
+    EXECUTE FUNCTION release_dependent_tasks();
+
 -- Function to get next tasks to run
 CREATE OR REPLACE FUNCTION get_pending_tasks(batch_size INTEGER DEFAULT 10)
 RETURNS TABLE(
@@ -105,19 +174,15 @@ BEGIN
     WHERE st.is_active = TRUE
         AND st.status = 'active'
         AND st.next_run_at <= CURRENT_TIMESTAMP
-        AND (st.depends_on_task_id IS NULL 
-             OR EXISTS (
-                 SELECT 1 FROM task_executions te 
-                 WHERE te.task_id = st.depends_on_task_id 
-                 AND te.status = 'success'
-                 AND te.completed_at > COALESCE(st.last_run_at, '1970-01-01'::timestamptz)
-             ))
+        AND task_dependencies_met(st.id, st.last_run_at)
     ORDER BY st.priority DESC, st.next_run_at ASC
     LIMIT batch_size;
 END;
 $$ LANGUAGE plpgsql;
 
 -- Function to calculate next run time
+-- NOTE: the schedulers compute next runs with cron_expression.py, which
+-- supports full cron syntax. This function is kept for ad-hoc SQL only.
 CREATE OR REPLACE FUNCTION calculate_next_run(
     schedule_type VARCHAR,
     cron_expression VARCHAR,
@@ -165,16 +230,566 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
--- View for active tasks with execution stats
-CREATE OR REPLACE VIEW active_tasks_view AS
-SELECT 
+-- Lease columns for multi-worker task claiming
+ALTER TABLE scheduled_tasks ADD COLUMN IF NOT EXISTS locked_by VARCHAR(255);
+ALTER TABLE scheduled_tasks ADD COLUMN IF NOT EXISTS locked_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE scheduled_tasks ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE;
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_tasks_lease ON scheduled_tasks(lease_expires_at) WHERE locked_by IS NOT NULL;
+
+-- Resource class used by admission control (admission_control.py) to hold
+-- back heavy tasks while the host is under load
+ALTER TABLE scheduled_tasks ADD COLUMN IF NOT EXISTS resource_class VARCHAR(20) NOT NULL DEFAULT 'network';
+ALTER TABLE scheduled_tasks DROP CONSTRAINT IF EXISTS scheduled_tasks_resource_class_check;
+ALTER TABLE scheduled_tasks ADD CONSTRAINT scheduled_tasks_resource_class_check
+    CHECK (resource_class IN ('cpu-heavy', 'memory-heavy', 'browser', 'network'));
+
+-- Older claim signature without exclude_classes
+DROP FUNCTION IF EXISTS claim_pending_tasks(VARCHAR, INTEGER, INTEGER, VARCHAR[]);
+
+-- Atomically claim due tasks for a worker. Rows locked by another claimer are
+-- skipped rather than waited on, and tasks whose lease has expired are
+-- claimable again, so any number of workers can drain the queue in parallel.
+CREATE OR REPLACE FUNCTION claim_pending_tasks(
+    worker_id VARCHAR,
+    batch_size INTEGER DEFAULT 10,
+    lease_seconds INTEGER DEFAULT 600,
+    exclude_types VARCHAR[] DEFAULT '{}',
+    exclude_classes VARCHAR[] DEFAULT '{}'
+)
+RETURNS SETOF scheduled_tasks AS $$
+BEGIN
+    RETURN QUERY
+    WITH candidates AS (
+        SELECT st.id
+        FROM scheduled_tasks st
+        WHERE st.is_active = TRUE
+            AND st.status = 'active'
+            AND st.next_run_at <= CURRENT_TIMESTAMP
+            AND (st.locked_by IS NULL OR st.lease_expires_at < CURRENT_TIMESTAMP)
+            AND NOT (st.task_type = ANY(exclude_types))
+            AND NOT (st.resource_class = ANY(exclude_classes))
+            AND task_dependencies_met(st.id, st.last_run_at)
+        ORDER BY st.priority DESC, st.next_run_at ASC
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE scheduled_tasks st
+    SET locked_by = worker_id,
+        locked_at = CURRENT_TIMESTAMP,
+        -- Lease always outlives the task's own timeout
+        lease_expires_at = CURRENT_TIMESTAMP + make_interval(
+            secs => GREATEST(lease_seconds, COALESCE(st.timeout_seconds, 300) + 60)
+        ),
+        last_run_at = CURRENT_TIMESTAMP
+    FROM candidates c
+    WHERE st.id = c.id
+    RETURNING st.*;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Extend the leases of tasks a worker is still executing
+CREATE OR REPLACE FUNCTION heartbeat_task_leases(
+    worker_id VARCHAR,
+    task_ids INTEGER[],
+    lease_seconds INTEGER DEFAULT 600
+)
+RETURNS INTEGER AS $$
+DECLARE
+    updated INTEGER;
+BEGIN
+    UPDATE scheduled_tasks st
+    SET lease_expires_at = GREATEST(
+        st.lease_expires_at,
+        CURRENT_TIMESTAMP + make_interval(secs => lease_seconds)
+    )
+    WHERE st.id = ANY(task_ids)
+        AND st.locked_by = heartbeat_task_leases.worker_id;
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Release leases held by dead workers and close out their orphaned executions
+CREATE OR REPLACE FUNCTION recover_expired_leases()
+RETURNS INTEGER AS $$
+DECLARE
+    recovered INTEGER;
+BEGIN
+    WITH expired AS (
+        UPDATE scheduled_tasks st
+        SET locked_by = NULL,
+            locked_at = NULL,
+            lease_expires_at = NULL
+        FROM (
+            SELECT id, locked_by, locked_at
+            FROM scheduled_tasks
+            WHERE locked_by IS NOT NULL
+                AND lease_expires_at < CURRENT_TIMESTAMP
+            FOR UPDATE SKIP LOCKED
+        ) old
+        WHERE st.id = old.id
+        RETURNING old.id, old.locked_by, old.locked_at
+    )
+    UPDATE task_executions te
+    SET status = 'timeout',
+        completed_at = CURRENT_TIMESTAMP,
+        error = 'Lease expired: worker ' || e.locked_by || ' stopped heartbeating'
+    FROM expired e
+    WHERE te.task_id = e.id
+        AND te.status = 'running'
+        AND te.started_at >= e.locked_at;
+    GET DIAGNOSTICS recovered = ROW_COUNT;
+    RETURN recovered;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Wake listening workers whenever a task becomes (re)scheduled
+CREATE OR REPLACE FUNCTION notify_scheduled_tasks_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('scheduled_tasks', NEW.id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notify_scheduled_tasks_changed ON scheduled_tasks;
+CREATE TRIGGER notify_scheduled_tasks_changed
+    AFTER INSERT OR UPDATE OF next_run_at, status, is_active ON scheduled_tasks
+    FOR EACH ROW
+    WHEN (NEW.is_active AND NEW.status = 'active')
+    EXECUTE FUNCTION notify_scheduled_tasks_changed();
+
+-- Make a task due immediately; the trigger above wakes the daemon
+CREATE OR REPLACE FUNCTION run_task_now(run_task_id INTEGER)
+RETURNS BOOLEAN AS $$
+BEGIN
+    UPDATE scheduled_tasks
+    SET next_run_at = CURRENT_TIMESTAMP
+    WHERE id = run_task_id AND is_active = TRUE AND status = 'active';
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ---------------------------------------------------------------------------
+-- Execution history: monthly partitions, archiving, output offload, rollups
+-- ---------------------------------------------------------------------------
+
+CREATE SCHEMA IF NOT EXISTS task_archive;
+
+-- Create the partition holding the month that starts at month_start
+CREATE OR REPLACE FUNCTION create_task_execution_partition(month_start DATE)
+RETURNS TEXT AS $$
+DECLARE
+    first_day DATE := date_trunc('month', month_start)::date;
+    partition_name TEXT := 'task_executions_' || to_char(first_day, 'YYYY_MM');
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF task_executions FOR VALUES FROM (%L) TO (%L)',
+        partition_name, first_day, (first_day + INTERVAL '1 month')::date
+    );
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Make sure partitions exist for this month and the next months_ahead months
+CREATE OR REPLACE FUNCTION ensure_task_execution_partitions(months_ahead INTEGER DEFAULT 2)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE;
+    created INTEGER := 0;
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'task_executions'::regclass
+    ) THEN
+        RAISE NOTICE 'task_executions is not partitioned; run migrate_task_executions_partitioned.sql';
+        RETURN 0;
+    END IF;
+
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', CURRENT_TIMESTAMP),
+            date_trunc('month', CURRENT_TIMESTAMP) + make_interval(months => months_ahead),
+            INTERVAL '1 month'
+        )::date
+    LOOP
+        IF to_regclass('task_executions_' || to_char(month_start, 'YYYY_MM')) IS NULL THEN
+            PERFORM create_task_execution_partition(month_start);
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Detach monthly partitions older than keep_months and move them to the
+-- task_archive schema, where they can be dumped and dropped at leisure.
+-- Rollups are unaffected: they already include the archived executions.
+CREATE OR REPLACE FUNCTION archive_task_execution_partitions(keep_months INTEGER DEFAULT 6)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    partition_name TEXT;
+    cutoff DATE := (date_trunc('month', CURRENT_TIMESTAMP) - make_interval(months => keep_months))::date;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'task_executions'::regclass
+            AND c.relname ~ '^task_executions_[0-9]{4}_[0-9]{2}$'
+            AND to_date(right(c.relname, 7), 'YYYY_MM') < cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE task_executions DETACH PARTITION %I', partition_name);
+        EXECUTE format('ALTER TABLE %I SET SCHEMA task_archive', partition_name);
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'task_executions'::regclass) THEN
+        -- Catches rows outside the pre-created months so inserts never fail
+        CREATE TABLE IF NOT EXISTS task_executions_default PARTITION OF task_executions DEFAULT;
+        PERFORM ensure_task_execution_partitions(2);
+    END IF;
+END $$;
+
+-- Full output of executions whose inline output/error was trimmed, zlib
+-- compressed by task_execution_maintenance.py offload
+CREATE TABLE IF NOT EXISTS task_execution_outputs (
+    execution_id INTEGER NOT NULL,
+    started_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    task_id INTEGER NOT NULL,
+    output_compressed BYTEA,
+    error_compressed BYTEA,
+    original_bytes INTEGER NOT NULL,
+    compressed_bytes INTEGER NOT NULL,
+    offloaded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (execution_id, started_at)
+);
+
+-- Already compressed: store out of line without a second TOAST compression pass
+ALTER TABLE task_execution_outputs ALTER COLUMN output_compressed SET STORAGE EXTERNAL;
+ALTER TABLE task_execution_outputs ALTER COLUMN error_compressed SET STORAGE EXTERNAL;
+
+-- Per-task execution statistics, maintained incrementally as executions finish
+-- so views and dashboards never aggregate the raw history
+CREATE TABLE IF NOT EXISTS task_execution_rollups (
+    task_id INTEGER PRIMARY KEY REFERENCES scheduled_tasks(id) ON DELETE CASCADE,
+    total_executions BIGINT NOT NULL DEFAULT 0,
+    successful_executions BIGINT NOT NULL DEFAULT 0,
+    failed_executions BIGINT NOT NULL DEFAULT 0,
+    timeout_executions BIGINT NOT NULL DEFAULT 0,
+    timed_executions BIGINT NOT NULL DEFAULT 0, -- Executions with an execution_time_ms
+    total_execution_time_ms BIGINT NOT NULL DEFAULT 0,
+    duration_buckets BIGINT[] NOT NULL DEFAULT array_fill(0::BIGINT, ARRAY[14]),
+    last_status VARCHAR(20),
+    last_completed_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Upper bounds (ms) of the duration histogram buckets; a 14th bucket holds the rest
+CREATE OR REPLACE FUNCTION task_duration_bucket_bounds()
+RETURNS INTEGER[] AS $$
+    SELECT ARRAY[100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000,
+                 120000, 300000, 600000, 1800000];
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 1-based histogram bucket for a duration
+CREATE OR REPLACE FUNCTION task_duration_bucket(duration_ms INTEGER)
+RETURNS INTEGER AS $$
+    SELECT width_bucket(duration_ms, task_duration_bucket_bounds()) + 1;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Approximate percentile from a duration histogram (upper bound of the bucket
+-- holding the quantile; the open-ended last bucket reports its lower bound)
+CREATE OR REPLACE FUNCTION task_duration_percentile(buckets BIGINT[], quantile NUMERIC)
+RETURNS INTEGER AS $$
+DECLARE
+    bounds INTEGER[] := task_duration_bucket_bounds();
+    total BIGINT;
+    target BIGINT;
+    seen BIGINT := 0;
+BEGIN
+    SELECT SUM(b) INTO total FROM unnest(buckets) b;
+    IF total IS NULL OR total = 0 THEN
+        RETURN NULL;
+    END IF;
+    target := CEIL(total * quantile);
+    FOR i IN 1..array_length(buckets, 1) LOOP
+        seen := seen + buckets[i];
+        IF seen >= target THEN
+            RETURN bounds[LEAST(i, array_length(bounds, 1))];
+        END IF;
+    END LOOP;
+    RETURN bounds[array_length(bounds, 1)];
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Fold a finished execution into its task's rollup
+CREATE OR REPLACE FUNCTION update_task_execution_rollup()
+RETURNS TRIGGER AS $$
+DECLARE
+    bucket INTEGER;
+BEGIN
+    INSERT INTO task_execution_rollups AS r (
+        task_id, total_executions, successful_executions, failed_executions,
+        timeout_executions, timed_executions, total_execution_time_ms,
+        last_status, last_completed_at
+    )
+    VALUES (
+        NEW.task_id, 1,
+        (NEW.status = 'success')::int,
+        (NEW.status = 'failed')::int,
+        (NEW.status = 'timeout')::int,
+        (NEW.execution_time_ms IS NOT NULL)::int,
+        COALESCE(NEW.execution_time_ms, 0),
+        NEW.status, NEW.completed_at
+    )
+    ON CONFLICT (task_id) DO UPDATE SET
+        total_executions = r.total_executions + 1,
+        successful_executions = r.successful_executions + EXCLUDED.successful_executions,
+        failed_executions = r.failed_executions + EXCLUDED.failed_executions,
+        timeout_executions = r.timeout_executions + EXCLUDED.timeout_executions,
+        timed_executions = r.timed_executions + EXCLUDED.timed_executions,
+        total_execution_time_ms = r.total_execution_time_ms + EXCLUDED.total_execution_time_ms,
+        last_status = EXCLUDED.last_status,
+        last_completed_at = GREATEST(r.last_completed_at, EXCLUDED.last_completed_at),
+        updated_at = CURRENT_TIMESTAMP;
+
+    IF NEW.execution_time_ms IS NOT NULL THEN
+        bucket := task_duration_bucket(NEW.execution_time_ms);
+        UPDATE task_execution_rollups
+        SET duration_buckets[bucket] = duration_buckets[bucket] + 1
+        WHERE task_id = NEW.task_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_task_execution_rollup ON task_executions;
+CREATE TRIGGER update_task_execution_rollup
+    AFTER UPDATE OF status ON task_executions
+    FOR EACH ROW
+    WHEN (OLD.status = 'running' AND NEW.status <> 'running')
+    EXECUTE FUNCTION update_task_execution_rollup();
+
+DROP TRIGGER IF EXISTS insert_task_execution_rollup ON task_executions;
+CREATE TRIGGER insert_task_execution_rollup
+    AFTER INSERT ON task_executions
+    FOR EACH ROW
+    WHEN (NEW.status <> 'running')
+    EXECUTE FUNCTION update_task_execution_rollup();
+
+-- Recompute every rollup from the (attached) execution history
+CREATE OR REPLACE FUNCTION rebuild_task_execution_rollups()
+RETURNS INTEGER AS $$
+DECLARE
+    rebuilt INTEGER;
+BEGIN
+    DELETE FROM task_execution_rollups;
+
+    INSERT INTO task_execution_rollups (
+        task_id, total_executions, successful_executions, failed_executions,
+        timeout_executions, timed_executions, total_execution_time_ms,
+        duration_buckets, last_status, last_completed_at
+    )
+    SELECT
+        te.task_id,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE te.status = 'success'),
+        COUNT(*) FILTER (WHERE te.status = 'failed'),
+        COUNT(*) FILTER (WHERE te.status = 'timeout'),
+        COUNT(te.execution_time_ms),
+        COALESCE(SUM(te.execution_time_ms), 0),
+        ARRAY(
+            SELECT COUNT(x.id)
+            FROM generate_series(1, 14) b
+            LEFT JOIN task_executions x
+                ON x.task_id = te.task_id
+                AND x.status <> 'running'
+                AND x.execution_time_ms IS NOT NULL
+                AND task_duration_bucket(x.execution_time_ms) = b
+            GROUP BY b
+            ORDER BY b
+        ),
+        (array_agg(te.status ORDER BY te.completed_at DESC NULLS LAST))[1],
+        MAX(te.completed_at)
+    FROM task_executions te
+    JOIN scheduled_tasks st ON st.id = te.task_id
+    WHERE te.status <> 'running'
+    GROUP BY te.task_id;
+
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+    RETURN rebuilt;
+END;
+$$ LANGUAGE plpgsql;
+
+-- View for active tasks with execution stats (read from the rollups)
+DROP VIEW IF EXISTS active_tasks_view;
+CREATE VIEW active_tasks_view AS
+SELECT
     st.*,
-    COUNT(te.id) as total_executions,
-    COUNT(CASE WHEN te.status = 'success' THEN 1 END) as successful_executions,
-    COUNT(CASE WHEN te.status = 'failed' THEN 1 END) as failed_executions,
-    AVG(te.execution_time_ms) as avg_execution_time_ms,
-    MAX(te.completed_at) as last_completed_at
+    COALESCE(r.total_executions, 0) as total_executions,
+    COALESCE(r.successful_executions, 0) as successful_executions,
+    COALESCE(r.failed_executions, 0) as failed_executions,
+    r.total_execution_time_ms::numeric / NULLIF(r.timed_executions, 0) as avg_execution_time_ms,
+    task_duration_percentile(r.duration_buckets, 0.95) as p95_execution_time_ms,
+    r.last_completed_at
 FROM scheduled_tasks st
-LEFT JOIN task_executions te ON st.id = te.task_id
-WHERE st.is_active = TRUE
-GROUP BY st.id;
\ No newline at end of file
+LEFT JOIN task_execution_rollups r ON r.task_id = st.id
+WHERE st.is_active = TRUE;
+
+-- Deferred retries for commands run through TaskErrorHandler: a failed
+-- attempt schedules its retry here instead of sleeping, so the caller returns
+-- immediately and the retry survives process restarts
+CREATE TABLE IF NOT EXISTS task_retry_queue (
+    id SERIAL PRIMARY KEY,
+    task_name VARCHAR(255) NOT NULL UNIQUE, -- At most one pending retry per task
+    command TEXT NOT NULL,
+    timeout_seconds INTEGER,
+    attempt INTEGER NOT NULL, -- Retry number this row will run (1 = first retry)
+    max_retries INTEGER NOT NULL,
+    next_run_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_error TEXT,
+    locked_by VARCHAR(255),
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_task_retry_queue_next_run ON task_retry_queue(next_run_at);
+
+-- Wake the daemon so it can shorten its sleep to the new retry's due time
+CREATE OR REPLACE FUNCTION notify_task_retry_queued()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('scheduled_tasks', 'retry:' || NEW.task_name);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notify_task_retry_queued ON task_retry_queue;
+CREATE TRIGGER notify_task_retry_queued
+    AFTER INSERT OR UPDATE OF next_run_at ON task_retry_queue
+    FOR EACH ROW
+    EXECUTE FUNCTION notify_task_retry_queued();
+
+-- Per-execution resource usage, recorded by task_resources.py from the task's
+-- cgroup (memory peak includes page cache) or sampled with psutil where
+-- cgroups v2 is unavailable. Limits come from scheduled_tasks.metadata
+-- (memory_limit_mb, cpu_limit, pids_limit).
+ALTER TABLE task_executions ADD COLUMN IF NOT EXISTS peak_rss_bytes BIGINT;
+ALTER TABLE task_executions ADD COLUMN IF NOT EXISTS cpu_user_ms BIGINT;
+ALTER TABLE task_executions ADD COLUMN IF NOT EXISTS cpu_system_ms BIGINT;
+ALTER TABLE task_executions ADD COLUMN IF NOT EXISTS io_read_bytes BIGINT;
+ALTER TABLE task_executions ADD COLUMN IF NOT EXISTS io_write_bytes BIGINT;
+ALTER TABLE task_executions ADD COLUMN IF NOT EXISTS oom_killed BOOLEAN;
+
+-- Fair-share dispatch (fair_share.py): peek at the due tasks of every
+-- task_type without locking them: the best per_type by aged priority
+-- (priority plus one point per aging_seconds past next_run_at) and the
+-- per_type oldest, so SLO breaches are always visible. The chosen ids are
+-- then leased with claim_tasks_by_id.
+CREATE OR REPLACE FUNCTION due_task_candidates(
+    per_type INTEGER DEFAULT 5,
+    aging_seconds INTEGER DEFAULT 600,
+    exclude_types VARCHAR[] DEFAULT '{}',
+    exclude_classes VARCHAR[] DEFAULT '{}'
+)
+RETURNS TABLE (
+    id INTEGER,
+    task_name VARCHAR,
+    task_type VARCHAR,
+    priority INTEGER,
+    next_run_at TIMESTAMP WITH TIME ZONE,
+    lag_seconds DOUBLE PRECISION,
+    effective_priority DOUBLE PRECISION
+) AS $$
+    SELECT c.id, c.task_name, c.task_type, c.priority, c.next_run_at,
+           c.lag_seconds, c.effective_priority
+    FROM (
+        SELECT st.id, st.task_name, st.task_type, st.priority, st.next_run_at,
+               a.lag_seconds,
+               st.priority + a.lag_seconds / GREATEST(aging_seconds, 1) AS effective_priority,
+               ROW_NUMBER() OVER (
+                   PARTITION BY st.task_type
+                   ORDER BY st.priority + a.lag_seconds / GREATEST(aging_seconds, 1) DESC,
+                            st.next_run_at
+               ) AS priority_rank,
+               ROW_NUMBER() OVER (
+                   PARTITION BY st.task_type
+                   ORDER BY st.next_run_at
+               ) AS lag_rank
+        FROM scheduled_tasks st
+        CROSS JOIN LATERAL (
+            SELECT EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - st.next_run_at)::DOUBLE PRECISION AS lag_seconds
+        ) a
+        WHERE st.is_active = TRUE
+            AND st.status = 'active'
+            AND st.next_run_at <= CURRENT_TIMESTAMP
+            AND (st.locked_by IS NULL OR st.lease_expires_at < CURRENT_TIMESTAMP)
+            AND NOT (st.task_type = ANY(exclude_types))
+            AND NOT (st.resource_class = ANY(exclude_classes))
+            AND task_dependencies_met(st.id, st.last_run_at)
+    ) c
+    WHERE c.priority_rank <= per_type OR c.lag_rank <= per_type;
+$$ LANGUAGE sql STABLE;
+
+-- Lease specific tasks picked from due_task_candidates. Conditions are checked
+-- again under the row lock; tasks another worker got first are left out.
+CREATE OR REPLACE FUNCTION claim_tasks_by_id(
+    worker_id VARCHAR,
+    task_ids INTEGER[],
+    lease_seconds INTEGER DEFAULT 600
+)
+RETURNS SETOF scheduled_tasks AS $$
+BEGIN
+    RETURN QUERY
+    WITH candidates AS (
+        SELECT st.id
+        FROM scheduled_tasks st
+        WHERE st.id = ANY(task_ids)
+            AND st.is_active = TRUE
+            AND st.status = 'active'
+            AND st.next_run_at <= CURRENT_TIMESTAMP
+            AND (st.locked_by IS NULL OR st.lease_expires_at < CURRENT_TIMESTAMP)
+            AND task_dependencies_met(st.id, st.last_run_at)
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE scheduled_tasks st
+    SET locked_by = worker_id,
+        locked_at = CURRENT_TIMESTAMP,
+        lease_expires_at = CURRENT_TIMESTAMP + make_interval(
+            secs => GREATEST(lease_seconds, COALESCE(st.timeout_seconds, 300) + 60)
+        ),
+        last_run_at = CURRENT_TIMESTAMP
+    FROM candidates c
+    WHERE st.id = c.id
+    RETURNING st.*;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Periodic snapshots of the in-process scheduler metrics (see task_metrics.py):
+-- counters and gauges carry a value, histograms their count, sum and quantiles
+CREATE TABLE IF NOT EXISTS task_metrics_snapshots (
+    id BIGSERIAL PRIMARY KEY,
+    captured_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    source VARCHAR(50) NOT NULL, -- task_daemon or task_scheduler
+    worker_id VARCHAR(255) NOT NULL,
+    metric VARCHAR(100) NOT NULL,
+    labels JSONB NOT NULL DEFAULT '{}',
+    value DOUBLE PRECISION,
+    count BIGINT,
+    sum DOUBLE PRECISION,
+    p50 DOUBLE PRECISION,
+    p95 DOUBLE PRECISION,
+    p99 DOUBLE PRECISION
+);
+
+CREATE INDEX IF NOT EXISTS idx_task_metrics_snapshots_captured
+    ON task_metrics_snapshots (captured_at);
+CREATE INDEX IF NOT EXISTS idx_task_metrics_snapshots_metric
+    ON task_metrics_snapshots (metric, captured_at DESC);
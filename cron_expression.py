@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Cron Expression Engine
+Parses five-field cron expressions into bitsets and finds fire times by jumping
+straight to the next matching month/day/hour/minute instead of iterating
+"""
+
+import random
+import calendar
+from itertools import islice
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+ALIASES = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+
+MONTH_NAMES = {name.lower(): i for i, name in enumerate(calendar.month_abbr) if name}
+DAY_NAMES = {'sun': 0, 'mon': 1, 'tue': 2, 'wed': 3, 'thu': 4, 'fri': 5, 'sat': 6}
+
+# (name, min, max, names) for minute, hour, day-of-month, month, day-of-week
+FIELDS = [
+    ('minute', 0, 59, {}),
+    ('hour', 0, 23, {}),
+    ('day', 1, 31, {}),
+    ('month', 1, 12, MONTH_NAMES),
+    ('weekday', 0, 7, DAY_NAMES),  # 7 is an alias for Sunday
+]
+
+# Give up on expressions that can never fire (e.g. "0 0 30 2 *")
+MAX_SEARCH_YEARS = 8
+
+
+def _next_bit(mask: int, start: int) -> Optional[int]:
+    """Lowest set bit position >= start, or None"""
+    shifted = mask >> start
+    if not shifted:
+        return None
+    return start + (shifted & -shifted).bit_length() - 1
+
+
+def _parse_value(value: str, names: Dict[str, int], field: str) -> int:
+    value = value.lower()
+    if value in names:
+        return names[value]
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Invalid {field} value: {value!r}")
+
+
+def _parse_field(spec: str, field: str, low: int, high: int, names: Dict[str, int]) -> int:
+    """Parse one cron field (lists, ranges, steps, names) into a bitmask"""
+    mask = 0
+    for item in spec.split(','):
+        if not item:
+            raise ValueError(f"Empty item in {field} field: {spec!r}")
+
+        step = 1
+        if '/' in item:
+            item, step_str = item.split('/', 1)
+            try:
+                step = int(step_str)
+            except ValueError:
+                raise ValueError(f"Invalid step in {field} field: {step_str!r}")
+            if step < 1:
+                raise ValueError(f"Step must be positive in {field} field: {spec!r}")
+
+        if item == '*':
+            start, end = low, high
+        elif '-' in item:
+            start_str, end_str = item.split('-', 1)
+            start = _parse_value(start_str, names, field)
+            end = _parse_value(end_str, names, field)
+        else:
+            start = _parse_value(item, names, field)
+            # "5/15" means "from 5 to the end, every 15"
+            end = high if step > 1 else start
+
+        if not (low <= start <= high and low <= end <= high) or start > end:
+            raise ValueError(f"{field} out of range {low}-{high}: {spec!r}")
+
+        for value in range(start, end + 1, step):
+            mask |= 1 << value
+    return mask
+
+
+class CronExpression:
+    """A compiled cron expression: one bitset per field"""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        spec = ALIASES.get(expression.strip().lower(), expression)
+        parts = spec.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields, got {len(parts)}: {expression!r}")
+
+        masks = [_parse_field(part, *field) for part, field in zip(parts, FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = masks
+
+        # Fold Sunday=7 onto Sunday=0
+        if weekdays & (1 << 7):
+            weekdays = (weekdays | 1) & ~(1 << 7)
+        self.weekdays = weekdays
+
+        # Standard cron semantics: when both day fields are restricted, a day
+        # matches if *either* matches; otherwise it must match both (a field
+        # starting with '*', like "*/7", counts as unrestricted)
+        self.day_restricted = not parts[2].startswith('*')
+        self.weekday_restricted = not parts[4].startswith('*')
+
+    def __repr__(self):
+        return f"CronExpression({self.expression!r})"
+
+    def _day_mask(self, year: int, month: int) -> int:
+        """Bitmask of matching days (bit N = day N) for a specific month"""
+        first_weekday, days_in_month = calendar.monthrange(year, month)
+        first_weekday = (first_weekday + 1) % 7  # Monday=0 -> cron Sunday=0
+        valid = ((1 << (days_in_month + 1)) - 1) & ~1
+
+        weekday_mask = 0
+        for weekday in range(7):
+            if self.weekdays & (1 << weekday):
+                day = 1 + (weekday - first_weekday) % 7
+                while day <= days_in_month:
+                    weekday_mask |= 1 << day
+                    day += 7
+
+        if self.day_restricted and self.weekday_restricted:
+            mask = self.days | weekday_mask
+        else:
+            mask = self.days & weekday_mask
+        return mask & valid
+
+    def matches(self, dt: datetime) -> bool:
+        """Check whether dt (to the minute) is a fire time"""
+        return bool(
+            self.minutes & (1 << dt.minute)
+            and self.hours & (1 << dt.hour)
+            and self.months & (1 << dt.month)
+            and self._day_mask(dt.year, dt.month) & (1 << dt.day)
+        )
+
+    def next_fire(self, after: datetime) -> datetime:
+        """First fire time strictly after `after`
+
+        Aware datetimes are evaluated in local wall-clock time and returned
+        aware; naive datetimes are treated as local time and returned naive.
+        """
+        aware = after.tzinfo is not None
+        t = after.astimezone().replace(tzinfo=None) if aware else after
+        t = t.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit_year = t.year + MAX_SEARCH_YEARS
+
+        while t.year <= limit_year:
+            month = _next_bit(self.months, t.month)
+            if month is None:
+                t = datetime(t.year + 1, 1, 1)
+                continue
+            if month != t.month:
+                t = datetime(t.year, month, 1)
+
+            day = _next_bit(self._day_mask(t.year, t.month), t.day)
+            if day is None:
+                t = datetime(t.year + (t.month == 12), t.month % 12 + 1, 1)
+                continue
+            if day != t.day:
+                t = t.replace(day=day, hour=0, minute=0)
+
+            hour = _next_bit(self.hours, t.hour)
+            if hour is None:
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if hour != t.hour:
+                t = t.replace(hour=hour, minute=0)
+
+            minute = _next_bit(self.minutes, t.minute)
+            if minute is None:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+
+            t = t.replace(minute=minute)
+            return t.astimezone() if aware else t
+
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+    def iter_fire_times(self, after: datetime) -> Iterator[datetime]:
+        """Yield successive fire times after `after`"""
+        t = after
+        while True:
+            t = self.next_fire(t)
+            yield t
+
+    def next_fire_times(self, after: datetime, count: int) -> List[datetime]:
+        """The next `count` fire times after `after`"""
+        return list(islice(self.iter_fire_times(after), count))
+
+
+@lru_cache(maxsize=1024)
+def compile_cron(expression: str) -> CronExpression:
+    """Parse a cron expression, caching the compiled bitsets"""
+    return CronExpression(expression)
+
+
+def is_cron_expression(pattern: str) -> bool:
+    """Check whether a schedule pattern is a valid cron expression or alias"""
+    try:
+        compile_cron(pattern)
+        return True
+    except ValueError:
+        return False
+
+
+def schedule_shift(task: Dict) -> Tuple[float, float]:
+    """(offset, jitter) seconds from a task's metadata (see capacity_planner.py)"""
+    metadata = task.get('metadata') or {}
+    try:
+        return (float(metadata.get('schedule_offset_seconds') or 0),
+                float(metadata.get('schedule_jitter_seconds') or 0))
+    except (TypeError, ValueError):
+        return 0.0, 0.0
+
+
+def next_run_time(schedule_type: str, cron_expression: Optional[str],
+                  interval_minutes: Optional[int],
+                  last_run: Optional[datetime] = None,
+                  offset_seconds: float = 0, jitter_seconds: float = 0) -> Optional[datetime]:
+    """Python counterpart of the calculate_next_run() SQL function
+
+    Returns None for one-off and 'dependent' tasks, which have no next run
+    of their own. Cron fire times are moved offset_seconds later (recurring
+    tasks carry their offset in their phase), and both get up to
+    jitter_seconds of random delay.
+    """
+    base = last_run or datetime.now().astimezone()
+    now = datetime.now(base.tzinfo) if base.tzinfo else datetime.now()
+    jitter = timedelta(seconds=random.uniform(0, jitter_seconds)) if jitter_seconds else timedelta()
+
+    if schedule_type == 'recurring' and interval_minutes:
+        return base + timedelta(minutes=interval_minutes) + jitter
+    if schedule_type == 'cron' and cron_expression:
+        # Never schedule into the past, however long ago the last run was
+        offset = timedelta(seconds=offset_seconds)
+        return compile_cron(cron_expression).next_fire(max(base, now) - offset) + offset + jitter
+    return None
+
+
+def next_fire_times_for_tasks(tasks: List[Dict], count: int = 1,
+                              after: Optional[datetime] = None) -> Dict[int, List[datetime]]:
+    """Bulk API: the next `count` fire times for every task
+
+    Tasks are dicts with id, schedule_type, cron_expression and
+    interval_minutes (scheduled_tasks rows or task templates).
+    Tasks that never fire again (one-off or unparseable) map to [].
+    """
+    after = after or datetime.now().astimezone()
+    results: Dict[int, List[datetime]] = {}
+
+    for i, task in enumerate(tasks):
+        key = task.get('id', i)
+        schedule_type = task.get('schedule_type')
+        try:
+            if schedule_type == 'cron' and task.get('cron_expression'):
+                results[key] = compile_cron(task['cron_expression']).next_fire_times(after, count)
+            elif schedule_type == 'recurring' and task.get('interval_minutes'):
+                step = timedelta(minutes=task['interval_minutes'])
+                results[key] = [after + step * (n + 1) for n in range(count)]
+            else:
+                results[key] = []
+        except ValueError:
+            results[key] = []
+    return results
+
+
+def main():
+    """Show upcoming fire times for a cron expression"""
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python cron_expression.py '<cron expression>' [count]")
+        return
+
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    expression = compile_cron(sys.argv[1])
+    for t in expression.next_fire_times(datetime.now(), count):
+        print(t.strftime('%a %Y-%m-%d %H:%M'))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,8 @@ Handles long-running tasks without timeouts
 import os
 import sys
 import json
-import subprocess
+import heapq
+import asyncio
 import logging
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -15,8 +16,9 @@ import psutil
 import signal
 import multiprocessing
 from typing import Dict, List, Optional, Callable
-import schedule
-import time
+from cron_expression import compile_cron
+from output_capture import OutputCapture, execution_log_path
+from cron_state import CronState, load_history
 
 # Setup logging
 log_dir = Path(__file__).parent / "logs"
@@ -43,6 +45,7 @@ class Task:
         self.retry_count = 0
         self.last_run = None
         self.last_status = None
+        self.last_start_lag = None  # Seconds between intended and actual start
         
     def to_dict(self) -> dict:
         return {
@@ -53,16 +56,20 @@ class Task:
             'max_retries': self.max_retries,
             'retry_count': self.retry_count,
             'last_run': self.last_run.isoformat() if self.last_run else None,
-            'last_status': self.last_status
+            'last_status': self.last_status,
+            'last_start_lag': self.last_start_lag
         }
 
 class CronScheduler:
     """Main scheduler class"""
     def __init__(self):
         self.tasks: Dict[str, Task] = {}
-        self.running_processes: Dict[str, subprocess.Popen] = {}
+        self.running_processes: Dict[str, asyncio.subprocess.Process] = {}
+        self.jobs: Dict[str, asyncio.Task] = {}  # Supervisor of each task's latest run
         self.config_file = Path(__file__).parent / "data" / "cron_tasks.json"
         self.config_file.parent.mkdir(exist_ok=True)
+        # Results are written behind, at most every CRON_STATE_FLUSH_SECONDS
+        self.state = CronState(self.config_file, self.snapshot)
         self.load_tasks()
         
     def load_tasks(self):
@@ -81,6 +88,7 @@ class CronScheduler:
                         if task_data.get('last_run'):
                             task.last_run = datetime.fromisoformat(task_data['last_run'])
                         task.last_status = task_data.get('last_status')
+                        task.last_start_lag = task_data.get('last_start_lag')
                         self.tasks[task.name] = task
                         logger.info(f"Loaded task: {task.name}")
             except Exception as e:
@@ -127,73 +135,127 @@ class CronScheduler:
         for task in default_tasks:
             self.tasks[task.name] = task
             
-        self.save_tasks()
+        self.save_tasks(force=True)
         
-    def save_tasks(self):
-        """Save tasks to configuration"""
-        data = {
+    def snapshot(self) -> dict:
+        """Task configuration as written to the config file"""
+        return {
             'tasks': [task.to_dict() for task in self.tasks.values()],
             'last_updated': datetime.now().isoformat()
         }
         
-        with open(self.config_file, 'w') as f:
-            json.dump(data, f, indent=2)
+    def save_tasks(self, force: bool = False):
+        """Save tasks to configuration (coalesced unless forced)"""
+        self.state.mark_dirty()
+        self.state.flush(force)
             
-    def run_task(self, task: Task):
-        """Run a single task"""
-        logger.info(f"Starting task: {task.name}")
+    def build_command(self, task: Task) -> List[str]:
+        """argv for a task's command"""
+        if task.command.endswith('.py'):
+            return ['/Users/claudemini/.local/bin/uv', 'run', 'python', task.command]
+        if task.command.endswith('.sh'):
+            return ['bash', task.command]
+        # Anything else (including commands that already start with uv) is split as-is
+        return task.command.split()
+        
+    def trigger_for(self, task: Task, start: datetime) -> Optional[Callable[[datetime], datetime]]:
+        """Function giving a task's first intended start strictly after a time
+        
+        Same semantics as the old `schedule` jobs: "*/N", hourly and daily
+        repeat from scheduler start, "HH:MM" fires daily at that time.
+        """
+        pattern = task.schedule_pattern
+        
+        if pattern.startswith('@') or len(pattern.split()) == 5:
+            # Full cron expression (e.g. "0 9 * * 1-5" or "@weekly")
+            try:
+                return compile_cron(pattern).next_fire
+            except ValueError as e:
+                logger.error(f"Invalid cron pattern for {task.name}: {e}")
+                return None
+        if ':' in pattern:
+            # Specific time of day
+            try:
+                hour, minute = (int(part) for part in pattern.split(':')[:2])
+                return compile_cron(f"{minute} {hour} * * *").next_fire
+            except ValueError as e:
+                logger.error(f"Invalid time pattern for {task.name}: {e}")
+                return None
+        
+        if pattern.startswith('*/') and pattern[2:].isdigit():
+            step = timedelta(minutes=int(pattern[2:]))
+        elif pattern == 'hourly':
+            step = timedelta(hours=1)
+        elif pattern == 'daily':
+            step = timedelta(days=1)
+        else:
+            logger.error(f"Unrecognized schedule pattern for {task.name}: {pattern}")
+            return None
+        # Keep the phase of the scheduler start, skipping slots already past
+        return lambda after: start + step * (max((after - start) // step, -1) + 1)
+        
+    def launch(self, task: Task, intended: datetime):
+        """Start a run of task in the background unless one is still going"""
+        job = self.jobs.get(task.name)
+        if job is not None and not job.done():
+            logger.warning(f"Task {task.name} is still running, skipping")
+            self.record_run(task, intended, None, 'skipped')
+            return
+        self.jobs[task.name] = asyncio.create_task(self.run_task(task, intended))
+        
+    async def kill_group(self, proc: asyncio.subprocess.Process, grace: float = 5.0):
+        """SIGTERM a job's whole process group, then SIGKILL what's left"""
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(proc.pid, sig)
+            except ProcessLookupError:
+                break
+            try:
+                await asyncio.wait_for(proc.wait(), grace)
+                break
+            except asyncio.TimeoutError:
+                continue
+        await proc.wait()
+        
+    async def run_task(self, task: Task, intended: Optional[datetime] = None):
+        """Run a single task as its own process group"""
         task.last_run = datetime.now()
+        intended = intended or task.last_run
+        logger.info(f"Starting task: {task.name}")
+        
+        # Output streams to a per-run log file instead of piling up in memory
+        log_path = execution_log_path(f"cron-{task.name}", task.last_run.timestamp())
+        capture = None
         
         try:
-            # Check if task is already running
-            if task.name in self.running_processes:
-                proc = self.running_processes[task.name]
-                if proc.poll() is None:
-                    logger.warning(f"Task {task.name} is still running, skipping")
-                    return
-                    
-            # Start the task
-            cwd = '/Users/claudemini/Claude/Code/utils'
-            
-            if task.command.endswith('.py'):
-                cmd = ['/Users/claudemini/.local/bin/uv', 'run', 'python', task.command]
-            elif task.command.endswith('.sh'):
-                cmd = ['bash', task.command]
-            elif task.command.startswith('/Users/claudemini/.local/bin/uv'):
-                # Command already includes uv - split it properly
-                cmd = task.command.split()
-            else:
-                cmd = task.command.split()
-                
-            proc = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                cwd=cwd
+            capture = OutputCapture(log_path)
+            # A new session makes the child a process-group leader, so a
+            # timeout kills anything it spawned as well
+            proc = await asyncio.create_subprocess_exec(
+                *self.build_command(task),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd='/Users/claudemini/Claude/Code/utils',
+                start_new_session=True
             )
-            
             self.running_processes[task.name] = proc
             
-            # Handle timeout if specified
-            if task.timeout:
-                try:
-                    stdout, stderr = proc.communicate(timeout=task.timeout)
-                    returncode = proc.returncode
-                except subprocess.TimeoutExpired:
-                    logger.warning(f"Task {task.name} timed out after {task.timeout}s")
-                    proc.terminate()
-                    try:
-                        proc.wait(timeout=5)
-                    except subprocess.TimeoutExpired:
-                        proc.kill()
-                    task.last_status = 'timeout'
-                    task.retry_count += 1
-                    return
-            else:
-                # No timeout - let it run
-                stdout, stderr = proc.communicate()
-                returncode = proc.returncode
+            # Handle timeout if specified (None lets it run indefinitely)
+            try:
+                returncode = await asyncio.wait_for(capture.pump_async(proc), task.timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Task {task.name} timed out after {task.timeout}s")
+                await self.kill_group(proc)
+                task.last_status = 'timeout'
+                task.retry_count += 1
+                return
+            except asyncio.CancelledError:
+                # Scheduler shutdown
+                await self.kill_group(proc)
+                task.last_status = 'cancelled'
+                raise
+            capture.close()
+            stderr = capture.stderr
                 
             # Check result
             if returncode == 0:
@@ -203,7 +265,7 @@ class CronScheduler:
             else:
                 logger.error(f"Task {task.name} failed with code {returncode}")
                 if stderr:
-                    logger.error(f"Error output: {stderr}")
+                    logger.error(f"Error output (full log: {log_path}): {stderr}")
                 task.last_status = 'failed'
                 task.retry_count += 1
                 
@@ -212,48 +274,121 @@ class CronScheduler:
             task.last_status = 'error'
             task.retry_count += 1
         finally:
-            if task.name in self.running_processes:
-                del self.running_processes[task.name]
-            self.save_tasks()
+            if capture is not None:
+                capture.close()
+            self.running_processes.pop(task.name, None)
+            self.record_run(task, intended, task.last_run, task.last_status)
+            # Written behind by flush_state(), never on the run's own path
+            self.state.mark_dirty()
             
-    def schedule_tasks(self):
-        """Schedule all tasks based on their patterns"""
-        for task in self.tasks.values():
-            pattern = task.schedule_pattern
+    def record_run(self, task: Task, intended: datetime, started: Optional[datetime], status: str):
+        """Add a run's schedule accuracy (intended vs actual start) to its task's history"""
+        lag = (started - intended).total_seconds() if started else None
+        if lag is not None:
+            task.last_start_lag = round(lag, 3)
+        self.state.record_run(task.name, {
+            'intended': intended.isoformat(),
+            'started': started.isoformat() if started else None,
+            'start_lag_seconds': round(lag, 3) if lag is not None else None,
+            'duration_seconds': round((datetime.now() - started).total_seconds(), 3) if started else None,
+            'status': status,
+        })
+        
+    async def flush_state(self):
+        """Write coalesced task state and run history in the background"""
+        while True:
+            await asyncio.sleep(self.state.flush_interval)
+            self.state.flush()
             
-            if pattern.startswith('*/'):
-                # Every N minutes
-                minutes = int(pattern[2:])
-                schedule.every(minutes).minutes.do(self.run_task, task)
-            elif ':' in pattern:
-                # Specific time
-                schedule.every().day.at(pattern).do(self.run_task, task)
-            elif pattern == 'hourly':
-                schedule.every().hour.do(self.run_task, task)
-            elif pattern == 'daily':
-                schedule.every().day.do(self.run_task, task)
-                
-            logger.info(f"Scheduled task {task.name} with pattern {pattern}")
+    async def run_async(self):
+        """Event loop: start each job at its intended time, supervise runs concurrently"""
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        
+        start = datetime.now()
+        triggers = {}
+        due = []  # Heap of (intended start, task name)
+        for task in self.tasks.values():
+            trigger = self.trigger_for(task, start)
+            if trigger is None:
+                continue
+            triggers[task.name] = trigger
+            heapq.heappush(due, (trigger(start), task.name))
+            logger.info(f"Scheduled task {task.name} with pattern {task.schedule_pattern}")
             
-    def run(self):
-        """Main scheduler loop"""
-        logger.info("Starting CRON scheduler")
-        self.schedule_tasks()
+        flusher = asyncio.create_task(self.flush_state())
         
         # Run system health check immediately
         if 'system_health_check' in self.tasks:
-            self.run_task(self.tasks['system_health_check'])
+            self.launch(self.tasks['system_health_check'], start)
+            
+        while not stop.is_set():
+            delay = (due[0][0] - datetime.now()).total_seconds() if due else None
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(stop.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            intended, name = heapq.heappop(due)
+            self.launch(self.tasks[name], intended)
+            # Slots missed while the machine slept are dropped, not replayed
+            next_start = triggers[name](max(intended, datetime.now()))
+            heapq.heappush(due, (next_start, name))
+            
+        logger.info("Scheduler stopping, terminating running tasks")
+        jobs = [job for job in self.jobs.values() if not job.done()]
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
+        flusher.cancel()
         
-        while True:
-            try:
-                schedule.run_pending()
-                time.sleep(30)  # Check every 30 seconds
-            except KeyboardInterrupt:
-                logger.info("Scheduler stopped by user")
-                break
-            except Exception as e:
-                logger.error(f"Scheduler error: {e}")
-                time.sleep(60)  # Wait a minute before retrying
+        
+    def run(self):
+        """Main scheduler loop"""
+        logger.info("Starting CRON scheduler")
+        try:
+            asyncio.run(self.run_async())
+        finally:
+            self.state.flush(force=True)
+        logger.info("Scheduler stopped")
+
+
+def schedule_accuracy(history: Dict[str, List[Dict]], hours: float = 24) -> Dict[str, Dict]:
+    """Per task: runs, skips and start lag over the last `hours`"""
+    since = datetime.now() - timedelta(hours=hours)
+    stats: Dict[str, Dict] = {}
+    for name, runs in history.items():
+        for run in runs:
+            if datetime.fromisoformat(run['intended']) < since:
+                continue
+            task = stats.setdefault(name, {'runs': 0, 'skipped': 0, 'lags': []})
+            if run['status'] == 'skipped':
+                task['skipped'] += 1
+            else:
+                task['runs'] += 1
+                task['lags'].append(run['start_lag_seconds'])
+    return stats
+
+
+def print_accuracy(history_file: Path, hours: float = 24):
+    """Print intended-vs-actual start statistics per task"""
+    stats = schedule_accuracy(load_history(history_file), hours)
+    if not stats:
+        print(f"No runs recorded in the last {hours:g}h")
+        return
+    print(f"{'task':<28} {'runs':>5} {'skipped':>8} {'mean lag':>9} {'p95 lag':>8} {'max lag':>8}")
+    for name, task in sorted(stats.items()):
+        lags = sorted(task['lags'])
+        if lags:
+            p95 = lags[min(int(len(lags) * 0.95), len(lags) - 1)]
+            print(f"{name[:28]:<28} {task['runs']:>5} {task['skipped']:>8} "
+                  f"{sum(lags) / len(lags):>8.2f}s {p95:>7.2f}s {lags[-1]:>7.2f}s")
+        else:
+            print(f"{name[:28]:<28} {task['runs']:>5} {task['skipped']:>8} {'-':>9} {'-':>8} {'-':>8}")
+
 
 if __name__ == "__main__":
     # Create git auto-commit script if it doesn't exist
@@ -294,5 +429,10 @@ done
 """)
         git_script.chmod(0o755)
         
+    if len(sys.argv) > 1 and sys.argv[1] == 'accuracy':
+        # Schedule accuracy of recent runs: accuracy [hours]
+        print_accuracy(Path(__file__).parent / "data" / "cron_run_history.json", float(sys.argv[2]) if len(sys.argv) > 2 else 24)
+        sys.exit(0)
+        
     scheduler = CronScheduler()
     scheduler.run()
\ No newline at end of file
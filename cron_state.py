@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Write-behind State for CronScheduler
+Run results only update memory; the task table is written at most every
+flush_interval seconds (and on shutdown) with temp file + fsync + rename, so a
+crash mid-write leaves the previous file intact. Each task's recent runs are
+kept in a bounded ring buffer persisted to their own file, off the hot path.
+"""
+
+import os
+import json
+import time
+import logging
+from collections import deque
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger('cron_state')
+
+FLUSH_SECONDS = float(os.environ.get('CRON_STATE_FLUSH_SECONDS', 30))
+HISTORY_SIZE = int(os.environ.get('CRON_RUN_HISTORY', 100))  # Runs kept per task
+
+
+def atomic_write_json(path: Path, data):
+    """Replace path with data as JSON without ever exposing a partial file"""
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def load_history(history_file: Path) -> Dict[str, List[Dict]]:
+    """Persisted run history: task name -> runs, oldest first"""
+    if not history_file.exists():
+        return {}
+    try:
+        with open(history_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Unreadable run history, starting empty: {e}")
+        return {}
+
+
+class CronState:
+    """Coalesces task-table writes and keeps per-task run history"""
+
+    def __init__(self, tasks_file: Path, snapshot: Callable[[], Dict],
+                 history_file: Optional[Path] = None, flush_interval: float = FLUSH_SECONDS,
+                 history_size: int = HISTORY_SIZE):
+        self.tasks_file = Path(tasks_file)
+        self.history_file = Path(history_file or self.tasks_file.with_name('cron_run_history.json'))
+        self.snapshot = snapshot  # Builds the task table when it's time to write
+        self.flush_interval = flush_interval
+        self.history: Dict[str, Deque[Dict]] = {
+            name: deque(runs, maxlen=history_size)
+            for name, runs in load_history(self.history_file).items()
+        }
+        self.history_size = history_size
+        self.tasks_dirty = False
+        self.history_dirty = False
+        self.last_flush = time.monotonic()
+        self.writes = 0
+
+    def mark_dirty(self):
+        """The task table changed; it will be written by the next flush"""
+        self.tasks_dirty = True
+
+    def record_run(self, name: str, run: Dict):
+        """Append a run to the task's ring buffer"""
+        self.history.setdefault(name, deque(maxlen=self.history_size)).append(run)
+        self.history_dirty = True
+
+    def runs(self, name: str) -> List[Dict]:
+        return list(self.history.get(name, ()))
+
+    def flush(self, force: bool = False) -> bool:
+        """Write whatever changed if flush_interval has passed (or force)
+
+        Returns whether anything was written.
+        """
+        if not (self.tasks_dirty or self.history_dirty):
+            return False
+        if not force and time.monotonic() - self.last_flush < self.flush_interval:
+            return False
+
+        try:
+            if self.tasks_dirty:
+                self.tasks_dirty = False
+                atomic_write_json(self.tasks_file, self.snapshot())
+                self.writes += 1
+            if self.history_dirty:
+                self.history_dirty = False
+                atomic_write_json(self.history_file,
+                                  {name: list(runs) for name, runs in self.history.items()})
+                self.writes += 1
+        except (OSError, TypeError, ValueError) as e:
+            # Keep the changes pending for the next attempt
+            self.tasks_dirty = self.history_dirty = True
+            logger.error(f"Could not save cron state: {e}")
+            return False
+        finally:
+            self.last_flush = time.monotonic()
+        return True
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Shared PostgreSQL connections
+One process-wide connection pool used by the scheduler, executor, memory
+manager, daemon and dashboards instead of a connection per class.
+"""
+
+import os
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+logger = logging.getLogger('db')
+
+DB_PARAMS = {
+    'dbname': 'claudemini',
+    'user': 'claudemini',
+    'host': 'localhost',
+}
+
+_pool: Optional[ThreadedConnectionPool] = None
+_shared = None
+_lock = threading.Lock()
+
+
+def configure(**params):
+    """Override connection parameters (e.g. options, connection_factory) before first use"""
+    if _pool is not None:
+        raise RuntimeError("db.configure() must be called before the pool is created")
+    DB_PARAMS.update(params)
+
+
+def connect(**overrides):
+    """A dedicated connection outside the pool (e.g. for LISTEN)"""
+    return psycopg2.connect(**{**DB_PARAMS, **overrides})
+
+
+def get_pool() -> ThreadedConnectionPool:
+    """Process-wide pool, sized by DB_POOL_MAX (default 5), closed at exit"""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadedConnectionPool(1, int(os.environ.get('DB_POOL_MAX', 5)), **DB_PARAMS)
+            atexit.register(close_all)
+        return _pool
+
+
+@contextmanager
+def pooled_connection():
+    """Borrow a connection for one unit of work; commits on success, rolls back on error"""
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def shared_connection():
+    """The connection shared by every component in this process
+
+    Components share it from a single thread and commit or roll back their
+    own work, so a scheduler run holds one connection instead of three.
+    A closed connection is returned to the pool and replaced.
+    """
+    global _shared
+    pool = get_pool()
+    with _lock:
+        if _shared is not None and _shared.closed:
+            pool.putconn(_shared, close=True)
+            _shared = None
+        if _shared is None:
+            _shared = pool.getconn()
+            _shared.autocommit = False
+        return _shared
+
+
+def close_all():
+    """Close every pooled connection"""
+    global _pool, _shared
+    with _lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+        _shared = None
@@ -22,6 +22,8 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from circuit_breaker import NETWORK_ERRORS, check_http_status, get_breaker
+
 # Set up logging
 log_dir = Path.home() / "Claude" / "logs"
 log_dir.mkdir(exist_ok=True)
@@ -45,6 +47,8 @@ class EmailAutomation:
         self.email_db = Path.home() / "Claude" / "Code" / "utils" / "email_database.json"
         self.response_templates = self.load_response_templates()
         self.service = None
+        # Shared with gmail_automation.py: skip Gmail while it's unreachable
+        self.gmail_breaker = get_breaker('gmail', failure_exceptions=NETWORK_ERRORS)
         
     def load_response_templates(self):
         """Load email response templates"""
@@ -104,14 +108,24 @@ class EmailAutomation:
             logger.error(f"Failed to authenticate Gmail: {e}")
             return False
     
+    def _execute(self, request):
+        """Run a Gmail API request through the shared circuit breaker"""
+        with self.gmail_breaker.guard():
+            try:
+                return request.execute()
+            except HttpError as e:
+                # 5xx/429 mean Gmail is unhealthy; other errors are ours
+                check_http_status(e.resp.status)
+                raise
+    
     def get_unread_emails(self, max_results=10):
         """Get unread emails from inbox"""
         try:
-            results = self.service.users().messages().list(
+            results = self._execute(self.service.users().messages().list(
                 userId='me',
                 q='is:unread in:inbox',
                 maxResults=max_results
-            ).execute()
+            ))
             
             messages = results.get('messages', [])
             
@@ -121,10 +135,10 @@ class EmailAutomation:
             
             emails = []
             for message in messages:
-                msg = self.service.users().messages().get(
+                msg = self._execute(self.service.users().messages().get(
                     userId='me',
                     id=message['id']
-                ).execute()
+                ))
                 
                 email_data = self.parse_email(msg)
                 emails.append(email_data)
@@ -237,10 +251,10 @@ class EmailAutomation:
             raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
             
             # Send
-            reply = self.service.users().messages().send(
+            reply = self._execute(self.service.users().messages().send(
                 userId='me',
                 body={'raw': raw, 'threadId': email_data['threadId']}
-            ).execute()
+            ))
             
             logger.info(f"✅ Sent reply to {email_data['from']}")
             return True
@@ -252,11 +266,11 @@ class EmailAutomation:
     def mark_as_read(self, email_id):
         """Mark email as read"""
         try:
-            self.service.users().messages().modify(
+            self._execute(self.service.users().messages().modify(
                 userId='me',
                 id=email_id,
                 body={'removeLabelIds': ['UNREAD']}
-            ).execute()
+            ))
             return True
         except:
             return False
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Journaled Error State for TaskErrorHandler
+Success/failure/reset events are appended (and fsync'd) to a journal under an
+flock, so concurrent handlers never clobber each other. The in-memory index is
+rebuilt from the last snapshot plus the journal tail, and the journal is
+periodically compacted into a new snapshot.
+
+Each journal starts with a header line carrying its generation, and a snapshot
+records the generation and byte offset of the journal it folded in. Records
+up to that offset are skipped on load, so a crash between writing the
+snapshot and starting the next journal never replays them twice.
+"""
+
+import os
+import json
+import fcntl
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger('error_state_journal')
+
+COMPACT_EVERY = 500  # Journal records between snapshots
+
+
+def _apply(state: Dict[str, Dict[str, Any]], record: Dict[str, Any]):
+    """Fold one journal record into the index"""
+    task = state.setdefault(record["task_id"], {
+        "task_name": record["task_name"],
+        "failures": 0,
+        "last_failure": None,
+        "last_success": None,
+        "consecutive_failures": 0
+    })
+    event = record["event"]
+    if event == "failure":
+        task["failures"] += 1
+        task["consecutive_failures"] += 1
+        task["last_failure"] = record["at"]
+    elif event == "success":
+        task["last_success"] = record["at"]
+        task["consecutive_failures"] = 0
+    elif event == "reset":
+        task["consecutive_failures"] = 0
+
+
+def _header(generation: int) -> str:
+    return json.dumps({"generation": generation}) + "\n"
+
+
+def _header_generation(line: bytes) -> Optional[int]:
+    """Generation from a journal header line, or None if line isn't one"""
+    if not line.endswith(b'\n'):
+        return None
+    try:
+        header = json.loads(line)
+    except ValueError:
+        return None
+    if isinstance(header, dict) and 'event' not in header and isinstance(header.get('generation'), int):
+        return header['generation']
+    return None
+
+
+def _fsync_dir(path: Path):
+    dir_fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class ErrorStateJournal:
+    """Snapshot + append-only journal of per-task error state"""
+
+    def __init__(self, snapshot_file: Path, compact_every: int = COMPACT_EVERY):
+        self.snapshot_file = Path(snapshot_file)
+        self.journal_file = self.snapshot_file.with_suffix('.journal')
+        self.lock_file = self.snapshot_file.with_suffix('.lock')
+        self.compact_every = compact_every
+
+        self.state: Dict[str, Dict[str, Any]] = {}
+        self.snapshot_generation: Optional[int] = None  # None: legacy snapshot
+        self.generation = 0  # Of the current journal (0 for one without a header)
+        self.journal_inode: Optional[int] = None
+        self.offset = 0
+        self.records = 0  # Records in the current journal
+
+        with self._locked(fcntl.LOCK_SH):
+            self._reload()
+
+    @contextmanager
+    def _locked(self, mode: int):
+        with open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _reload(self):
+        """Rebuild the index from the snapshot and the journal records it lacks"""
+        self.state = {}
+        self.snapshot_generation = None
+        journal_offset = 0
+        if self.snapshot_file.exists():
+            try:
+                with open(self.snapshot_file, 'r') as f:
+                    snapshot = json.load(f)
+                if 'generation' in snapshot and 'tasks' in snapshot:
+                    self.state = snapshot['tasks']
+                    self.snapshot_generation = snapshot['generation']
+                    journal_offset = snapshot.get('journal_offset', 0)
+                else:
+                    self.state = snapshot  # Written before journals had generations
+            except (OSError, ValueError) as e:
+                logger.error(f"Unreadable error state snapshot, starting empty: {e}")
+        self.journal_inode = None
+        self.generation = 0
+        self.offset = 0
+        self.records = 0
+
+        try:
+            with open(self.journal_file, 'rb') as f:
+                self.journal_inode = os.fstat(f.fileno()).st_ino
+                header = f.readline()
+                complete = header.endswith(b'\n') and len(header) + f.read().rfind(b'\n') + 1
+        except FileNotFoundError:
+            header, complete = b'', 0
+        header_generation = _header_generation(header)
+        if header_generation is not None:
+            self.generation = header_generation
+            self.offset = len(header)
+        if self.snapshot_generation is not None:
+            if self.generation == self.snapshot_generation:
+                # Compaction stopped before replacing this journal
+                self.offset = max(self.offset, journal_offset)
+            elif self.generation < self.snapshot_generation:
+                self.offset = complete  # Entirely folded into the snapshot
+        self._read_tail()
+
+    def _read_tail(self):
+        """Apply journal records written since the last read"""
+        try:
+            f = open(self.journal_file, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            inode = os.fstat(f.fileno()).st_ino
+            generation = _header_generation(f.readline())
+            if self.journal_inode is None:
+                # The first journal after our snapshot, unless a compaction
+                # has replaced both since we loaded
+                if generation not in (None, (self.snapshot_generation or 0) + 1):
+                    self._reload()
+                    return
+                self.journal_inode = inode
+                if generation is not None:
+                    self.generation = generation
+                    self.offset = max(self.offset, f.tell())
+            elif inode != self.journal_inode or (generation or 0) != self.generation:
+                # A compaction swapped in a new journal (and snapshot): start over
+                self._reload()
+                return
+            f.seek(self.offset)
+            data = f.read()
+
+        # Only consume complete lines; a torn final write is ignored (and
+        # cut off by the next append)
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                _apply(self.state, json.loads(line))
+                self.records += 1
+            except (ValueError, KeyError, TypeError):
+                logger.warning(f"Skipping corrupt error journal record: {line[:80]!r}")
+        self.offset += end
+
+    def refresh(self) -> Dict[str, Dict[str, Any]]:
+        """Bring the index up to date with other processes' writes"""
+        with self._locked(fcntl.LOCK_SH):
+            self._read_tail()
+        return self.state
+
+    def record(self, task_id: str, task_name: str, event: str):
+        """Durably append an event ("success", "failure" or "reset")"""
+        line = json.dumps({
+            "task_id": task_id,
+            "task_name": task_name,
+            "event": event,
+            "at": datetime.now().isoformat()
+        }) + "\n"
+
+        with self._locked(fcntl.LOCK_EX):
+            self._read_tail()
+            fd = os.open(self.journal_file, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                size = os.fstat(fd).st_size
+                if size == 0:
+                    generation = (self.snapshot_generation or 0) + 1
+                    line = _header(generation) + line
+                elif size > self.offset:
+                    # A writer died mid-append (appends hold the lock): drop the
+                    # torn bytes so they don't swallow this record
+                    logger.warning(f"Truncating {size - self.offset} torn bytes from the error journal")
+                    os.ftruncate(fd, self.offset)
+                os.write(fd, line.encode('utf-8'))
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._read_tail()
+            if self.records >= self.compact_every:
+                self._compact()
+
+    def _compact(self):
+        """Write the index as a new snapshot and start the next journal (lock held)
+
+        The snapshot names the journal generation and offset it folds in, so
+        the journal can be replaced after it without risking a double replay.
+        """
+        tmp_snapshot = self.snapshot_file.with_suffix('.json.tmp')
+        with open(tmp_snapshot, 'w') as f:
+            json.dump({'generation': self.generation, 'journal_offset': self.offset,
+                       'tasks': self.state}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_snapshot, self.snapshot_file)
+        _fsync_dir(self.snapshot_file.parent)
+        self.snapshot_generation = self.generation
+
+        # Replace (not truncate) the journal so readers notice the new inode
+        header = _header(self.generation + 1)
+        tmp_journal = self.journal_file.with_suffix('.journal.tmp')
+        with open(tmp_journal, 'w') as f:
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_journal, self.journal_file)
+        _fsync_dir(self.snapshot_file.parent)
+
+        self.generation += 1
+        self.journal_inode = os.stat(self.journal_file).st_ino
+        self.offset = len(header.encode('utf-8'))
+        self.records = 0
+        logger.info(f"Compacted error state journal into {self.snapshot_file}")
+
+    def compact(self):
+        """Force a snapshot compaction"""
+        with self._locked(fcntl.LOCK_EX):
+            self._read_tail()
+            self._compact()
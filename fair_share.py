@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Fair-share Dispatch across task types
+Claiming strictly by priority lets a burst of high-priority routine tasks
+starve low-priority maintenance work. FairShareScheduler picks what to claim
+instead:
+
+- weighted fair queuing across task_type: each type gets dispatches in
+  proportion to its weight over a sliding window, whatever its priorities
+- priority aging within a type: effective priority rises by one point per
+  aging_seconds a task waits past next_run_at
+- per-type max-lag SLOs: tasks later than their type's max lag go first,
+  most overdue (relative to the SLO) first
+
+Select with TASK_SCHEDULING_POLICY=fair (default) or priority (plain
+claim_pending_tasks order).
+"""
+
+import os
+import sys
+import time
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from worker_pool import parse_type_limits
+
+logger = logging.getLogger('fair_share')
+
+# Relative dispatch shares; unlisted types weigh 1
+DEFAULT_WEIGHTS = {
+    'trading_operations': 3,
+    'system_monitoring': 2,
+    'network_security': 2,
+    'financial_monitoring': 2,
+}
+
+# Seconds past next_run_at a task of each type should ever wait
+DEFAULT_MAX_LAG = {
+    'trading_operations': 300,
+    'system_monitoring': 600,
+    'network_security': 600,
+    'financial_monitoring': 900,
+    'social_media': 900,
+}
+DEFAULT_MAX_LAG_SECONDS = 3600
+
+AGING_SECONDS = 600  # One priority point per 10 minutes late
+SHARE_WINDOW = 3600  # Dispatch history the shares are measured over
+
+
+class FairShareScheduler:
+    """Chooses which due tasks to claim from a task store
+
+    claim() has the store's claim() signature, so it can stand in for the
+    store wherever tasks are claimed (e.g. AdmissionController.claim).
+    """
+
+    def __init__(self, store, weights: Optional[Dict[str, float]] = None,
+                 max_lag: Optional[Dict[str, float]] = None,
+                 aging_seconds: float = AGING_SECONDS, window: float = SHARE_WINDOW,
+                 refresh_interval: float = 60.0):
+        self.store = store
+        self.weights = dict(DEFAULT_WEIGHTS)
+        self.weights.update(weights if weights is not None else
+                            parse_type_limits(os.environ.get('TASK_FAIR_SHARE_WEIGHTS')))
+        self.max_lag = dict(DEFAULT_MAX_LAG)
+        self.max_lag.update(max_lag if max_lag is not None else
+                            parse_type_limits(os.environ.get('TASK_MAX_LAG')))
+        self.aging_seconds = aging_seconds
+        self.window = window
+        self.refresh_interval = refresh_interval
+        self.served: Dict[str, float] = {}  # Dispatches per type in the window
+        self._refreshed_at: Optional[float] = None
+
+    def weight(self, task_type: str) -> float:
+        return max(self.weights.get(task_type, 1), 0.01)
+
+    def max_lag_for(self, task_type: str) -> float:
+        return self.max_lag.get(task_type, DEFAULT_MAX_LAG_SECONDS)
+
+    def _refresh(self):
+        """Reload dispatch counts from the store (other workers dispatch too)"""
+        now = time.monotonic()
+        if self._refreshed_at is None or now - self._refreshed_at >= self.refresh_interval:
+            try:
+                self.served = dict(self.store.recent_dispatches(self.window))
+                self._refreshed_at = now
+            except Exception as e:
+                logger.error(f"Could not load recent dispatches: {e}")
+
+    def order(self, candidates: List[Dict], limit: int) -> List[Dict]:
+        """Pick up to limit candidates in dispatch order
+
+        SLO breaches come first. Otherwise the type with the smallest
+        weighted finish tag ((served + 1) / weight) is served next, ties going
+        to the higher effective priority. Within a type, tasks past the max
+        lag go oldest first, then the rest by effective priority.
+        """
+        queues: Dict[str, List[Dict]] = {}
+        for task in candidates:
+            queues.setdefault(task['task_type'], []).append(task)
+        for task_type, queue in queues.items():
+            max_lag = self.max_lag_for(task_type)
+            queue.sort(key=lambda t: (
+                (0, -t['lag_seconds']) if t['lag_seconds'] > max_lag
+                else (1, -t['effective_priority']),
+                t['next_run_at']))
+
+        def overdue(task_type):
+            return queues[task_type][0]['lag_seconds'] / self.max_lag_for(task_type)
+
+        served = dict(self.served)
+        picked = []
+        while queues and len(picked) < limit:
+            breached = [t for t in queues if overdue(t) > 1]
+            if breached:
+                task_type = max(breached, key=overdue)
+            else:
+                task_type = min(queues, key=lambda t: (
+                    (served.get(t, 0) + 1) / self.weight(t),
+                    -queues[t][0]['effective_priority']))
+
+            picked.append(queues[task_type].pop(0))
+            served[task_type] = served.get(task_type, 0) + 1
+            if not queues[task_type]:
+                del queues[task_type]
+        return picked
+
+    def claim(self, batch_size: int = 10, exclude_types: Iterable[str] = (),
+              exclude_classes: Iterable[str] = ()) -> List[Dict]:
+        """Lease up to batch_size due tasks in fair-share order"""
+        self._refresh()
+        candidates = self.store.due_candidates(batch_size, self.aging_seconds,
+                                               exclude_types, exclude_classes)
+        lags = {c['id']: c['lag_seconds'] for c in candidates}
+        claimed: List[Dict] = []
+        # Other workers may take some of the picks first; refill from the rest
+        for _ in range(3):
+            picks = self.order(candidates, batch_size - len(claimed))
+            if not picks:
+                break
+            rank = {task['id']: i for i, task in enumerate(picks)}
+            tasks = sorted(self.store.claim_ids(list(rank)), key=lambda t: rank[t['id']])
+            for task in tasks:
+                self.served[task['task_type']] = self.served.get(task['task_type'], 0) + 1
+            claimed.extend(tasks)
+            if len(claimed) >= batch_size or len(tasks) == len(picks):
+                break
+            candidates = [c for c in candidates if c['id'] not in rank]
+
+        for task in claimed:
+            lag = lags.get(task['id'])
+            if lag is not None and lag > self.max_lag_for(task['task_type']):
+                logger.warning(f"Dispatching {task['task_name']} {lag:.0f}s late "
+                               f"(max lag for {task['task_type']}: "
+                               f"{self.max_lag_for(task['task_type']):.0f}s)")
+        return claimed
+
+    def status(self) -> Dict[str, Dict]:
+        """Per type: weight, max lag, dispatch share and the due backlog"""
+        self._refresh()
+        candidates = self.store.due_candidates(1000, self.aging_seconds)
+        total_served = sum(self.served.values()) or 1
+        types = set(self.served) | {c['task_type'] for c in candidates}
+        status = {}
+        for task_type in sorted(types):
+            waiting = [c for c in candidates if c['task_type'] == task_type]
+            status[task_type] = {
+                'weight': self.weight(task_type),
+                'max_lag': self.max_lag_for(task_type),
+                'share': self.served.get(task_type, 0) / total_served,
+                'due': len(waiting),
+                'oldest_lag': max((c['lag_seconds'] for c in waiting), default=None),
+            }
+        return status
+
+
+def get_dispatcher(store):
+    """What to claim tasks through under TASK_SCHEDULING_POLICY"""
+    policy = os.environ.get('TASK_SCHEDULING_POLICY', 'fair')
+    if policy == 'priority':
+        return store
+    if policy != 'fair':
+        logger.warning(f"Unknown scheduling policy {policy!r}, using fair")
+    return FairShareScheduler(store)
+
+
+def main():
+    """CLI: show fair-share state"""
+    if len(sys.argv) < 2 or sys.argv[1] != "status":
+        print("Usage: fair_share.py status")
+        print("  status - Dispatch share, backlog and lag per task type")
+        sys.exit(1)
+
+    from task_store import get_task_store
+    scheduler = FairShareScheduler(get_task_store())
+    print(f"{'task type':<24} {'weight':>6} {'share':>6} {'due':>5} {'oldest':>8} {'max lag':>8}")
+    for task_type, info in scheduler.status().items():
+        oldest = f"{info['oldest_lag']:.0f}s" if info['oldest_lag'] is not None else '-'
+        flag = ' SLO' if info['oldest_lag'] and info['oldest_lag'] > info['max_lag'] else ''
+        print(f"{task_type:<24} {info['weight']:>6g} {info['share']:>6.0%} {info['due']:>5} "
+              f"{oldest:>8} {info['max_lag']:>7.0f}s{flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,7 @@ from email.mime.multipart import MIMEMultipart
 from dataclasses import dataclass, asdict
 import logging
 from dotenv import load_dotenv
+from circuit_breaker import NETWORK_ERRORS, get_breaker
 
 # Load environment variables
 env_path = Path.home() / "Claude" / ".env"
@@ -73,6 +74,9 @@ class GmailAutomation:
         self.smtp_server = "smtp.gmail.com"
         self.smtp_port = 587
         
+        # Shared with email_automation.py: skip Gmail while it's unreachable
+        self.gmail_breaker = get_breaker('gmail', failure_exceptions=NETWORK_ERRORS)
+        
         # Load auto-response rules
         self.auto_responses = self.load_auto_responses()
         
@@ -203,8 +207,9 @@ Claude Mini 🤖""",
     def connect_imap(self) -> imaplib.IMAP4_SSL:
         """Connect to Gmail IMAP"""
         try:
-            mail = imaplib.IMAP4_SSL(self.imap_server)
-            mail.login(self.gmail_user, self.gmail_password)
+            with self.gmail_breaker.guard():
+                mail = imaplib.IMAP4_SSL(self.imap_server)
+                mail.login(self.gmail_user, self.gmail_password)
             return mail
         except Exception as e:
             logger.error(f"Error connecting to IMAP: {e}")
@@ -224,13 +229,14 @@ Claude Mini 🤖""",
             
             msg.attach(MIMEText(body, 'plain'))
             
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.gmail_user, self.gmail_password)
-            
-            text = msg.as_string()
-            server.sendmail(self.gmail_user, to_email, text)
-            server.quit()
+            with self.gmail_breaker.guard():
+                server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+                server.starttls()
+                server.login(self.gmail_user, self.gmail_password)
+                
+                text = msg.as_string()
+                server.sendmail(self.gmail_user, to_email, text)
+                server.quit()
             
             logger.info(f"Email sent successfully to {to_email}")
             return True
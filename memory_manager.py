@@ -5,9 +5,6 @@ Memory Manager for Claude Mini
 Stores and retrieves memories using PostgreSQL with vector embeddings
 """
 
-import numpy as np
-from sentence_transformers import SentenceTransformer
-import psycopg2
 from psycopg2.extras import Json, RealDictCursor
 import os
 from datetime import datetime
@@ -15,24 +12,26 @@ from typing import List, Dict, Optional, Tuple
 import json
 import sys
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import db
+
 class MemoryManager:
     def __init__(self, model_name: str = 'sentence-transformers/all-MiniLM-L6-v2'):
-        """Initialize memory manager with embedding model and database connection"""
-        print(f"Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name)
-        
-        # Database connection
-        self.conn = psycopg2.connect(
-            dbname="claudemini",
-            user="claudemini",
-            host="localhost"
-        )
-        self.conn.autocommit = False
+        """Initialize memory manager; the embedding model loads on first use"""
+        self.model_name = model_name
+        self._model = None
         
-    def __del__(self):
-        """Clean up database connection"""
-        if hasattr(self, 'conn') and self.conn:
-            self.conn.close()
+        # Database connection (shared with other components in this process)
+        self.conn = db.shared_connection()
+    
+    @property
+    def model(self):
+        """Embedding model, importing sentence_transformers (and torch) on first use"""
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            print(f"Loading embedding model: {self.model_name}")
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
     
     def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding using sentence-transformers model"""
@@ -0,0 +1,83 @@
+-- One-time migration: convert an existing task_executions table into the
+-- monthly range-partitioned layout defined in create_task_tables.sql.
+-- Run from the utils directory: psql -d claudemini -f migrate_task_executions_partitioned.sql
+-- Stop the scheduler and daemon first; the copy holds an exclusive lock.
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+LOCK TABLE task_executions IN ACCESS EXCLUSIVE MODE;
+
+-- Depends on the old table; create_task_tables.sql recreates it below
+DROP VIEW IF EXISTS active_tasks_view;
+
+-- Move the old table and its indexes out of the way
+ALTER TABLE task_executions RENAME TO task_executions_unpartitioned;
+ALTER INDEX IF EXISTS task_executions_pkey RENAME TO task_executions_unpartitioned_pkey;
+ALTER INDEX IF EXISTS idx_task_executions_task_id RENAME TO idx_task_executions_unpartitioned_task_id;
+ALTER INDEX IF EXISTS idx_task_executions_started_at RENAME TO idx_task_executions_unpartitioned_started_at;
+ALTER INDEX IF EXISTS idx_task_executions_status RENAME TO idx_task_executions_unpartitioned_status;
+
+CREATE TABLE task_executions (
+    id INTEGER NOT NULL DEFAULT nextval('task_executions_id_seq'),
+    task_id INTEGER NOT NULL REFERENCES scheduled_tasks(id),
+    execution_id UUID DEFAULT uuid_generate_v4(),
+    started_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP WITH TIME ZONE,
+    status VARCHAR(20) NOT NULL CHECK (status IN ('running', 'success', 'failed', 'timeout', 'cancelled')),
+    output TEXT,
+    error TEXT,
+    execution_time_ms INTEGER,
+    memory_ids INTEGER[],
+    log_file_path VARCHAR(500),
+    metadata JSONB DEFAULT '{}',
+    PRIMARY KEY (id, started_at)
+) PARTITION BY RANGE (started_at);
+
+-- Keep the id sequence when the old table is dropped
+ALTER SEQUENCE task_executions_id_seq OWNED BY task_executions.id;
+
+-- Same as in create_task_tables.sql, which only runs after the copy below
+-- (an unpartitioned database doesn't have the function yet)
+CREATE OR REPLACE FUNCTION create_task_execution_partition(month_start DATE)
+RETURNS TEXT AS $$
+DECLARE
+    first_day DATE := date_trunc('month', month_start)::date;
+    partition_name TEXT := 'task_executions_' || to_char(first_day, 'YYYY_MM');
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF task_executions FOR VALUES FROM (%L) TO (%L)',
+        partition_name, first_day, (first_day + INTERVAL '1 month')::date
+    );
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- One partition per month of existing history, through two months ahead
+SELECT create_task_execution_partition(month_start::date)
+FROM generate_series(
+    date_trunc('month', COALESCE((SELECT MIN(started_at) FROM task_executions_unpartitioned), CURRENT_TIMESTAMP)),
+    date_trunc('month', CURRENT_TIMESTAMP) + INTERVAL '2 months',
+    INTERVAL '1 month'
+) AS month_start;
+
+CREATE TABLE task_executions_default PARTITION OF task_executions DEFAULT;
+
+INSERT INTO task_executions (
+    id, task_id, execution_id, started_at, completed_at, status, output, error,
+    execution_time_ms, memory_ids, log_file_path, metadata
+)
+SELECT
+    id, task_id, execution_id, started_at, completed_at, status, output, error,
+    execution_time_ms, memory_ids, log_file_path, metadata
+FROM task_executions_unpartitioned;
+
+DROP TABLE task_executions_unpartitioned;
+
+COMMIT;
+
+-- Recreate indexes, triggers and views against the partitioned table
+\ir create_task_tables.sql
+
+SELECT rebuild_task_execution_rollups() AS rollups_rebuilt;
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Misfire Handling for scheduled tasks
+After the daemon or the cron-driven scheduler has been down, recurring and cron
+tasks have missed slots. Each task's misfire policy (metadata misfire_policy)
+decides what that costs:
+
+  coalesce   - run once, skip the other missed slots (default)
+  fire_all   - run once per missed slot, back to back
+  skip_stale - run once if the oldest missed slot is within the grace window
+               (metadata misfire_grace_seconds), otherwise skip to the next slot
+
+Catch-up runs are staggered with jitter over a startup window so a reboot
+doesn't launch every overdue task in the same tick. Catch-up only happens on
+startup after downtime: the daemon and scheduler touch a stamp file whenever
+they dispatch, and only slots that came due after it count as missed. Tasks
+that were due while a scheduler was running were held back (admission
+control, fair share) and keep their lag for aging and SLOs.
+"""
+
+import os
+import sys
+import math
+import random
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from cron_expression import compile_cron, next_run_time, schedule_shift
+
+logger = logging.getLogger('misfire')
+
+POLICIES = ('coalesce', 'fire_all', 'skip_stale')
+DEFAULT_POLICY = 'coalesce'
+DEFAULT_GRACE_SECONDS = 3600
+
+# A task counts as misfired once it is this late; below it, lateness is just
+# normal dispatch delay (e.g. the scheduler's 5-minute cron cadence)
+MISFIRE_THRESHOLD = int(os.environ.get('TASK_MISFIRE_THRESHOLD', 600))
+
+# Window over which catch-up runs are spread at startup
+STAGGER_SECONDS = int(os.environ.get('TASK_STARTUP_STAGGER', 180))
+
+# Touched on every dispatch pass; its mtime is when a scheduler last saw the queue
+STAMP_FILE = Path(os.environ.get('TASK_DISPATCH_STAMP',
+                                 Path(__file__).parent / "logs" / ".last_dispatch"))
+
+
+def misfire_policy(task: Dict) -> Tuple[str, float]:
+    """(policy, grace seconds) from a task's metadata"""
+    metadata = task.get('metadata') or {}
+    policy = metadata.get('misfire_policy', DEFAULT_POLICY)
+    if policy not in POLICIES:
+        logger.warning(f"Unknown misfire policy {policy!r} for {task.get('task_name')}, "
+                       f"using {DEFAULT_POLICY}")
+        policy = DEFAULT_POLICY
+    try:
+        grace = float(metadata.get('misfire_grace_seconds', DEFAULT_GRACE_SECONDS))
+    except (TypeError, ValueError):
+        grace = DEFAULT_GRACE_SECONDS
+    return policy, grace
+
+
+def next_slot(task: Dict, after: datetime) -> Optional[datetime]:
+    """The task's first schedule slot strictly after `after`
+
+    Recurring tasks keep the phase of their current next_run_at rather than
+    restarting the interval from `after`.
+    """
+    if task['schedule_type'] == 'cron' and task.get('cron_expression'):
+        offset = timedelta(seconds=schedule_shift(task)[0])
+        return compile_cron(task['cron_expression']).next_fire(after - offset) + offset
+    if task['schedule_type'] == 'recurring' and task.get('interval_minutes'):
+        step = timedelta(minutes=task['interval_minutes'])
+        anchor = task.get('next_run_at') or after
+        if anchor > after:
+            return anchor
+        return anchor + step * (math.floor((after - anchor) / step) + 1)
+    return None
+
+
+def next_run_after_success(task: Dict) -> Optional[datetime]:
+    """next_run_at for a claimed task that just succeeded
+
+    fire_all tasks advance one slot from the slot that just ran, so missed
+    slots keep coming due until they're caught up; every other policy moves
+    on to the next slot in the future.
+    """
+    scheduled = task.get('next_run_at')
+    if scheduled is not None and misfire_policy(task)[0] == 'fire_all':
+        return next_slot({**task, 'next_run_at': None}, scheduled)
+    offset, jitter = schedule_shift(task)
+    return next_run_time(task['schedule_type'], task.get('cron_expression'),
+                         task.get('interval_minutes'), offset_seconds=offset,
+                         jitter_seconds=jitter)
+
+
+def plan_catch_up(tasks: List[Dict], now: Optional[datetime] = None,
+                  window: float = STAGGER_SECONDS,
+                  rng: Optional[random.Random] = None) -> Dict[int, datetime]:
+    """New next_run_at for misfired tasks (id -> time)
+
+    tasks are overdue scheduled_tasks rows. Runs that will happen are spread
+    over window seconds, highest priority first, each with jitter within its
+    share of the window. fire_all tasks keep their slot (their catch-up runs
+    are sequential anyway); skipped ones move to their next future slot.
+    """
+    now = now or datetime.now().astimezone()
+    rng = rng or random.Random()
+    runs, plan = [], {}
+
+    for task in tasks:
+        policy, grace = misfire_policy(task)
+        lateness = (now - task['next_run_at']).total_seconds()
+        if policy == 'fire_all':
+            continue
+        if policy == 'skip_stale' and lateness > grace:
+            slot = next_slot(task, now)
+            if slot is not None:
+                plan[task['id']] = slot
+                logger.info(f"Skipping stale run of {task['task_name']} "
+                            f"({lateness / 60:.0f} min late), next at {slot}")
+            continue
+        runs.append(task)
+
+    runs.sort(key=lambda t: (-(t.get('priority') or 5), t['next_run_at']))
+    share = window / len(runs) if runs else 0
+    for i, task in enumerate(runs):
+        plan[task['id']] = now + timedelta(seconds=share * i + rng.uniform(0, share))
+    return plan
+
+
+def last_dispatch(stamp: Optional[Path] = None) -> Optional[datetime]:
+    """When the daemon or scheduler last dispatched (None if never)"""
+    try:
+        return datetime.fromtimestamp((stamp or STAMP_FILE).stat().st_mtime).astimezone()
+    except OSError:
+        return None
+
+
+def mark_dispatch(stamp: Optional[Path] = None):
+    """Record that everything due by now has been seen by a running scheduler"""
+    stamp = stamp or STAMP_FILE
+    try:
+        stamp.parent.mkdir(parents=True, exist_ok=True)
+        stamp.touch()
+    except OSError as e:
+        logger.warning(f"Could not update dispatch stamp {stamp}: {e}")
+
+
+def catch_up(store, window: float = STAGGER_SECONDS, threshold: float = MISFIRE_THRESHOLD,
+             since: Optional[datetime] = None) -> Dict[int, datetime]:
+    """Apply misfire policies to every task more than threshold seconds overdue
+
+    With since, only slots that came due after it are misfires; earlier ones
+    were seen by a running scheduler and deferred, so they're left alone.
+    """
+    now = datetime.now().astimezone()
+    overdue = [task for task in store.overdue_tasks(now - timedelta(seconds=threshold))
+               if since is None or task['next_run_at'] >= since]
+    if not overdue:
+        return {}
+    plan = plan_catch_up(overdue, now, window)
+    previous = {task['id']: task['next_run_at'] for task in overdue}
+    applied = store.reschedule({task_id: (previous[task_id], next_run)
+                                for task_id, next_run in plan.items()})
+    logger.info(f"Misfire catch-up: {len(overdue)} overdue tasks, {applied} rescheduled "
+                f"(runs staggered over {window:.0f}s)")
+    return plan
+
+
+def catch_up_on_startup(store, stamp: Optional[Path] = None) -> Dict[int, datetime]:
+    """catch_up() if nothing has dispatched for more than MISFIRE_THRESHOLD
+
+    Called once when the daemon or a cron-driven scheduler run starts, before
+    it marks its own dispatch; a scheduler that has kept running sees a fresh
+    stamp and leaves overdue tasks alone.
+    """
+    since = last_dispatch(stamp)
+    if since is not None and (datetime.now().astimezone() - since).total_seconds() <= MISFIRE_THRESHOLD:
+        return {}
+    return catch_up(store, since=since)
+
+
+def main():
+    """CLI: preview or apply misfire catch-up"""
+    if len(sys.argv) < 2:
+        print("Usage: misfire.py <command>")
+        print("Commands:")
+        print("  preview - Show what catch-up would do with the overdue tasks")
+        print("  apply - Reschedule overdue tasks now")
+        sys.exit(1)
+
+    from task_store import get_task_store
+    store = get_task_store()
+    command = sys.argv[1]
+    if command == "preview":
+        now = datetime.now().astimezone()
+        overdue = store.overdue_tasks(now - timedelta(seconds=MISFIRE_THRESHOLD))
+        plan = plan_catch_up(overdue, now)
+        for task in overdue:
+            policy, _ = misfire_policy(task)
+            late = (now - task['next_run_at']).total_seconds() / 60
+            planned = plan.get(task['id'])
+            action = planned.strftime('%H:%M:%S') if planned else 'due now'
+            print(f"{task['task_name'][:40]:<40} {policy:<10} {late:7.0f} min late -> {action}")
+        if not overdue:
+            print("No misfired tasks")
+    elif command == "apply":
+        plan = catch_up(store)
+        print(f"Rescheduled {len(plan)} tasks")
+    else:
+        print("Invalid command")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
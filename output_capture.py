@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Streaming Output Capture for task subprocesses
+Reads child stdout/stderr incrementally, spills everything to a rotating
+per-execution log file and keeps only a bounded head/tail in memory for the
+task_executions row. In-flight executions can be tailed from their log file.
+"""
+
+import os
+import sys
+import time
+import codecs
+import asyncio
+import threading
+import subprocess
+from collections import deque
+from pathlib import Path
+from typing import List, Optional, Union
+
+EXECUTION_LOG_DIR = Path(__file__).parent / "logs" / "executions"
+
+HEAD_CHARS = 8 * 1024
+TAIL_CHARS = 24 * 1024
+MAX_FILE_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 3
+READ_CHUNK = 64 * 1024
+
+
+def execution_log_path(execution_id: Union[int, str], started: Optional[float] = None) -> Path:
+    """Log file for one run of an execution (task_executions.id or a cron run name)
+
+    Ids repeat across processes (the in-memory store and benchmark schemas
+    count from 1), so the name also carries the start time and pid.
+    """
+    stamp = time.strftime('%Y%m%dT%H%M%S', time.localtime(started or time.time()))
+    return EXECUTION_LOG_DIR / f"{execution_id}.{stamp}-{os.getpid()}.log"
+
+
+def find_execution_log(execution_id: Union[int, str]) -> Optional[Path]:
+    """The latest run's log for an execution id, or the log file path itself"""
+    if str(execution_id).endswith('.log'):
+        path = Path(execution_id)
+        return path if path.exists() else None
+    runs = list(EXECUTION_LOG_DIR.glob(f"{execution_id}.*.log"))
+    return max(runs, key=lambda path: path.stat().st_mtime) if runs else None
+
+
+class BoundedBuffer:
+    """Keeps the first head_chars and last tail_chars of a text stream"""
+
+    def __init__(self, head_chars: int = HEAD_CHARS, tail_chars: int = TAIL_CHARS):
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.head = []
+        self.head_size = 0
+        self.tail = deque()
+        self.tail_size = 0
+        self.total = 0
+
+    def add(self, text: str):
+        self.total += len(text)
+        if self.head_size < self.head_chars:
+            take = text[:self.head_chars - self.head_size]
+            self.head.append(take)
+            self.head_size += len(take)
+            text = text[len(take):]
+            if not text:
+                return
+
+        self.tail.append(text)
+        self.tail_size += len(text)
+        while self.tail_size - len(self.tail[0]) >= self.tail_chars:
+            self.tail_size -= len(self.tail.popleft())
+
+    def value(self) -> str:
+        head = ''.join(self.head)
+        tail = ''.join(self.tail)
+        if len(tail) > self.tail_chars:
+            tail = tail[-self.tail_chars:]
+        dropped = self.total - len(head) - len(tail)
+        if dropped > 0:
+            return f"{head}\n... [{dropped} characters truncated, see log file] ...\n{tail}"
+        return head + tail
+
+
+class OutputCapture:
+    """Captures a child's output to a rotating log file with bounded memory"""
+
+    def __init__(self, log_path: Path, head_chars: int = HEAD_CHARS,
+                 tail_chars: int = TAIL_CHARS, max_file_bytes: int = MAX_FILE_BYTES,
+                 backup_count: int = BACKUP_COUNT):
+        self.log_path = Path(log_path)
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_file_bytes = max_file_bytes
+        self.backup_count = backup_count
+        self.buffers = {
+            'stdout': BoundedBuffer(head_chars, tail_chars),
+            'stderr': BoundedBuffer(head_chars, tail_chars),
+        }
+        self.lock = threading.Lock()
+        self.file = open(self.log_path, 'w', encoding='utf-8')
+        self.threads: List[threading.Thread] = []
+
+    def _rotate(self):
+        """Shift log -> log.1 -> log.2 ..., dropping the oldest"""
+        self.file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = self.log_path.with_name(f"{self.log_path.name}.{i}")
+            if src.exists():
+                src.replace(self.log_path.with_name(f"{self.log_path.name}.{i + 1}"))
+        if self.backup_count > 0:
+            self.log_path.replace(self.log_path.with_name(f"{self.log_path.name}.1"))
+        else:
+            self.log_path.unlink()
+        self.file = open(self.log_path, 'w', encoding='utf-8')
+
+    def write(self, text: str, stream: str = 'stdout'):
+        """Record a chunk of output from stream"""
+        if not text:
+            return
+        with self.lock:
+            self.buffers[stream].add(text)
+            self.file.write(text if stream == 'stdout' else
+                            ''.join(f"[stderr] {line}" for line in text.splitlines(True)))
+            self.file.flush()
+            if self.file.tell() > self.max_file_bytes:
+                self._rotate()
+
+    @property
+    def stdout(self) -> str:
+        return self.buffers['stdout'].value()
+
+    @property
+    def stderr(self) -> str:
+        return self.buffers['stderr'].value()
+
+    def _drain(self, pipe, stream: str):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while True:
+            chunk = pipe.read1(READ_CHUNK)
+            if not chunk:
+                break
+            self.write(decoder.decode(chunk), stream)
+        self.write(decoder.decode(b'', final=True), stream)
+
+    def pump(self, proc: subprocess.Popen, timeout: Optional[float] = None) -> int:
+        """Stream a Popen child's binary pipes until it exits
+
+        Raises subprocess.TimeoutExpired on timeout; the caller should kill
+        the child and then call close().
+        """
+        for pipe, stream in ((proc.stdout, 'stdout'), (proc.stderr, 'stderr')):
+            if pipe is not None:
+                thread = threading.Thread(target=self._drain, args=(pipe, stream), daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        returncode = proc.wait(timeout=timeout)
+        self.close()
+        return returncode
+
+    async def _drain_async(self, reader: asyncio.StreamReader, stream: str):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while True:
+            chunk = await reader.read(READ_CHUNK)
+            if not chunk:
+                break
+            self.write(decoder.decode(chunk), stream)
+        self.write(decoder.decode(b'', final=True), stream)
+
+    async def pump_async(self, proc: asyncio.subprocess.Process) -> int:
+        """Stream an asyncio child's pipes until it exits"""
+        readers = [self._drain_async(reader, stream)
+                   for reader, stream in ((proc.stdout, 'stdout'), (proc.stderr, 'stderr'))
+                   if reader is not None]
+        await asyncio.gather(*readers)
+        return await proc.wait()
+
+    def close(self):
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self.threads = []
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+def tail_execution_log(execution_id: Union[int, str], lines: int = 50) -> str:
+    """Last `lines` lines of an execution's log (works while it is running)"""
+    path = find_execution_log(execution_id)
+    if path is None:
+        return ''
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        # Read backwards in blocks until we have enough lines
+        block = 8192
+        data = b''
+        pos = end
+        while pos > 0 and data.count(b'\n') <= lines:
+            pos = max(0, pos - block)
+            f.seek(pos)
+            data = f.read(end - pos)
+    return b'\n'.join(data.splitlines()[-lines:]).decode('utf-8', errors='replace')
+
+
+def follow_execution_log(execution_id: Union[int, str], lines: int = 50, interval: float = 1.0):
+    """Print the tail of an execution log and keep following it like tail -f"""
+    path = find_execution_log(execution_id)
+    print(tail_execution_log(execution_id, lines))
+    position = path.stat().st_size if path else 0
+    while True:
+        time.sleep(interval)
+        path = path or find_execution_log(execution_id)
+        if path is None or not path.exists():
+            continue
+        size = path.stat().st_size
+        if size < position:
+            position = 0  # Rotated
+        if size > position:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                f.seek(position)
+                sys.stdout.write(f.read())
+                sys.stdout.flush()
+                position = f.tell()
+
+
+def main():
+    """CLI: live-tail the output of an in-flight execution"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Tail task execution output')
+    parser.add_argument('execution_id',
+                        help='task_executions.id, cron run name or log_file_path')
+    parser.add_argument('-n', '--lines', type=int, default=50, help='Number of lines')
+    parser.add_argument('-f', '--follow', action='store_true', help='Keep following the log')
+    args = parser.parse_args()
+
+    if args.follow:
+        try:
+            follow_execution_log(args.execution_id, args.lines)
+        except KeyboardInterrupt:
+            pass
+    else:
+        print(tail_execution_log(args.execution_id, args.lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,7 @@ import logging
 from dotenv import load_dotenv
 import base64
 import struct
+from circuit_breaker import NETWORK_ERRORS, check_http_status, get_breaker
 
 # Load environment variables
 env_path = Path.home() / "Claude" / ".env"
@@ -76,6 +77,11 @@ class PortfolioMonitor:
         self.ethereum_rpc = "https://api.etherscan.io/api"
         self.coingecko_api = "https://api.coingecko.com/api/v3"
         
+        # Shared circuit breakers: skip an upstream other processes found dead
+        self.coingecko_breaker = get_breaker('coingecko', failure_exceptions=NETWORK_ERRORS)
+        self.solana_breaker = get_breaker('solana_rpc', failure_exceptions=NETWORK_ERRORS)
+        self.etherscan_breaker = get_breaker('etherscan', failure_exceptions=NETWORK_ERRORS)
+        
         # Price cache
         self.price_cache = {}
         self.cache_timestamp = None
@@ -91,13 +97,15 @@ class PortfolioMonitor:
             url = f"{self.coingecko_api}/simple/price"
             params = {'ids': token_id, 'vs_currencies': 'usd'}
             
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    price = data.get(token_id, {}).get('usd', 0)
-                    self.price_cache[token_id] = price
-                    self.cache_timestamp = datetime.now()
-                    return price
+            with self.coingecko_breaker.guard():
+                async with session.get(url, params=params) as response:
+                    check_http_status(response.status)
+                    if response.status == 200:
+                        data = await response.json()
+                        price = data.get(token_id, {}).get('usd', 0)
+                        self.price_cache[token_id] = price
+                        self.cache_timestamp = datetime.now()
+                        return price
         except Exception as e:
             logger.error(f"Error fetching price for {token_id}: {e}")
             
@@ -116,21 +124,24 @@ class PortfolioMonitor:
                 "params": [self.solana_address]
             }
             
-            async with session.post(self.solana_rpc, json=payload) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    sol_lamports = data.get('result', {}).get('value', 0)
-                    sol_amount = sol_lamports / 1e9  # Convert lamports to SOL
-                    
-                    sol_price = await self.get_token_price(session, 'solana')
-                    sol_usd_value = sol_amount * sol_price
-                    
-                    balances.append(Balance(
-                        token='SOL',
-                        amount=sol_amount,
-                        usd_value=sol_usd_value,
-                        timestamp=datetime.now()
-                    ))
+            with self.solana_breaker.guard():
+                async with session.post(self.solana_rpc, json=payload) as response:
+                    check_http_status(response.status)
+                    data = await response.json() if response.status == 200 else None
+            
+            if data is not None:
+                sol_lamports = data.get('result', {}).get('value', 0)
+                sol_amount = sol_lamports / 1e9  # Convert lamports to SOL
+                
+                sol_price = await self.get_token_price(session, 'solana')
+                sol_usd_value = sol_amount * sol_price
+                
+                balances.append(Balance(
+                    token='SOL',
+                    amount=sol_amount,
+                    usd_value=sol_usd_value,
+                    timestamp=datetime.now()
+                ))
                     
             # Get token balances
             payload = {
@@ -144,28 +155,31 @@ class PortfolioMonitor:
                 ]
             }
             
-            async with session.post(self.solana_rpc, json=payload) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    token_accounts = data.get('result', {}).get('value', [])
-                    
-                    for account in token_accounts:
-                        try:
-                            parsed_info = account['account']['data']['parsed']['info']
-                            token_amount = float(parsed_info['tokenAmount']['uiAmount'] or 0)
-                            mint = parsed_info['mint']
-                            
-                            if token_amount > 0:
-                                # For now, just track as unknown tokens
-                                balances.append(Balance(
-                                    token=f'SPL-{mint[:8]}...',
-                                    amount=token_amount,
-                                    usd_value=0.0,  # Would need token metadata to get price
-                                    timestamp=datetime.now()
-                                ))
-                        except Exception as e:
-                            logger.warning(f"Error parsing token account: {e}")
-                            
+            with self.solana_breaker.guard():
+                async with session.post(self.solana_rpc, json=payload) as response:
+                    check_http_status(response.status)
+                    data = await response.json() if response.status == 200 else None
+            
+            if data is not None:
+                token_accounts = data.get('result', {}).get('value', [])
+                
+                for account in token_accounts:
+                    try:
+                        parsed_info = account['account']['data']['parsed']['info']
+                        token_amount = float(parsed_info['tokenAmount']['uiAmount'] or 0)
+                        mint = parsed_info['mint']
+                        
+                        if token_amount > 0:
+                            # For now, just track as unknown tokens
+                            balances.append(Balance(
+                                token=f'SPL-{mint[:8]}...',
+                                amount=token_amount,
+                                usd_value=0.0,  # Would need token metadata to get price
+                                timestamp=datetime.now()
+                            ))
+                    except Exception as e:
+                        logger.warning(f"Error parsing token account: {e}")
+                        
         except Exception as e:
             logger.error(f"Error fetching Solana balance: {e}")
             
@@ -186,22 +200,24 @@ class PortfolioMonitor:
                 'apikey': 'YourApiKeyToken'  # Free tier
             }
             
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get('status') == '1':
-                        eth_wei = int(data.get('result', '0'))
-                        eth_amount = eth_wei / 1e18  # Convert wei to ETH
-                        
-                        eth_price = await self.get_token_price(session, 'ethereum')
-                        eth_usd_value = eth_amount * eth_price
-                        
-                        balances.append(Balance(
-                            token='ETH',
-                            amount=eth_amount,
-                            usd_value=eth_usd_value,
-                            timestamp=datetime.now()
-                        ))
+            with self.etherscan_breaker.guard():
+                async with session.get(url, params=params) as response:
+                    check_http_status(response.status)
+                    data = await response.json() if response.status == 200 else None
+            
+            if data is not None and data.get('status') == '1':
+                eth_wei = int(data.get('result', '0'))
+                eth_amount = eth_wei / 1e18  # Convert wei to ETH
+                
+                eth_price = await self.get_token_price(session, 'ethereum')
+                eth_usd_value = eth_amount * eth_price
+                
+                balances.append(Balance(
+                    token='ETH',
+                    amount=eth_amount,
+                    usd_value=eth_usd_value,
+                    timestamp=datetime.now()
+                ))
                         
         except Exception as e:
             logger.error(f"Error fetching Ethereum balance: {e}")
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Prompt Result Cache for ClaudeExecutor
+Templates that opt in with metadata cache_ttl_seconds reuse a successful
+output instead of invoking Claude again. The cache key hashes the normalized
+prompt and the context memory IDs, and each result is served for ttl seconds
+after it was produced. A TTL shorter than the template's interval only hits
+on retries and run-now; opt in where a result stays useful for at least one
+interval. Tasks with auto_post are never cached. Entries live in a
+size-bounded SQLite file (least recently used evicted first;
+CLAUDE_RESULT_CACHE_MAX_ENTRIES, CLAUDE_RESULT_CACHE_MAX_MB), independent of
+the task store, with hit/miss counters per template.
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger('result_cache')
+
+CACHE_FILE = Path(__file__).parent / "data" / "claude_result_cache.db"
+MAX_ENTRIES = int(os.environ.get('CLAUDE_RESULT_CACHE_MAX_ENTRIES', 500))
+MAX_BYTES = int(os.environ.get('CLAUDE_RESULT_CACHE_MAX_MB', 50)) * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    cache_key TEXT PRIMARY KEY,
+    template TEXT NOT NULL,
+    output TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used_at);
+CREATE TABLE IF NOT EXISTS template_stats (
+    template TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0,
+    stores INTEGER NOT NULL DEFAULT 0,
+    evictions INTEGER NOT NULL DEFAULT 0,
+    saved_ms INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def cache_ttl(task: Dict) -> Optional[float]:
+    """The task's cache TTL in seconds, or None when it doesn't opt in"""
+    metadata = task.get('metadata') or {}
+    if metadata.get('auto_post'):
+        # A cached tweet would be posted twice
+        return None
+    try:
+        ttl = float(metadata.get('cache_ttl_seconds') or 0)
+    except (TypeError, ValueError):
+        return None
+    return ttl if ttl > 0 else None
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so reformatted templates share entries"""
+    return ' '.join((prompt or '').split())
+
+
+def cache_key(prompt: str, memory_ids: Iterable[int], method: str) -> str:
+    """Hash of the normalized prompt, context memory IDs and execution method"""
+    payload = json.dumps([normalize_prompt(prompt), sorted(memory_ids or []), method])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Size-bounded on-disk store of successful task outputs"""
+
+    def __init__(self, path: Path = CACHE_FILE, max_entries: int = MAX_ENTRIES,
+                 max_bytes: int = MAX_BYTES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        """A connection per operation: executors share the file across threads and processes"""
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            if not self._initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                self._initialized = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _count(self, conn, template: str, column: str, amount: int = 1):
+        conn.execute(f"""
+            INSERT INTO template_stats (template, {column}) VALUES (?, ?)
+            ON CONFLICT (template) DO UPDATE SET {column} = {column} + excluded.{column}
+        """, (template, amount))
+
+    def get(self, key: str, template: str) -> Optional[Dict]:
+        """Cached output for key if still fresh, counting the hit or miss"""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT output, created_at FROM results WHERE cache_key = ? AND expires_at > ?",
+                    (key, now)).fetchone()
+                if row is None:
+                    self._count(conn, template, 'misses')
+                    return None
+                conn.execute("UPDATE results SET last_used_at = ?, hits = hits + 1 WHERE cache_key = ?",
+                             (now, key))
+                self._count(conn, template, 'hits')
+                return {'output': row[0], 'cached_at': row[1]}
+        except sqlite3.Error as e:
+            logger.error(f"Result cache lookup failed: {e}")
+            return None
+
+    def put(self, key: str, template: str, output: str, ttl: float, execution_time_ms: int = 0):
+        """Store a successful output, then evict down to the size bounds"""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO results
+                        (cache_key, template, output, size, created_at, expires_at, last_used_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (key, template, output, len(output.encode('utf-8')), now, now + ttl, now))
+                self._count(conn, template, 'stores')
+                # What a hit on this entry saves, for the stats
+                conn.execute("UPDATE template_stats SET saved_ms = ? WHERE template = ?",
+                             (execution_time_ms, template))
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.error(f"Result cache store failed: {e}")
+
+    def _evict(self, conn, now: float):
+        """Drop expired entries, then least recently used ones past the bounds"""
+        conn.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+        count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+        evicted: Dict[str, int] = {}
+        for key, template, entry_size in conn.execute(
+                "SELECT cache_key, template, size FROM results ORDER BY last_used_at").fetchall():
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM results WHERE cache_key = ?", (key,))
+            evicted[template] = evicted.get(template, 0) + 1
+            count -= 1
+            size -= entry_size
+        for template, n in evicted.items():
+            self._count(conn, template, 'evictions', n)
+
+    def stats(self) -> List[Dict]:
+        """Per template: hits, misses, hit rate, evictions and current entries"""
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT s.template, s.hits, s.misses, s.stores, s.evictions, s.saved_ms,
+                       COUNT(r.cache_key), COALESCE(SUM(r.size), 0)
+                FROM template_stats s
+                LEFT JOIN results r ON r.template = s.template AND r.expires_at > ?
+                GROUP BY s.template
+                ORDER BY s.hits + s.misses DESC
+            """, (time.time(),)).fetchall()
+        return [{
+            'template': template, 'hits': hits, 'misses': misses, 'stores': stores,
+            'evictions': evictions, 'saved_ms': saved_ms, 'entries': entries, 'bytes': size,
+            'hit_rate': hits / (hits + misses) if hits + misses else None,
+        } for template, hits, misses, stores, evictions, saved_ms, entries, size in rows]
+
+    def clear(self, template: Optional[str] = None) -> int:
+        """Remove cached results (all, or one template's); returns how many"""
+        with self._connect() as conn:
+            if template:
+                return conn.execute("DELETE FROM results WHERE template = ?", (template,)).rowcount
+            return conn.execute("DELETE FROM results").rowcount
+
+
+_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    """Process-wide cache instance"""
+    global _cache
+    if _cache is None:
+        _cache = ResultCache()
+    return _cache
+
+
+def main():
+    """CLI: inspect or clear the result cache"""
+    if len(sys.argv) < 2:
+        print("Usage: result_cache.py <command> [template]")
+        print("Commands:")
+        print("  stats - Hit rate, entries and evictions per template")
+        print("  clear - Drop cached results (optionally for one template)")
+        sys.exit(1)
+
+    cache = get_result_cache()
+    command = sys.argv[1]
+    if command == "stats":
+        rows = cache.stats()
+        if not rows:
+            print("Result cache is empty")
+            return
+        print(f"{'template':<36} {'hits':>6} {'misses':>7} {'rate':>6} {'entries':>8} {'evicted':>8}")
+        for row in rows:
+            rate = f"{row['hit_rate']:.0%}" if row['hit_rate'] is not None else '-'
+            print(f"{row['template'][:36]:<36} {row['hits']:>6} {row['misses']:>7} {rate:>6} "
+                  f"{row['entries']:>8} {row['evictions']:>8}")
+        saved = sum(row['hits'] * row['saved_ms'] for row in rows) / 1000
+        print(f"\nApproximate Claude time saved: {saved:.0f}s")
+    elif command == "clear":
+        template = sys.argv[2] if len(sys.argv) > 2 else None
+        print(f"Removed {cache.clear(template)} cached results")
+    else:
+        print("Invalid command")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
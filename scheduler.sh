@@ -1,7 +1,7 @@
 #!/bin/bash
 
 # Task Scheduler wrapper script
-# Usage: ./scheduler.sh [run|status|init|list]
+# Usage: ./scheduler.sh [run|run-now|status|init|list]
 
 UTILS_DIR="$(dirname "$0")"
 cd "$UTILS_DIR"
@@ -43,6 +43,17 @@ case "$1" in
         "
         ;;
     
+    run-now)
+        if [[ ! "$2" =~ ^[0-9]+$ ]]; then
+            echo "Usage: $0 run-now <task_id>"
+            exit 1
+        fi
+        # Marks the task due; the running daemon is woken via NOTIFY
+        psql -d claudemini -t -v id="$2" <<< "SELECT run_task_now(:'id'::int);" | grep -q t \
+            && echo "Task $2 queued to run now" \
+            || { echo "Task $2 not found or not active"; exit 1; }
+        ;;
+    
     init)
         echo "Initializing database tables..."
         psql -d claudemini -f create_task_tables.sql
@@ -50,8 +61,9 @@ case "$1" in
         ;;
     
     *)
-        echo "Usage: $0 {run|status|init|list}"
+        echo "Usage: $0 {run|run-now|status|init|list}"
         echo "  run    - Run the task scheduler once"
+        echo "  run-now <task_id> - Make a task due immediately"
         echo "  status - Show recent task executions"
         echo "  init   - Initialize database tables"
         echo "  list   - List all active tasks"
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Scheduler Load Test and Benchmark
+Seeds an isolated Postgres schema with synthetic scheduled_tasks across every
+task_type, runs TaskScheduler (with a fake executor) or TaskDaemon (with fake
+sleep/exit commands) at steady state, and reports dequeue latency, throughput,
+schedule lag and DB round trips per task. --store memory runs the same load
+against the in-process MemoryTaskStore instead.
+
+  python3 scheduler_benchmark.py --tasks 5000 --duration 60 --json bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import db
+
+SCHEMA_FILE = Path(__file__).parent / "create_task_tables.sql"
+
+TASK_TYPES = (
+    'memory_management', 'social_media', 'financial_monitoring',
+    'system_monitoring', 'learning_research', 'daily_routine',
+    'personality_development', 'goal_management', 'trading_operations',
+    'backup_maintenance', 'network_security', 'tool_development',
+    'content_creation', 'environmental_response', 'custom'
+)
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    """Connection that counts statements and transaction ends sent to the server"""
+
+    round_trips = 0  # Shared by every connection of the benchmark process
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(super().cursor(*args, **kwargs))
+
+    def commit(self):
+        if self.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            CountingConnection.round_trips += 1
+        super().commit()
+
+    def rollback(self):
+        if self.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            CountingConnection.round_trips += 1
+        super().rollback()
+
+
+class CountingCursor:
+    """Cursor proxy counting execute calls"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        CountingConnection.round_trips += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        CountingConnection.round_trips += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class FakeWorkload:
+    """Latency and failure distribution standing in for real task execution"""
+
+    def __init__(self, latency_ms: float = 50, distribution: str = 'lognormal',
+                 failure_rate: float = 0.05, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.distribution = distribution
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+
+    def sample(self) -> Tuple[float, bool]:
+        """(latency in seconds, whether the run fails)"""
+        if self.distribution == 'fixed':
+            latency = self.latency_ms
+        elif self.distribution == 'uniform':
+            latency = self.random.uniform(0, 2 * self.latency_ms)
+        else:
+            # Median latency_ms with a long tail, like real claude runs
+            latency = self.random.lognormvariate(0, 0.75) * self.latency_ms
+        return latency / 1000, self.random.random() < self.failure_rate
+
+    def command(self) -> str:
+        """Shell command for the daemon, which runs task commands itself"""
+        latency, fail = self.sample()
+        return f"sleep {latency:.3f}" + ("; exit 1" if fail else "")
+
+
+class FakeExecutor:
+    """Drop-in for ClaudeExecutor.execute_task driven by a FakeWorkload"""
+
+    def __init__(self, workload: FakeWorkload):
+        self.workload = workload
+
+    def execute_task(self, task: Dict, execution_id: Optional[int] = None) -> Dict:
+        latency, fail = self.workload.sample()
+        time.sleep(latency)
+        return {
+            'status': 'failed' if fail else 'success',
+            'output': None if fail else f"fake output for {task['task_name']}",
+            'error': 'fake failure' if fail else None,
+            'execution_time_ms': int(latency * 1000),
+        }
+
+
+def percentiles(values: List[float], scale: float = 1.0) -> Dict[str, Optional[float]]:
+    """p50/p90/p99/max (nearest rank), multiplied by scale"""
+    if not values:
+        return {'p50': None, 'p90': None, 'p99': None, 'max': None}
+    ordered = sorted(values)
+
+    def rank(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * scale, 3)
+    return {'p50': rank(0.5), 'p90': rank(0.9), 'p99': rank(0.99),
+            'max': round(ordered[-1] * scale, 3)}
+
+
+class Recorder:
+    """Collects per-claim and per-completion timings"""
+
+    def __init__(self):
+        self.dequeue_seconds: List[float] = []
+        self.complete_seconds: List[float] = []
+        self.schedule_lag: List[float] = []
+        self.type_lag: Dict[str, List[float]] = {}
+        self.claimed = 0
+        self.empty_claims = 0
+
+    def wrap_claim(self, claim):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            tasks = claim(*args, **kwargs)
+            self.dequeue_seconds.append(time.perf_counter() - start)
+            now = datetime.now(timezone.utc)
+            for task in tasks:
+                if task.get('next_run_at'):
+                    lag = (now - task['next_run_at']).total_seconds()
+                    self.schedule_lag.append(lag)
+                    self.type_lag.setdefault(task['task_type'], []).append(lag)
+            self.claimed += len(tasks)
+            if not tasks:
+                self.empty_claims += 1
+            return tasks
+        return timed
+
+    def wrap_complete(self, complete):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = complete(*args, **kwargs)
+            self.complete_seconds.append(time.perf_counter() - start)
+            return result
+        return timed
+
+
+def prepare_schema(schema: str):
+    """(Re)create the benchmark schema from create_task_tables.sql"""
+    conn = db.connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+            cur.execute(f"CREATE SCHEMA {schema}")
+            cur.execute(SCHEMA_FILE.read_text())
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def seed_tasks(count: int, duration: float, backlog: float, workload: FakeWorkload,
+               seed: Optional[int] = None, store=None) -> int:
+    """Insert count tasks coming due evenly over the run, backlog fraction already due
+
+    Rows go straight into the benchmark schema, or into store when given.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(count):
+        if rng.random() < backlog:
+            next_run = now - timedelta(seconds=rng.uniform(0, 300))
+        else:
+            next_run = now + timedelta(seconds=rng.uniform(0, duration))
+        schedule_type = rng.choice(('once', 'recurring', 'cron'))
+        rows.append((
+            f"bench-{i:06d}",
+            TASK_TYPES[i % len(TASK_TYPES)],
+            workload.command(),
+            schedule_type,
+            '*/5 * * * *' if schedule_type == 'cron' else None,
+            60 if schedule_type == 'recurring' else None,
+            next_run,
+            rng.randint(1, 10),
+        ))
+
+    if store is not None:
+        columns = ('task_name', 'task_type', 'command', 'schedule_type',
+                   'cron_expression', 'interval_minutes', 'next_run_at', 'priority')
+        store.add_tasks([dict(zip(columns, row)) for row in rows])
+        return len(rows)
+
+    conn = db.connect()
+    try:
+        with conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO scheduled_tasks (
+                    task_name, task_type, command, schedule_type,
+                    cron_expression, interval_minutes, next_run_at, priority
+                ) VALUES %s
+            """, rows, page_size=1000)
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def run_scheduler(args, workload: FakeWorkload, recorder: Recorder, store=None) -> Dict:
+    """Drive TaskScheduler.run_single_batch with a fake executor until the deadline"""
+    from task_scheduler import TaskScheduler
+
+    scheduler = TaskScheduler(store)
+    scheduler.executor = FakeExecutor(workload)
+    scheduler.get_pending_tasks = recorder.wrap_claim(scheduler.get_pending_tasks)
+    scheduler.complete_task_execution = recorder.wrap_complete(scheduler.complete_task_execution)
+
+    deadline = time.monotonic() + args.duration
+    while scheduler.running and time.monotonic() < deadline:
+        claimed = recorder.claimed
+        scheduler.run_single_batch(batch_size=args.batch_size)
+        if recorder.claimed == claimed:
+            time.sleep(args.idle_sleep)
+    return {}
+
+
+def run_daemon(args, recorder: Recorder, store=None) -> Dict:
+    """Run TaskDaemon's main loop (seeded commands sleep/exit) until the deadline"""
+    from task_daemon import TaskDaemon
+
+    daemon = TaskDaemon()
+    if store is not None:
+        # Already seeded, so connect_db() won't load the real templates
+        daemon.store_kind = store.kind
+        daemon.store = store
+    daemon.connect_db()
+    daemon.get_pending_tasks = recorder.wrap_claim(daemon.get_pending_tasks)
+
+    async def stop_after_deadline():
+        await asyncio.sleep(args.duration)
+        daemon.running = False
+        daemon.wakeup.set()
+
+    async def run():
+        await asyncio.gather(daemon.main_loop(), stop_after_deadline())
+
+    asyncio.run(run())
+    return {'max_workers': daemon.pool.max_workers}
+
+
+def execution_counts(store=None) -> Dict[str, int]:
+    if store is not None:
+        counts: Dict[str, int] = {}
+        for execution in store.executions.values():
+            counts[execution['status']] = counts.get(execution['status'], 0) + 1
+        return counts
+    conn = db.connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT status, COUNT(*) FROM task_executions GROUP BY status")
+            return dict(cur.fetchall())
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the task scheduler')
+    parser.add_argument('--mode', choices=('scheduler', 'daemon'), default='scheduler')
+    parser.add_argument('--store', choices=('postgres', 'memory'), default='postgres',
+                        help='Task store to benchmark')
+    parser.add_argument('--policy', choices=('fair', 'priority'), default='fair',
+                        help='Scheduling policy (TASK_SCHEDULING_POLICY)')
+    parser.add_argument('--tasks', type=int, default=1000, help='Synthetic tasks to seed')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+    parser.add_argument('--backlog', type=float, default=0.1,
+                        help='Fraction of tasks already due at the start')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Median fake task latency')
+    parser.add_argument('--latency-dist', choices=('fixed', 'uniform', 'lognormal'),
+                        default='lognormal')
+    parser.add_argument('--failure-rate', type=float, default=0.05)
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--idle-sleep', type=float, default=0.05,
+                        help='Scheduler mode: pause when nothing is due')
+    parser.add_argument('--schema', default='scheduler_bench',
+                        help='Postgres schema to (re)create for the run')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', metavar='PATH', help='Write results as JSON ("-" for stdout)')
+    args = parser.parse_args()
+
+    # Every connection (pool, listener, seeding) uses the benchmark schema and
+    # counts its round trips. The schema's triggers still NOTIFY on the shared
+    # scheduled_tasks channel, so a production daemon may wake up spuriously.
+    db.configure(options=f"-c search_path={args.schema},public",
+                 connection_factory=CountingConnection)
+
+    os.environ['TASK_SCHEDULING_POLICY'] = args.policy
+    workload = FakeWorkload(args.latency_ms, args.latency_dist, args.failure_rate, args.seed)
+    store = None
+    if args.store == 'memory':
+        from task_store import MemoryTaskStore
+        os.environ['TASK_STORE'] = 'memory'
+        store = MemoryTaskStore()
+    else:
+        prepare_schema(args.schema)
+    seeded = seed_tasks(args.tasks, args.duration, args.backlog, workload, args.seed, store)
+
+    recorder = Recorder()
+    CountingConnection.round_trips = 0
+    started_at = datetime.now(timezone.utc)
+    start = time.monotonic()
+    if args.mode == 'scheduler':
+        extra = run_scheduler(args, workload, recorder, store)
+    else:
+        extra = run_daemon(args, recorder, store)
+    elapsed = time.monotonic() - start
+    round_trips = CountingConnection.round_trips
+    db.close_all()
+
+    executions = execution_counts(store)
+    finished = sum(n for status, n in executions.items() if status != 'running')
+    results = {
+        'config': {**vars(args), 'seeded_tasks': seeded, **extra},
+        'host': {'platform': platform.platform(), 'cpus': os.cpu_count(),
+                 'python': platform.python_version()},
+        'started_at': started_at.isoformat(),
+        'elapsed_seconds': round(elapsed, 3),
+        'claimed': recorder.claimed,
+        'executions': executions,
+        'tasks_per_second': round(finished / elapsed, 2) if elapsed else None,
+        'dequeue_latency_ms': percentiles(recorder.dequeue_seconds, 1000),
+        'complete_latency_ms': percentiles(recorder.complete_seconds, 1000),
+        'schedule_lag_seconds': percentiles(recorder.schedule_lag),
+        'schedule_lag_by_type': {task_type: percentiles(lags)
+                                 for task_type, lags in sorted(recorder.type_lag.items())},
+        'empty_claims': recorder.empty_claims,
+        'db_round_trips': round_trips,
+        'db_round_trips_per_task': round(round_trips / finished, 2) if finished else None,
+    }
+
+    if args.json:
+        if args.json == '-':
+            print(json.dumps(results, indent=2, default=str))
+        else:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2, default=str)
+            print(f"Results written to {args.json}")
+
+    if args.json != '-':
+        print(f"Mode: {args.mode}  store: {args.store}  policy: {args.policy}  "
+              f"tasks: {seeded}  elapsed: {elapsed:.1f}s")
+        print(f"Executions: {executions}  ({results['tasks_per_second']} tasks/sec)")
+        for label, key, unit in (('Dequeue latency', 'dequeue_latency_ms', 'ms'),
+                                 ('Complete latency', 'complete_latency_ms', 'ms'),
+                                 ('Schedule lag', 'schedule_lag_seconds', 's')):
+            p = results[key]
+            if p['p50'] is not None:
+                print(f"{label:<17} p50 {p['p50']}{unit}  p90 {p['p90']}{unit}  "
+                      f"p99 {p['p99']}{unit}  max {p['max']}{unit}")
+        worst = max(results['schedule_lag_by_type'].items(), key=lambda item: item[1]['max'],
+                    default=None)
+        if worst:
+            print(f"Worst type lag    {worst[0]} p99 {worst[1]['p99']}s  max {worst[1]['max']}s")
+        print(f"DB round trips: {round_trips} ({results['db_round_trips_per_task']} per task)")
+
+
+if __name__ == "__main__":
+    main()
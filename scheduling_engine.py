@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Unified Scheduling Engine
+One process with one timer heap, one WorkerPool and one database connection
+pool (db.py) for the job sources that each used to run their own polling loop:
+
+  tasks       - TaskDaemon's task-store dispatch (the 5-minute task_scheduler.py
+                line in crontab_entry.txt is commented out with this rollout;
+                it claims from the same store, so it is only needed without
+                the engine)
+  cron        - CronScheduler's configured jobs
+  autonomous  - AutonomousSystem's daily routines and hourly check
+  twitter     - TwitterMonitor's 5-minute pass
+  fs          - continuous_fs_monitor.sh's 30-minute scan
+
+The engine sleeps until the earliest deadline or a wake-up (NOTIFY, a worker
+finishing) instead of every source waking on its own interval.
+
+  python3 scheduling_engine.py run [--sources tasks,cron,...]
+  python3 scheduling_engine.py bench [--seconds 300] [--sources ...]
+
+bench compares RSS, CPU time and wakeups with the standalone loops. It starts
+the real sources, so stop the running services first.
+"""
+
+import os
+import sys
+import heapq
+import signal
+import asyncio
+import logging
+import itertools
+import subprocess
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger('scheduling_engine')
+
+SOURCES = ('tasks', 'cron', 'autonomous', 'twitter', 'fs')
+SHUTDOWN_GRACE = float(os.environ.get('ENGINE_SHUTDOWN_GRACE', 60))
+UTILS_DIR = Path(__file__).parent
+
+
+def every(seconds: float, start: datetime) -> Callable[[datetime], datetime]:
+    """Trigger firing every `seconds` in phase with start"""
+    step = timedelta(seconds=seconds)
+    return lambda after: start + step * (max((after - start) // step, -1) + 1)
+
+
+def daily_at(hour: int, minute: int = 0) -> Callable[[datetime], datetime]:
+    from cron_expression import compile_cron
+    return compile_cron(f"{minute} {hour} * * *").next_fire
+
+
+class Job:
+    """A unit of work the engine starts when due
+
+    trigger(after) gives the next intended start after a time, or None to run
+    only when woken. Inline jobs are quick synchronous calls made on the
+    engine loop; a number they return overrides the trigger as the delay
+    until their next run. Other jobs are coroutine factories run on the
+    shared pool, never overlapping with themselves.
+    """
+
+    def __init__(self, name: str, trigger: Optional[Callable[[datetime], Optional[datetime]]],
+                 action: Callable, job_type: str = 'engine', inline: bool = False,
+                 on_skip: Optional[Callable[[datetime], None]] = None,
+                 wake_on_capacity: bool = False):
+        self.name = name
+        self.trigger = trigger
+        self.action = action
+        self.job_type = job_type
+        self.inline = inline
+        self.on_skip = on_skip
+        self.wake_on_capacity = wake_on_capacity  # Rerun when a pool worker finishes
+        self.runs = 0
+        self.skips = 0
+
+
+class WakeSignal:
+    """Stands in for an asyncio.Event a source sets to be run again
+
+    set() makes the named jobs (or every capacity-waiting job) due now;
+    the engine owns waiting, so clear() does nothing.
+    """
+
+    def __init__(self, engine: 'SchedulingEngine', name: Optional[str] = None):
+        self.engine = engine
+        self.name = name
+
+    def set(self):
+        if self.name is None:
+            self.engine.capacity_freed()
+        else:
+            self.engine.wake(self.name)
+
+    def clear(self):
+        pass
+
+    def is_set(self) -> bool:
+        return False
+
+
+class SchedulingEngine:
+    """Single timer heap driving every registered job on one worker pool"""
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 type_limits: Optional[Dict[str, int]] = None):
+        from worker_pool import WorkerPool
+        self.wakeup = asyncio.Event()
+        self.pool = WorkerPool(max_workers, type_limits, done_event=WakeSignal(self))
+        self.jobs: Dict[str, Job] = {}
+        self.heap: List = []  # (when, seq, name); superseded entries are skipped
+        self.deadlines: Dict[str, datetime] = {}
+        self.deferred: Dict[str, datetime] = {}  # Due jobs waiting for a free worker
+        self.seq = itertools.count()
+        self.running = True
+        self.loop_wakeups = 0
+        self.shutdown_hooks: List[Callable] = []
+
+    def add_job(self, job: Job, first: Optional[datetime] = None):
+        """Register a job, first due at `first` or its trigger's next time"""
+        self.jobs[job.name] = job
+        when = first or (job.trigger(datetime.now()) if job.trigger else None)
+        if when is not None:
+            self.schedule(job.name, when)
+
+    def on_shutdown(self, hook: Callable):
+        """Call hook (sync or async) once jobs have stopped"""
+        self.shutdown_hooks.append(hook)
+
+    def schedule(self, name: str, when: datetime):
+        self.deadlines[name] = when
+        heapq.heappush(self.heap, (when, next(self.seq), name))
+        self.wakeup.set()
+
+    def wake(self, name: str):
+        """Make a job due now"""
+        if name in self.jobs:
+            self.schedule(name, datetime.now())
+
+    def capacity_freed(self):
+        for name, job in self.jobs.items():
+            if job.wake_on_capacity or name in self.deferred:
+                self.schedule(name, self.deferred.pop(name, datetime.now()))
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+
+    def _fire(self, job: Job, intended: datetime):
+        if job.inline:
+            job.runs += 1
+            try:
+                delay = job.action()
+            except Exception as e:
+                logger.error(f"Job {job.name} failed: {e}")
+                # Woken-only jobs would otherwise never run again
+                delay = None if job.trigger else 60
+            if isinstance(delay, (int, float)):
+                self.schedule(job.name, datetime.now() + timedelta(seconds=delay))
+                return
+        elif self.pool.is_running(job.name):
+            job.skips += 1
+            logger.warning(f"Job {job.name} is still running, skipping")
+            if job.on_skip:
+                job.on_skip(intended)
+        elif not self.pool.has_capacity(job.job_type):
+            # Keep the intended time so lag stays measurable; retried when a worker frees
+            self.deferred[job.name] = intended
+            return
+        else:
+            job.runs += 1
+            self.pool.submit(job.name, job.job_type, job.action(intended))
+
+        if job.trigger:
+            # Slots missed while the machine slept are dropped, not replayed
+            next_start = job.trigger(max(intended, datetime.now()))
+            if next_start is not None:
+                self.schedule(job.name, next_start)
+
+    async def run(self):
+        """Run due jobs until stop(), then let running work finish"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+        logger.info(f"Scheduling engine started with {len(self.jobs)} jobs "
+                    f"(max {self.pool.max_workers} concurrent)")
+
+        while self.running:
+            self.wakeup.clear()
+            now = datetime.now()
+            while self.heap and self.heap[0][0] <= now:
+                when, _, name = heapq.heappop(self.heap)
+                if self.deadlines.get(name) != when:
+                    continue
+                del self.deadlines[name]
+                self._fire(self.jobs[name], when)
+
+            delay = (self.heap[0][0] - datetime.now()).total_seconds() if self.heap else None
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                self.loop_wakeups += 1
+
+        logger.info("Scheduling engine stopping")
+        await self.pool.drain(timeout=SHUTDOWN_GRACE)
+        for hook in self.shutdown_hooks:
+            try:
+                result = hook()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Shutdown hook failed: {e}")
+        logger.info(f"Scheduling engine stopped after {self.loop_wakeups} wakeups")
+
+
+def add_task_store_source(engine: SchedulingEngine):
+    """TaskDaemon's dispatch as an inline job on the shared pool"""
+    from task_daemon import TaskDaemon
+    daemon = TaskDaemon()
+    daemon.pool = engine.pool
+    daemon.wakeup = WakeSignal(engine, 'tasks')
+    daemon.load_context()
+    daemon.connect_db()
+    daemon.start()
+
+    def stop():
+        daemon.running = False
+        if daemon.listen_conn:
+            daemon.listen_conn.close()
+        return daemon.stop()
+
+    engine.add_job(Job('tasks', None, daemon.tick, inline=True, wake_on_capacity=True),
+                   first=datetime.now())
+    engine.on_shutdown(stop)
+
+
+def add_cron_source(engine: SchedulingEngine):
+    """Each CronScheduler job, plus its write-behind state flush"""
+    from cron_scheduler import CronScheduler
+    cron = CronScheduler()
+    start = datetime.now()
+    for task in cron.tasks.values():
+        trigger = cron.trigger_for(task, start)
+        if trigger is None:
+            continue
+        engine.add_job(Job(
+            f"cron:{task.name}", trigger,
+            lambda intended, t=task: cron.run_task(t, intended),
+            job_type='cron',
+            on_skip=lambda intended, t=task: cron.record_run(t, intended, None, 'skipped'),
+        ), first=start if task.name == 'system_health_check' else None)
+
+    engine.add_job(Job('cron:state', every(cron.state.flush_interval, start),
+                       cron.state.flush, inline=True))
+    engine.on_shutdown(lambda: cron.state.flush(force=True))
+
+
+def add_autonomous_source(engine: SchedulingEngine):
+    """AutonomousSystem's routines (blocking calls, so run in threads)"""
+    from autonomous_system import AutonomousSystem
+    system = AutonomousSystem()
+
+    def job(name, trigger, method, first=None):
+        engine.add_job(Job(f"autonomous:{name}", trigger,
+                           lambda intended: asyncio.to_thread(method),
+                           job_type='autonomous'), first)
+
+    job('morning', daily_at(9), system.morning_routine)
+    job('afternoon', daily_at(14), system.afternoon_routine)
+    job('evening', daily_at(18), system.evening_routine)
+    start = datetime.now()
+    job('hourly', every(3600, start), system.hourly_check, first=start)
+
+
+def add_twitter_source(engine: SchedulingEngine):
+    """TwitterMonitor's periodic pass"""
+    from twitter_monitor import CHECK_INTERVAL, TwitterMonitor
+    monitor = TwitterMonitor()
+    monitor.load_state()
+    start = datetime.now()
+    engine.add_job(Job('twitter', every(CHECK_INTERVAL, start),
+                       lambda intended: asyncio.to_thread(monitor.check_once),
+                       job_type='twitter'), first=start)
+
+
+def add_fs_source(engine: SchedulingEngine):
+    """continuous_fs_monitor.sh's scan, one process per run"""
+    async def scan(intended):
+        proc = await asyncio.create_subprocess_exec(
+            'bash', str(UTILS_DIR / 'continuous_fs_monitor.sh'), '--once',
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+        try:
+            await proc.wait()
+        except asyncio.CancelledError:
+            proc.kill()
+            raise
+
+    start = datetime.now()
+    engine.add_job(Job('fs', every(1800, start), scan, job_type='fs'), first=start)
+
+
+SOURCE_LOADERS = {
+    'tasks': add_task_store_source,
+    'cron': add_cron_source,
+    'autonomous': add_autonomous_source,
+    'twitter': add_twitter_source,
+    'fs': add_fs_source,
+}
+
+
+async def run_engine(sources: List[str]):
+    """Build the engine with the given sources and run it"""
+    from task_daemon import TaskDaemon
+    from worker_pool import parse_type_limits
+    # Same caps as the standalone daemon; the other sources' job types are uncapped
+    type_limits = dict(TaskDaemon.default_type_limits)
+    type_limits.update(parse_type_limits(os.environ.get('TASK_DAEMON_TYPE_LIMITS')))
+    engine = SchedulingEngine(int(os.environ.get('TASK_DAEMON_MAX_WORKERS', 0)) or None,
+                              type_limits)
+    for source in sources:
+        try:
+            SOURCE_LOADERS[source](engine)
+            logger.info(f"Registered source: {source}")
+        except Exception as e:
+            logger.error(f"Could not start source {source}: {e}")
+    for name in sorted(engine.deadlines, key=engine.deadlines.get):
+        logger.info(f"  {name:<28} next at {engine.deadlines[name]:%Y-%m-%d %H:%M:%S}")
+    await engine.run()
+
+
+# Standalone processes the engine replaces; task_scheduler.py is cron-launched
+LEGACY_COMMANDS = {
+    'tasks': [sys.executable, 'task_daemon.py'],
+    'cron': [sys.executable, 'cron_scheduler.py'],
+    'autonomous': [sys.executable, 'autonomous_system.py'],
+    'twitter': [sys.executable, 'twitter_monitor.py'],
+    'fs': ['bash', 'continuous_fs_monitor.sh'],
+}
+LEGACY_CRON = {'tasks': ([sys.executable, 'task_scheduler.py'], 300)}
+
+
+def measure(launch: Dict[str, List[str]], seconds: float,
+            periodic: Optional[Dict[str, tuple]] = None, interval: float = 1.0) -> Dict:
+    """Run commands for `seconds`, sampling RSS of their process trees
+
+    CPU time and voluntary context switches come from the rusage of the
+    reaped process trees once they are stopped. Voluntary switches
+    approximate wakeups: an idle loop switches out once per sleep.
+    """
+    import time
+    import resource
+    import psutil
+
+    def tree_rss(pid):
+        try:
+            proc = psutil.Process(pid)
+            return sum(p.memory_info().rss for p in [proc] + proc.children(recursive=True))
+        except psutil.NoSuchProcess:
+            return 0
+
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    roots: List[subprocess.Popen] = []
+
+    def start(cmd):
+        roots.append(subprocess.Popen(cmd, cwd=UTILS_DIR, start_new_session=True,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+
+    for cmd in launch.values():
+        start(cmd)
+    next_periodic = {name: 0.0 for name in (periodic or {})}
+    began = time.monotonic()
+    samples = []
+    while time.monotonic() - began < seconds:
+        elapsed = time.monotonic() - began
+        for name, (cmd, every_seconds) in (periodic or {}).items():
+            if elapsed >= next_periodic[name]:
+                start(cmd)
+                next_periodic[name] += every_seconds
+        time.sleep(interval)
+        samples.append(sum(tree_rss(root.pid) for root in roots if root.poll() is None))
+
+    for root in roots:
+        try:
+            os.killpg(root.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for root in roots:
+        try:
+            root.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(root.pid, signal.SIGKILL)
+            root.wait()
+
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        'processes': len(roots),
+        'mean_rss_mb': sum(samples) / len(samples) / 2 ** 20 if samples else 0,
+        'peak_rss_mb': max(samples, default=0) / 2 ** 20,
+        'cpu_seconds': (usage.ru_utime - usage_before.ru_utime) +
+                       (usage.ru_stime - usage_before.ru_stime),
+        'wakeups_per_minute': (usage.ru_nvcsw - usage_before.ru_nvcsw) / seconds * 60,
+    }
+
+
+def bench(sources: List[str], seconds: float):
+    """Compare the standalone loops with the engine over the same sources
+
+    Both runs start the real sources (jobs due at startup will run), so stop
+    the normal services first.
+    """
+    legacy = measure({s: LEGACY_COMMANDS[s] for s in sources}, seconds,
+                     {s: LEGACY_CRON[s] for s in sources if s in LEGACY_CRON})
+    engine = measure({'engine': [sys.executable, 'scheduling_engine.py', 'run',
+                                 '--sources', ','.join(sources)]}, seconds)
+    print(f"Idle benchmark over {seconds:.0f}s with sources: {', '.join(sources)}")
+    print(f"{'':<22} {'standalone':>11} {'engine':>11}")
+    for key, label in (('processes', 'processes launched'), ('mean_rss_mb', 'mean RSS (MB)'),
+                       ('peak_rss_mb', 'peak RSS (MB)'), ('cpu_seconds', 'CPU seconds'),
+                       ('wakeups_per_minute', 'wakeups / minute')):
+        print(f"{label:<22} {legacy[key]:>11.1f} {engine[key]:>11.1f}")
+
+
+def main():
+    """CLI: run the engine or benchmark it against the standalone loops"""
+    if len(sys.argv) < 2 or sys.argv[1] not in ('run', 'bench'):
+        print("Usage: scheduling_engine.py <command> [options]")
+        print("Commands:")
+        print("  run - Run every job source in this process")
+        print("  bench - Compare idle RSS, CPU and wakeups with the standalone loops")
+        print("Options:")
+        print(f"  --sources a,b     Job sources (default all: {','.join(SOURCES)})")
+        print("  --seconds N       Length of each benchmark run (default 300)")
+        sys.exit(1)
+
+    sources = list(SOURCES)
+    if '--sources' in sys.argv:
+        sources = [s for s in sys.argv[sys.argv.index('--sources') + 1].split(',') if s]
+        unknown = set(sources) - set(SOURCES)
+        if unknown:
+            print(f"Unknown sources: {', '.join(sorted(unknown))}")
+            sys.exit(1)
+
+    if sys.argv[1] == 'bench':
+        seconds = float(sys.argv[sys.argv.index('--seconds') + 1]) if '--seconds' in sys.argv else 300
+        bench(sources, seconds)
+        return
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(UTILS_DIR / 'logs' / 'scheduling_engine.log'),
+            logging.StreamHandler()
+        ]
+    )
+    asyncio.run(run_engine(sources))
+
+
+if __name__ == "__main__":
+    main()
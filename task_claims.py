@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Task Claims for multi-worker scheduling
+Atomically leases due scheduled_tasks rows using FOR UPDATE SKIP LOCKED
+"""
+
+import os
+import socket
+import logging
+from typing import Dict, Iterable, List, Optional
+from psycopg2.extras import RealDictCursor
+
+logger = logging.getLogger('task_claims')
+
+
+def default_worker_id() -> str:
+    """Identify this worker as host:pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class TaskClaimer:
+    """Claims, heartbeats and releases task leases for one worker"""
+
+    def __init__(self, conn, worker_id: Optional[str] = None, lease_seconds: int = 600):
+        self.conn = conn
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+
+    def claim(self, batch_size: int = 10, exclude_types: Iterable[str] = (),
+              exclude_classes: Iterable[str] = ()) -> List[Dict]:
+        """Lease up to batch_size due tasks; rows held by other workers are skipped"""
+        try:
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    "SELECT * FROM claim_pending_tasks(%s, %s, %s, %s::varchar[], %s::varchar[])",
+                    (self.worker_id, batch_size, self.lease_seconds, list(exclude_types),
+                     list(exclude_classes))
+                )
+                tasks = cur.fetchall()
+            self.conn.commit()
+            # RETURNING doesn't preserve the candidate ordering
+            tasks.sort(key=lambda t: (-t['priority'], t['next_run_at']))
+            return tasks
+        except Exception as e:
+            logger.error(f"Error claiming tasks: {e}")
+            self.conn.rollback()
+            return []
+
+    def claim_ids(self, task_ids: List[int]) -> List[Dict]:
+        """Lease specific due tasks (picked by a scheduling policy); tasks
+        claimed elsewhere or no longer due are left out"""
+        if not task_ids:
+            return []
+        try:
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    "SELECT * FROM claim_tasks_by_id(%s, %s, %s)",
+                    (self.worker_id, list(task_ids), self.lease_seconds)
+                )
+                tasks = cur.fetchall()
+            self.conn.commit()
+            return tasks
+        except Exception as e:
+            logger.error(f"Error claiming tasks: {e}")
+            self.conn.rollback()
+            return []
+
+    def heartbeat(self, task_ids: List[int]) -> int:
+        """Extend leases on tasks this worker is still running"""
+        if not task_ids:
+            return 0
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    "SELECT heartbeat_task_leases(%s, %s, %s)",
+                    (self.worker_id, list(task_ids), self.lease_seconds)
+                )
+                updated = cur.fetchone()[0]
+            self.conn.commit()
+            return updated
+        except Exception as e:
+            logger.error(f"Error renewing task leases: {e}")
+            self.conn.rollback()
+            return 0
+
+    def release(self, task_id: int):
+        """Drop this worker's lease on a task without completing it"""
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE scheduled_tasks
+                    SET locked_by = NULL, locked_at = NULL, lease_expires_at = NULL
+                    WHERE id = %s AND locked_by = %s
+                """, (task_id, self.worker_id))
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Error releasing lease on task {task_id}: {e}")
+            self.conn.rollback()
+
+    def recover_expired(self) -> int:
+        """Reclaim leases from dead workers, closing their orphaned executions"""
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("SELECT recover_expired_leases()")
+                recovered = cur.fetchone()[0]
+            self.conn.commit()
+            if recovered:
+                logger.warning(f"Recovered {recovered} executions from expired leases")
+            return recovered
+        except Exception as e:
+            logger.error(f"Error recovering expired leases: {e}")
+            self.conn.rollback()
+            return 0
@@ -10,13 +10,21 @@ import sys
 import time
 import signal
 import logging
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-import psycopg2
-from psycopg2.extras import RealDictCursor
 import subprocess
 import json
 from task_error_handler import TaskErrorHandler
+from worker_pool import WorkerPool, parse_type_limits
+from task_store import MemoryTaskStore, PostgresTaskStore, initialize_from_templates
+from admission_control import AdmissionController
+from fair_share import get_dispatcher
+from misfire import catch_up_on_startup, mark_dispatch, next_run_after_success
+from output_capture import OutputCapture, execution_log_path
+from task_resources import TaskResources, limits_from_metadata
+from task_claims import default_worker_id
+import task_metrics
+import db
 
 # Setup logging
 logging.basicConfig(
@@ -30,17 +38,48 @@ logging.basicConfig(
 logger = logging.getLogger('task_daemon')
 
 class TaskDaemon:
+    # Task types that must not overlap with themselves (trades, backups, posting)
+    default_type_limits = {
+        'trading_operations': 1,
+        'backup_maintenance': 1,
+        'social_media': 1,
+    }
+    
     def __init__(self):
         self.running = True
-        self.tick_interval = 60  # Check every 60 seconds
+        self.tick_interval = 60  # Housekeeping interval (lease recovery)
+        self.max_sleep = 300  # Safety-net poll in case a notification is missed
+        self.listen_conn = None
+        self.wakeup = asyncio.Event()  # Set by NOTIFY or a finished worker
         self.claude_md_path = Path("/Users/claudemini/Claude/CLAUDE.md")
         self.env_path = Path("/Users/claudemini/Claude/.env")
         self.context = {}
         self.db_conn = None
+        self.store = None
+        self.dispatcher = None  # Claims through the store in fair-share order
+        self.store_kind = os.environ.get('TASK_STORE', 'postgres')
+        self.lease_seconds = 600  # Renewed every tick while a task runs
+        self.last_lease_recovery = 0
+        self.tick_count = 0
+        self.uses_postgres = False  # Set by start()
         self.retry_attempts = {}  # Track retry attempts per task
         self.max_retries = 3
         self.retry_delays = [60, 300, 900]  # 1 min, 5 min, 15 min
         self.error_handler = TaskErrorHandler()  # Initialize error handler
+        self.retry_worker = None  # Thread running due TaskErrorHandler retries
+        self.retry_shutdown_grace = 30  # Seconds stop() waits for that batch
+        self.admission = AdmissionController()  # Holds back heavy tasks under load
+        self.admission_recheck = 15  # Seconds between load checks while deferring
+        self.gauge_interval = 15  # Seconds between queue depth refreshes
+        self.last_gauge_update = 0
+        self.metrics_snapshots = None  # Set by start() on the Postgres store
+        
+        # Concurrent execution limits (override via environment)
+        max_workers = int(os.environ.get('TASK_DAEMON_MAX_WORKERS', 0)) or os.cpu_count()
+        type_limits = dict(self.default_type_limits)
+        type_limits.update(parse_type_limits(os.environ.get('TASK_DAEMON_TYPE_LIMITS')))
+        self.pool = WorkerPool(max_workers=max_workers, type_limits=type_limits,
+                               done_event=self.wakeup)
         
         # Signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self.handle_shutdown)
@@ -49,6 +88,7 @@ class TaskDaemon:
     def handle_shutdown(self, signum, frame):
         logger.info(f"Received signal {signum}, shutting down gracefully...")
         self.running = False
+        self.wakeup.set()
         
     def load_context(self):
         """Load CLAUDE.md and environment context"""
@@ -75,56 +115,97 @@ class TaskDaemon:
             logger.error(f"Error loading context: {e}")
             
     def connect_db(self):
-        """Connect to PostgreSQL database"""
+        """Attach to the process's shared PostgreSQL connection, or set up the
+        in-memory task store (loaded from the templates) when TASK_STORE=memory"""
+        if self.store_kind == 'memory':
+            if self.store is None:
+                self.store = MemoryTaskStore(lease_seconds=self.lease_seconds)
+                added = initialize_from_templates(self.store)
+                logger.info(f"Using in-memory task store with {added} template tasks "
+                            f"as worker {self.store.worker_id}")
+            if self.dispatcher is None:
+                self.dispatcher = get_dispatcher(self.store)
+            return
         try:
-            self.db_conn = psycopg2.connect(
-                dbname="claudemini",
-                user="claudemini",
-                host="localhost"
-            )
-            logger.info("Connected to database")
+            self.db_conn = db.shared_connection()
+            # Clear any transaction aborted by the error that got us here
+            self.db_conn.rollback()
+            worker_id = self.store.worker_id if self.store else None
+            self.store = PostgresTaskStore(self.db_conn, worker_id, self.lease_seconds)
+            self.dispatcher = get_dispatcher(self.store)
+            logger.info(f"Connected to database as worker {self.store.worker_id}")
         except Exception as e:
             logger.error(f"Database connection failed: {e}")
             raise
             
-    def get_pending_tasks(self):
-        """Get tasks that need to be executed"""
+    def listen_for_changes(self):
+        """Open a dedicated autocommit connection that LISTENs for task changes"""
+        loop = asyncio.get_running_loop()
+        if self.listen_conn:
+            try:
+                loop.remove_reader(self.listen_conn.fileno())
+                self.listen_conn.close()
+            except Exception:
+                pass
+            self.listen_conn = None
+            
+        try:
+            conn = db.connect()
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("LISTEN scheduled_tasks")
+            loop.add_reader(conn.fileno(), self._on_notify)
+            self.listen_conn = conn
+            logger.info("Listening for scheduled_tasks notifications")
+        except Exception as e:
+            logger.error(f"LISTEN failed, falling back to polling: {e}")
+            
+    def _on_notify(self):
+        """Drain pending notifications and wake the main loop"""
+        try:
+            self.listen_conn.poll()
+        except Exception as e:
+            logger.error(f"Notification connection lost: {e}")
+            asyncio.get_running_loop().remove_reader(self.listen_conn.fileno())
+            self.listen_conn = None
+            self.wakeup.set()
+            return
+        if self.listen_conn.notifies:
+            self.listen_conn.notifies.clear()
+            self.wakeup.set()
+            
+    def seconds_until_next_task(self):
+        """Seconds until the earliest future next_run_at, capped at max_sleep"""
+        # Tasks already due but not claimable (dependencies, leases, saturated
+        # types) are picked up on a NOTIFY or a worker finishing
         try:
-            with self.db_conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT * FROM scheduled_tasks 
-                    WHERE is_active = TRUE 
-                    AND next_run_at <= NOW() 
-                    ORDER BY priority DESC, next_run_at ASC
-                    LIMIT 5
-                """)
-                return cur.fetchall()
+            seconds = self.store.seconds_until_next_run()
         except Exception as e:
-            logger.error(f"Error fetching tasks: {e}")
-            return []
+            logger.error(f"Error fetching next run time: {e}")
+            return self.tick_interval
             
-    def execute_task(self, task):
-        """Execute a single task with full context"""
+        if seconds is None:
+            return self.max_sleep
+        return min(max(seconds, 0.05), self.max_sleep)
+        
+    def get_pending_tasks(self, limit=5):
+        """Claim tasks that need to be executed, skipping saturated task types
+        and resource classes the host has no room for"""
+        return self.admission.claim(self.dispatcher, limit,
+                                    exclude_types=self.pool.saturated_types())
+            
+    async def execute_task(self, task):
+        """Execute a single task with full context as a non-blocking subprocess"""
+        # Store bookkeeping below is synchronous and never awaits mid-transaction,
+        # so concurrent workers can safely share the store on the event loop.
         execution_id = None
+        resources = None
         start_time = datetime.now(timezone.utc)
+        started = time.time()
         
         try:
-            # Update last run time (don't change status in scheduled_tasks)
-            with self.db_conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE scheduled_tasks 
-                    SET last_run_at = NOW() 
-                    WHERE id = %s
-                """, (task['id'],))
-                
-                # Create execution record
-                cur.execute("""
-                    INSERT INTO task_executions (task_id, status)
-                    VALUES (%s, 'running')
-                    RETURNING id
-                """, (task['id'],))
-                execution_id = cur.fetchone()[0]
-                self.db_conn.commit()
+            # Create execution record (last_run_at was set when the task was claimed)
+            execution_id = self.store.start_execution(task['id'])
                 
             logger.info(f"Executing task: {task['task_name']} (ID: {task['id']})")
             
@@ -141,82 +222,99 @@ class TaskDaemon:
                 # Use command directly
                 cmd = task['command'] or 'echo "No command specified"'
                 
-            # Execute with timeout
-            timeout = task.get('timeout_seconds', 300)  # 5 min default
-            result = subprocess.run(
-                cmd,
-                shell=isinstance(cmd, str),
-                capture_output=True,
-                text=True,
-                timeout=timeout,
+            # Execute with timeout without blocking the event loop, in the
+            # task's own cgroup (or under ulimits) for limits and accounting
+            timeout = task.get('timeout_seconds') or 300  # 5 min default
+            resources = TaskResources(execution_id, limits_from_metadata(task.get('metadata')),
+                                      timeout=timeout)
+            proc = await asyncio.create_subprocess_exec(
+                *resources.wrap(cmd),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
                 env=os.environ.copy(),
                 cwd="/Users/claudemini/Claude"  # Set home directory
             )
+            resources.started(proc.pid)
+            
+            # Stream output to the execution log; only a bounded head/tail
+            # is kept in memory for the task_executions row
+            log_path = execution_log_path(execution_id)
+            capture = OutputCapture(log_path)
+            try:
+                returncode = await asyncio.wait_for(capture.pump_async(proc), timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise
+            finally:
+                capture.close()
+            
+            result = subprocess.CompletedProcess(cmd, returncode, capture.stdout, capture.stderr)
+            usage = await asyncio.to_thread(resources.finish)
+            if usage.get('oom_killed'):
+                logger.warning(f"Task {task['task_name']} was OOM-killed "
+                               f"(memory limit {resources.limits.get('memory_limit_mb')} MB)")
             
             # Update execution record
             end_time = datetime.now(timezone.utc)
             execution_time_ms = int((end_time - start_time).total_seconds() * 1000)
             
-            with self.db_conn.cursor() as cur:
-                if result.returncode == 0:
-                    status = 'success'
-                    # Reset retry count on success
-                    if task['id'] in self.retry_attempts:
-                        del self.retry_attempts[task['id']]
-                    
-                    cur.execute("""
-                        UPDATE task_executions 
-                        SET status = %s, output = %s, completed_at = NOW(),
-                            execution_time_ms = %s
-                        WHERE id = %s
-                    """, (status, result.stdout, execution_time_ms, execution_id))
-                    
-                    # Calculate next run time
-                    if task['schedule_type'] == 'interval' or task['schedule_type'] == 'recurring':
-                        interval = task.get('interval_seconds', 300)  # Default 5 min
-                        cur.execute("""
-                            UPDATE scheduled_tasks 
-                            SET next_run_at = NOW() + INTERVAL '%s seconds'
-                            WHERE id = %s
-                        """, (interval, task['id']))
-                    else:
-                        # One-time task
-                        cur.execute("""
-                            UPDATE scheduled_tasks 
-                            SET status = 'completed'
-                            WHERE id = %s
-                        """, (task['id'],))
+            execution = {
+                'execution_time_ms': execution_time_ms,
+                'log_file_path': str(log_path),
+                'metadata': resources.describe(),
+                **usage,
+            }
+            if result.returncode == 0:
+                status = 'success'
+                # Reset retry count on success
+                if task['id'] in self.retry_attempts:
+                    del self.retry_attempts[task['id']]
+                
+                # Calculate next run time
+                next_run = next_run_after_success(task)
+                # Succeeding releases any dependent children; dependent tasks
+                # themselves wait (NULL) for their parents, one-time tasks
+                # without a next run are completed
+                if next_run or task['schedule_type'] == 'dependent':
+                    task_update = {'next_run_at': next_run, 'retry_count': 0}
                 else:
-                    status = 'failed'
-                    error = result.stderr or f"Exit code: {result.returncode}"
-                    cur.execute("""
-                        UPDATE task_executions 
-                        SET status = %s, error = %s, completed_at = NOW(),
-                            execution_time_ms = %s
-                        WHERE id = %s
-                    """, (status, error, execution_time_ms, execution_id))
-                    
-                    cur.execute("""
-                        UPDATE scheduled_tasks 
-                        SET next_run_at = NOW() + INTERVAL '5 minutes'
-                        WHERE id = %s
-                    """, (task['id'],))
-                    
-                self.db_conn.commit()
-                logger.info(f"Task {task['task_name']} completed with status: {status}")
+                    task_update = {'status': 'completed'}
+                self.store.complete_execution(execution_id, {
+                    **execution, 'status': status, 'output': result.stdout,
+                }, task_update, succeeded=True)
+            else:
+                status = 'failed'
+                error = result.stderr or f"Exit code: {result.returncode}"
+                self.store.complete_execution(execution_id, {
+                    **execution, 'status': status, 'error': error,
+                }, {'next_run_at': datetime.now(timezone.utc) + timedelta(minutes=5)})
+                task_metrics.record_retry(task['task_type'])
+            task_metrics.record_run(task, status, execution_time_ms / 1000, started)
                 
-        except subprocess.TimeoutExpired:
+            logger.info(f"Task {task['task_name']} completed with status: {status}")
+                
+        except asyncio.TimeoutError:
             logger.error(f"Task {task['task_name']} timed out")
-            self._handle_task_failure(task['id'], execution_id, 'timeout', 'Task execution timed out')
+            usage = await asyncio.to_thread(resources.finish) if resources else None
+            task_metrics.record_run(task, 'timeout', time.time() - started, started)
+            self._handle_task_failure(task['id'], execution_id, 'timeout', 'Task execution timed out',
+                                      usage, task_type=task['task_type'])
         except Exception as e:
             logger.error(f"Task {task['task_name']} failed: {e}")
-            self._handle_task_failure(task['id'], execution_id, 'failed', str(e))
+            usage = await asyncio.to_thread(resources.finish) if resources else None
+            task_metrics.record_run(task, 'failed', time.time() - started, started)
+            self._handle_task_failure(task['id'], execution_id, 'failed', str(e), usage,
+                                      task_type=task['task_type'])
+        finally:
+            self.admission.finished(task['id'])
             
-    def _handle_task_failure(self, task_id, execution_id, status, error):
+    def _handle_task_failure(self, task_id, execution_id, status, error, usage=None, task_type=None):
         """Handle task failure with exponential backoff retry logic"""
         try:
             # Rollback any pending transaction
-            self.db_conn.rollback()
+            if self.db_conn is not None:
+                self.db_conn.rollback()
             
             # Track retry attempts
             if task_id not in self.retry_attempts:
@@ -225,90 +323,197 @@ class TaskDaemon:
             self.retry_attempts[task_id] += 1
             retry_count = self.retry_attempts[task_id]
             
-            with self.db_conn.cursor() as cur:
-                if execution_id:
-                    cur.execute("""
-                        UPDATE task_executions 
-                        SET status = %s, error = %s, completed_at = NOW()
-                        WHERE id = %s
-                    """, (status, error, execution_id))
+            # Determine next retry time based on retry count
+            if retry_count <= self.max_retries:
+                # Use exponential backoff
+                delay_seconds = self.retry_delays[min(retry_count - 1, len(self.retry_delays) - 1)]
+                logger.info(f"Task {task_id} will retry in {delay_seconds} seconds (attempt {retry_count}/{self.max_retries})")
+                task_update = {'next_run_at': datetime.now(timezone.utc) + timedelta(seconds=delay_seconds)}
+                task_metrics.record_retry(task_type)
+            else:
+                # Max retries exceeded, disable task
+                logger.error(f"Task {task_id} exceeded max retries ({self.max_retries}), disabling")
+                task_update = {'status': 'failed', 'next_run_at': None}
+            
+            if execution_id:
+                self.store.complete_execution(execution_id, {
+                    **(usage or {}), 'status': status, 'error': error,
+                }, task_update)
+            else:
+                self.store.update_task(task_id, task_update)
                 
-                # Determine next retry time based on retry count
-                if retry_count <= self.max_retries:
-                    # Use exponential backoff
-                    delay_seconds = self.retry_delays[min(retry_count - 1, len(self.retry_delays) - 1)]
-                    logger.info(f"Task {task_id} will retry in {delay_seconds} seconds (attempt {retry_count}/{self.max_retries})")
-                    
-                    cur.execute("""
-                        UPDATE scheduled_tasks 
-                        SET next_run_at = NOW() + INTERVAL '%s seconds'
-                        WHERE id = %s
-                    """, (delay_seconds, task_id))
-                else:
-                    # Max retries exceeded, disable task
-                    logger.error(f"Task {task_id} exceeded max retries ({self.max_retries}), disabling")
-                    cur.execute("""
-                        UPDATE scheduled_tasks 
-                        SET status = 'failed',
-                            next_run_at = NULL
-                        WHERE id = %s
-                    """, (task_id,))
-                    
-                    # Store memory about the failure
-                    from memory_manager import MemoryManager
-                    memory = MemoryManager()
-                    memory.store_memory(
-                        f"Task {task_id} failed after {self.max_retries} retries with error: {error}",
-                        memory_type="task",
-                        tags=["task_failure", "automation"],
-                        importance=7
-                    )
-                    
-                self.db_conn.commit()
+            if retry_count > self.max_retries and self.store.kind == 'postgres':
+                # Store memory about the failure (after committing: the memory
+                # manager shares this connection and rolls back its own errors)
+                from memory_manager import MemoryManager
+                memory = MemoryManager()
+                memory.store_memory(
+                    f"Task {task_id} failed after {self.max_retries} retries with error: {error}",
+                    memory_type="task",
+                    tags=["task_failure", "automation"],
+                    importance=7
+                )
         except Exception as e:
             logger.error(f"Error handling task failure: {e}")
-            self.db_conn.rollback()
+            if self.db_conn is not None:
+                self.db_conn.rollback()
             
-    async def main_loop(self):
-        """Main game loop"""
-        logger.info("Task daemon started")
-        tick_count = 0
+    def dispatch_pending_tasks(self, tick_count):
+        """Start workers for pending tasks up to the pool's free capacity"""
+        slots = self.pool.available_slots()
+        if slots <= 0:
+            return
         
-        while self.running:
-            tick_start = time.time()
-            tick_count += 1
+        tasks = self.get_pending_tasks(limit=slots)
+        if tasks:
+            logger.info(f"Tick #{tick_count}: Found {len(tasks)} pending tasks "
+                        f"({len(self.pool.in_flight)} already running)")
+        
+        for task in tasks:
+            if not self.running:
+                break
+            self.pool.submit(task['id'], task['task_type'], self.execute_task(task))
+            
+    def running_task_ids(self):
+        """Ids of the tasks this daemon is running; under the scheduling engine
+        the shared pool also runs cron, monitor and routine jobs (string keys)"""
+        return [key for key in self.pool.running_keys() if isinstance(key, int)]
+        
+    def dispatch_due_retries(self):
+        """Run due TaskErrorHandler retries off the event loop, one batch at a time"""
+        if self.retry_worker and not self.retry_worker.done():
+            return
+        self.retry_worker = asyncio.create_task(
+            asyncio.to_thread(self.error_handler.process_due_retries)
+        )
+        self.retry_worker.add_done_callback(self._on_retries_done)
+        
+    def _on_retries_done(self, worker):
+        if worker.cancelled():
+            return
+        if worker.exception():
+            logger.error(f"Error running deferred retries: {worker.exception()}")
+            return
+        results = worker.result()
+        if results:
+            logger.info(f"Ran {len(results)} deferred retries "
+                        f"({sum(r['success'] for r in results)} succeeded)")
+            # More may have come due while this batch ran
+            self.wakeup.set()
             
+    def update_metrics(self, now):
+        """Refresh queue depth and in-flight gauges; snapshot to Postgres once a minute"""
+        if now - self.last_gauge_update >= self.gauge_interval:
+            self.last_gauge_update = now
             try:
-                # Get pending tasks
-                tasks = self.get_pending_tasks()
-                
-                if tasks:
-                    logger.info(f"Tick #{tick_count}: Found {len(tasks)} pending tasks")
+                task_metrics.update_gauges(self.store.due_counts(), dict(self.pool.type_counts),
+                                           self.admission.deferred)
+            except Exception as e:
+                logger.error(f"Could not update metrics: {e}")
+        if self.metrics_snapshots:
+            self.metrics_snapshots.maybe_snapshot()
+            
+    def start(self):
+        """Listen for changes and catch up on missed runs before the first tick"""
+        # Only the Postgres store has other writers to listen for and a
+        # persistent retry queue; the in-memory store is woken by its workers
+        self.uses_postgres = self.store.kind == 'postgres'
+        if self.uses_postgres:
+            self.listen_for_changes()
+            self.metrics_snapshots = task_metrics.SnapshotTimer('task_daemon', default_worker_id())
+        task_metrics.start_metrics_server()
+        
+        # Spread out runs missed while no daemon was up (see misfire.py)
+        try:
+            self.store.recover_expired()
+            self.last_lease_recovery = time.time()
+            catch_up_on_startup(self.store)
+        except Exception as e:
+            logger.error(f"Misfire catch-up failed: {e}")
+            
+    def tick(self) -> float:
+        """Renew leases and dispatch due work; returns seconds until the next tick"""
+        tick_start = time.time()
+        self.tick_count += 1
+        # Clear before querying so a NOTIFY arriving mid-dispatch isn't lost
+        self.wakeup.clear()
+        
+        try:
+            # Keep leases alive on tasks we're still running, and
+            # periodically reclaim tasks from workers that died mid-run
+            self.store.heartbeat(self.running_task_ids())
+            if tick_start - self.last_lease_recovery >= self.tick_interval:
+                self.store.recover_expired()
+                self.last_lease_recovery = tick_start
+            
+            # Launch pending tasks as concurrent workers
+            self.dispatch_pending_tasks(self.tick_count)
+            mark_dispatch()
+            self.update_metrics(tick_start)
+            if self.uses_postgres:
+                self.dispatch_due_retries()
                     
-                    # Execute tasks (could be made concurrent)
-                    for task in tasks:
-                        if not self.running:
-                            break
-                        self.execute_task(task)
-                        
                 # Ensure connection is healthy
                 self.db_conn.commit()
+            
+        except Exception as e:
+            logger.error(f"Error in main loop: {e}")
+            # Try to reconnect to database
+            try:
+                self.connect_db()
+            except:
+                pass
                 
-            except Exception as e:
-                logger.error(f"Error in main loop: {e}")
-                # Try to reconnect to database
+        # Reconnect the listener if its connection dropped
+        if self.uses_postgres and self.listen_conn is None and self.running:
+            self.listen_for_changes()
+            
+        # Sleep until the earliest next_run_at, a NOTIFY, or a worker
+        # finishing, whichever comes first. Without a listener, fall back
+        # to the fixed tick; with running tasks, wake for lease renewal.
+        sleep_time = self.seconds_until_next_task()
+        if self.uses_postgres and self.listen_conn is None:
+            sleep_time = min(sleep_time, self.tick_interval)
+        if self.pool.in_flight:
+            sleep_time = min(sleep_time, self.lease_seconds / 3)
+        if self.admission.deferred:
+            # Deferred tasks stay due; recheck load rather than wait on a NOTIFY
+            sleep_time = min(sleep_time, self.admission_recheck)
+        return sleep_time
+        
+    async def stop(self):
+        """Wait (briefly) for an in-flight retry batch to finish"""
+        if self.retry_worker and not self.retry_worker.done():
+            _, pending = await asyncio.wait([self.retry_worker], timeout=self.retry_shutdown_grace)
+            if pending:
+                # The thread can't be interrupted; its leases expire and
+                # another runner picks the retries up
+                logger.warning(f"Deferred retries still running after "
+                               f"{self.retry_shutdown_grace}s, not waiting for them")
+            
+    async def main_loop(self):
+        """Main game loop"""
+        logger.info(f"Task daemon started (max {self.pool.max_workers} concurrent tasks)")
+        
+        # Route signals through the loop so shutdown interrupts a long sleep
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.handle_shutdown, sig, None)
+        
+        self.start()
+        while self.running:
+            sleep_time = self.tick()
+            if self.running:
                 try:
-                    self.connect_db()
-                except:
+                    await asyncio.wait_for(self.wakeup.wait(), sleep_time)
+                except asyncio.TimeoutError:
                     pass
-                    
-            # Calculate sleep time to maintain tick rate
-            tick_duration = time.time() - tick_start
-            sleep_time = max(0, self.tick_interval - tick_duration)
-            
-            if sleep_time > 0 and self.running:
-                await asyncio.sleep(sleep_time)
-                
+        
+        # Let running tasks finish their bookkeeping before exiting
+        await self.pool.drain()
+        await self.stop()
+        if self.metrics_snapshots:
+            self.metrics_snapshots.maybe_snapshot(force=True)
         logger.info("Task daemon stopped")
         
     def run(self):
@@ -324,8 +529,9 @@ class TaskDaemon:
             asyncio.run(self.main_loop())
             
         finally:
-            if self.db_conn:
-                self.db_conn.close()
+            db.close_all()
+            if self.listen_conn:
+                self.listen_conn.close()
                 
 
 if __name__ == "__main__":
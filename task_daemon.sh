@@ -16,6 +16,10 @@ case "$1" in
             echo "Task daemon is already running in tmux session '$SESSION_NAME'"
             exit 1
         fi
+        if pgrep -f "scheduling_engine.py run" > /dev/null; then
+            echo "Tasks are already dispatched by the scheduling engine (PID: $(pgrep -f 'scheduling_engine.py run'))"
+            exit 1
+        fi
         
         echo "Starting task daemon..."
         
@@ -49,8 +53,13 @@ case "$1" in
         ;;
         
     status)
-        if tmux has-session -t "$SESSION_NAME" 2>/dev/null; then
-            echo "Task daemon is running in tmux session '$SESSION_NAME'"
+        ENGINE_PID=$(pgrep -f "scheduling_engine.py run")
+        if tmux has-session -t "$SESSION_NAME" 2>/dev/null || [ -n "$ENGINE_PID" ]; then
+            if tmux has-session -t "$SESSION_NAME" 2>/dev/null; then
+                echo "Task daemon is running in tmux session '$SESSION_NAME'"
+            else
+                echo "Task daemon is running in the scheduling engine (PID: $ENGINE_PID)"
+            fi
             echo ""
             echo "Recent executions:"
             psql -d claudemini -c "
@@ -15,7 +15,8 @@ class EnhancedTaskExecutor:
         
     def execute_task(self, task_name: str, command: str, timeout: int = 300):
         """Execute a task using the error handler with retry logic"""
-        # Use the error handler for automatic retry
+        # Returns after one attempt; failures are retried later from the
+        # retry queue by the task daemon (or task_error_handler.py run-due)
         result = self.error_handler.execute_with_retry(
             task_name=task_name,
             command=command,
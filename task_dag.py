@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Task DAG for scheduled task dependencies
+Validates and inspects the task_dependencies graph. Release of children is
+done in the database (release_dependent_tasks trigger) as soon as every
+parent has succeeded in the current run window.
+"""
+
+import sys
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+
+class CycleError(ValueError):
+    """Raised when a dependency would make the task graph cyclic"""
+
+
+class TaskDAG:
+    """In-memory view of the task dependency graph"""
+
+    def __init__(self, edges: Iterable[Tuple[int, int]] = ()):
+        # parents[child] = {parent, ...}; children[parent] = {child, ...}
+        self.parents: Dict[int, Set[int]] = defaultdict(set)
+        self.children: Dict[int, Set[int]] = defaultdict(set)
+        self.nodes: Set[int] = set()
+        for task_id, depends_on in edges:
+            self.add_edge(task_id, depends_on)
+
+    @classmethod
+    def load(cls, conn) -> 'TaskDAG':
+        """Load every edge from task_dependencies"""
+        with conn.cursor() as cur:
+            cur.execute("SELECT task_id, depends_on_task_id FROM task_dependencies")
+            return cls(cur.fetchall())
+
+    def add_edge(self, task_id: int, depends_on: int):
+        self.parents[task_id].add(depends_on)
+        self.children[depends_on].add(task_id)
+        self.nodes.update((task_id, depends_on))
+
+    def would_cycle(self, task_id: int, depends_on: int) -> bool:
+        """Would task_id -> depends_on close a cycle (is task_id an ancestor of depends_on)?"""
+        if task_id == depends_on:
+            return True
+        stack, seen = [depends_on], set()
+        while stack:
+            node = stack.pop()
+            if node == task_id:
+                return True
+            if node in seen:
+                continue
+            seen.add(node)
+            stack.extend(self.parents.get(node, ()))
+        return False
+
+    def levels(self) -> List[List[int]]:
+        """Topological layers (Kahn's algorithm); tasks in one layer can run in parallel"""
+        indegree = {node: len(self.parents.get(node, ())) for node in self.nodes}
+        layer = sorted(node for node, degree in indegree.items() if degree == 0)
+        layers = []
+        visited = 0
+
+        while layer:
+            layers.append(layer)
+            visited += len(layer)
+            next_layer = []
+            for node in layer:
+                for child in self.children.get(node, ()):
+                    indegree[child] -= 1
+                    if indegree[child] == 0:
+                        next_layer.append(child)
+            layer = sorted(next_layer)
+
+        if visited != len(self.nodes):
+            raise CycleError("Task dependency graph contains a cycle")
+        return layers
+
+    def critical_path(self, durations: Dict[int, float]) -> Tuple[float, List[int]]:
+        """Longest chain by expected duration: the fastest a full pipeline run can finish"""
+        finish: Dict[int, float] = {}
+        best_parent: Dict[int, Optional[int]] = {}
+
+        for layer in self.levels():
+            for node in layer:
+                parent = max(self.parents.get(node, ()), key=lambda p: finish[p], default=None)
+                start = finish[parent] if parent is not None else 0.0
+                finish[node] = start + durations.get(node, 0.0)
+                best_parent[node] = parent
+
+        if not finish:
+            return 0.0, []
+        node = max(finish, key=finish.get)
+        total = finish[node]
+        path = []
+        while node is not None:
+            path.append(node)
+            node = best_parent[node]
+        return total, list(reversed(path))
+
+
+def add_dependency(conn, task_id: int, depends_on: int):
+    """Add a dependency edge, refusing edges that would create a cycle"""
+    dag = TaskDAG.load(conn)
+    if dag.would_cycle(task_id, depends_on):
+        raise CycleError(f"Task {task_id} depending on {depends_on} would create a cycle")
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO task_dependencies (task_id, depends_on_task_id)
+            VALUES (%s, %s)
+            ON CONFLICT DO NOTHING
+        """, (task_id, depends_on))
+
+
+def remove_dependency(conn, task_id: int, depends_on: int):
+    with conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM task_dependencies
+            WHERE task_id = %s AND depends_on_task_id = %s
+        """, (task_id, depends_on))
+
+
+def show_pipelines(conn):
+    """Print the DAG as parallel layers with each pipeline's critical path"""
+    dag = TaskDAG.load(conn)
+    if not dag.nodes:
+        print("No task dependencies defined")
+        return
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT st.id, st.task_name,
+                   r.total_execution_time_ms::float / NULLIF(r.timed_executions, 0) AS avg_ms
+            FROM scheduled_tasks st
+            LEFT JOIN task_execution_rollups r ON r.task_id = st.id
+            WHERE st.id = ANY(%s)
+        """, (list(dag.nodes),))
+        info = {row['id']: row for row in cur.fetchall()}
+
+    for depth, layer in enumerate(dag.levels()):
+        print(f"Level {depth}:")
+        for node in layer:
+            parents = ', '.join(str(p) for p in sorted(dag.parents.get(node, ()))) or '-'
+            print(f"  [{node}] {info.get(node, {}).get('task_name', '?')} (after: {parents})")
+
+    durations = {node: float(row['avg_ms'] or 0) / 1000 for node, row in info.items()}
+    total, path = dag.critical_path(durations)
+    print(f"\nCritical path ({total:.0f}s): {' -> '.join(str(n) for n in path)}")
+
+
+def main():
+    """CLI for managing task dependencies"""
+    if len(sys.argv) < 2:
+        print("Usage: task_dag.py <command> [args]")
+        print("Commands:")
+        print("  show - Show dependency layers and critical path")
+        print("  add <task_id> <depends_on_task_id> - Add a dependency")
+        print("  remove <task_id> <depends_on_task_id> - Remove a dependency")
+        sys.exit(1)
+
+    conn = psycopg2.connect(dbname="claudemini", user="claudemini", host="localhost")
+    try:
+        command = sys.argv[1]
+        if command == "show":
+            show_pipelines(conn)
+        elif command in ("add", "remove") and len(sys.argv) >= 4:
+            task_id, depends_on = int(sys.argv[2]), int(sys.argv[3])
+            if command == "add":
+                add_dependency(conn, task_id, depends_on)
+                action = "added"
+            else:
+                remove_dependency(conn, task_id, depends_on)
+                action = "removed"
+            conn.commit()
+            print(f"Dependency {task_id} -> {depends_on} {action}")
+        else:
+            print("Invalid command")
+            sys.exit(1)
+    except CycleError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
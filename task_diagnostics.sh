@@ -11,6 +11,8 @@ echo
 echo "1. Checking task daemon status..."
 if pgrep -f "task_daemon.py" > /dev/null; then
     echo "✓ Task daemon is running (PID: $(pgrep -f 'task_daemon.py'))"
+elif pgrep -f "scheduling_engine.py run" > /dev/null; then
+    echo "✓ Task daemon is running in the scheduling engine (PID: $(pgrep -f 'scheduling_engine.py run'))"
 else
     echo "✗ Task daemon is NOT running"
 fi
@@ -1,25 +1,41 @@
 #!/usr/bin/env python3
 """
 Unified Task Error Handler with Retry Logic
-Provides automatic retry, error tracking, and recovery for scheduled tasks
+Provides automatic retry, error tracking, and recovery for scheduled tasks.
+Retries are deferred to the task_retry_queue table rather than slept on;
+the task daemon (or `task_error_handler.py run-due`) runs them when due.
 """
 
+import os
+import sys
 import json
-import time
+import random
+import socket
 import subprocess
 import logging
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, List, Optional, Tuple
 import hashlib
 
+from psycopg2.extras import RealDictCursor
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import db
+from error_state_journal import ErrorStateJournal
+
+# Deferred retries without their own timeout_seconds get this bound (and a
+# lease just past it), so one hung retry can't stall the queue
+DEFAULT_RETRY_TIMEOUT = 3600
+
 class TaskErrorHandler:
     def __init__(self, log_dir: Path = Path("/Users/claudemini/Claude/logs")):
         self.log_dir = log_dir
         self.log_dir.mkdir(exist_ok=True)
         
+        # Snapshot + fsync'd append-only journal, safe across concurrent handlers
         self.error_state_file = self.log_dir / ".task_error_state.json"
-        self.error_state = self._load_error_state()
+        self.journal = ErrorStateJournal(self.error_state_file)
         
         # Configure logging
         self.logger = logging.getLogger("TaskErrorHandler")
@@ -34,7 +50,8 @@ class TaskErrorHandler:
             "max_retries": 3,
             "base_delay": 60,  # seconds
             "max_delay": 3600,  # 1 hour
-            "exponential_base": 2
+            "exponential_base": 2,
+            "jitter": 0.5  # Delay is drawn from [delay * (1 - jitter), delay]
         }
         
         # Task-specific configurations
@@ -61,51 +78,79 @@ class TaskErrorHandler:
             }
         }
     
-    def _load_error_state(self) -> Dict[str, Any]:
-        """Load persisted error state"""
-        if self.error_state_file.exists():
-            try:
-                with open(self.error_state_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
-    
-    def _save_error_state(self):
-        """Persist error state"""
-        with open(self.error_state_file, 'w') as f:
-            json.dump(self.error_state, f, indent=2)
+    @property
+    def error_state(self) -> Dict[str, Any]:
+        """Per-task error state, including other processes' updates"""
+        return self.journal.refresh()
     
     def _get_task_id(self, task_name: str) -> str:
         """Generate unique task ID"""
         return hashlib.md5(task_name.encode()).hexdigest()[:8]
     
     def _get_retry_delay(self, task_name: str, attempt: int) -> int:
-        """Calculate retry delay with exponential backoff"""
+        """Calculate retry delay with jittered exponential backoff"""
         config = self.task_configs.get(task_name, self.default_retry_config)
         base_delay = config.get("base_delay", self.default_retry_config["base_delay"])
         max_delay = config.get("max_delay", self.default_retry_config["max_delay"])
         exp_base = config.get("exponential_base", self.default_retry_config["exponential_base"])
+        jitter = config.get("jitter", self.default_retry_config["jitter"])
         
         delay = min(base_delay * (exp_base ** attempt), max_delay)
-        return int(delay)
+        # Spread out retries of tasks that failed together (e.g. a network
+        # outage) so they don't all fire in the same second
+        return int(random.uniform(delay * (1 - jitter), delay))
+    
+    def _get_task_state(self, task_name: str) -> Dict[str, Any]:
+        """Current error state for a task"""
+        return self.error_state.get(self._get_task_id(task_name), {
+            "task_name": task_name,
+            "failures": 0,
+            "last_failure": None,
+            "last_success": None,
+            "consecutive_failures": 0
+        })
+    
+    def _record(self, task_name: str, event: str):
+        self.journal.record(self._get_task_id(task_name), task_name, event)
+    
+    def _run_attempt(self, task_name: str, command: str, timeout: Optional[int],
+                     attempt: int) -> Tuple[bool, Optional[str], Optional[str]]:
+        """Run one attempt and record it; returns (success, output, error)"""
+        self.logger.info(f"Executing {task_name} (attempt {attempt + 1})")
+        
+        try:
+            result = subprocess.run(
+                command,
+                shell=True,
+                capture_output=True,
+                text=True,
+                timeout=timeout
+            )
+            
+            if result.returncode == 0:
+                self._record(task_name, "success")
+                
+                self.logger.info(f"Task {task_name} completed successfully")
+                return True, result.stdout, None
+            
+            error = f"Command failed with code {result.returncode}: {result.stderr}"
+        except subprocess.TimeoutExpired:
+            error = "Task timeout"
+        except Exception as e:
+            error = str(e)
+        
+        self.logger.error(f"Task {task_name} failed: {error}")
+        self._record(task_name, "failure")
+        return False, None, error
     
     def execute_with_retry(self, task_name: str, command: str, 
                           timeout: Optional[int] = None) -> Dict[str, Any]:
-        """Execute a task with automatic retry on failure"""
-        task_id = self._get_task_id(task_name)
+        """Execute a task once, deferring any retry to the retry queue
         
-        # Initialize task state if needed
-        if task_id not in self.error_state:
-            self.error_state[task_id] = {
-                "task_name": task_name,
-                "failures": 0,
-                "last_failure": None,
-                "last_success": None,
-                "consecutive_failures": 0
-            }
-        
-        task_state = self.error_state[task_id]
+        Returns immediately after the first attempt; a failure schedules the
+        next attempt with jittered exponential backoff instead of sleeping.
+        """
+        task_state = self._get_task_state(task_name)
         config = self.task_configs.get(task_name, self.default_retry_config)
         max_retries = config.get("max_retries", self.default_retry_config["max_retries"])
         
@@ -120,68 +165,134 @@ class TaskErrorHandler:
                     "reason": "Too many consecutive failures"
                 }
         
-        # Execute the task
-        attempt = 0
-        last_error = None
+        success, output, error = self._run_attempt(task_name, command, timeout, 0)
+        if success:
+            # A fresh success supersedes any retry still waiting
+            self.cancel_retry(task_name)
+            return {
+                "success": True,
+                "output": output,
+                "attempts": 1
+            }
         
-        while attempt <= max_retries:
-            try:
-                self.logger.info(f"Executing {task_name} (attempt {attempt + 1})")
-                
-                # Run the command
-                result = subprocess.run(
-                    command,
-                    shell=True,
-                    capture_output=True,
-                    text=True,
-                    timeout=timeout
-                )
-                
-                if result.returncode == 0:
-                    # Success
-                    task_state["last_success"] = datetime.now().isoformat()
-                    task_state["consecutive_failures"] = 0
-                    self._save_error_state()
-                    
-                    self.logger.info(f"Task {task_name} completed successfully")
-                    return {
-                        "success": True,
-                        "output": result.stdout,
-                        "attempts": attempt + 1
-                    }
-                else:
-                    # Command failed
-                    raise Exception(f"Command failed with code {result.returncode}: {result.stderr}")
-                    
-            except subprocess.TimeoutExpired:
-                last_error = "Task timeout"
-                self.logger.error(f"Task {task_name} timed out")
-            except Exception as e:
-                last_error = str(e)
-                self.logger.error(f"Task {task_name} failed: {last_error}")
+        result = {
+            "success": False,
+            "error": error,
+            "attempts": 1
+        }
+        if max_retries >= 1:
+            retry_at = self.schedule_retry(task_name, command, timeout, 1, max_retries, error)
+            result["retry_scheduled_at"] = retry_at.isoformat() if retry_at else None
+        elif config.get("critical", False):
+            self._handle_critical_failure(task_name, error)
+        return result
+    
+    def schedule_retry(self, task_name: str, command: str, timeout: Optional[int],
+                       attempt: int, max_retries: int, error: str) -> Optional[datetime]:
+        """Queue a retry; keeps an already pending retry for the same task"""
+        delay = self._get_retry_delay(task_name, attempt)
+        try:
+            with db.pooled_connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO task_retry_queue
+                        (task_name, command, timeout_seconds, attempt, max_retries,
+                         next_run_at, last_error)
+                    VALUES (%s, %s, %s, %s, %s, NOW() + make_interval(secs => %s), %s)
+                    ON CONFLICT (task_name) DO UPDATE
+                        SET task_name = task_retry_queue.task_name
+                    RETURNING next_run_at
+                """, (task_name, command, timeout, attempt, max_retries, delay, error))
+                retry_at = cur.fetchone()[0]
+        except Exception as e:
+            self.logger.error(f"Could not schedule retry of {task_name}: {e}")
+            return None
+        
+        self.logger.info(f"Retry of {task_name} scheduled for {retry_at}")
+        return retry_at
+    
+    def cancel_retry(self, task_name: str):
+        """Drop a pending retry for a task"""
+        try:
+            with db.pooled_connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM task_retry_queue
+                    WHERE task_name = %s AND locked_by IS NULL
+                """, (task_name,))
+        except Exception as e:
+            self.logger.error(f"Could not cancel retry of {task_name}: {e}")
+    
+    def _claim_due_retries(self, limit: int) -> List[Dict[str, Any]]:
+        """Lease due retries so concurrent runners never run one twice"""
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        with db.pooled_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                UPDATE task_retry_queue q
+                SET locked_by = %s,
+                    lease_expires_at = NOW() + make_interval(
+                        secs => COALESCE(q.timeout_seconds, %s) + 60
+                    )
+                FROM (
+                    SELECT id
+                    FROM task_retry_queue
+                    WHERE next_run_at <= NOW()
+                        AND (locked_by IS NULL OR lease_expires_at < NOW())
+                    ORDER BY next_run_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ) due
+                WHERE q.id = due.id
+                RETURNING q.*
+            """, (worker_id, DEFAULT_RETRY_TIMEOUT, limit))
+            return cur.fetchall()
+    
+    def process_due_retries(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Run retries that are due, rescheduling the ones that fail again"""
+        results = []
+        for retry in self._claim_due_retries(limit):
+            task_name, attempt = retry["task_name"], retry["attempt"]
+            success, output, error = self._run_attempt(
+                task_name, retry["command"], retry["timeout_seconds"] or DEFAULT_RETRY_TIMEOUT,
+                attempt
+            )
             
-            # Update failure state
-            task_state["failures"] += 1
-            task_state["consecutive_failures"] += 1
-            task_state["last_failure"] = datetime.now().isoformat()
-            self._save_error_state()
+            with db.pooled_connection() as conn, conn.cursor() as cur:
+                if success or attempt >= retry["max_retries"]:
+                    cur.execute("DELETE FROM task_retry_queue WHERE id = %s", (retry["id"],))
+                else:
+                    delay = self._get_retry_delay(task_name, attempt + 1)
+                    cur.execute("""
+                        UPDATE task_retry_queue
+                        SET attempt = attempt + 1,
+                            next_run_at = NOW() + make_interval(secs => %s),
+                            last_error = %s,
+                            locked_by = NULL,
+                            lease_expires_at = NULL
+                        WHERE id = %s
+                    """, (delay, error, retry["id"]))
             
-            # Check if we should retry
-            attempt += 1
-            if attempt <= max_retries:
-                delay = self._get_retry_delay(task_name, attempt)
-                self.logger.info(f"Retrying {task_name} in {delay} seconds...")
-                time.sleep(delay)
+            if not success and attempt >= retry["max_retries"]:
+                config = self.task_configs.get(task_name, self.default_retry_config)
+                if config.get("critical", False):
+                    self._handle_critical_failure(task_name, error)
             
-        # All retries exhausted
-        if config.get("critical", False):
-            self._handle_critical_failure(task_name, last_error)
-        
-        return {
-            "success": False,
-            "error": last_error,
-            "attempts": attempt
-        }
+            results.append({
+                "task_name": task_name,
+                "success": success,
+                "output": output,
+                "error": error,
+                "attempts": attempt + 1
+            })
+        return results
+    
+    def pending_retries(self) -> List[Dict[str, Any]]:
+        """Retries waiting in the queue"""
+        with db.pooled_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT task_name, attempt, max_retries, next_run_at, locked_by, last_error
+                FROM task_retry_queue
+                ORDER BY next_run_at
+            """)
+            return cur.fetchall()
     
     def _handle_critical_failure(self, task_name: str, error: str):
         """Handle critical task failures"""
@@ -225,17 +336,13 @@ class TaskErrorHandler:
     
     def reset_task_state(self, task_name: str):
         """Reset error state for a specific task"""
-        task_id = self._get_task_id(task_name)
-        if task_id in self.error_state:
-            self.error_state[task_id]["consecutive_failures"] = 0
-            self._save_error_state()
+        if self._get_task_id(task_name) in self.error_state:
+            self._record(task_name, "reset")
             self.logger.info(f"Reset error state for {task_name}")
 
 
 # CLI interface
 if __name__ == "__main__":
-    import sys
-    
     handler = TaskErrorHandler()
     
     if len(sys.argv) < 2:
@@ -244,6 +351,8 @@ if __name__ == "__main__":
         print("  execute <task_name> <command> - Execute task with retry")
         print("  report - Show failure report")
         print("  reset <task_name> - Reset task error state")
+        print("  run-due - Run retries that are due")
+        print("  retries - List pending retries")
         sys.exit(1)
     
     command = sys.argv[1]
@@ -258,6 +367,13 @@ if __name__ == "__main__":
         report = handler.get_failure_report()
         print(json.dumps(report, indent=2))
         
+    elif command == "run-due":
+        results = handler.process_due_retries()
+        print(json.dumps(results, indent=2))
+        
+    elif command == "retries":
+        print(json.dumps(handler.pending_retries(), indent=2, default=str))
+        
     elif command == "reset" and len(sys.argv) >= 3:
         task_name = sys.argv[2]
         handler.reset_task_state(task_name)
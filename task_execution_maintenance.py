@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Task Execution History Maintenance
+Creates upcoming task_executions partitions, archives old ones, offloads large
+outputs into compressed storage, rebuilds the per-task rollups and reports
+per-task resource usage.
+Run daily from cron: task_execution_maintenance.py all
+"""
+
+import sys
+import zlib
+import logging
+import argparse
+from typing import Optional
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+logger = logging.getLogger('task_execution_maintenance')
+
+# Inline excerpt kept on the task_executions row after offloading
+EXCERPT_CHARS = 1024
+OFFLOAD_MARKER = "\n... [full output offloaded to task_execution_outputs] ..."
+
+
+class ExecutionMaintenance:
+    """Partition, archive and offload housekeeping for task_executions"""
+
+    def __init__(self, conn=None):
+        self.conn = conn or psycopg2.connect(
+            dbname="claudemini",
+            user="claudemini",
+            host="localhost"
+        )
+
+    def ensure_partitions(self, months_ahead: int = 2) -> int:
+        """Create monthly partitions through months_ahead months from now"""
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT ensure_task_execution_partitions(%s)", (months_ahead,))
+            created = cur.fetchone()[0]
+        self.conn.commit()
+        logger.info(f"Created {created} task_executions partitions")
+        return created
+
+    def archive_partitions(self, keep_months: int = 6) -> list:
+        """Detach partitions older than keep_months into the task_archive schema"""
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT archive_task_execution_partitions(%s)", (keep_months,))
+            archived = [row[0] for row in cur.fetchall()]
+        self.conn.commit()
+        for name in archived:
+            logger.info(f"Archived partition task_archive.{name}")
+        return archived
+
+    def offload_outputs(self, older_than_days: int = 7, min_bytes: int = 4096,
+                        batch_size: int = 100) -> int:
+        """Move large outputs of finished executions into compressed storage
+
+        The row keeps a short excerpt so listings stay readable; the full text
+        is available through get_output().
+        """
+        offloaded = 0
+        while True:
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT te.id, te.started_at, te.task_id, te.output, te.error
+                    FROM task_executions te
+                    WHERE te.started_at < NOW() - make_interval(days => %s)
+                        AND te.status <> 'running'
+                        AND COALESCE(octet_length(te.output), 0)
+                            + COALESCE(octet_length(te.error), 0) >= %s
+                        AND NOT EXISTS (
+                            SELECT 1 FROM task_execution_outputs o
+                            WHERE o.execution_id = te.id AND o.started_at = te.started_at
+                        )
+                    ORDER BY te.started_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                """, (older_than_days, min_bytes, batch_size))
+                rows = cur.fetchall()
+
+                for row in rows:
+                    output = (row['output'] or '').encode('utf-8')
+                    error = (row['error'] or '').encode('utf-8')
+                    output_compressed = zlib.compress(output, 9) if row['output'] else None
+                    error_compressed = zlib.compress(error, 9) if row['error'] else None
+
+                    cur.execute("""
+                        INSERT INTO task_execution_outputs
+                            (execution_id, started_at, task_id, output_compressed,
+                             error_compressed, original_bytes, compressed_bytes)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    """, (
+                        row['id'], row['started_at'], row['task_id'],
+                        psycopg2.Binary(output_compressed) if output_compressed else None,
+                        psycopg2.Binary(error_compressed) if error_compressed else None,
+                        len(output) + len(error),
+                        len(output_compressed or b'') + len(error_compressed or b'')
+                    ))
+                    cur.execute("""
+                        UPDATE task_executions
+                        SET output = %s, error = %s
+                        WHERE id = %s AND started_at = %s
+                    """, (
+                        self._excerpt(row['output']),
+                        self._excerpt(row['error']),
+                        row['id'], row['started_at']
+                    ))
+            self.conn.commit()
+
+            offloaded += len(rows)
+            if len(rows) < batch_size:
+                break
+
+        logger.info(f"Offloaded output of {offloaded} executions")
+        return offloaded
+
+    @staticmethod
+    def _excerpt(text: Optional[str]) -> Optional[str]:
+        if not text or len(text) <= EXCERPT_CHARS:
+            return text
+        return text[:EXCERPT_CHARS] + OFFLOAD_MARKER
+
+    def get_output(self, execution_id: int) -> Optional[dict]:
+        """Full output and error of an execution, decompressing if offloaded"""
+        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT te.output, te.error, o.output_compressed, o.error_compressed
+                FROM task_executions te
+                LEFT JOIN task_execution_outputs o
+                    ON o.execution_id = te.id AND o.started_at = te.started_at
+                WHERE te.id = %s
+            """, (execution_id,))
+            row = cur.fetchone()
+
+        if not row:
+            return None
+        return {
+            'output': (zlib.decompress(bytes(row['output_compressed'])).decode('utf-8')
+                       if row['output_compressed'] else row['output']),
+            'error': (zlib.decompress(bytes(row['error_compressed'])).decode('utf-8')
+                      if row['error_compressed'] else row['error']),
+        }
+
+    def rebuild_rollups(self) -> int:
+        """Recompute task_execution_rollups from the attached history"""
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT rebuild_task_execution_rollups()")
+            rebuilt = cur.fetchone()[0]
+        self.conn.commit()
+        logger.info(f"Rebuilt rollups for {rebuilt} tasks")
+        return rebuilt
+
+    def resource_usage(self, days: int = 7) -> list:
+        """Per-task peak memory, CPU time, I/O and OOM kills over recent executions"""
+        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT st.task_name,
+                       COUNT(*) AS executions,
+                       MAX(te.peak_rss_bytes) AS max_peak_rss_bytes,
+                       AVG(te.peak_rss_bytes)::BIGINT AS avg_peak_rss_bytes,
+                       AVG(te.cpu_user_ms + te.cpu_system_ms)::BIGINT AS avg_cpu_ms,
+                       AVG(te.io_read_bytes + te.io_write_bytes)::BIGINT AS avg_io_bytes,
+                       COUNT(*) FILTER (WHERE te.oom_killed) AS oom_kills
+                FROM task_executions te
+                JOIN scheduled_tasks st ON st.id = te.task_id
+                WHERE te.started_at > NOW() - make_interval(days => %s)
+                    AND te.peak_rss_bytes IS NOT NULL
+                GROUP BY st.task_name
+                ORDER BY max_peak_rss_bytes DESC NULLS LAST
+            """, (days,))
+            rows = cur.fetchall()
+        self.conn.rollback()
+        return rows
+
+    def close(self):
+        self.conn.close()
+
+
+def _mb(n: Optional[int]) -> str:
+    return f"{n / 1048576:.0f}MB" if n is not None else '-'
+
+
+def main():
+    """CLI for execution history maintenance"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='Maintain task execution history')
+    sub = parser.add_subparsers(dest='command')
+
+    partitions = sub.add_parser('partitions', help='Create upcoming monthly partitions')
+    partitions.add_argument('--months-ahead', type=int, default=2)
+
+    archive = sub.add_parser('archive', help='Detach old partitions into task_archive')
+    archive.add_argument('--keep-months', type=int, default=6)
+
+    offload = sub.add_parser('offload', help='Compress large outputs out of line')
+    offload.add_argument('--older-than-days', type=int, default=7)
+    offload.add_argument('--min-bytes', type=int, default=4096)
+
+    sub.add_parser('rollups', help='Rebuild per-task rollups from history')
+
+    resources = sub.add_parser('resources', help='Per-task memory, CPU and I/O usage')
+    resources.add_argument('--days', type=int, default=7)
+
+    output = sub.add_parser('output', help='Print the full output of an execution')
+    output.add_argument('execution_id', type=int)
+
+    sub.add_parser('all', help='partitions + archive + offload with defaults')
+
+    args = parser.parse_args()
+    if not args.command:
+        parser.print_help()
+        sys.exit(1)
+
+    maintenance = ExecutionMaintenance()
+    try:
+        if args.command == 'partitions':
+            maintenance.ensure_partitions(args.months_ahead)
+        elif args.command == 'archive':
+            maintenance.archive_partitions(args.keep_months)
+        elif args.command == 'offload':
+            maintenance.offload_outputs(args.older_than_days, args.min_bytes)
+        elif args.command == 'rollups':
+            maintenance.rebuild_rollups()
+        elif args.command == 'resources':
+            print(f"{'Task':<45} {'Runs':>5} {'Peak mem':>9} {'Avg mem':>9} "
+                  f"{'Avg CPU':>9} {'Avg I/O':>9} {'OOM':>4}")
+            for row in maintenance.resource_usage(args.days):
+                cpu = f"{row['avg_cpu_ms'] / 1000:.1f}s" if row['avg_cpu_ms'] is not None else '-'
+                print(f"{row['task_name'][:45]:<45} {row['executions']:>5} "
+                      f"{_mb(row['max_peak_rss_bytes']):>9} {_mb(row['avg_peak_rss_bytes']):>9} "
+                      f"{cpu:>9} {_mb(row['avg_io_bytes']):>9} {row['oom_kills']:>4}")
+        elif args.command == 'output':
+            result = maintenance.get_output(args.execution_id)
+            if result is None:
+                print(f"Execution {args.execution_id} not found")
+                sys.exit(1)
+            print(result['output'] or '')
+            if result['error']:
+                print(f"\n[stderr]\n{result['error']}")
+        elif args.command == 'all':
+            maintenance.ensure_partitions()
+            maintenance.archive_partitions()
+            maintenance.offload_outputs()
+    finally:
+        maintenance.close()
+
+
+if __name__ == "__main__":
+    main()
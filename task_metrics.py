@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+In-process Scheduler Metrics
+Counters, gauges and HDR-style latency histograms per task_type, kept by
+TaskDaemon and TaskScheduler as they run. They are served in Prometheus text
+format on a local /metrics endpoint (TASK_METRICS_PORT, 0 disables) and
+snapshotted to task_metrics_snapshots once a minute, so queue depth, schedule
+lag, execution time and retry rates are visible without querying the task
+tables.
+"""
+
+import os
+import sys
+import json
+import time
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger('task_metrics')
+
+METRICS_PORT = int(os.environ.get('TASK_METRICS_PORT', 9187))
+SNAPSHOT_SECONDS = 60
+
+# Histograms keep 2^SUB_BITS linear sub-buckets per power of two of the value
+# in milliseconds: every recorded value is within ~1.6% of its bucket's bound
+SUB_BITS = 6
+SUB_COUNT = 1 << SUB_BITS
+
+# Cumulative buckets (seconds) exported to Prometheus
+EXPORT_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600]
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def bucket_index(value: int) -> int:
+    """Log-linear bucket for a non-negative integer value"""
+    if value < SUB_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BITS - 1
+    return ((shift + 1) << SUB_BITS) + (value >> shift) - SUB_COUNT
+
+
+def bucket_bounds(index: int) -> Tuple[int, int]:
+    """[lower, upper) values held by a bucket"""
+    if index < SUB_COUNT:
+        return index, index + 1
+    shift = (index >> SUB_BITS) - 1
+    lower = ((index & (SUB_COUNT - 1)) + SUB_COUNT) << shift
+    return lower, lower + (1 << shift)
+
+
+class Histogram:
+    """Sparse log-linear histogram of durations, recorded in milliseconds"""
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.export_counts = [0] * (len(EXPORT_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0  # Seconds
+        self.max_ms = 0
+
+    def observe(self, seconds: float):
+        ms = max(int(seconds * 1000), 0)
+        index = bucket_index(ms)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.export_counts[bisect.bisect_left(EXPORT_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += max(seconds, 0.0)
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate quantile in seconds (midpoint of the bucket holding it)"""
+        if not self.count:
+            return None
+        target = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                lower, upper = bucket_bounds(index)
+                return min((lower + upper - 1) / 2, self.max_ms) / 1000
+        return self.max_ms / 1000
+
+
+class MetricsRegistry:
+    """Thread-safe store of the process's metrics, keyed by name and labels"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.help: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.started = time.time()
+
+    def describe(self, name: str, kind: str, text: str):
+        self.help[name] = (kind, text)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauges(self, name: str, values: Dict[str, float], label: str = 'task_type'):
+        """Replace every series of a gauge; label values missing from values drop to 0"""
+        with self.lock:
+            for key in [k for k in self.gauges if k[0] == name]:
+                self.gauges[key] = 0
+            for value_label, value in values.items():
+                self.gauges[(name, ((label, value_label),))] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self.lock:
+            series: Dict[str, List[str]] = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_number(value)}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_number(value)}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                out = series.setdefault(name, [])
+                cumulative = 0
+                for bound, count in zip(EXPORT_BUCKETS + [float('inf')], histogram.export_counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else _number(bound)
+                    out.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                out.append(f"{name}_sum{_format_labels(labels)} {_number(round(histogram.sum, 6))}")
+                out.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+            series['task_metrics_uptime_seconds'] = [
+                f"task_metrics_uptime_seconds {_number(round(time.time() - self.started, 3))}"]
+        for name in sorted(series):
+            kind, text = self.help.get(name, ('gauge', ''))
+            if text:
+                lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(series[name])
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> List[Dict]:
+        """One row per series: value for counters and gauges, summary for histograms"""
+        rows = []
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                rows.append({'metric': name, 'labels': dict(labels), 'value': value})
+            for (name, labels), value in self.gauges.items():
+                rows.append({'metric': name, 'labels': dict(labels), 'value': value})
+            for (name, labels), histogram in self.histograms.items():
+                p50, p95, p99 = (histogram.quantile(q) for q in QUANTILES)
+                rows.append({'metric': name, 'labels': dict(labels), 'value': None,
+                             'count': histogram.count, 'sum': histogram.sum,
+                             'p50': p50, 'p95': p95, 'p99': p99})
+        return rows
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+registry = MetricsRegistry()
+registry.describe('task_runs_total', 'counter', 'Finished task executions by task_type and status')
+registry.describe('task_retries_total', 'counter', 'Failed executions rescheduled for a retry')
+registry.describe('task_execution_seconds', 'histogram', 'Task execution wall time')
+registry.describe('task_schedule_lag_seconds', 'histogram',
+                  'Delay between a task coming due and its execution starting')
+registry.describe('task_queue_depth', 'gauge', 'Due tasks not yet claimed')
+registry.describe('task_in_flight', 'gauge', 'Tasks currently executing in this process')
+registry.describe('task_admission_deferred', 'gauge',
+                  'Resource classes held back by admission control (1 = deferred)')
+
+
+def schedule_lag(task: Dict, started: Optional[float] = None) -> Optional[float]:
+    """Seconds between the task's next_run_at and started (now by default)"""
+    due = task.get('next_run_at')
+    if due is None or not hasattr(due, 'timestamp'):
+        return None
+    return max((started or time.time()) - due.timestamp(), 0.0)
+
+
+def record_run(task: Dict, status: str, seconds: Optional[float], started: Optional[float] = None):
+    """Count a finished execution and record its duration and schedule lag"""
+    task_type = task.get('task_type') or 'unknown'
+    registry.inc('task_runs_total', task_type=task_type, status=status)
+    if seconds is not None:
+        registry.observe('task_execution_seconds', seconds, task_type=task_type)
+    lag = schedule_lag(task, started)
+    if lag is not None:
+        registry.observe('task_schedule_lag_seconds', lag, task_type=task_type)
+
+
+def record_retry(task_type: Optional[str]):
+    registry.inc('task_retries_total', task_type=task_type or 'unknown')
+
+
+def update_gauges(queue_depth: Dict[str, int], in_flight: Dict[str, int],
+                  deferred: Optional[List[str]] = None):
+    """Refresh the point-in-time gauges"""
+    registry.set_gauges('task_queue_depth', queue_depth)
+    registry.set_gauges('task_in_flight', in_flight)
+    if deferred is not None:
+        registry.set_gauges('task_admission_deferred', {c: 1 for c in deferred}, label='resource_class')
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would flood the daemon log
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics on 127.0.0.1 from a daemon thread (once per process)"""
+    global _server
+    if _server is not None or port <= 0:
+        return _server
+    try:
+        _server = ThreadingHTTPServer(('127.0.0.1', port), _MetricsHandler)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint not started on port {port}: {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name='task-metrics', daemon=True).start()
+    logger.info(f"Serving metrics on http://127.0.0.1:{port}/metrics")
+    return _server
+
+
+def snapshot_to_postgres(source: str, worker_id: str) -> int:
+    """Append the current metrics to task_metrics_snapshots; returns rows written"""
+    from psycopg2.extras import execute_values
+    import db
+
+    rows = registry.snapshot()
+    if not rows:
+        return 0
+    with db.pooled_connection() as conn:
+        with conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO task_metrics_snapshots
+                    (source, worker_id, metric, labels, value, count, sum, p50, p95, p99)
+                VALUES %s
+            """, [(source, worker_id, row['metric'], json.dumps(row['labels']), row['value'],
+                   row.get('count'), row.get('sum'), row.get('p50'), row.get('p95'), row.get('p99'))
+                  for row in rows])
+    return len(rows)
+
+
+class SnapshotTimer:
+    """Snapshots at most every SNAPSHOT_SECONDS when polled from a loop"""
+
+    def __init__(self, source: str, worker_id: str, interval: float = SNAPSHOT_SECONDS):
+        self.source = source
+        self.worker_id = worker_id
+        self.interval = interval
+        self.last = time.monotonic()
+
+    def maybe_snapshot(self, force: bool = False):
+        if not force and time.monotonic() - self.last < self.interval:
+            return
+        self.last = time.monotonic()
+        try:
+            snapshot_to_postgres(self.source, self.worker_id)
+        except Exception as e:
+            logger.error(f"Metrics snapshot failed: {e}")
+
+
+def print_latest(minutes: int = 60):
+    """Latest snapshot of each series written in the last minutes"""
+    from psycopg2.extras import RealDictCursor
+    import db
+
+    with db.pooled_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT DISTINCT ON (source, worker_id, metric, labels)
+                       captured_at, source, worker_id, metric, labels, value, count, p50, p95, p99
+                FROM task_metrics_snapshots
+                WHERE captured_at > NOW() - make_interval(mins => %s)
+                ORDER BY source, worker_id, metric, labels, captured_at DESC
+            """, (minutes,))
+            rows = cur.fetchall()
+    if not rows:
+        print(f"No metrics snapshots in the last {minutes} minutes")
+        return
+    for row in rows:
+        labels = ','.join(f"{k}={v}" for k, v in sorted(row['labels'].items()))
+        if row['count'] is not None:
+            quantiles = ' '.join(f"{name}={row[name]:.2f}s" if row[name] is not None else f"{name}=-"
+                                 for name in ('p50', 'p95', 'p99'))
+            summary = f"count={row['count']} {quantiles}"
+        else:
+            summary = _number(row['value'])
+        print(f"{row['captured_at']:%H:%M:%S} {row['source']:<14} {row['metric']}{{{labels}}} {summary}")
+
+
+def main():
+    """CLI: inspect metrics snapshots"""
+    if len(sys.argv) < 2:
+        print("Usage: task_metrics.py <command> [minutes]")
+        print("Commands:")
+        print("  latest - Most recent snapshot of each series (default: last 60 minutes)")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    if command == "latest":
+        print_latest(int(sys.argv[2]) if len(sys.argv) > 2 else 60)
+    else:
+        print("Invalid command")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
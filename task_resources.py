@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Per-task Resource Limits and Accounting
+Each task subprocess runs in its own cgroup v2 with memory, CPU and pids
+limits taken from task metadata (memory_limit_mb, cpu_limit in cores,
+pids_limit). Peak RSS, CPU time, I/O bytes and OOM kills are read back from
+the cgroup when the task exits. Without a writable cgroup v2 hierarchy (e.g.
+on macOS), or when a task can't be attached to its cgroup, limits fall back
+to ulimit and usage is sampled with psutil.
+"""
+
+import os
+import math
+import time
+import shlex
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import psutil
+
+logger = logging.getLogger('task_resources')
+
+# Delegated cgroup under which one child cgroup per execution is created
+CGROUP_ROOT = Path(os.environ.get('TASK_CGROUP_ROOT', '/sys/fs/cgroup/claude-tasks'))
+CONTROLLERS = ('memory', 'cpu', 'pids', 'io')
+CPU_PERIOD_US = 100000
+SAMPLE_INTERVAL = 0.5
+
+# task_executions columns filled from finish()
+USAGE_FIELDS = ('peak_rss_bytes', 'cpu_user_ms', 'cpu_system_ms',
+                'io_read_bytes', 'io_write_bytes', 'oom_killed')
+
+_cgroup_available: Optional[bool] = None
+
+
+def cgroup_available() -> bool:
+    """Whether per-task cgroups can be created under CGROUP_ROOT"""
+    global _cgroup_available
+    if _cgroup_available is None:
+        _cgroup_available = False
+        if Path('/sys/fs/cgroup/cgroup.controllers').exists():
+            try:
+                CGROUP_ROOT.mkdir(exist_ok=True)
+                for controller in CONTROLLERS:
+                    try:
+                        (CGROUP_ROOT / 'cgroup.subtree_control').write_text(f"+{controller}")
+                    except OSError as e:
+                        logger.warning(f"Cannot enable {controller} controller for task cgroups: {e}")
+                _cgroup_available = os.access(CGROUP_ROOT, os.W_OK)
+            except OSError as e:
+                logger.info(f"cgroup v2 not usable at {CGROUP_ROOT} ({e}), using ulimit fallback")
+    return _cgroup_available
+
+
+def limits_from_metadata(metadata: Optional[Dict[str, Any]]) -> Dict[str, float]:
+    """memory_limit_mb / cpu_limit / pids_limit from a task's metadata"""
+    limits = {}
+    for key in ('memory_limit_mb', 'cpu_limit', 'pids_limit'):
+        value = (metadata or {}).get(key)
+        if value is None:
+            continue
+        try:
+            limits[key] = float(value)
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring invalid {key}: {value!r}")
+    return limits
+
+
+def _read_keyed(path: Path) -> Dict[str, int]:
+    """Parse a 'key value' per line cgroup file (cpu.stat, memory.events)"""
+    values = {}
+    try:
+        for line in path.read_text().splitlines():
+            key, _, value = line.partition(' ')
+            if value.strip().isdigit():
+                values[key] = int(value)
+    except OSError:
+        pass
+    return values
+
+
+class TaskResources:
+    """Limits and usage accounting for one task subprocess
+
+    Usage: wrap() the command, launch it, started(pid), then finish() once it
+    has exited to get the usage columns. finish() also kills anything the
+    task left running in its cgroup.
+    """
+
+    def __init__(self, name: Union[int, str], limits: Optional[Dict[str, float]] = None,
+                 timeout: Optional[float] = None):
+        self.name = f"exec-{name}"
+        self.limits = limits or {}
+        self.timeout = timeout
+        self.mode = 'cgroup' if cgroup_available() else 'ulimit'
+        self.cgroup: Optional[Path] = None
+        self.pid: Optional[int] = None
+        # Created by the wrapper when it can't join the cgroup
+        self.attach_marker = Path(tempfile.gettempdir()) / f"task-{self.name}-{os.getpid()}-{id(self)}.noattach"
+
+        # Sampled usage (fallback accounting, and peak memory on old kernels)
+        self.peak_rss = 0
+        self.cpu_times: Dict[int, tuple] = {}
+        self.io_counters: Dict[int, tuple] = {}
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self.usage: Optional[Dict[str, Any]] = None
+
+        if self.mode == 'cgroup':
+            try:
+                self._create_cgroup()
+            except OSError as e:
+                logger.warning(f"Could not create cgroup {self.name}, using ulimit: {e}")
+                self.mode = 'ulimit'
+                self.cgroup = None
+
+    def _create_cgroup(self):
+        self.cgroup = CGROUP_ROOT / self.name
+        self.cgroup.mkdir(exist_ok=True)
+        if 'memory_limit_mb' in self.limits:
+            self._write('memory.max', str(int(self.limits['memory_limit_mb'] * 1024 * 1024)))
+        if 'cpu_limit' in self.limits:
+            quota = max(int(self.limits['cpu_limit'] * CPU_PERIOD_US), 1000)
+            self._write('cpu.max', f"{quota} {CPU_PERIOD_US}")
+        if 'pids_limit' in self.limits:
+            self._write('pids.max', str(int(self.limits['pids_limit'])))
+
+    def _write(self, name: str, value: str):
+        (self.cgroup / name).write_text(value)
+
+    def _ulimit_setup(self) -> Optional[str]:
+        """Shell steps applying the limits with ulimit, or None if none apply"""
+        # RLIMIT_AS bounds address space, not RSS, and RLIMIT_CPU is a total
+        # budget rather than a rate; RLIMIT_NPROC is per user, so no pids limit
+        steps = []
+        if 'memory_limit_mb' in self.limits:
+            steps.append(f"ulimit -v {int(self.limits['memory_limit_mb'] * 1024)}")
+        if 'cpu_limit' in self.limits and self.timeout:
+            steps.append(f"ulimit -t {math.ceil(self.limits['cpu_limit'] * self.timeout)}")
+        return '; '.join(f"{step} 2>/dev/null" for step in steps) or None
+
+    def wrap(self, cmd: Union[str, List[str]]) -> List[str]:
+        """argv that applies the limits to cmd (a shell string or argv) and execs it"""
+        argv = ['/bin/sh', '-c', cmd] if isinstance(cmd, str) else list(cmd)
+        fallback = self._ulimit_setup()
+
+        if self.mode == 'cgroup':
+            procs = shlex.quote(str(self.cgroup / 'cgroup.procs'))
+            marker = shlex.quote(str(self.attach_marker))
+            setup = (f'if ! echo $$ 2>/dev/null > {procs}; then '
+                     f'echo "task_resources: cgroup attach failed, using ulimit" >&2; '
+                     f'{fallback + "; " if fallback else ""}: > {marker}; fi')
+        elif fallback:
+            setup = fallback
+        else:
+            self.mode = 'unlimited'
+            return argv
+
+        return ['/bin/sh', '-c', f'{setup}; exec "$@"', 'task'] + argv
+
+    def _check_attach(self):
+        """Leave cgroup mode if the wrapper reported that it couldn't attach"""
+        if self.mode == 'cgroup' and self.attach_marker.exists():
+            self.mode = 'ulimit' if self._ulimit_setup() else 'unlimited'
+            logger.warning(f"Task {self.name} could not join its cgroup; ran with "
+                           f"{'ulimit limits' if self.mode == 'ulimit' else 'no limits'}")
+
+    def started(self, pid: int):
+        """Begin sampling usage of the launched process"""
+        self.pid = pid
+        self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+        self._sampler.start()
+
+    def _sample_loop(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(SAMPLE_INTERVAL)
+
+    def _sample(self):
+        self._check_attach()
+        if self.mode == 'cgroup':
+            try:
+                current = int((self.cgroup / 'memory.current').read_text())
+                self.peak_rss = max(self.peak_rss, current)
+            except (OSError, ValueError):
+                pass
+            return
+
+        try:
+            root = psutil.Process(self.pid)
+            procs = [root] + root.children(recursive=True)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return
+        rss = 0
+        for proc in procs:
+            try:
+                with proc.oneshot():
+                    rss += proc.memory_info().rss
+                    times = proc.cpu_times()
+                    self.cpu_times[proc.pid] = (times.user + times.children_user,
+                                                times.system + times.children_system)
+                    if hasattr(proc, 'io_counters'):
+                        io = proc.io_counters()
+                        self.io_counters[proc.pid] = (io.read_bytes, io.write_bytes)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        self.peak_rss = max(self.peak_rss, rss)
+
+    def finish(self) -> Dict[str, Any]:
+        """Stop accounting, clean up the cgroup and return the usage columns"""
+        if self.usage is not None:
+            return self.usage
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join(timeout=2)
+
+        self._check_attach()
+        try:
+            self.attach_marker.unlink()
+        except FileNotFoundError:
+            pass
+        if self.mode == 'cgroup' and self.cgroup is not None:
+            self.usage = self._cgroup_usage()
+            self._remove_cgroup()
+            return self.usage
+        if self.cgroup is not None:
+            self._remove_cgroup()  # Created, but the task never joined it
+
+        # Sampled, so approximate: short-lived processes can be missed and a
+        # reaped child's time may also show up in its parent's children_* times
+        self.usage = {
+            'peak_rss_bytes': self.peak_rss or None,
+            'cpu_user_ms': int(sum(t[0] for t in self.cpu_times.values()) * 1000) if self.cpu_times else None,
+            'cpu_system_ms': int(sum(t[1] for t in self.cpu_times.values()) * 1000) if self.cpu_times else None,
+            'io_read_bytes': sum(c[0] for c in self.io_counters.values()) if self.io_counters else None,
+            'io_write_bytes': sum(c[1] for c in self.io_counters.values()) if self.io_counters else None,
+            'oom_killed': None,
+        }
+        return self.usage
+
+    def _cgroup_usage(self) -> Dict[str, Any]:
+        cpu = _read_keyed(self.cgroup / 'cpu.stat')
+        events = _read_keyed(self.cgroup / 'memory.events')
+
+        peak = self.peak_rss
+        try:
+            # memory.peak needs Linux 5.19+; older kernels keep the sampled peak
+            peak = max(peak, int((self.cgroup / 'memory.peak').read_text()))
+        except (OSError, ValueError):
+            pass
+
+        read_bytes = write_bytes = 0
+        try:
+            for line in (self.cgroup / 'io.stat').read_text().splitlines():
+                for field in line.split()[1:]:
+                    key, _, value = field.partition('=')
+                    if key == 'rbytes':
+                        read_bytes += int(value)
+                    elif key == 'wbytes':
+                        write_bytes += int(value)
+        except (OSError, ValueError):
+            pass
+
+        return {
+            'peak_rss_bytes': peak or None,
+            'cpu_user_ms': cpu['user_usec'] // 1000 if 'user_usec' in cpu else None,
+            'cpu_system_ms': cpu['system_usec'] // 1000 if 'system_usec' in cpu else None,
+            'io_read_bytes': read_bytes,
+            'io_write_bytes': write_bytes,
+            'oom_killed': events.get('oom_kill', 0) > 0,
+        }
+
+    def _remove_cgroup(self):
+        """Kill stragglers the task left behind and remove its cgroup"""
+        try:
+            if (self.cgroup / 'cgroup.kill').exists():
+                self._write('cgroup.kill', '1')
+            else:
+                for pid in (self.cgroup / 'cgroup.procs').read_text().split():
+                    try:
+                        os.kill(int(pid), 9)
+                    except ProcessLookupError:
+                        pass
+        except OSError as e:
+            logger.warning(f"Could not kill leftover processes in {self.cgroup}: {e}")
+
+        # Killed processes leave the cgroup asynchronously
+        for _ in range(20):
+            try:
+                self.cgroup.rmdir()
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.1)
+        logger.warning(f"Could not remove cgroup {self.cgroup}")
+
+    def describe(self) -> Dict[str, Any]:
+        """Limits and accounting mode, for the execution's metadata"""
+        return {'resource_mode': self.mode, 'resource_limits': self.limits}
+
+    def report(self) -> Dict[str, Any]:
+        """finish() usage together with describe()"""
+        return {**self.finish(), **self.describe()}
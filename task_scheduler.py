@@ -8,11 +8,12 @@ Runs every 5 minutes to execute pending tasks
 import os
 import sys
 import time
+
+_IMPORT_START = time.perf_counter()
+
 import signal
 import logging
 from datetime import datetime, timedelta
-import psycopg2
-from psycopg2.extras import RealDictCursor, Json
 import subprocess
 from typing import List, Dict, Optional
 import json
@@ -21,7 +22,16 @@ import traceback
 # Add utils directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from claude_executor import ClaudeExecutor
-from task_templates import TaskTemplates
+from task_store import get_task_store, initialize_from_templates
+from admission_control import AdmissionController
+from fair_share import get_dispatcher
+from misfire import catch_up_on_startup, mark_dispatch, next_run_after_success
+from task_resources import USAGE_FIELDS
+from task_claims import default_worker_id
+import task_metrics
+import db
+
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_START
 
 # Set up logging
 logging.basicConfig(
@@ -35,15 +45,12 @@ logging.basicConfig(
 logger = logging.getLogger('task_scheduler')
 
 class TaskScheduler:
-    def __init__(self):
+    def __init__(self, store=None):
         self.executor = ClaudeExecutor()
         self.running = True
-        self.conn = psycopg2.connect(
-            dbname="claudemini",
-            user="claudemini",
-            host="localhost"
-        )
-        self.conn.autocommit = False
+        self.store = store or get_task_store()
+        self.dispatcher = get_dispatcher(self.store)  # Fair-share or plain priority order
+        self.admission = AdmissionController()
         
         # Create logs directory if it doesn't exist
         os.makedirs('/Users/claudemini/Claude/Code/utils/logs', exist_ok=True)
@@ -58,119 +65,66 @@ class TaskScheduler:
         self.running = False
     
     def get_pending_tasks(self, batch_size: int = 10) -> List[Dict]:
-        """Get tasks that are ready to run"""
-        try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT * FROM get_pending_tasks(%s)", (batch_size,))
-                return cur.fetchall()
-        except Exception as e:
-            logger.error(f"Error getting pending tasks: {e}")
-            self.conn.rollback()
-            return []
+        """Claim tasks that are ready to run and that the host has room for"""
+        return self.admission.claim(self.dispatcher, batch_size)
     
     def start_task_execution(self, task_id: int) -> Optional[int]:
         """Create a task execution record"""
         try:
-            with self.conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO task_executions (task_id, status, started_at)
-                    VALUES (%s, 'running', CURRENT_TIMESTAMP)
-                    RETURNING id
-                """, (task_id,))
-                execution_id = cur.fetchone()[0]
-                
-                # Update task last_run_at
-                cur.execute("""
-                    UPDATE scheduled_tasks 
-                    SET last_run_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                """, (task_id,))
-                
-                self.conn.commit()
-                return execution_id
+            return self.store.start_execution(task_id)
         except Exception as e:
             logger.error(f"Error starting task execution: {e}")
-            self.conn.rollback()
             return None
     
-    def complete_task_execution(self, execution_id: int, result: Dict):
-        """Update task execution with results"""
+    def complete_task_execution(self, execution_id: int, result: Dict, task: Dict,
+                                started: Optional[float] = None):
+        """Record an execution's result and reschedule its task atomically"""
+        execution_time_ms = result.get('execution_time_ms')
+        task_metrics.record_run(task, result['status'],
+                                execution_time_ms / 1000 if execution_time_ms is not None else None,
+                                started)
+        success = result['status'] == 'success'
+        resources = result.get('resources') or {}
+        
+        if success:
+            task_update = {'retry_count': 0, 'status': 'active'}
+            if task['schedule_type'] == 'dependent':
+                # Dependent tasks wait for their parents again
+                task_update['next_run_at'] = None
+            else:
+                next_run = next_run_after_success(task)
+                if next_run is not None:
+                    task_update['next_run_at'] = next_run
+            if task['schedule_type'] == 'once':
+                task_update['status'] = 'completed'
+        else:
+            retry_count = (task.get('retry_count') or 0) + 1
+            task_update = {'retry_count': retry_count}
+            if retry_count < task.get('max_retries', 3):
+                task_update['next_run_at'] = datetime.now().astimezone() + timedelta(minutes=5)
+                task_metrics.record_retry(task['task_type'])
+            else:
+                task_update['status'] = 'failed'
+        
         try:
-            with self.conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE task_executions
-                    SET status = %s,
-                        completed_at = CURRENT_TIMESTAMP,
-                        output = %s,
-                        error = %s,
-                        execution_time_ms = %s,
-                        memory_ids = %s,
-                        log_file_path = %s
-                    WHERE id = %s
-                """, (
-                    result['status'],
-                    result.get('output'),
-                    result.get('error'),
-                    result.get('execution_time_ms'),
-                    result.get('memory_ids', []),
-                    result.get('log_file_path'),
-                    execution_id
-                ))
-                
-                # Get task info for next run calculation
-                cur.execute("""
-                    SELECT st.* 
-                    FROM scheduled_tasks st
-                    JOIN task_executions te ON te.task_id = st.id
-                    WHERE te.id = %s
-                """, (execution_id,))
-                task = cur.fetchone()
-                
-                if task:
-                    # Update task based on result
-                    if result['status'] == 'success':
-                        # Reset retry count and calculate next run
-                        cur.execute("""
-                            UPDATE scheduled_tasks
-                            SET retry_count = 0,
-                                last_success_at = CURRENT_TIMESTAMP,
-                                next_run_at = calculate_next_run(
-                                    schedule_type, 
-                                    cron_expression, 
-                                    interval_minutes, 
-                                    CURRENT_TIMESTAMP
-                                ),
-                                status = CASE 
-                                    WHEN schedule_type = 'once' THEN 'completed'
-                                    ELSE 'active'
-                                END
-                            WHERE id = %s
-                        """, (task[0],))  # task[0] is the id
-                    else:
-                        # Increment retry count
-                        cur.execute("""
-                            UPDATE scheduled_tasks
-                            SET retry_count = retry_count + 1,
-                                status = CASE 
-                                    WHEN retry_count + 1 >= max_retries THEN 'failed'
-                                    ELSE status
-                                END,
-                                next_run_at = CASE
-                                    WHEN retry_count + 1 < max_retries 
-                                    THEN CURRENT_TIMESTAMP + INTERVAL '5 minutes'
-                                    ELSE next_run_at
-                                END
-                            WHERE id = %s
-                        """, (task[0],))
-                
-                self.conn.commit()
-                
+            self.store.complete_execution(execution_id, {
+                'status': result['status'],
+                'output': result.get('output'),
+                'error': result.get('error'),
+                'execution_time_ms': result.get('execution_time_ms'),
+                'memory_ids': result.get('memory_ids', []),
+                'log_file_path': result.get('log_file_path'),
+                'metadata': {
+                    key: resources[key] for key in ('resource_mode', 'resource_limits')
+                    if key in resources
+                },
+                **{field: resources.get(field) for field in USAGE_FIELDS},
+            }, task_update, succeeded=success)
         except Exception as e:
             logger.error(f"Error completing task execution: {e}")
             logger.error(traceback.format_exc())
-            self.conn.rollback()
     
-    def execute_task(self, task: Dict) -> Dict:
+    def execute_task(self, task: Dict, execution_id: Optional[int] = None) -> Dict:
         """Execute a single task"""
         logger.info(f"Executing task: {task['task_name']} (ID: {task['id']})")
         
@@ -178,7 +132,7 @@ class TaskScheduler:
         metadata = task.get('metadata', {})
         
         # Execute the task
-        result = self.executor.execute_task(task)
+        result = self.executor.execute_task(task, execution_id=execution_id)
         
         # Special handling for social media posts
         if (task['task_type'] == 'social_media' and 
@@ -206,112 +160,89 @@ class TaskScheduler:
         
         return result
     
-    def run_single_batch(self):
+    def run_single_batch(self, batch_size: int = 10):
         """Run a single batch of tasks"""
-        tasks = self.get_pending_tasks()
+        self.store.recover_expired()
+        executed = 0
         
-        if not tasks:
+        # Claim one task at a time: tasks run sequentially here, so holding
+        # leases on a whole batch would starve other workers (or let leases
+        # on the tail of the batch expire before those tasks even start)
+        while self.running and executed < batch_size:
+            tasks = self.get_pending_tasks(batch_size=1)
+            if not tasks:
+                break
+            task = tasks[0]
+            executed += 1
+            
+            try:
+                self.run_claimed_task(task)
+            finally:
+                self.admission.finished(task['id'])
+        
+        if executed:
+            logger.info(f"Processed {executed} pending tasks")
+        else:
             logger.debug("No pending tasks found")
+    
+    def run_claimed_task(self, task: Dict):
+        """Execute a claimed task and record its result"""
+        # Start execution record
+        execution_id = self.start_task_execution(task['id'])
+        if not execution_id:
+            logger.error(f"Failed to start execution for task {task['id']}")
+            self.store.release(task['id'])
             return
         
-        logger.info(f"Found {len(tasks)} pending tasks")
-        
-        for task in tasks:
-            if not self.running:
-                break
+        started = time.time()
+        try:
+            # Execute the task
+            result = self.execute_task(task, execution_id)
             
-            # Start execution record
-            execution_id = self.start_task_execution(task['id'])
-            if not execution_id:
-                logger.error(f"Failed to start execution for task {task['id']}")
-                continue
+            # Record results
+            self.complete_task_execution(execution_id, result, task, started)
             
-            try:
-                # Execute the task
-                result = self.execute_task(task)
-                
-                # Record results
-                self.complete_task_execution(execution_id, result)
-                
-                logger.info(
-                    f"Task {task['task_name']} completed with status: {result['status']}"
-                )
-                
-            except Exception as e:
-                logger.error(f"Error executing task {task['id']}: {e}")
-                logger.error(traceback.format_exc())
-                
-                # Record failure
-                self.complete_task_execution(execution_id, {
-                    'status': 'failed',
-                    'error': str(e),
-                    'execution_time_ms': 0
-                })
+            logger.info(
+                f"Task {task['task_name']} completed with status: {result['status']}"
+            )
+            
+        except Exception as e:
+            logger.error(f"Error executing task {task['id']}: {e}")
+            logger.error(traceback.format_exc())
+            
+            # Record failure
+            self.complete_task_execution(execution_id, {
+                'status': 'failed',
+                'error': str(e),
+                'execution_time_ms': int((time.time() - started) * 1000)
+            }, task, started)
+    
+    def snapshot_metrics(self):
+        """Record this batch's metrics and the remaining queue depth in Postgres
+
+        A batch is too short-lived to be scraped, so the scheduler only
+        snapshots (see task_metrics.py); the daemon also serves /metrics.
+        """
+        if self.store.kind != 'postgres':
+            return
+        try:
+            task_metrics.update_gauges(self.store.due_counts(), {}, self.admission.deferred)
+        except Exception as e:
+            logger.error(f"Could not update metrics: {e}")
+        task_metrics.SnapshotTimer('task_scheduler', default_worker_id()).maybe_snapshot(force=True)
     
     def initialize_tasks(self):
-        """Initialize database with task templates"""
+        """Initialize the task store with task templates"""
         logger.info("Checking for task initialization...")
         
         try:
-            with self.conn.cursor() as cur:
-                # Check if we already have tasks
-                cur.execute("SELECT COUNT(*) FROM scheduled_tasks")
-                count = cur.fetchone()[0]
-                
-                if count == 0:
-                    logger.info("No tasks found, initializing with templates...")
-                    templates = TaskTemplates.get_all_templates()
-                    
-                    for template in templates:
-                        # Calculate initial next_run_at
-                        if template['schedule_type'] == 'recurring':
-                            next_run = datetime.now() + timedelta(
-                                minutes=template['interval_minutes']
-                            )
-                        else:
-                            # For cron tasks, use the calculate_next_run function
-                            cur.execute(
-                                "SELECT calculate_next_run(%s, %s, %s, %s)",
-                                (
-                                    template['schedule_type'],
-                                    template.get('cron_expression'),
-                                    template.get('interval_minutes'),
-                                    datetime.now()
-                                )
-                            )
-                            next_run = cur.fetchone()[0]
-                        
-                        # Insert task
-                        cur.execute("""
-                            INSERT INTO scheduled_tasks (
-                                task_name, task_type, description, command,
-                                schedule_type, cron_expression, interval_minutes,
-                                next_run_at, priority, timeout_seconds,
-                                requires_brain, metadata
-                            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """, (
-                            template['task_name'],
-                            template['task_type'],
-                            template.get('description'),
-                            template['command'],
-                            template['schedule_type'],
-                            template.get('cron_expression'),
-                            template.get('interval_minutes'),
-                            next_run,
-                            template.get('priority', 5),
-                            template.get('timeout_seconds', 300),
-                            template.get('requires_brain', False),
-                            Json(template.get('metadata', {}))
-                        ))
-                    
-                    self.conn.commit()
-                    logger.info(f"Initialized {len(templates)} tasks")
-                else:
-                    logger.info(f"Found {count} existing tasks")
-                    
+            added = initialize_from_templates(self.store)
+            if added:
+                logger.info(f"Initialized {added} tasks")
+            else:
+                logger.info(f"Found {self.store.count_tasks()} existing tasks")
         except Exception as e:
             logger.error(f"Error initializing tasks: {e}")
-            self.conn.rollback()
     
     def run(self):
         """Main scheduler loop"""
@@ -320,14 +251,63 @@ class TaskScheduler:
         # Initialize tasks if needed
         self.initialize_tasks()
         
+        # Spread out runs missed while no scheduler was running (see misfire.py);
+        # the every-5-minutes cron runs find a fresh stamp and skip this
+        try:
+            catch_up_on_startup(self.store)
+        except Exception as e:
+            logger.error(f"Misfire catch-up failed: {e}")
+        mark_dispatch()
+        
         # Run one batch
         self.run_single_batch()
+        self.snapshot_metrics()
         
         logger.info("Task scheduler completed")
 
 
+def bench_startup():
+    """Report where the empty-queue path spends its startup time"""
+    phases = [('imports', _IMPORT_SECONDS)]
+    
+    start = time.perf_counter()
+    conn = db.shared_connection()
+    phases.append(('db connect', time.perf_counter() - start))
+    
+    start = time.perf_counter()
+    ClaudeExecutor()
+    phases.append(('ClaudeExecutor()', time.perf_counter() - start))
+    
+    start = time.perf_counter()
+    TaskScheduler()
+    phases.append(('TaskScheduler()', time.perf_counter() - start))
+    
+    # Read-only stand-in for the claim, so benchmarking never runs tasks
+    start = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*) FROM scheduled_tasks
+            WHERE is_active = TRUE AND status = 'active' AND next_run_at <= NOW()
+        """)
+        due = cur.fetchone()[0]
+    conn.rollback()
+    phases.append(('pending check', time.perf_counter() - start))
+    
+    print("Startup phases:")
+    for name, seconds in phases:
+        print(f"  {name:<20} {seconds * 1000:8.1f} ms")
+    print(f"  {'total':<20} {sum(s for _, s in phases) * 1000:8.1f} ms")
+    print(f"Due tasks: {due}")
+    for module in ('sentence_transformers', 'torch', 'numpy'):
+        print(f"{module} loaded: {'yes' if module in sys.modules else 'no'}")
+
+
 def main():
     """Main entry point"""
+    if '--bench-startup' in sys.argv:
+        bench_startup()
+        return
+    
     scheduler = TaskScheduler()
     
     try:
@@ -0,0 +1,1009 @@
+#!/usr/bin/env python3
+"""
+Task Storage Backends
+TaskScheduler, TaskDaemon and the workflow dashboard read and write tasks and
+executions through a TaskStore. PostgresTaskStore is the shared
+create_task_tables.sql schema; MemoryTaskStore keeps everything in-process
+(a heap keyed on next_run_at plus dict indexes) for single-node runs, tests
+and benchmarks. Pick one with TASK_STORE=postgres|memory.
+"""
+
+import os
+import heapq
+import itertools
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from task_claims import default_worker_id
+
+logger = logging.getLogger('task_store')
+
+# scheduled_tasks columns a completion may change (besides the lease)
+TASK_UPDATE_FIELDS = ('next_run_at', 'status', 'retry_count')
+
+# task_executions columns a completion may set
+EXECUTION_FIELDS = ('status', 'output', 'error', 'execution_time_ms', 'memory_ids',
+                    'log_file_path', 'peak_rss_bytes', 'cpu_user_ms', 'cpu_system_ms',
+                    'io_read_bytes', 'io_write_bytes', 'oom_killed')
+
+
+class TaskStore(ABC):
+    """Storage for scheduled tasks, their leases and their executions
+
+    complete_execution() takes the execution's result fields and the task
+    changes decided by the caller, and applies both (and drops the lease)
+    atomically; update_task() does the same when no execution was started.
+    Both leave the task alone if this worker no longer holds its lease.
+    """
+
+    kind = None
+
+    @abstractmethod
+    def claim(self, batch_size: int = 10, exclude_types: Iterable[str] = (),
+              exclude_classes: Iterable[str] = ()) -> List[Dict]:
+        """Lease up to batch_size due tasks, highest priority first"""
+
+    @abstractmethod
+    def due_candidates(self, per_type: int = 5, aging_seconds: float = 600,
+                       exclude_types: Iterable[str] = (),
+                       exclude_classes: Iterable[str] = ()) -> List[Dict]:
+        """Claimable due tasks without leasing them: for each task_type the best
+        per_type by aged priority (priority + lag_seconds / aging_seconds) plus
+        the per_type oldest"""
+
+    @abstractmethod
+    def claim_ids(self, task_ids: List[int]) -> List[Dict]:
+        """Lease specific tasks from due_candidates() that are still claimable"""
+
+    @abstractmethod
+    def recent_dispatches(self, seconds: float) -> Dict[str, int]:
+        """Executions started per task_type in the last seconds"""
+
+    @abstractmethod
+    def heartbeat(self, task_ids: List[int]) -> int:
+        """Extend this worker's leases on task_ids; returns how many were extended"""
+
+    @abstractmethod
+    def release(self, task_id: int):
+        """Drop this worker's lease on a task without running it"""
+
+    @abstractmethod
+    def recover_expired(self) -> int:
+        """Free tasks whose lease expired, failing their running executions"""
+
+    @abstractmethod
+    def start_execution(self, task_id: int) -> int:
+        """Record a running execution of a claimed task; returns its id"""
+
+    @abstractmethod
+    def complete_execution(self, execution_id: int, result: Dict[str, Any],
+                           task_update: Dict[str, Any], succeeded: bool = False) -> bool:
+        """Record an execution's result and apply task_update to its task
+
+        The result is only recorded while the execution is still running, and
+        the task only changes while this worker holds its lease. Returns False
+        (and reschedules nothing) if the lease was lost.
+        """
+
+    @abstractmethod
+    def update_task(self, task_id: int, task_update: Dict[str, Any]) -> bool:
+        """Apply task_update to a claimed task and drop its lease; False if the
+        lease was lost"""
+
+    @abstractmethod
+    def seconds_until_next_run(self) -> Optional[float]:
+        """Seconds until the earliest future next_run_at (None if nothing is scheduled)"""
+
+    @abstractmethod
+    def overdue_tasks(self, before: datetime) -> List[Dict]:
+        """Unclaimed active recurring/cron tasks whose next_run_at is before `before`"""
+
+    @abstractmethod
+    def reschedule(self, updates: Dict[int, tuple]) -> int:
+        """Apply task_id -> (expected next_run_at, new next_run_at) to unclaimed tasks
+
+        A task claimed or rescheduled by someone else since it was read is
+        left alone. Returns how many tasks were updated.
+        """
+
+    @abstractmethod
+    def scheduled_tasks(self) -> List[Dict]:
+        """Every active recurring and cron task"""
+
+    @abstractmethod
+    def due_counts(self) -> Dict[str, int]:
+        """task_type -> unclaimed active tasks that are due (the queue depth)"""
+
+    @abstractmethod
+    def mean_durations(self) -> Dict[int, float]:
+        """task_id -> mean execution seconds, for tasks that have run"""
+
+    @abstractmethod
+    def set_schedule_shift(self, shifts: Dict[int, tuple]) -> int:
+        """Apply task_id -> (offset seconds, jitter seconds, new next_run_at or None)
+
+        Offset and jitter are stored in the task's metadata; next_run_at is
+        only moved on tasks that aren't claimed. Returns how many tasks changed.
+        """
+
+    @abstractmethod
+    def count_tasks(self) -> int:
+        """Number of scheduled tasks"""
+
+    @abstractmethod
+    def add_tasks(self, tasks: List[Dict]) -> Dict[str, int]:
+        """Insert tasks and wire their depends_on (by task name); returns name -> id"""
+
+    @abstractmethod
+    def task_status(self) -> List[Dict]:
+        """Every task with its rollup counts and p95 duration (dashboard)"""
+
+    @abstractmethod
+    def recent_executions(self, limit: int = 10) -> List[Dict]:
+        """The latest executions with their task names, newest first"""
+
+    @abstractmethod
+    def execution_stats(self, hours: int = 24) -> Dict[str, Any]:
+        """Outcome counts and success durations over the last hours"""
+
+
+class PostgresTaskStore(TaskStore):
+    """The scheduled_tasks / task_executions schema in PostgreSQL"""
+
+    kind = 'postgres'
+
+    def __init__(self, conn=None, worker_id: Optional[str] = None, lease_seconds: int = 600):
+        import db
+        from task_claims import TaskClaimer
+        self.conn = conn or db.shared_connection()
+        self.claimer = TaskClaimer(self.conn, worker_id, lease_seconds)
+
+    @property
+    def worker_id(self) -> str:
+        return self.claimer.worker_id
+
+    def claim(self, batch_size: int = 10, exclude_types: Iterable[str] = (),
+              exclude_classes: Iterable[str] = ()) -> List[Dict]:
+        return self.claimer.claim(batch_size, exclude_types, exclude_classes)
+
+    def due_candidates(self, per_type: int = 5, aging_seconds: float = 600,
+                       exclude_types: Iterable[str] = (),
+                       exclude_classes: Iterable[str] = ()) -> List[Dict]:
+        return self._fetch(
+            "SELECT * FROM due_task_candidates(%s, %s, %s::varchar[], %s::varchar[])",
+            (per_type, int(aging_seconds), list(exclude_types), list(exclude_classes)))
+
+    def claim_ids(self, task_ids: List[int]) -> List[Dict]:
+        return self.claimer.claim_ids(task_ids)
+
+    def recent_dispatches(self, seconds: float) -> Dict[str, int]:
+        rows = self._fetch("""
+            SELECT st.task_type, COUNT(*) AS dispatches
+            FROM task_executions te
+            JOIN scheduled_tasks st ON st.id = te.task_id
+            WHERE te.started_at > NOW() - make_interval(secs => %s)
+            GROUP BY st.task_type
+        """, (seconds,))
+        return {row['task_type']: row['dispatches'] for row in rows}
+
+    def heartbeat(self, task_ids: List[int]) -> int:
+        return self.claimer.heartbeat(task_ids)
+
+    def release(self, task_id: int):
+        self.claimer.release(task_id)
+
+    def recover_expired(self) -> int:
+        return self.claimer.recover_expired()
+
+    def start_execution(self, task_id: int) -> int:
+        try:
+            with self.conn.cursor() as cur:
+                # last_run_at was already set when the task was claimed
+                cur.execute("""
+                    INSERT INTO task_executions (task_id, status, started_at, metadata)
+                    VALUES (%s, 'running', CURRENT_TIMESTAMP,
+                            jsonb_build_object('worker_id', %s::text))
+                    RETURNING id
+                """, (task_id, self.worker_id))
+                execution_id = cur.fetchone()[0]
+            self.conn.commit()
+            return execution_id
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def _task_params(self, task_update: Dict[str, Any]):
+        assignments = ''.join(f"{field} = %(task_{field})s, " for field in TASK_UPDATE_FIELDS
+                              if field in task_update)
+        params = {f"task_{field}": task_update[field] for field in TASK_UPDATE_FIELDS
+                  if field in task_update}
+        return assignments, params
+
+    def complete_execution(self, execution_id: int, result: Dict[str, Any],
+                           task_update: Dict[str, Any], succeeded: bool = False) -> bool:
+        from psycopg2.extras import Json
+        assignments, params = self._task_params(task_update)
+        params.update({field: result.get(field) for field in EXECUTION_FIELDS})
+        params.update({
+            'execution_id': execution_id,
+            'metadata': Json(result.get('metadata') or {}),
+            'succeeded': succeeded,
+            'worker_id': self.worker_id,
+        })
+        try:
+            with self.conn.cursor() as cur:
+                # Setting last_success_at releases any dependent children
+                cur.execute(f"""
+                    WITH execution AS (
+                        UPDATE task_executions
+                        SET status = %(status)s,
+                            completed_at = CURRENT_TIMESTAMP,
+                            output = %(output)s,
+                            error = %(error)s,
+                            execution_time_ms = %(execution_time_ms)s,
+                            memory_ids = %(memory_ids)s,
+                            log_file_path = %(log_file_path)s,
+                            peak_rss_bytes = %(peak_rss_bytes)s,
+                            cpu_user_ms = %(cpu_user_ms)s,
+                            cpu_system_ms = %(cpu_system_ms)s,
+                            io_read_bytes = %(io_read_bytes)s,
+                            io_write_bytes = %(io_write_bytes)s,
+                            oom_killed = %(oom_killed)s,
+                            metadata = metadata || %(metadata)s
+                        WHERE id = %(execution_id)s
+                        AND status = 'running'
+                        RETURNING task_id
+                    )
+                    UPDATE scheduled_tasks st
+                    SET {assignments}
+                        last_success_at = CASE
+                            WHEN %(succeeded)s THEN CURRENT_TIMESTAMP
+                            ELSE st.last_success_at
+                        END,
+                        locked_by = NULL,
+                        locked_at = NULL,
+                        lease_expires_at = NULL
+                    FROM execution e
+                    WHERE st.id = e.task_id
+                    AND st.locked_by = %(worker_id)s
+                """, params)
+                updated = cur.rowcount
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        if not updated:
+            logger.warning(f"Lost the lease behind execution {execution_id}; "
+                           f"leaving its task to the new owner")
+        return bool(updated)
+
+    def update_task(self, task_id: int, task_update: Dict[str, Any]) -> bool:
+        assignments, params = self._task_params(task_update)
+        params.update({'task_id': task_id, 'worker_id': self.worker_id})
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(f"""
+                    UPDATE scheduled_tasks
+                    SET {assignments}
+                        locked_by = NULL, locked_at = NULL, lease_expires_at = NULL
+                    WHERE id = %(task_id)s
+                    AND locked_by = %(worker_id)s
+                """, params)
+                updated = cur.rowcount
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        if not updated:
+            logger.warning(f"Lost the lease on task {task_id}; leaving it to the new owner")
+        return bool(updated)
+
+    def seconds_until_next_run(self) -> Optional[float]:
+        try:
+            with self.conn.cursor() as cur:
+                # Includes deferred TaskErrorHandler retries, which run from the daemon
+                cur.execute("""
+                    SELECT EXTRACT(EPOCH FROM MIN(next_run_at) - NOW())
+                    FROM (
+                        SELECT next_run_at
+                        FROM scheduled_tasks
+                        WHERE is_active = TRUE
+                        AND status = 'active'
+                        AND next_run_at > NOW()
+                        UNION ALL
+                        SELECT next_run_at
+                        FROM task_retry_queue
+                        WHERE next_run_at > NOW()
+                    ) upcoming
+                """)
+                seconds = cur.fetchone()[0]
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return float(seconds) if seconds is not None else None
+
+    def overdue_tasks(self, before: datetime) -> List[Dict]:
+        return self._fetch("""
+            SELECT *
+            FROM scheduled_tasks
+            WHERE is_active = TRUE
+            AND status = 'active'
+            AND schedule_type IN ('recurring', 'cron')
+            AND locked_by IS NULL
+            AND next_run_at < %s
+            ORDER BY next_run_at
+        """, (before,))
+
+    def reschedule(self, updates: Dict[int, tuple]) -> int:
+        from psycopg2.extras import execute_values
+        if not updates:
+            return 0
+        try:
+            with self.conn.cursor() as cur:
+                updated = execute_values(cur, """
+                    UPDATE scheduled_tasks st
+                    SET next_run_at = v.next_run
+                    FROM (VALUES %s) AS v(id, previous, next_run)
+                    WHERE st.id = v.id
+                    AND st.next_run_at = v.previous
+                    AND st.locked_by IS NULL
+                    RETURNING st.id
+                """, [(task_id, previous, next_run)
+                      for task_id, (previous, next_run) in updates.items()],
+                    template="(%s, %s::timestamptz, %s::timestamptz)", fetch=True)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return len(updated)
+
+    def due_counts(self) -> Dict[str, int]:
+        rows = self._fetch("""
+            SELECT task_type, COUNT(*) AS due
+            FROM scheduled_tasks
+            WHERE is_active = TRUE
+            AND status = 'active'
+            AND next_run_at <= NOW()
+            AND (locked_by IS NULL OR lease_expires_at < NOW())
+            GROUP BY task_type
+        """)
+        return {row['task_type']: row['due'] for row in rows}
+
+    def scheduled_tasks(self) -> List[Dict]:
+        return self._fetch("""
+            SELECT *
+            FROM scheduled_tasks
+            WHERE is_active = TRUE
+            AND status = 'active'
+            AND schedule_type IN ('recurring', 'cron')
+            ORDER BY id
+        """)
+
+    def mean_durations(self) -> Dict[int, float]:
+        rows = self._fetch("""
+            SELECT task_id, total_execution_time_ms::float / timed_executions / 1000 AS seconds
+            FROM task_execution_rollups
+            WHERE timed_executions > 0
+        """)
+        return {row['task_id']: row['seconds'] for row in rows}
+
+    def set_schedule_shift(self, shifts: Dict[int, tuple]) -> int:
+        from psycopg2.extras import Json
+        updated = 0
+        try:
+            with self.conn.cursor() as cur:
+                for task_id, (offset, jitter, next_run) in shifts.items():
+                    cur.execute("""
+                        UPDATE scheduled_tasks
+                        SET metadata = COALESCE(metadata, '{}') || %s,
+                            next_run_at = CASE
+                                WHEN %s::timestamptz IS NOT NULL AND locked_by IS NULL
+                                THEN %s::timestamptz
+                                ELSE next_run_at
+                            END
+                        WHERE id = %s
+                    """, (Json({'schedule_offset_seconds': offset,
+                                'schedule_jitter_seconds': jitter}),
+                          next_run, next_run, task_id))
+                    updated += cur.rowcount
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return updated
+
+    def count_tasks(self) -> int:
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM scheduled_tasks")
+            count = cur.fetchone()[0]
+        self.conn.rollback()
+        return count
+
+    def add_tasks(self, tasks: List[Dict]) -> Dict[str, int]:
+        from psycopg2.extras import Json
+        from admission_control import resource_class_of
+        from task_dag import add_dependency
+        task_ids = {}
+        try:
+            with self.conn.cursor() as cur:
+                for task in tasks:
+                    cur.execute("""
+                        INSERT INTO scheduled_tasks (
+                            task_name, task_type, description, command,
+                            schedule_type, cron_expression, interval_minutes,
+                            next_run_at, priority, timeout_seconds,
+                            requires_brain, resource_class, metadata
+                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        RETURNING id
+                    """, (
+                        task['task_name'],
+                        task['task_type'],
+                        task.get('description'),
+                        task['command'],
+                        task['schedule_type'],
+                        task.get('cron_expression'),
+                        task.get('interval_minutes'),
+                        task.get('next_run_at'),
+                        task.get('priority', 5),
+                        task.get('timeout_seconds', 300),
+                        task.get('requires_brain', False),
+                        resource_class_of(task),
+                        Json(task.get('metadata', {}))
+                    ))
+                    task_ids[task['task_name']] = cur.fetchone()[0]
+
+            for task in tasks:
+                for parent_name in task.get('depends_on', []):
+                    add_dependency(self.conn, task_ids[task['task_name']], task_ids[parent_name])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return task_ids
+
+    def _fetch(self, query: str, params=()) -> List[Dict]:
+        from psycopg2.extras import RealDictCursor
+        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+        self.conn.rollback()
+        return rows
+
+    def task_status(self) -> List[Dict]:
+        return self._fetch("""
+            SELECT
+                st.id,
+                st.task_name,
+                st.is_active,
+                st.last_run_at,
+                st.next_run_at,
+                st.schedule_type,
+                r.last_status,
+                r.total_executions,
+                r.successful_executions,
+                task_duration_percentile(r.duration_buckets, 0.95) as p95_execution_time_ms
+            FROM scheduled_tasks st
+            LEFT JOIN task_execution_rollups r ON r.task_id = st.id
+            ORDER BY st.priority DESC, st.created_at
+        """)
+
+    def recent_executions(self, limit: int = 10) -> List[Dict]:
+        return self._fetch("""
+            SELECT
+                te.id,
+                st.task_name,
+                te.status,
+                te.started_at,
+                te.completed_at,
+                te.execution_time_ms,
+                te.error
+            FROM task_executions te
+            JOIN scheduled_tasks st ON te.task_id = st.id
+            ORDER BY te.started_at DESC
+            LIMIT %s
+        """, (limit,))
+
+    def execution_stats(self, hours: int = 24) -> Dict[str, Any]:
+        return self._fetch("""
+            SELECT
+                COUNT(CASE WHEN status = 'success' THEN 1 END) as success,
+                COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed,
+                COUNT(CASE WHEN status = 'timeout' THEN 1 END) as timeout,
+                COUNT(*) as total,
+                AVG(execution_time_ms) FILTER (WHERE status = 'success') as avg_time,
+                MIN(execution_time_ms) FILTER (WHERE status = 'success') as min_time,
+                MAX(execution_time_ms) FILTER (WHERE status = 'success') as max_time
+            FROM task_executions
+            WHERE started_at > NOW() - make_interval(hours => %s)
+        """, (hours,))[0]
+
+
+class MemoryTaskStore(TaskStore):
+    """In-process task store: nothing survives a restart
+
+    Scheduled tasks sit in a heap keyed on next_run_at. Claiming moves the
+    ones that have come due into a ready heap ordered like the Postgres claim
+    (priority, then next_run_at). Rescheduling pushes a new entry and bumps
+    the task's version, so stale heap entries are skipped lazily.
+    """
+
+    kind = 'memory'
+
+    def __init__(self, worker_id: Optional[str] = None, lease_seconds: int = 600):
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.lock = threading.RLock()
+
+        self.tasks: Dict[int, Dict[str, Any]] = {}
+        self.executions: Dict[int, Dict[str, Any]] = {}
+        self.executions_by_task: Dict[int, List[int]] = {}
+        self.parents: Dict[int, Set[int]] = {}
+        self.children: Dict[int, Set[int]] = {}
+        self.locked: Set[int] = set()
+
+        self.scheduled: List[tuple] = []  # (next_run_at ts, seq, task_id, version)
+        self.ready: List[tuple] = []  # (-priority, next_run_at ts, seq, task_id, version)
+        self.versions: Dict[int, int] = {}
+        self.seq = itertools.count()
+        self.task_ids = itertools.count(1)
+        self.execution_ids = itertools.count(1)
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    def _schedule(self, task: Dict[str, Any]):
+        """(Re)queue a task under its current next_run_at"""
+        version = self.versions.get(task['id'], 0) + 1
+        self.versions[task['id']] = version
+        if (task['next_run_at'] is not None and task['is_active']
+                and task['status'] == 'active' and task['id'] not in self.locked):
+            heapq.heappush(self.scheduled, (task['next_run_at'].timestamp(), next(self.seq),
+                                            task['id'], version))
+
+    def _dependencies_met(self, task: Dict[str, Any]) -> bool:
+        last_run = task['last_run_at']
+        for parent_id in self.parents.get(task['id'], ()):
+            parent_success = self.tasks[parent_id]['last_success_at']
+            if parent_success is None or (last_run is not None and parent_success <= last_run):
+                return False
+        return True
+
+    def _promote_due(self, now_ts: float):
+        """Move tasks that have come due from the scheduled to the ready heap"""
+        while self.scheduled and self.scheduled[0][0] <= now_ts:
+            due_ts, seq, task_id, version = heapq.heappop(self.scheduled)
+            if self.versions.get(task_id) == version:
+                priority = self.tasks[task_id]['priority']
+                heapq.heappush(self.ready, (-priority, due_ts, seq, task_id, version))
+
+    def claim(self, batch_size: int = 10, exclude_types: Iterable[str] = (),
+              exclude_classes: Iterable[str] = ()) -> List[Dict]:
+        exclude_types, exclude_classes = set(exclude_types), set(exclude_classes)
+        with self.lock:
+            now = self._now()
+            self._recover_expired(now)
+            self._promote_due(now.timestamp())
+
+            claimed, skipped = [], []
+            while self.ready and len(claimed) < batch_size:
+                entry = heapq.heappop(self.ready)
+                task_id, version = entry[3], entry[4]
+                if self.versions.get(task_id) != version:
+                    continue
+                task = self.tasks[task_id]
+                if (task['task_type'] in exclude_types
+                        or task['resource_class'] in exclude_classes
+                        or not self._dependencies_met(task)):
+                    skipped.append(entry)
+                    continue
+
+                self._lease(task, now)
+                claimed.append(dict(task))
+
+            for entry in skipped:
+                heapq.heappush(self.ready, entry)
+            return claimed
+
+    def _claimable(self, task: Dict[str, Any], now: datetime) -> bool:
+        return (task['is_active'] and task['status'] == 'active'
+                and task['id'] not in self.locked
+                and task['next_run_at'] is not None and task['next_run_at'] <= now
+                and self._dependencies_met(task))
+
+    def due_candidates(self, per_type: int = 5, aging_seconds: float = 600,
+                       exclude_types: Iterable[str] = (),
+                       exclude_classes: Iterable[str] = ()) -> List[Dict]:
+        exclude_types, exclude_classes = set(exclude_types), set(exclude_classes)
+        with self.lock:
+            now = self._now()
+            self._recover_expired(now)
+            self._promote_due(now.timestamp())
+            by_type: Dict[str, List[Dict]] = {}
+            for entry in self.ready:
+                task_id, version = entry[3], entry[4]
+                task = self.tasks[task_id]
+                if (self.versions.get(task_id) != version or task['task_type'] in exclude_types
+                        or task['resource_class'] in exclude_classes
+                        or not self._claimable(task, now)):
+                    continue
+                lag = (now - task['next_run_at']).total_seconds()
+                by_type.setdefault(task['task_type'], []).append({
+                    'id': task_id,
+                    'task_name': task['task_name'],
+                    'task_type': task['task_type'],
+                    'priority': task['priority'],
+                    'next_run_at': task['next_run_at'],
+                    'lag_seconds': lag,
+                    'effective_priority': task['priority'] + lag / max(aging_seconds, 1),
+                })
+            candidates = []
+            for tasks in by_type.values():
+                tasks.sort(key=lambda t: (-t['effective_priority'], t['next_run_at']))
+                best = tasks[:per_type]
+                oldest = sorted(tasks[per_type:], key=lambda t: t['next_run_at'])[:per_type]
+                candidates.extend(best + oldest)
+            return candidates
+
+    def claim_ids(self, task_ids: List[int]) -> List[Dict]:
+        with self.lock:
+            now = self._now()
+            self._recover_expired(now)
+            claimed = []
+            for task_id in task_ids:
+                task = self.tasks.get(task_id)
+                if task is None or not self._claimable(task, now):
+                    continue
+                self._lease(task, now)
+                claimed.append(dict(task))
+            return claimed
+
+    def recent_dispatches(self, seconds: float) -> Dict[str, int]:
+        with self.lock:
+            since = self._now() - timedelta(seconds=seconds)
+            counts: Dict[str, int] = {}
+            for execution in self.executions.values():
+                if execution['started_at'] > since:
+                    task_type = self.tasks[execution['task_id']]['task_type']
+                    counts[task_type] = counts.get(task_type, 0) + 1
+            return counts
+
+    def _lease(self, task: Dict[str, Any], now: datetime):
+        """Lease a task to this worker; its heap entries become stale"""
+        task.update({
+            'locked_by': self.worker_id,
+            'locked_at': now,
+            'lease_expires_at': now + timedelta(seconds=max(
+                self.lease_seconds, (task['timeout_seconds'] or 300) + 60)),
+            'last_run_at': now,
+        })
+        self.locked.add(task['id'])
+        self.versions[task['id']] = self.versions.get(task['id'], 0) + 1
+
+    def heartbeat(self, task_ids: List[int]) -> int:
+        with self.lock:
+            updated = 0
+            extended = self._now() + timedelta(seconds=self.lease_seconds)
+            for task_id in task_ids:
+                task = self.tasks.get(task_id)
+                if task and task['locked_by'] == self.worker_id:
+                    task['lease_expires_at'] = max(task['lease_expires_at'], extended)
+                    updated += 1
+            return updated
+
+    def _unlock(self, task: Dict[str, Any]):
+        task.update({'locked_by': None, 'locked_at': None, 'lease_expires_at': None})
+        self.locked.discard(task['id'])
+        self._schedule(task)
+
+    def release(self, task_id: int):
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task and task['locked_by'] == self.worker_id:
+                self._unlock(task)
+
+    def recover_expired(self) -> int:
+        with self.lock:
+            return self._recover_expired(self._now())
+
+    def _recover_expired(self, now: datetime) -> int:
+        """Unlock tasks whose lease expired; claims call this too, since an
+        expired lease is claimable again (as in claim_pending_tasks)"""
+        recovered = 0
+        for task_id in list(self.locked):
+            task = self.tasks[task_id]
+            if task['lease_expires_at'] >= now:
+                continue
+            for execution_id in self.executions_by_task.get(task_id, ()):
+                execution = self.executions[execution_id]
+                if execution['status'] == 'running' and execution['started_at'] >= task['locked_at']:
+                    execution.update({
+                        'status': 'timeout',
+                        'completed_at': now,
+                        'error': f"Lease expired: worker {task['locked_by']} stopped heartbeating",
+                    })
+                    recovered += 1
+            self._unlock(task)
+        return recovered
+
+    def start_execution(self, task_id: int) -> int:
+        with self.lock:
+            execution_id = next(self.execution_ids)
+            self.executions[execution_id] = {
+                'id': execution_id,
+                'task_id': task_id,
+                'status': 'running',
+                'started_at': self._now(),
+                'completed_at': None,
+                'metadata': {'worker_id': self.worker_id},
+                **{field: None for field in EXECUTION_FIELDS if field != 'status'},
+            }
+            self.executions_by_task.setdefault(task_id, []).append(execution_id)
+            return execution_id
+
+    def _apply_task_update(self, task: Dict[str, Any], task_update: Dict[str, Any],
+                           succeeded: bool):
+        for field in TASK_UPDATE_FIELDS:
+            if field in task_update:
+                task[field] = task_update[field]
+        if succeeded:
+            task['last_success_at'] = self._now()
+        self._unlock(task)
+        if succeeded:
+            self._release_dependents(task)
+
+    def _release_dependents(self, parent: Dict[str, Any]):
+        """Make 'dependent' children whose parents have all succeeded due now"""
+        now = self._now()
+        for child_id in self.children.get(parent['id'], ()):
+            child = self.tasks[child_id]
+            if (child['schedule_type'] == 'dependent' and child['is_active']
+                    and child['status'] == 'active'
+                    and (child['next_run_at'] is None or child['next_run_at'] > now)
+                    and self._dependencies_met(child)):
+                child['next_run_at'] = now
+                if child_id not in self.locked:
+                    self._schedule(child)
+
+    def complete_execution(self, execution_id: int, result: Dict[str, Any],
+                           task_update: Dict[str, Any], succeeded: bool = False) -> bool:
+        with self.lock:
+            execution = self.executions[execution_id]
+            if execution['status'] != 'running':
+                # Already closed by lease recovery
+                logger.warning(f"Lost the lease behind execution {execution_id}; "
+                               f"leaving its task to the new owner")
+                return False
+            execution.update({field: result.get(field) for field in EXECUTION_FIELDS})
+            execution['completed_at'] = self._now()
+            execution['metadata'].update(result.get('metadata') or {})
+            return self._owned_update(execution['task_id'], task_update, succeeded)
+
+    def update_task(self, task_id: int, task_update: Dict[str, Any]) -> bool:
+        with self.lock:
+            return self._owned_update(task_id, task_update, False)
+
+    def _owned_update(self, task_id: int, task_update: Dict[str, Any], succeeded: bool) -> bool:
+        task = self.tasks[task_id]
+        if task['locked_by'] != self.worker_id:
+            logger.warning(f"Lost the lease on task {task_id}; leaving it to the new owner")
+            return False
+        self._apply_task_update(task, task_update, succeeded)
+        return True
+
+    def seconds_until_next_run(self) -> Optional[float]:
+        with self.lock:
+            now_ts = self._now().timestamp()
+            self._promote_due(now_ts)
+            while self.scheduled:
+                due_ts, _, task_id, version = self.scheduled[0]
+                if self.versions.get(task_id) == version:
+                    return due_ts - now_ts
+                heapq.heappop(self.scheduled)
+            return None
+
+    def overdue_tasks(self, before: datetime) -> List[Dict]:
+        with self.lock:
+            return sorted((dict(task) for task in self.tasks.values()
+                           if task['is_active'] and task['status'] == 'active'
+                           and task['schedule_type'] in ('recurring', 'cron')
+                           and task['id'] not in self.locked
+                           and task['next_run_at'] is not None
+                           and task['next_run_at'] < before),
+                          key=lambda task: task['next_run_at'])
+
+    def reschedule(self, updates: Dict[int, tuple]) -> int:
+        with self.lock:
+            updated = 0
+            for task_id, (previous, next_run) in updates.items():
+                task = self.tasks.get(task_id)
+                if task and task_id not in self.locked and task['next_run_at'] == previous:
+                    task['next_run_at'] = next_run
+                    self._schedule(task)
+                    updated += 1
+            return updated
+
+    def due_counts(self) -> Dict[str, int]:
+        now = self._now()
+        with self.lock:
+            counts: Dict[str, int] = {}
+            for task in self.tasks.values():
+                if (task['is_active'] and task['status'] == 'active'
+                        and task['id'] not in self.locked
+                        and task['next_run_at'] is not None and task['next_run_at'] <= now):
+                    counts[task['task_type']] = counts.get(task['task_type'], 0) + 1
+            return counts
+
+    def scheduled_tasks(self) -> List[Dict]:
+        with self.lock:
+            return [dict(task) for task in self.tasks.values()
+                    if task['is_active'] and task['status'] == 'active'
+                    and task['schedule_type'] in ('recurring', 'cron')]
+
+    def mean_durations(self) -> Dict[int, float]:
+        with self.lock:
+            durations: Dict[int, List[int]] = {}
+            for execution in self.executions.values():
+                if execution['execution_time_ms'] is not None:
+                    durations.setdefault(execution['task_id'], []).append(execution['execution_time_ms'])
+            return {task_id: sum(ms) / len(ms) / 1000 for task_id, ms in durations.items()}
+
+    def set_schedule_shift(self, shifts: Dict[int, tuple]) -> int:
+        with self.lock:
+            updated = 0
+            for task_id, (offset, jitter, next_run) in shifts.items():
+                task = self.tasks.get(task_id)
+                if task is None:
+                    continue
+                task['metadata'].update({'schedule_offset_seconds': offset,
+                                         'schedule_jitter_seconds': jitter})
+                if next_run is not None and task_id not in self.locked:
+                    task['next_run_at'] = next_run
+                    self._schedule(task)
+                updated += 1
+            return updated
+
+    def count_tasks(self) -> int:
+        return len(self.tasks)
+
+    def add_tasks(self, tasks: List[Dict]) -> Dict[str, int]:
+        from admission_control import resource_class_of
+        from task_dag import TaskDAG, CycleError
+        with self.lock:
+            now = self._now()
+            task_ids = {}
+            for spec in tasks:
+                task_id = next(self.task_ids)
+                self.tasks[task_id] = {
+                    'id': task_id,
+                    'task_name': spec['task_name'],
+                    'task_type': spec['task_type'],
+                    'description': spec.get('description'),
+                    'command': spec['command'],
+                    'schedule_type': spec['schedule_type'],
+                    'cron_expression': spec.get('cron_expression'),
+                    'interval_minutes': spec.get('interval_minutes'),
+                    'next_run_at': spec.get('next_run_at'),
+                    'last_run_at': None,
+                    'last_success_at': None,
+                    'status': 'active',
+                    'priority': spec.get('priority', 5),
+                    'max_retries': spec.get('max_retries', 3),
+                    'retry_count': 0,
+                    'timeout_seconds': spec.get('timeout_seconds', 300),
+                    'requires_brain': spec.get('requires_brain', False),
+                    'context_memory_ids': spec.get('context_memory_ids'),
+                    'resource_class': resource_class_of(spec),
+                    'metadata': dict(spec.get('metadata', {})),
+                    'created_at': now,
+                    'is_active': True,
+                    'locked_by': None,
+                    'locked_at': None,
+                    'lease_expires_at': None,
+                }
+                task_ids[spec['task_name']] = task_id
+
+            dag = TaskDAG((child, parent) for child, parents in self.parents.items()
+                          for parent in parents)
+            for spec in tasks:
+                child = task_ids[spec['task_name']]
+                for parent_name in spec.get('depends_on', []):
+                    parent = task_ids[parent_name]
+                    if dag.would_cycle(child, parent):
+                        raise CycleError(f"Task {child} depending on {parent} would create a cycle")
+                    dag.add_edge(child, parent)
+                    self.parents.setdefault(child, set()).add(parent)
+                    self.children.setdefault(parent, set()).add(child)
+
+            for task_id in task_ids.values():
+                self._schedule(self.tasks[task_id])
+            return task_ids
+
+    def task_status(self) -> List[Dict]:
+        with self.lock:
+            rows = []
+            for task in sorted(self.tasks.values(), key=lambda t: (-t['priority'], t['created_at'])):
+                finished = [self.executions[e] for e in self.executions_by_task.get(task['id'], ())
+                            if self.executions[e]['status'] != 'running']
+                durations = sorted(e['execution_time_ms'] for e in finished
+                                   if e['execution_time_ms'] is not None)
+                rows.append({
+                    'id': task['id'],
+                    'task_name': task['task_name'],
+                    'is_active': task['is_active'],
+                    'last_run_at': task['last_run_at'],
+                    'next_run_at': task['next_run_at'],
+                    'schedule_type': task['schedule_type'],
+                    'last_status': max(finished, key=lambda e: e['completed_at'])['status'] if finished else None,
+                    'total_executions': len(finished) if finished else None,
+                    'successful_executions': sum(e['status'] == 'success' for e in finished) if finished else None,
+                    'p95_execution_time_ms': durations[min(len(durations) - 1, int(0.95 * len(durations)))] if durations else None,
+                })
+            return rows
+
+    def recent_executions(self, limit: int = 10) -> List[Dict]:
+        with self.lock:
+            recent = sorted(self.executions.values(), key=lambda e: e['started_at'], reverse=True)[:limit]
+            return [{
+                'id': e['id'],
+                'task_name': self.tasks[e['task_id']]['task_name'],
+                'status': e['status'],
+                'started_at': e['started_at'],
+                'completed_at': e['completed_at'],
+                'execution_time_ms': e['execution_time_ms'],
+                'error': e['error'],
+            } for e in recent]
+
+    def execution_stats(self, hours: int = 24) -> Dict[str, Any]:
+        with self.lock:
+            since = self._now() - timedelta(hours=hours)
+            window = [e for e in self.executions.values() if e['started_at'] > since]
+            times = [e['execution_time_ms'] for e in window
+                     if e['status'] == 'success' and e['execution_time_ms'] is not None]
+            return {
+                'success': sum(e['status'] == 'success' for e in window),
+                'failed': sum(e['status'] == 'failed' for e in window),
+                'timeout': sum(e['status'] == 'timeout' for e in window),
+                'total': len(window),
+                'avg_time': sum(times) / len(times) if times else None,
+                'min_time': min(times) if times else None,
+                'max_time': max(times) if times else None,
+            }
+
+
+def initialize_from_templates(store: TaskStore) -> int:
+    """Load the task templates into an empty store; returns how many were added"""
+    from cron_expression import next_run_time, schedule_shift
+    from task_templates import TaskTemplates
+    if store.count_tasks():
+        return 0
+
+    tasks = []
+    for template in TaskTemplates.get_all_templates():
+        # Calculate initial next_run_at (dependent tasks wait for parents)
+        offset, _ = schedule_shift(template)
+        next_run = next_run_time(
+            template['schedule_type'],
+            template.get('cron_expression'),
+            template.get('interval_minutes'),
+            offset_seconds=offset
+        )
+        if next_run is None and template['schedule_type'] != 'dependent':
+            next_run = datetime.now().astimezone()
+        tasks.append({**template, 'next_run_at': next_run})
+    store.add_tasks(tasks)
+    return len(tasks)
+
+
+def get_task_store(kind: Optional[str] = None, **kwargs) -> TaskStore:
+    """Store selected by kind or TASK_STORE (default postgres)"""
+    kind = kind or os.environ.get('TASK_STORE', 'postgres')
+    if kind == 'memory':
+        return MemoryTaskStore(**kwargs)
+    if kind == 'postgres':
+        return PostgresTaskStore(**kwargs)
+    raise ValueError(f"Unknown task store: {kind}")
@@ -31,6 +31,7 @@ Format the response as:
                 'cron_expression': '0 6 * * *',  # 6 AM daily
                 'requires_brain': True,
                 'priority': 9,
+                'resource_class': 'network',
                 'timeout_seconds': 300
             },
             {
@@ -45,6 +46,7 @@ Provide a brief status update and any necessary goal modifications.''',
                 'cron_expression': '0 12 * * *',  # Noon daily
                 'requires_brain': True,
                 'priority': 7,
+                'resource_class': 'network',
                 'timeout_seconds': 180
             },
             {
@@ -59,6 +61,7 @@ Create a preliminary focus for tomorrow based on today's progress.''',
                 'cron_expression': '0 21 * * *',  # 9 PM daily
                 'requires_brain': True,
                 'priority': 8,
+                'resource_class': 'network',
                 'timeout_seconds': 300
             },
             {
@@ -75,6 +78,7 @@ Store this as a daily memory with high importance.''',
                 'cron_expression': '0 23 * * *',  # 11 PM daily
                 'requires_brain': True,
                 'priority': 7,
+                'resource_class': 'network',
                 'timeout_seconds': 300
             }
         ]
@@ -95,6 +99,7 @@ Focus on actionable patterns that can improve future performance.''',
                 'interval_minutes': 60,  # Every hour
                 'requires_brain': True,
                 'priority': 6,
+                'resource_class': 'memory-heavy',
                 'timeout_seconds': 300
             },
             {
@@ -109,6 +114,7 @@ Clean up redundant or low-value memories.''',
                 'cron_expression': '0 22 * * *',  # 10 PM daily
                 'requires_brain': True,
                 'priority': 6,
+                'resource_class': 'memory-heavy',
                 'timeout_seconds': 300
             },
             {
@@ -123,6 +129,7 @@ Create memories capturing key insights and questions for further exploration.'''
                 'interval_minutes': 240,  # Every 4 hours
                 'requires_brain': True,
                 'priority': 5,
+                'resource_class': 'browser',
                 'timeout_seconds': 1800  # 30 minutes
             }
         ]
@@ -144,8 +151,11 @@ Output format: Just the tweet text, nothing else.''',
                 'cron_expression': '0 8 * * *',  # 8 AM daily
                 'requires_brain': False,
                 'priority': 5,
+                'resource_class': 'network',
                 'timeout_seconds': 120,
-                'metadata': {'auto_post': True}
+                # A tweet hours late reads oddly, so skip it after an outage
+                'metadata': {'auto_post': True, 'misfire_policy': 'skip_stale',
+                             'misfire_grace_seconds': 7200}
             },
             {
                 'task_name': 'Afternoon Insight Tweet',
@@ -159,8 +169,10 @@ Output format: Just the tweet text, nothing else.''',
                 'cron_expression': '0 14 * * *',  # 2 PM daily
                 'requires_brain': False,
                 'priority': 5,
+                'resource_class': 'network',
                 'timeout_seconds': 120,
-                'metadata': {'auto_post': True}
+                'metadata': {'auto_post': True, 'misfire_policy': 'skip_stale',
+                             'misfire_grace_seconds': 7200}
             },
             {
                 'task_name': 'Twitter Engagement Check',
@@ -174,6 +186,7 @@ Note: Actual posting will be done by a separate process.''',
                 'interval_minutes': 120,  # Every 2 hours
                 'requires_brain': True,
                 'priority': 4,
+                'resource_class': 'browser',
                 'timeout_seconds': 300
             }
         ]
@@ -195,8 +208,12 @@ Create a brief market summary with actionable insights.''',
                 'interval_minutes': 30,  # Every 30 minutes during market hours
                 'requires_brain': True,
                 'priority': 7,
+                'resource_class': 'network',
                 'timeout_seconds': 300,
-                'metadata': {'market_hours_only': False}
+                # The TTL spans one interval but not two, so every other run
+                # reuses the previous summary: ~50% hit rate, summaries at most
+                # 55 minutes old, plus hits on run-now (see result_cache.py)
+                'metadata': {'market_hours_only': False, 'cache_ttl_seconds': 3300}
             },
             {
                 'task_name': 'Portfolio Performance Review',
@@ -211,6 +228,7 @@ Store significant findings as financial memories.''',
                 'interval_minutes': 60,  # Every hour
                 'requires_brain': True,
                 'priority': 6,
+                'resource_class': 'network',
                 'timeout_seconds': 300
             },
             {
@@ -227,6 +245,7 @@ Store as a financial memory with high importance.''',
                 'cron_expression': '0 20 * * *',  # 8 PM daily
                 'requires_brain': True,
                 'priority': 7,
+                'resource_class': 'network',
                 'timeout_seconds': 300
             }
         ]
@@ -249,6 +268,7 @@ Flag any concerning metrics that need attention.''',
                 'interval_minutes': 5,  # Every 5 minutes
                 'requires_brain': False,
                 'priority': 3,
+                'resource_class': 'network',
                 'timeout_seconds': 60
             },
             {
@@ -265,6 +285,7 @@ Recommend specific cleanup actions if disk space < 20GB free.''',
                 'interval_minutes': 360,  # Every 6 hours
                 'requires_brain': False,
                 'priority': 4,
+                'resource_class': 'cpu-heavy',
                 'timeout_seconds': 120
             },
             {
@@ -281,6 +302,7 @@ Report any anomalies found.''',
                 'interval_minutes': 240,  # Every 4 hours
                 'requires_brain': False,
                 'priority': 6,
+                'resource_class': 'cpu-heavy',
                 'timeout_seconds': 180
             }
         ]
@@ -304,6 +326,7 @@ Suggest trait adjustments for optimal performance and growth.''',
                 'cron_expression': '0 22 * * *',  # 10 PM daily
                 'requires_brain': True,
                 'priority': 5,
+                'resource_class': 'network',
                 'timeout_seconds': 300
             },
             {
@@ -319,6 +342,7 @@ Update goal-related memories with current status.''',
                 'cron_expression': '0 21 * * 0',  # 9 PM every Sunday
                 'requires_brain': True,
                 'priority': 7,
+                'resource_class': 'network',
                 'timeout_seconds': 300
             },
             {
@@ -335,6 +359,7 @@ Create a skill development plan for the coming week.''',
                 'cron_expression': '0 10 * * 1',  # 10 AM every Monday
                 'requires_brain': True,
                 'priority': 6,
+                'resource_class': 'network',
                 'timeout_seconds': 300
             }
         ]
@@ -359,7 +384,10 @@ Only execute trades that meet all criteria for safety and strategy.''',
                 'interval_minutes': 60,  # Every hour
                 'requires_brain': True,
                 'priority': 8,
-                'timeout_seconds': 300
+                'resource_class': 'network',
+                'timeout_seconds': 300,
+                # Trade signals go stale; don't trade on an hours-old slot
+                'metadata': {'misfire_policy': 'skip_stale', 'misfire_grace_seconds': 900}
             },
             {
                 'task_name': 'Portfolio Rebalancing Check',
@@ -376,6 +404,7 @@ If rebalancing is needed, create specific action items.''',
                 'interval_minutes': 240,  # Every 4 hours
                 'requires_brain': True,
                 'priority': 7,
+                'resource_class': 'network',
                 'timeout_seconds': 300
             },
             {
@@ -393,6 +422,7 @@ Store risk metrics as financial memories.''',
                 'cron_expression': '0 16 * * *',  # 4 PM daily
                 'requires_brain': True,
                 'priority': 7,
+                'resource_class': 'network',
                 'timeout_seconds': 300
             }
         ]
@@ -415,6 +445,7 @@ Create timestamped backups and verify integrity.''',
                 'cron_expression': '0 2 * * *',  # 2 AM daily
                 'requires_brain': False,
                 'priority': 6,
+                'resource_class': 'cpu-heavy',
                 'timeout_seconds': 600
             },
             {
@@ -432,6 +463,7 @@ Report space saved and any issues found.''',
                 'cron_expression': '0 3 * * *',  # 3 AM daily
                 'requires_brain': False,
                 'priority': 4,
+                'resource_class': 'cpu-heavy',
                 'timeout_seconds': 300
             },
             {
@@ -449,6 +481,7 @@ Focus on /Users/claudemini/Claude/ and subdirectories.''',
                 'interval_minutes': 60,  # Every hour
                 'requires_brain': False,
                 'priority': 3,
+                'resource_class': 'cpu-heavy',
                 'timeout_seconds': 180
             }
         ]
@@ -472,6 +505,7 @@ Report any anomalies or security concerns.''',
                 'interval_minutes': 30,  # Every 30 minutes
                 'requires_brain': False,
                 'priority': 5,
+                'resource_class': 'network',
                 'timeout_seconds': 120
             },
             {
@@ -489,6 +523,7 @@ Take immediate action if threats are detected.''',
                 'interval_minutes': 120,  # Every 2 hours
                 'requires_brain': True,
                 'priority': 9,
+                'resource_class': 'network',
                 'timeout_seconds': 300
             }
         ]
@@ -512,6 +547,7 @@ Focus on productivity, development, and automation tools.''',
                 'cron_expression': '0 10 * * 0',  # 10 AM every Sunday
                 'requires_brain': True,
                 'priority': 5,
+                'resource_class': 'browser',
                 'timeout_seconds': 600
             },
             {
@@ -529,6 +565,7 @@ Store tool evaluations as memories for future reference.''',
                 'cron_expression': '0 14 * * 0',  # 2 PM every Sunday
                 'requires_brain': True,
                 'priority': 4,
+                'resource_class': 'cpu-heavy',
                 'timeout_seconds': 900
             },
             {
@@ -546,6 +583,7 @@ Focus on tasks that consume significant time or effort.''',
                 'cron_expression': '0 16 * * 0',  # 4 PM every Sunday
                 'requires_brain': True,
                 'priority': 6,
+                'resource_class': 'network',
                 'timeout_seconds': 600
             }
         ]
@@ -569,6 +607,7 @@ Focus on actionable insights and practical applications.''',
                 'cron_expression': '0 19 * * 0',  # 7 PM every Sunday
                 'requires_brain': True,
                 'priority': 6,
+                'resource_class': 'memory-heavy',
                 'timeout_seconds': 900
             },
             {
@@ -586,6 +625,7 @@ Focus on topics that provide value to followers.''',
                 'cron_expression': '0 18 * * 3',  # 6 PM every Wednesday
                 'requires_brain': True,
                 'priority': 5,
+                'resource_class': 'network',
                 'timeout_seconds': 600
             },
             {
@@ -603,8 +643,10 @@ Output format: Just the tweet text, nothing else.''',
                 'cron_expression': '0 20 * * *',  # 8 PM daily
                 'requires_brain': True,
                 'priority': 5,
+                'resource_class': 'network',
                 'timeout_seconds': 120,
-                'metadata': {'auto_post': True}
+                'metadata': {'auto_post': True, 'misfire_policy': 'skip_stale',
+                             'misfire_grace_seconds': 7200}
             }
         ]
     
@@ -627,6 +669,7 @@ Only take action on clear performance issues.''',
                 'interval_minutes': 15,  # Every 15 minutes
                 'requires_brain': False,
                 'priority': 6,
+                'resource_class': 'network',
                 'timeout_seconds': 180
             },
             {
@@ -644,6 +687,7 @@ Focus on events that affect system stability or performance.''',
                 'interval_minutes': 60,  # Every hour
                 'requires_brain': True,
                 'priority': 5,
+                'resource_class': 'network',
                 'timeout_seconds': 300
             },
             {
@@ -661,6 +705,7 @@ Focus on problems that occur frequently or impact productivity.''',
                 'cron_expression': '0 22 * * 6',  # 10 PM every Saturday
                 'requires_brain': True,
                 'priority': 7,
+                'resource_class': 'network',
                 'timeout_seconds': 900
             }
         ]
@@ -684,6 +729,7 @@ Focus on accounts that match current learning interests and goals.''',
                 'cron_expression': '0 15 * * 2',  # 3 PM every Tuesday
                 'requires_brain': True,
                 'priority': 4,
+                'resource_class': 'browser',
                 'timeout_seconds': 600
             },
             {
@@ -701,7 +747,61 @@ Focus on content that aligns with interests and adds value.''',
                 'cron_expression': '0 16 * * 1,3,5',  # 4 PM Mon, Wed, Fri
                 'requires_brain': True,
                 'priority': 4,
+                'resource_class': 'browser',
+                'timeout_seconds': 300
+            }
+        ]
+    
+    @staticmethod
+    def pipeline_tasks() -> List[Dict]:
+        """Multi-step pipelines; 'dependent' tasks run as soon as all of
+        their depends_on parents have succeeded"""
+        return [
+            {
+                'task_name': 'Market Pipeline - Market Analysis',
+                'task_type': 'financial_monitoring',
+                'description': 'Morning market analysis that feeds the portfolio review',
+                'command': '''Analyze overnight cryptocurrency market movements.
+Summarize major price moves, volume changes and sentiment shifts.
+Highlight anything relevant to currently held positions.
+Store the summary as a financial memory for the portfolio review.''',
+                'schedule_type': 'cron',
+                'cron_expression': '0 9 * * *',  # 9 AM daily
+                'requires_brain': True,
+                'priority': 7,
+                'resource_class': 'network',
+                'timeout_seconds': 300
+            },
+            {
+                'task_name': 'Market Pipeline - Portfolio Review',
+                'task_type': 'financial_monitoring',
+                'description': 'Review the portfolio against the morning market analysis',
+                'command': '''Review portfolio positions against this morning's market analysis.
+Search memories for the latest market summary.
+Flag positions that drifted from target allocations or carry elevated risk.
+Store key findings as financial memories.''',
+                'schedule_type': 'dependent',
+                'depends_on': ['Market Pipeline - Market Analysis'],
+                'requires_brain': True,
+                'priority': 7,
+                'resource_class': 'network',
                 'timeout_seconds': 300
+            },
+            {
+                'task_name': 'Market Pipeline - Market Update Tweet',
+                'task_type': 'social_media',
+                'description': 'Tweet a market update once the portfolio review is done',
+                'command': '''Create a tweet summarizing today's market view.
+Search memories for this morning's market analysis and portfolio review.
+Share a general market insight, never specific holdings or amounts.
+Output format: Just the tweet text, nothing else.''',
+                'schedule_type': 'dependent',
+                'depends_on': ['Market Pipeline - Portfolio Review'],
+                'requires_brain': False,
+                'priority': 5,
+                'resource_class': 'network',
+                'timeout_seconds': 120,
+                'metadata': {'auto_post': True}
             }
         ]
     
@@ -722,6 +822,7 @@ Focus on content that aligns with interests and adds value.''',
         templates.extend(TaskTemplates.content_creation_tasks())
         templates.extend(TaskTemplates.environmental_response_tasks())
         templates.extend(TaskTemplates.enhanced_social_media_tasks())
+        templates.extend(TaskTemplates.pipeline_tasks())
         return templates
     
     @staticmethod
@@ -764,9 +865,12 @@ def main():
                 print(f"({template['cron_expression']})")
             elif template['schedule_type'] == 'recurring':
                 print(f"(every {template['interval_minutes']} minutes)")
+            elif template['schedule_type'] == 'dependent':
+                print(f"(after {', '.join(template['depends_on'])})")
             else:
                 print()
             print(f"  Priority: {template['priority']}")
+            print(f"  Resource class: {template['resource_class']}")
             print(f"  Uses Brain: {template.get('requires_brain', False)}")
             print()
 
@@ -0,0 +1,71 @@
+"""Tests for the resource-class admission control in admission_control.py"""
+
+import pytest
+
+from admission_control import AdmissionController
+
+IDLE = {'cpu': 5.0, 'memory': 30.0, 'load': 0.1}
+
+
+class FakeClaimer:
+    """Hands out tasks of one resource class unless that class is excluded"""
+
+    def __init__(self, resource_class):
+        self.resource_class = resource_class
+        self.next_id = 0
+
+    def claim(self, limit, exclude_types=(), exclude_classes=()):
+        if self.resource_class in exclude_classes:
+            return []
+        tasks = []
+        for _ in range(limit):
+            self.next_id += 1
+            tasks.append({'id': self.next_id, 'resource_class': self.resource_class})
+        return tasks
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = AdmissionController(thresholds={})
+    controller.cpu_count = 8  # Make CPU percent, not load per core, the binding limit
+    monkeypatch.setattr(controller, 'sample', lambda: dict(IDLE))
+    return controller
+
+
+def test_sequential_runs_on_an_idle_host_are_never_deferred(controller):
+    claimer = FakeClaimer('cpu-heavy')
+    for _ in range(100):
+        tasks = controller.claim(claimer, 1)
+        assert len(tasks) == 1
+        controller.finished(tasks[0]['id'])
+    assert controller.deferred == []
+    assert controller.recent == {}
+
+
+def test_running_tasks_count_until_they_finish(controller):
+    claimer = FakeClaimer('cpu-heavy')
+    running = controller.claim(claimer, 10)
+    # cpu-heavy costs 25% CPU each against a 75% ceiling
+    assert len(running) == 2
+    assert controller.claim(claimer, 1) == []
+    assert 'cpu-heavy' in controller.deferred
+
+    controller.finished(running[0]['id'])
+    assert len(controller.claim(claimer, 1)) == 1
+
+
+def test_costs_expire_after_the_settle_window(controller, monkeypatch):
+    claimer = FakeClaimer('cpu-heavy')
+    controller.claim(claimer, 10)
+    assert controller.claim(claimer, 1) == []
+
+    controller.settle_seconds = 0
+    assert len(controller.claim(claimer, 1)) == 1
+
+
+def test_finishing_a_settled_or_unknown_task_is_harmless(controller):
+    token = controller.admitted({'resource_class': 'network'})
+    controller.finished(token)
+    controller.finished(token)
+    controller.finished(12345)
+    assert controller.recent == {}
@@ -0,0 +1,101 @@
+"""Tests for the mmap'd cross-process breakers in circuit_breaker.py"""
+
+import struct
+import threading
+import time
+
+import pytest
+
+from circuit_breaker import (BreakerRegistry, CircuitBreaker, CircuitOpenError, CLOSED, OPEN,
+                             SLOT_SIZE)
+
+
+@pytest.fixture
+def registry_file(tmp_path):
+    return tmp_path / ".circuit_breakers"
+
+
+def make_breaker(registry_file, **kwargs):
+    options = {'failure_threshold': 2, 'recovery_timeout': 0.2}
+    options.update(kwargs)
+    return CircuitBreaker('api', registry=BreakerRegistry(registry_file), **options)
+
+
+def test_opens_after_threshold_and_probes_after_timeout(registry_file):
+    breaker = make_breaker(registry_file)
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: None)
+
+    time.sleep(0.25)
+    assert breaker.allow()
+    assert breaker.state == 'half-open'
+    assert not breaker.allow()  # Only one probe at a time
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+
+def test_state_is_shared_between_registries(registry_file):
+    first = make_breaker(registry_file)
+    second = make_breaker(registry_file)
+    first.record_failure()
+    first.record_failure()
+    assert second.state == 'open'
+    second.reset()
+    assert first.allow()
+
+
+def test_slot_left_mid_write_is_repaired_not_spun_on(registry_file):
+    breaker = make_breaker(registry_file)
+    breaker.record_failure()
+    breaker.record_failure()
+    registry = breaker.registry
+
+    # A writer killed between its two seq bumps leaves the seq odd
+    offset = breaker.slot * SLOT_SIZE
+    seq = struct.unpack_from('<I', registry.map, offset)[0]
+    struct.pack_into('<I', registry.map, offset, seq + 1)
+
+    other = make_breaker(registry_file)
+    start = time.monotonic()
+    assert other.allow()
+    assert time.monotonic() - start < 5
+    assert struct.unpack_from('<I', registry.map, offset)[0] % 2 == 0
+    assert registry.read(breaker.slot)[0] == CLOSED
+
+
+def test_repair_under_an_existing_lock(registry_file):
+    breaker = make_breaker(registry_file)
+    offset = breaker.slot * SLOT_SIZE
+    seq = struct.unpack_from('<I', breaker.registry.map, offset)[0]
+    struct.pack_into('<I', breaker.registry.map, offset, seq + 1)
+    breaker.record_failure()  # Reads the slot while holding the lock
+    assert breaker.registry.read(breaker.slot)[1] == 1
+
+
+def test_threads_sharing_a_registry_do_not_lose_failures(registry_file):
+    breaker = make_breaker(registry_file, failure_threshold=10 ** 6)
+
+    def fail():
+        for _ in range(200):
+            breaker.record_failure()
+
+    threads = [threading.Thread(target=fail) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    state, failures, _, _ = breaker.registry.read(breaker.slot)
+    assert (state, failures) == (CLOSED, 800)
+
+
+def test_failure_opens_from_half_open(registry_file):
+    breaker = make_breaker(registry_file, failure_threshold=1)
+    breaker.record_failure()
+    time.sleep(0.25)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.registry.read(breaker.slot)[0] == OPEN
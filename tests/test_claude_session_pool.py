@@ -0,0 +1,71 @@
+"""Tests for the single-use sessions of claude_session_pool.py"""
+
+import os
+import sys
+import time
+
+import pytest
+
+from claude_session_pool import ClaudeSessionPool
+
+# Answers every prompt with its pid and how many prompts it has seen
+FAKE_CLAUDE = f"""#!{sys.executable}
+import json, os, sys
+seen = 0
+for line in sys.stdin:
+    seen += 1
+    print(json.dumps({{"type": "result", "subtype": "success",
+                      "result": f"{{os.getpid()}}:{{seen}}"}}), flush=True)
+"""
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    claude = tmp_path / "claude"
+    claude.write_text(FAKE_CLAUDE)
+    claude.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    pool = ClaudeSessionPool(size=1, cwd=str(tmp_path))
+    yield pool
+    pool.shutdown()
+
+
+def wait_for_idle(pool, timeout=10):
+    deadline = time.time() + timeout
+    while pool.idle.empty():
+        assert time.time() < deadline, "replacement session never started"
+        time.sleep(0.05)
+
+
+def test_each_prompt_gets_a_fresh_session(pool):
+    pool.warm()
+    outputs = []
+    for _ in range(3):
+        result = pool.execute("hello", timeout=10)
+        assert result['status'] == 'success'
+        outputs.append(result['output'])
+        wait_for_idle(pool)
+
+    pids = [output.split(':')[0] for output in outputs]
+    assert [output.split(':')[1] for output in outputs] == ['1', '1', '1']
+    assert len(set(pids)) == 3
+
+
+def test_replacement_is_spawned_while_the_prompt_runs(pool):
+    pool.warm()
+    session = pool.acquire(timeout=5)
+    # The checked-out session no longer occupies a slot; its successor is starting
+    wait_for_idle(pool)
+    assert session not in pool.sessions
+    assert len(pool.sessions) == 1
+    pool.release(session)
+    assert not session.is_alive()
+
+
+def test_multi_use_sessions_keep_their_slot(pool):
+    pool.max_uses = 2
+    pool.warm()
+    first = pool.execute("a", timeout=10)['output']
+    second = pool.execute("b", timeout=10)['output']
+    assert first.split(':')[0] == second.split(':')[0]
+    assert second.endswith(':2')
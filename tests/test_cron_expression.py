@@ -0,0 +1,150 @@
+"""Tests for the bitset cron engine in cron_expression.py"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from cron_expression import CronExpression, compile_cron, is_cron_expression, next_run_time
+
+RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def reference_values(spec, low, high):
+    """Naive set of values for one numeric cron field"""
+    values = set()
+    for item in spec.split(','):
+        base, _, step = item.partition('/')
+        step = int(step) if step else 1
+        if base == '*':
+            start, end = low, high
+        elif '-' in base:
+            start, end = (int(v) for v in base.split('-'))
+        else:
+            start = int(base)
+            end = high if step > 1 else start
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def reference_next(expression, after):
+    """Scan day by day, then minute by minute, using plain datetime arithmetic"""
+    parts = expression.split()
+    minutes, hours, days, months, weekdays = (
+        reference_values(part, low, high) for part, (low, high) in zip(parts, RANGES))
+    weekdays = {d % 7 for d in weekdays}
+    day_any, weekday_any = parts[2].startswith('*'), parts[4].startswith('*')
+
+    start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    day = start.replace(hour=0, minute=0)
+    for _ in range(366 * 9):
+        cron_weekday = (day.weekday() + 1) % 7
+        dom, dow = day.day in days, cron_weekday in weekdays
+        if day_any or weekday_any:
+            day_ok = dom and dow
+        else:
+            day_ok = dom or dow
+        if day.month in months and day_ok:
+            for hour in sorted(hours):
+                for minute in sorted(minutes):
+                    candidate = day.replace(hour=hour, minute=minute)
+                    if candidate >= start:
+                        return candidate
+        day += timedelta(days=1)
+    return None
+
+
+def random_field(rng, low, high):
+    kind = rng.random()
+    if kind < 0.3:
+        return '*'
+    if kind < 0.45:
+        return f"*/{rng.randint(2, max(2, (high - low) // 2))}"
+    if kind < 0.65:
+        a = rng.randint(low, high)
+        b = rng.randint(a, high)
+        return f"{a}-{b}" if rng.random() < 0.5 else f"{a}-{b}/{rng.randint(1, 3)}"
+    items = sorted(rng.sample(range(low, high + 1), rng.randint(1, 3)))
+    return ','.join(str(v) for v in items)
+
+
+def test_matches_reference_on_random_expressions():
+    rng = random.Random(4)
+    checked = 0
+    while checked < 400:
+        expression = ' '.join(random_field(rng, low, high) for low, high in RANGES)
+        after = datetime(2024, 1, 1) + timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60))
+        expected = reference_next(expression, after)
+        if expected is None:
+            with pytest.raises(ValueError):
+                compile_cron(expression).next_fire(after)
+            continue
+        cron = CronExpression(expression)
+        assert cron.next_fire(after) == expected, (expression, after)
+        assert cron.matches(expected)
+        checked += 1
+
+
+def test_day_of_month_or_day_of_week_when_both_restricted():
+    # The 13th, or any Friday
+    cron = compile_cron('0 9 13 * 5')
+    times = cron.next_fire_times(datetime(2024, 9, 1), 4)
+    assert times == [datetime(2024, 9, 6, 9), datetime(2024, 9, 13, 9),
+                     datetime(2024, 9, 20, 9), datetime(2024, 9, 27, 9)]
+    assert cron.next_fire(datetime(2024, 10, 12)) == datetime(2024, 10, 13, 9)
+
+
+def test_only_restricted_day_field_counts():
+    assert compile_cron('0 0 * * 1').next_fire(datetime(2024, 9, 3)) == datetime(2024, 9, 9)
+    assert compile_cron('0 0 15 * *').next_fire(datetime(2024, 9, 3)) == datetime(2024, 9, 15)
+
+
+def test_starred_step_day_field_is_intersected_with_weekdays():
+    # "*/7" counts as unrestricted, so days 1, 8, 15, ... must also be Wednesdays
+    assert compile_cron('0 0 */7 * 3').next_fire(datetime(2024, 9, 3)) == datetime(2025, 1, 1)
+
+
+def test_sunday_is_zero_or_seven():
+    after = datetime(2024, 9, 2)  # A Monday
+    assert compile_cron('30 6 * * 7').next_fire(after) == datetime(2024, 9, 8, 6, 30)
+    assert compile_cron('30 6 * * 0').next_fire(after) == datetime(2024, 9, 8, 6, 30)
+    assert compile_cron('0 0 * * sun').weekdays == compile_cron('0 0 * * 7').weekdays == 1
+    assert compile_cron('0 0 * * 5-7').next_fire(after) == datetime(2024, 9, 6)
+
+
+def test_february_29_only_in_leap_years():
+    cron = compile_cron('0 12 29 2 *')
+    assert cron.next_fire(datetime(2024, 3, 1)) == datetime(2028, 2, 29, 12)
+    assert cron.next_fire(datetime(2023, 6, 1)) == datetime(2024, 2, 29, 12)
+
+
+def test_expression_that_never_fires():
+    with pytest.raises(ValueError):
+        compile_cron('0 0 30 2 *').next_fire(datetime(2024, 1, 1))
+
+
+@pytest.mark.parametrize('expression', ['* * * *', '60 * * * *', '* * 0 * *', '*/0 * * * *',
+                                        '5-1 * * * *', '* * * foo *'])
+def test_invalid_expressions(expression):
+    assert not is_cron_expression(expression)
+
+
+def test_aliases_and_names():
+    assert compile_cron('@hourly').next_fire(datetime(2024, 1, 1, 10, 5)) == datetime(2024, 1, 1, 11)
+    assert compile_cron('0 0 1 jan-mar *').next_fire(datetime(2024, 3, 2)) == datetime(2025, 1, 1)
+
+
+def test_aware_input_returns_aware_result():
+    after = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+    fire = compile_cron('*/15 * * * *').next_fire(after)
+    assert fire.tzinfo is not None
+    assert timedelta(0) < fire - after <= timedelta(minutes=15)
+
+
+def test_next_run_time_applies_offset_and_never_returns_past():
+    last_run = datetime.now().astimezone() - timedelta(days=3)
+    fire = next_run_time('cron', '0 * * * *', None, last_run, offset_seconds=600)
+    assert fire > datetime.now().astimezone()
+    assert fire.minute == 10
+    assert next_run_time('recurring', None, 30, last_run) == last_run + timedelta(minutes=30)
+    assert next_run_time('once', None, None, last_run) is None
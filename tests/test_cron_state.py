@@ -0,0 +1,99 @@
+"""Tests for CronScheduler's write-behind state in cron_state.py"""
+
+import json
+
+import pytest
+
+import cron_state
+from cron_state import CronState, load_history
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cron_state.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def table():
+    return {'tasks': [{'name': 'backup', 'last_status': None}]}
+
+
+@pytest.fixture
+def state(tmp_path, clock, table):
+    return CronState(tmp_path / "cron_tasks.json", lambda: table, flush_interval=30)
+
+
+def read(path):
+    return json.loads(path.read_text())
+
+
+def test_updates_inside_the_flush_interval_are_debounced(state, clock, table):
+    for status in ('success', 'failed', 'success'):
+        table['tasks'][0]['last_status'] = status
+        state.mark_dirty()
+        assert state.flush() is False
+        clock.now += 5
+    assert not state.tasks_file.exists()
+
+    clock.now += 15
+    assert state.flush() is True
+    assert state.writes == 1
+    assert read(state.tasks_file)['tasks'][0]['last_status'] == 'success'
+    assert state.flush() is False  # Nothing changed since
+
+
+def test_flush_replaces_the_file_and_keeps_it_intact_on_failure(state, table, monkeypatch):
+    assert state.flush(force=True) is False  # Nothing to write yet
+    state.mark_dirty()
+    assert state.flush(force=True) is True
+    before = state.tasks_file.read_text()
+
+    dump = json.dump
+    failures = []
+
+    def fail_midway_once(data, f, **kwargs):
+        if failures:
+            return dump(data, f, **kwargs)
+        failures.append(f.name)
+        f.write('{"tasks": [')
+        raise ValueError("disk full")
+
+    monkeypatch.setattr(cron_state.json, 'dump', fail_midway_once)
+    table['tasks'][0]['last_status'] = 'failed'
+    state.mark_dirty()
+    assert state.flush(force=True) is False
+    assert failures == [str(state.tasks_file) + '.tmp']
+    assert state.tasks_file.read_text() == before
+    assert state.tasks_dirty  # Still pending for the next flush
+
+    assert state.flush(force=True) is True
+    assert read(state.tasks_file)['tasks'][0]['last_status'] == 'failed'
+
+
+def test_forced_flush_on_shutdown_persists_pending_history(state, table):
+    state.record_run('backup', {'status': 'success', 'start_lag_seconds': 0.4})
+    assert state.flush() is False  # Inside the interval
+    assert state.flush(force=True) is True
+
+    assert load_history(state.history_file) == {
+        'backup': [{'status': 'success', 'start_lag_seconds': 0.4}]}
+    reloaded = CronState(state.tasks_file, lambda: table, history_size=2)
+    assert reloaded.runs('backup') == [{'status': 'success', 'start_lag_seconds': 0.4}]
+
+
+def test_history_is_a_bounded_ring_per_task(tmp_path, clock, table):
+    state = CronState(tmp_path / "cron_tasks.json", lambda: table, history_size=3)
+    for n in range(5):
+        state.record_run('backup', {'n': n})
+    state.flush(force=True)
+    assert [run['n'] for run in load_history(state.history_file)['backup']] == [2, 3, 4]
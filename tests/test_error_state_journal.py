@@ -0,0 +1,114 @@
+"""Tests for the snapshot + journal error state in error_state_journal.py"""
+
+import json
+
+import pytest
+
+import error_state_journal
+from error_state_journal import ErrorStateJournal
+
+
+@pytest.fixture
+def snapshot_file(tmp_path):
+    return tmp_path / ".task_error_state.json"
+
+
+def failures(journal, task_id="t1"):
+    return journal.refresh()[task_id]["failures"]
+
+
+def test_records_are_shared_between_instances(snapshot_file):
+    writer = ErrorStateJournal(snapshot_file)
+    reader = ErrorStateJournal(snapshot_file)
+    writer.record("t1", "Task", "failure")
+    writer.record("t1", "Task", "failure")
+    reader.record("t1", "Task", "success")
+
+    state = writer.refresh()["t1"]
+    assert state["failures"] == 2
+    assert state["consecutive_failures"] == 0
+    assert state["last_success"] is not None
+
+
+def test_compaction_is_seen_by_other_instances(snapshot_file):
+    writer = ErrorStateJournal(snapshot_file, compact_every=3)
+    reader = ErrorStateJournal(snapshot_file)
+    for _ in range(7):
+        writer.record("t1", "Task", "failure")
+    assert failures(reader) == 7
+    assert failures(ErrorStateJournal(snapshot_file)) == 7
+    assert writer.generation > 1
+
+
+def test_crash_between_snapshot_and_journal_replace_does_not_replay(snapshot_file, monkeypatch):
+    journal = ErrorStateJournal(snapshot_file)
+    for _ in range(4):
+        journal.record("t1", "Task", "failure")
+
+    real_replace = error_state_journal.os.replace
+
+    def crash_on_journal(src, dst):
+        if str(dst).endswith('.journal'):
+            raise OSError("simulated crash")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(error_state_journal.os, "replace", crash_on_journal)
+    with pytest.raises(OSError):
+        journal.compact()
+    monkeypatch.setattr(error_state_journal.os, "replace", real_replace)
+
+    # The snapshot already holds the four failures and the old journal is still there
+    restarted = ErrorStateJournal(snapshot_file)
+    assert failures(restarted) == 4
+    restarted.record("t1", "Task", "failure")
+    assert failures(ErrorStateJournal(snapshot_file)) == 5
+    restarted.compact()
+    assert failures(ErrorStateJournal(snapshot_file)) == 5
+
+
+def test_torn_final_line_does_not_swallow_the_next_record(snapshot_file):
+    journal = ErrorStateJournal(snapshot_file)
+    journal.record("t1", "Task", "failure")
+    with open(journal.journal_file, 'ab') as f:
+        f.write(b'{"task_id": "t1", "task_name": "Task", "ev')
+
+    restarted = ErrorStateJournal(snapshot_file)
+    assert failures(restarted) == 1
+    restarted.record("t1", "Task", "failure")
+    restarted.record("t1", "Task", "failure")
+    assert failures(ErrorStateJournal(snapshot_file)) == 3
+    assert failures(journal) == 3
+
+
+def test_legacy_snapshot_and_headerless_journal(snapshot_file):
+    snapshot_file.write_text(json.dumps({"t1": {
+        "task_name": "Task", "failures": 5, "last_failure": None,
+        "last_success": None, "consecutive_failures": 5}}))
+    record = {"task_id": "t1", "task_name": "Task", "event": "failure", "at": "2024-01-01T00:00:00"}
+    snapshot_file.with_suffix('.journal').write_text(json.dumps(record) + "\n")
+
+    journal = ErrorStateJournal(snapshot_file)
+    assert failures(journal) == 6
+    journal.compact()
+    assert failures(ErrorStateJournal(snapshot_file)) == 6
+    journal.record("t1", "Task", "reset")
+    assert ErrorStateJournal(snapshot_file).refresh()["t1"]["consecutive_failures"] == 0
+
+
+def _record_failures(snapshot_file, count):
+    journal = ErrorStateJournal(snapshot_file, compact_every=20)
+    for _ in range(count):
+        journal.record("t1", "Task", "failure")
+
+
+def test_concurrent_writers_with_compaction(snapshot_file):
+    import multiprocessing
+
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_record_failures, args=(snapshot_file, 50)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+    assert failures(ErrorStateJournal(snapshot_file)) == 200
@@ -0,0 +1,114 @@
+"""Tests for the fair-share dispatch order in fair_share.py"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import misfire
+from fair_share import FairShareScheduler
+from task_store import MemoryTaskStore
+
+
+def add(store, task_type, lag=0, priority=5, count=1, schedule_type='recurring'):
+    """count due tasks of a type, lag seconds past their next_run_at"""
+    now = datetime.now().astimezone()
+    start = len(store.tasks)
+    ids = store.add_tasks([{
+        'task_name': f"{task_type}-{start + i}", 'task_type': task_type, 'command': 'true',
+        'schedule_type': schedule_type, 'interval_minutes': 1440, 'priority': priority,
+        'next_run_at': now - timedelta(seconds=lag),
+    } for i in range(count)])
+    return list(ids.values())
+
+
+def scheduler(store, served=None, **kwargs):
+    options = {'weights': {}, 'max_lag': {}}
+    options.update(kwargs)
+    fair = FairShareScheduler(store, **options)
+    if served is not None:
+        fair.served = dict(served)
+        fair._refreshed_at = time.monotonic()
+    return fair
+
+
+def test_types_are_served_in_proportion_to_their_weights():
+    store = MemoryTaskStore()
+    add(store, 'trading_operations', lag=5, count=12)
+    add(store, 'memory_management', lag=5, priority=9, count=12)
+    claimed = scheduler(store).claim(8)
+
+    types = [task['task_type'] for task in claimed]
+    # trading_operations weighs 3, memory_management 1: higher priority doesn't buy a bigger share
+    assert types.count('trading_operations') == 6
+    assert types.count('memory_management') == 2
+
+
+def test_recent_dispatches_count_against_a_type():
+    store = MemoryTaskStore()
+    add(store, 'content_creation', lag=5, count=3)
+    add(store, 'learning_research', lag=5, count=3)
+    claimed = scheduler(store, served={'content_creation': 4}).claim(4)
+    assert [task['task_type'] for task in claimed][:4] == ['learning_research'] * 3 + ['content_creation']
+
+
+def test_waiting_tasks_age_past_higher_priorities():
+    store = MemoryTaskStore()
+    fresh = add(store, 'content_creation', lag=1, priority=7)
+    # Priority 3 plus 3000s / 600s of aging = 8 > 7
+    waited = add(store, 'content_creation', lag=3000, priority=3)
+    fair = scheduler(store)
+
+    candidates = store.due_candidates(5, fair.aging_seconds)
+    assert [task['id'] for task in fair.order(candidates, 2)] == waited + fresh
+    assert [task['id'] for task in fair.claim(1)] == waited
+
+
+def test_slo_breach_goes_first_regardless_of_share():
+    store = MemoryTaskStore()
+    add(store, 'system_monitoring', lag=5, priority=9, count=3)
+    late = add(store, 'trading_operations', lag=400, priority=1)  # Max lag 300s
+    fair = scheduler(store, served={'trading_operations': 50})
+
+    assert [task['id'] for task in fair.claim(1)] == late
+
+
+def test_most_overdue_relative_to_its_slo_first():
+    store = MemoryTaskStore()
+    social = add(store, 'social_media', lag=1000)  # 1.1x its 900s SLO
+    trading = add(store, 'trading_operations', lag=450)  # 1.5x its 300s SLO
+    fair = scheduler(store)
+    assert [task['id'] for task in fair.claim(2)] == trading + social
+
+
+@pytest.fixture
+def stamp(tmp_path):
+    return tmp_path / ".last_dispatch"
+
+
+def age_stamp(stamp, seconds):
+    stamp.touch()
+    when = time.time() - seconds
+    os.utime(stamp, (when, when))
+
+
+@pytest.mark.parametrize('stamp_age', [300, 1000])
+def test_catch_up_keeps_the_lag_of_deferred_tasks(stamp, stamp_age):
+    """Regression: catch-up used to move deferred tasks to now, hiding SLO breaches
+
+    A financial_monitoring task (900s SLO) has waited 1200s behind a busy
+    queue while a scheduler was dispatching. Neither the next routine
+    5-minute run nor a restart after downtime may reset its lag.
+    """
+    store = MemoryTaskStore()
+    late = add(store, 'financial_monitoring', lag=1200)
+    add(store, 'trading_operations', lag=5, count=4)
+    age_stamp(stamp, stamp_age)
+
+    misfire.catch_up_on_startup(store, stamp)
+    fair = scheduler(store)
+    candidates = {c['id']: c for c in store.due_candidates(5, fair.aging_seconds)}
+    assert late[0] in candidates, "catch-up rescheduled a deferred task"
+    assert candidates[late[0]]['lag_seconds'] >= 1200
+    assert fair.claim(1)[0]['id'] == late[0]
@@ -0,0 +1,69 @@
+"""Tests for the startup-only misfire catch-up in misfire.py"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import misfire
+from task_store import MemoryTaskStore
+
+
+@pytest.fixture
+def stamp(tmp_path):
+    return tmp_path / ".last_dispatch"
+
+
+def set_stamp(stamp, seconds_ago):
+    stamp.touch()
+    when = time.time() - seconds_ago
+    os.utime(stamp, (when, when))
+
+
+def make_store(minutes_late):
+    """One recurring task per lateness, named after it"""
+    now = datetime.now().astimezone()
+    store = MemoryTaskStore()
+    store.add_tasks([{
+        'task_name': f"late-{minutes}", 'task_type': 'maintenance', 'command': 'true',
+        'schedule_type': 'recurring', 'interval_minutes': 1440,
+        'next_run_at': now - timedelta(minutes=minutes),
+    } for minutes in minutes_late])
+    return store
+
+
+def next_runs(store):
+    return {task['task_name']: task['next_run_at'] for task in store.tasks.values()}
+
+
+def test_running_scheduler_leaves_overdue_tasks_alone(stamp):
+    store = make_store([20, 90])
+    before = next_runs(store)
+    set_stamp(stamp, 300)  # The previous 5-minute cron run
+    assert misfire.catch_up_on_startup(store, stamp) == {}
+    assert next_runs(store) == before
+
+
+def test_only_slots_missed_during_downtime_are_caught_up(stamp):
+    store = make_store([20, 90])
+    before = next_runs(store)
+    set_stamp(stamp, 3600)  # Down for an hour
+
+    plan = misfire.catch_up_on_startup(store, stamp)
+    after = next_runs(store)
+    assert len(plan) == 1
+    # Due 90 minutes ago, while a scheduler was still dispatching: deferred, not missed
+    assert after['late-90'] == before['late-90']
+    assert after['late-20'] > datetime.now().astimezone() - timedelta(seconds=1)
+
+
+def test_first_start_catches_up_everything(stamp):
+    store = make_store([20, 90])
+    assert len(misfire.catch_up_on_startup(store, stamp)) == 2
+
+
+def test_mark_dispatch_refreshes_the_stamp(stamp):
+    set_stamp(stamp, 3600)
+    misfire.mark_dispatch(stamp)
+    assert datetime.now().astimezone() - misfire.last_dispatch(stamp) < timedelta(seconds=5)
@@ -0,0 +1,65 @@
+"""Tests for the prompt result cache in result_cache.py"""
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, cache_key, cache_ttl
+from task_templates import TaskTemplates
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(result_cache.time, 'time', lambda: now[0])
+    return now
+
+
+def templates_by_name():
+    return {t['task_name']: t for t in TaskTemplates.get_all_templates()}
+
+
+def simulate(cache, task, runs, clock, lag=0.0):
+    """Run a recurring template on its interval; returns the hit count"""
+    ttl = cache_ttl(task)
+    key = cache_key(task['command'], task.get('context_memory_ids'), 'brain')
+    hits = 0
+    for _ in range(runs):
+        if cache.get(key, task['task_name']) is not None:
+            hits += 1
+        else:
+            cache.put(key, task['task_name'], 'summary', ttl)
+        clock[0] += task['interval_minutes'] * 60 + lag
+    return hits
+
+
+def test_every_opted_in_template_can_hit():
+    for task in TaskTemplates.get_all_templates():
+        ttl = cache_ttl(task)
+        if ttl and task['schedule_type'] == 'recurring':
+            assert ttl >= task['interval_minutes'] * 60, task['task_name']
+
+
+def test_uncacheable_templates_do_not_opt_in():
+    templates = templates_by_name()
+    assert cache_ttl(templates['System Resource Check']) is None
+    assert cache_ttl(templates['Content Thread Planning']) is None
+
+
+@pytest.mark.parametrize('lag', [0, 90, 600])
+def test_crypto_analysis_hits_every_other_run(tmp_path, clock, lag):
+    # Any start time and dispatch lag: no time bucket cuts the window short
+    clock[0] += 1234
+    task = templates_by_name()['Crypto Market Analysis']
+    cache = ResultCache(tmp_path / "cache.db")
+    assert simulate(cache, task, 48, clock, lag) == 24
+    assert cache.stats()[0]['hit_rate'] == 0.5
+
+
+def test_run_now_reuses_a_fresh_result(tmp_path, clock):
+    cache = ResultCache(tmp_path / "cache.db")
+    key = cache_key('Analyze  the\nmarket', [3, 1], 'brain')
+    cache.put(key, 'T', 'summary', 600)
+    clock[0] += 300
+    assert cache.get(cache_key('Analyze the market', [1, 3], 'brain'), 'T')['output'] == 'summary'
+    clock[0] += 301
+    assert cache.get(key, 'T') is None
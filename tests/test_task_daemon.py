@@ -0,0 +1,35 @@
+"""Tests for TaskDaemon's use of a worker pool shared with the scheduling engine"""
+
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from task_daemon import TaskDaemon
+from task_store import MemoryTaskStore
+from worker_pool import WorkerPool
+
+
+def test_heartbeat_only_renews_the_daemons_own_tasks():
+    store = MemoryTaskStore(worker_id='worker-a')
+    ids = store.add_tasks([{
+        'task_name': 'job', 'task_type': 'backup_maintenance', 'command': 'true',
+        'schedule_type': 'recurring', 'interval_minutes': 60,
+        'next_run_at': datetime.now().astimezone() - timedelta(minutes=1),
+    }])
+    [claimed] = store.claim(1)
+
+    async def main():
+        # The engine's pool runs cron, monitor and routine jobs next to tasks
+        pool = WorkerPool(max_workers=4)
+        pool.submit('cron:system_health_check', 'cron', asyncio.sleep(1))
+        pool.submit(claimed['id'], claimed['task_type'], asyncio.sleep(1))
+        pool.submit('twitter', 'monitor', asyncio.sleep(1))
+        daemon = SimpleNamespace(pool=pool)
+        try:
+            return TaskDaemon.running_task_ids(daemon)
+        finally:
+            await pool.drain(timeout=0)
+
+    task_ids = asyncio.run(main())
+    assert task_ids == [ids['job']]
+    assert store.heartbeat(task_ids) == 1
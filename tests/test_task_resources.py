@@ -0,0 +1,64 @@
+"""Tests for the per-task limits and accounting in task_resources.py"""
+
+import subprocess
+
+import pytest
+
+import task_resources
+from task_resources import TaskResources
+
+
+@pytest.fixture
+def fake_cgroups(tmp_path, monkeypatch):
+    """A plain directory standing in for the delegated cgroup hierarchy"""
+    monkeypatch.setattr(task_resources, 'CGROUP_ROOT', tmp_path)
+    monkeypatch.setattr(task_resources, '_cgroup_available', True)
+    return tmp_path
+
+
+def run(resources, cmd):
+    proc = subprocess.Popen(resources.wrap(cmd), stdout=subprocess.PIPE, text=True)
+    resources.started(proc.pid)
+    output, _ = proc.communicate(timeout=10)
+    return output.strip(), resources.report()
+
+
+def test_attached_task_is_accounted_from_its_cgroup(fake_cgroups):
+    resources = TaskResources(1, {'memory_limit_mb': 64})
+    (resources.cgroup / 'cgroup.procs').write_text('')
+    (resources.cgroup / 'cpu.stat').write_text('user_usec 5000\nsystem_usec 2000\n')
+    output, report = run(resources, 'ulimit -v')
+
+    assert output == 'unlimited'  # The cgroup, not ulimit, holds the limit
+    assert report['resource_mode'] == 'cgroup'
+    assert (report['cpu_user_ms'], report['cpu_system_ms']) == (5, 2)
+
+
+def test_failed_attach_falls_back_to_ulimit(fake_cgroups):
+    resources = TaskResources(2, {'memory_limit_mb': 64})
+    (resources.cgroup / 'cgroup.procs').mkdir()  # Makes the attach fail
+    output, report = run(resources, 'ulimit -v')
+
+    assert output == str(64 * 1024)
+    assert report['resource_mode'] == 'ulimit'
+    assert report['oom_killed'] is None
+    assert not resources.attach_marker.exists()
+
+
+def test_failed_attach_without_ulimit_limits_is_unlimited(fake_cgroups):
+    resources = TaskResources(3, {'pids_limit': 10})
+    (resources.cgroup / 'cgroup.procs').mkdir()
+    (resources.cgroup / 'cpu.stat').write_text('user_usec 9000000\nsystem_usec 9000000\n')
+    _, report = run(resources, 'true')
+
+    assert report['resource_mode'] == 'unlimited'
+    # The cgroup the task never joined isn't read; only sampled usage (or NULL) is
+    assert report['cpu_user_ms'] != 9000 and report['cpu_system_ms'] != 9000
+    assert report['oom_killed'] is None
+
+
+def test_no_limits_without_cgroups_runs_unwrapped(monkeypatch):
+    monkeypatch.setattr(task_resources, '_cgroup_available', False)
+    resources = TaskResources(4)
+    assert resources.wrap(['true']) == ['true']
+    assert resources.describe()['resource_mode'] == 'unlimited'
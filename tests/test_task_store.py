@@ -0,0 +1,225 @@
+"""Tests run against both task store backends in task_store.py
+
+The Postgres cases need a server: set TASK_STORE_TEST_DSN (e.g. "host=localhost
+user=postgres dbname=postgres"). Each test gets a throwaway schema built
+from create_task_tables.sql.
+"""
+
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from task_store import MemoryTaskStore
+
+SCHEMA_FILE = Path(__file__).parent.parent / "create_task_tables.sql"
+TEST_DSN = os.environ.get('TASK_STORE_TEST_DSN')
+
+
+class MemoryBackend:
+    def __init__(self):
+        self.shared = MemoryTaskStore(worker_id='worker-a')
+
+    def store(self, worker_id):
+        # One in-process store; a second worker shares its state under another id
+        if worker_id == self.shared.worker_id:
+            return self.shared
+        other = MemoryTaskStore.__new__(MemoryTaskStore)
+        other.__dict__.update(self.shared.__dict__)
+        other.worker_id = worker_id
+        return other
+
+    def expire_leases(self):
+        with self.shared.lock:
+            for task_id in self.shared.locked:
+                self.shared.tasks[task_id]['lease_expires_at'] = self.shared._now() - timedelta(seconds=1)
+
+    def close(self):
+        pass
+
+
+class PostgresBackend:
+    def __init__(self):
+        psycopg2 = pytest.importorskip('psycopg2')
+        self.psycopg2 = psycopg2
+        self.schema = f"task_store_test_{os.getpid()}"
+        try:
+            self.admin = psycopg2.connect(TEST_DSN)
+        except psycopg2.Error as e:
+            pytest.skip(f"Postgres not reachable: {e}")
+        with self.admin.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {self.schema} CASCADE")
+            cur.execute(f"CREATE SCHEMA {self.schema}")
+            cur.execute(f"SET search_path TO {self.schema}, public")
+            cur.execute(SCHEMA_FILE.read_text())
+        self.admin.commit()
+        self.conns = []
+
+    def store(self, worker_id):
+        from task_store import PostgresTaskStore
+        conn = self.psycopg2.connect(TEST_DSN, options=f"-c search_path={self.schema},public")
+        self.conns.append(conn)
+        return PostgresTaskStore(conn, worker_id=worker_id)
+
+    def expire_leases(self):
+        with self.admin.cursor() as cur:
+            cur.execute("UPDATE scheduled_tasks SET lease_expires_at = NOW() - INTERVAL '1 second' "
+                        "WHERE locked_by IS NOT NULL")
+        self.admin.commit()
+
+    def close(self):
+        for conn in self.conns:
+            conn.close()
+        with self.admin.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {self.schema} CASCADE")
+        self.admin.commit()
+        self.admin.close()
+
+
+@pytest.fixture(params=['memory', pytest.param('postgres', marks=pytest.mark.skipif(
+    not TEST_DSN, reason="TASK_STORE_TEST_DSN not set"))])
+def backend(request):
+    backend = MemoryBackend() if request.param == 'memory' else PostgresBackend()
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def store(backend):
+    return backend.store('worker-a')
+
+
+def task(name, minutes=-1, priority=5, **fields):
+    """A recurring task due minutes from now (negative: overdue)"""
+    spec = {
+        'task_name': name, 'task_type': fields.pop('task_type', 'backup_maintenance'),
+        'command': 'true', 'schedule_type': 'recurring', 'interval_minutes': 60,
+        'priority': priority,
+        'next_run_at': datetime.now().astimezone() + timedelta(minutes=minutes),
+    }
+    spec.update(fields)
+    return spec
+
+
+def names(tasks):
+    return [t['task_name'] for t in tasks]
+
+
+def run(store, claimed, succeeded=True, next_run_minutes=60):
+    """Record a finished execution for a claimed task"""
+    execution_id = store.start_execution(claimed['id'])
+    next_run = datetime.now().astimezone() + timedelta(minutes=next_run_minutes)
+    store.complete_execution(execution_id, {'status': 'success' if succeeded else 'failed',
+                                            'output': 'ok', 'execution_time_ms': 5},
+                             {'next_run_at': next_run}, succeeded=succeeded)
+    return execution_id
+
+
+def test_claim_leases_due_tasks_by_priority(store, backend):
+    store.add_tasks([task('low', priority=2), task('high', priority=8),
+                     task('future', minutes=30, priority=9),
+                     task('other type', task_type='social_media', priority=7)])
+
+    assert names(store.claim(10, exclude_types=['social_media'])) == ['high', 'low']
+    assert names(store.claim(10)) == ['other type']
+    assert store.claim(10) == []
+    assert names(backend.store('worker-b').claim(10)) == []
+
+
+def test_complete_records_the_execution_and_frees_the_task(store):
+    ids = store.add_tasks([task('job')])
+    [claimed] = store.claim(1)
+    run(store, claimed)
+
+    [execution] = store.recent_executions(5)
+    assert (execution['task_name'], execution['status']) == ('job', 'success')
+    assert store.claim(1) == []
+    assert store.overdue_tasks(datetime.now().astimezone() + timedelta(hours=2))[0]['id'] == ids['job']
+    assert store.heartbeat([ids['job']]) == 0  # The lease went with the completion
+
+
+def test_rescheduled_task_is_claimed_once(store):
+    ids = store.add_tasks([task('job', minutes=-5)])
+    due = store.overdue_tasks(datetime.now().astimezone())[0]['next_run_at']
+    later = datetime.now().astimezone() + timedelta(minutes=30)
+    # Each move leaves the old position behind (a stale heap entry in memory)
+    assert store.reschedule({ids['job']: (due, later)}) == 1
+    assert store.claim(5) == []
+    earlier = datetime.now().astimezone() - timedelta(minutes=1)
+    assert store.reschedule({ids['job']: (later, earlier)}) == 1
+    assert store.reschedule({ids['job']: (later, earlier)}) == 0  # Expected value no longer matches
+
+    assert names(store.claim(5)) == ['job']
+    assert store.claim(5) == []
+
+
+def test_dependent_task_is_released_by_its_parent_succeeding(store):
+    store.add_tasks([task('parent'),
+                     task('child', schedule_type='dependent', interval_minutes=None,
+                          next_run_at=None, depends_on=['parent'])])
+    [parent] = store.claim(5)
+    assert parent['task_name'] == 'parent'
+
+    run(store, parent, succeeded=False)
+    assert store.claim(5) == []
+
+    store.reschedule({parent['id']: (store.scheduled_tasks()[0]['next_run_at'],
+                                     datetime.now().astimezone() - timedelta(minutes=1))})
+    [parent] = store.claim(5)
+    run(store, parent)
+    assert names(store.claim(5)) == ['child']
+
+
+def test_expired_lease_is_recovered_and_the_task_reclaimed(store, backend):
+    ids = store.add_tasks([task('job')])
+    [claimed] = store.claim(1)
+    execution_id = store.start_execution(claimed['id'])
+    assert store.heartbeat([claimed['id']]) == 1
+
+    # worker-a stops heartbeating; worker-b's periodic recovery finds the lease expired
+    backend.expire_leases()
+    other = backend.store('worker-b')
+    assert other.recover_expired() == 1
+    assert other.recover_expired() == 0
+
+    [execution] = other.recent_executions(5)
+    assert (execution['id'], execution['status']) == (execution_id, 'timeout')
+    assert store.heartbeat([ids['job']]) == 0
+    assert names(other.claim(1)) == ['job']
+    assert store.claim(1) == []
+
+
+def test_expired_lease_is_claimable_without_recovery(store, backend):
+    ids = store.add_tasks([task('job')])
+    store.claim(1)
+    other = backend.store('worker-b')
+    assert other.claim(1) == []
+
+    backend.expire_leases()
+    assert [t['id'] for t in other.claim(1)] == [ids['job']]
+    assert store.heartbeat([ids['job']]) == 0  # worker-a lost the lease
+    assert other.heartbeat([ids['job']]) == 1
+
+
+def test_completion_after_losing_the_lease_leaves_the_new_owner_alone(store, backend):
+    ids = store.add_tasks([task('job')])
+    [claimed] = store.claim(1)
+    execution_id = store.start_execution(claimed['id'])
+
+    # worker-a stalls past its lease; worker-b recovers and re-claims the task
+    backend.expire_leases()
+    other = backend.store('worker-b')
+    other.recover_expired()
+    assert names(other.claim(1)) == ['job']
+    next_run_at = other.scheduled_tasks()[0]['next_run_at']
+
+    later = datetime.now().astimezone() + timedelta(minutes=60)
+    assert store.complete_execution(execution_id, {'status': 'success', 'output': 'late'},
+                                    {'next_run_at': later}, succeeded=True) is False
+    assert store.update_task(ids['job'], {'next_run_at': later}) is False
+
+    [execution] = other.recent_executions(5)
+    assert (execution['id'], execution['status']) == (execution_id, 'timeout')
+    assert other.scheduled_tasks()[0]['next_run_at'] == next_run_at
+    assert other.heartbeat([ids['job']]) == 1  # worker-b still holds the lease
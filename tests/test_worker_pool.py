@@ -0,0 +1,116 @@
+"""Tests for the bounded asyncio worker pool in worker_pool.py"""
+
+import asyncio
+
+from worker_pool import WorkerPool, parse_type_limits
+
+
+class Tracker:
+    """Fake task coroutines that record peak concurrency overall and per type"""
+
+    def __init__(self):
+        self.running = {}
+        self.peak = {}
+        self.peak_total = 0
+        self.finished = 0
+
+    async def job(self, task_type, seconds=0.01):
+        self.running[task_type] = self.running.get(task_type, 0) + 1
+        self.peak[task_type] = max(self.peak.get(task_type, 0), self.running[task_type])
+        self.peak_total = max(self.peak_total, sum(self.running.values()))
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.running[task_type] -= 1
+        self.finished += 1
+
+
+async def dispatch(pool, tracker, jobs):
+    """Submit (task_type, key) jobs whenever the caps allow, like the daemon loop"""
+    queue = list(jobs)
+    while queue or pool.in_flight:
+        for task_type, key in list(queue):
+            if pool.submit(key, task_type, tracker.job(task_type)):
+                queue.remove((task_type, key))
+        await pool.wait_for_completion(1)
+
+
+def test_parse_type_limits_skips_invalid_entries():
+    assert parse_type_limits('social_media=2, backup = 1,bad,x=y') == {'social_media': 2, 'backup': 1}
+    assert parse_type_limits(None) == {}
+
+
+def test_global_and_per_type_caps_are_never_exceeded():
+    tracker = Tracker()
+    jobs = [('social_media', f"s{i}") for i in range(6)] + [('backup', f"b{i}") for i in range(6)]
+
+    async def main():
+        pool = WorkerPool(max_workers=3, type_limits={'social_media': 1})
+        await dispatch(pool, tracker, jobs)
+        return pool
+
+    pool = asyncio.run(main())
+    assert tracker.finished == len(jobs)
+    assert tracker.peak_total == 3
+    assert tracker.peak['social_media'] == 1
+    assert tracker.peak['backup'] <= 3
+    assert pool.in_flight == {} and pool.type_counts == {'social_media': 0, 'backup': 0}
+
+
+def test_submit_refuses_duplicates_and_full_types():
+    async def main():
+        pool = WorkerPool(max_workers=4, type_limits={'browser': 1})
+        assert pool.submit(1, 'browser', asyncio.sleep(1)) is not None
+        assert pool.submit(1, 'other', asyncio.sleep(1)) is None  # Already running
+        assert pool.submit(2, 'browser', asyncio.sleep(1)) is None  # Type cap reached
+        assert pool.saturated_types() == ['browser']
+        assert pool.available_slots() == 3
+        await pool.drain(timeout=0)
+
+    asyncio.run(main())
+
+
+def test_finishing_worker_wakes_the_waiter():
+    async def main():
+        loop = asyncio.get_running_loop()
+        pool = WorkerPool(max_workers=2)
+        pool.submit('quick', 'any', asyncio.sleep(0.01))
+        started = loop.time()
+        assert await pool.wait_for_completion(5) is True
+        assert loop.time() - started < 1
+        assert not pool.is_running('quick')
+        # Nothing left to finish: the wait runs to its timeout
+        assert await pool.wait_for_completion(0.01) is False
+
+    asyncio.run(main())
+
+
+def test_shared_done_event_is_set_by_finishing_workers():
+    async def main():
+        wakeup = asyncio.Event()
+        pool = WorkerPool(max_workers=1, done_event=wakeup)
+        pool.submit('job', 'any', asyncio.sleep(0))
+        await asyncio.wait_for(wakeup.wait(), 1)
+
+    asyncio.run(main())
+
+
+def test_drain_waits_for_workers_and_cancels_stragglers():
+    finished = []
+
+    async def job(name, seconds):
+        await asyncio.sleep(seconds)
+        finished.append(name)
+
+    async def main():
+        pool = WorkerPool(max_workers=4)
+        quick = pool.submit('quick', 'any', job('quick', 0.01))
+        slow = pool.submit('slow', 'any', job('slow', 30))
+        await pool.drain(timeout=0.2)
+        return pool, quick, slow
+
+    pool, quick, slow = asyncio.run(main())
+    assert finished == ['quick']
+    assert quick.done() and not quick.cancelled()
+    assert slow.cancelled()
+    assert pool.in_flight == {}
@@ -11,6 +11,7 @@ import json
 import tweepy
 from pathlib import Path
 from dotenv import load_dotenv
+from circuit_breaker import GuardedClient, NETWORK_ERRORS, get_breaker
 from datetime import datetime, timedelta, timezone
 import argparse
 import time
@@ -45,7 +46,9 @@ class TwitterManager:
                 access_token_secret=ACCESS_TOKEN_SECRET,
                 wait_on_rate_limit=True
             )
-            return client
+            # Shared with every other Twitter consumer: fail fast while it's down
+            breaker = get_breaker('twitter', failure_exceptions=(tweepy.TwitterServerError,) + NETWORK_ERRORS)
+            return GuardedClient(client, breaker)
         except Exception as e:
             print(f"Error authenticating with Twitter: {e}")
             sys.exit(1)
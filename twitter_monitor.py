@@ -118,6 +118,12 @@ class TwitterMonitor:
             self.run_script("twitter_search_mentions.py")
             self.last_mention_check = now
     
+    def check_once(self):
+        """One monitoring pass: scheduled posts, mentions, then persist state"""
+        self.check_scheduled_tasks()
+        self.check_mentions()
+        self.save_state()
+    
     def save_state(self):
         """Save monitor state to file"""
         state = {
@@ -169,14 +175,7 @@ class TwitterMonitor:
         
         while True:
             try:
-                # Check scheduled tasks
-                self.check_scheduled_tasks()
-                
-                # Check mentions
-                self.check_mentions()
-                
-                # Save state
-                self.save_state()
+                self.check_once()
                 
                 # Wait before next check
                 time.sleep(CHECK_INTERVAL)
@@ -10,6 +10,7 @@ import sys
 import tweepy
 from pathlib import Path
 from dotenv import load_dotenv
+from circuit_breaker import CircuitOpenError, GuardedClient, NETWORK_ERRORS, get_breaker
 
 # Load environment variables from Claude's .env file
 env_path = Path('/Users/claudemini/Claude/.env')
@@ -31,7 +32,9 @@ def authenticate_twitter():
             access_token=ACCESS_TOKEN,
             access_token_secret=ACCESS_TOKEN_SECRET
         )
-        return client
+        # Fail fast while Twitter is down instead of waiting on timeouts
+        breaker = get_breaker('twitter', failure_exceptions=(tweepy.TwitterServerError,) + NETWORK_ERRORS)
+        return GuardedClient(client, breaker)
     except Exception as e:
         print(f"Error authenticating with Twitter: {e}")
         sys.exit(1)
@@ -52,6 +55,9 @@ def post_tweet(message, reply_to_id=None):
         print(f"View at: https://twitter.com/ClaudeMini/status/{tweet_id}")
         return tweet_id
         
+    except CircuitOpenError as e:
+        print(f"Skipping tweet: {e}")
+        sys.exit(1)
     except tweepy.TooManyRequests:
         print("Rate limit reached. Please wait before posting again.")
         sys.exit(1)
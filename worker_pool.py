@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Worker Pool for concurrent task execution
+Bounded asyncio pool with a global concurrency cap and per-task_type caps
+"""
+
+import asyncio
+import os
+import logging
+from collections import defaultdict
+from typing import Any, Awaitable, Dict, List, Optional
+
+logger = logging.getLogger('worker_pool')
+
+
+def parse_type_limits(spec: Optional[str]) -> Dict[str, int]:
+    """Parse a 'type=N,type=N' limit string (e.g. from an env var)"""
+    limits = {}
+    if not spec:
+        return limits
+    for part in spec.split(','):
+        if '=' not in part:
+            continue
+        task_type, value = part.split('=', 1)
+        try:
+            limits[task_type.strip()] = int(value)
+        except ValueError:
+            logger.warning(f"Ignoring invalid type limit: {part}")
+    return limits
+
+
+class WorkerPool:
+    """Tracks in-flight asyncio workers and enforces concurrency caps"""
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 type_limits: Optional[Dict[str, int]] = None,
+                 done_event: Optional[asyncio.Event] = None):
+        self.max_workers = max_workers or os.cpu_count() or 4
+        self.type_limits = type_limits or {}
+        self.in_flight: Dict[Any, asyncio.Task] = {}
+        self.in_flight_types: Dict[Any, str] = {}
+        self.type_counts: Dict[str, int] = defaultdict(int)
+        # Set whenever a worker finishes; callers may share it with other wakeup sources
+        self._done = done_event or asyncio.Event()
+
+    def available_slots(self) -> int:
+        """Number of workers that can still be started"""
+        return max(0, self.max_workers - len(self.in_flight))
+
+    def has_capacity(self, task_type: Optional[str] = None) -> bool:
+        """Check the global cap and the cap for task_type"""
+        if self.available_slots() <= 0:
+            return False
+        limit = self.type_limits.get(task_type)
+        return limit is None or self.type_counts[task_type] < limit
+
+    def saturated_types(self) -> List[str]:
+        """Task types that have reached their per-type cap"""
+        return [t for t, limit in self.type_limits.items()
+                if self.type_counts[t] >= limit]
+
+    def is_running(self, key: Any) -> bool:
+        return key in self.in_flight
+
+    def running_keys(self) -> List[Any]:
+        return list(self.in_flight.keys())
+
+    def submit(self, key: Any, task_type: str, coro: Awaitable) -> Optional[asyncio.Task]:
+        """Start a worker for key unless it is already running or caps are reached"""
+        if key in self.in_flight or not self.has_capacity(task_type):
+            # Close the coroutine so it doesn't warn about never being awaited
+            coro.close()
+            return None
+
+        worker = asyncio.create_task(coro)
+        self.in_flight[key] = worker
+        self.in_flight_types[key] = task_type
+        self.type_counts[task_type] += 1
+        worker.add_done_callback(lambda w, k=key: self._on_done(k, w))
+        return worker
+
+    def _on_done(self, key: Any, worker: asyncio.Task):
+        task_type = self.in_flight_types.pop(key, None)
+        self.in_flight.pop(key, None)
+        if task_type is not None:
+            self.type_counts[task_type] -= 1
+
+        if not worker.cancelled() and worker.exception():
+            logger.error(f"Worker {key} crashed: {worker.exception()}")
+        self._done.set()
+
+    async def wait_for_completion(self, timeout: float) -> bool:
+        """Sleep up to timeout seconds, waking early when any worker finishes"""
+        self._done.clear()
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Wait for all in-flight workers to finish, cancelling any still
+        running after timeout seconds"""
+        if not self.in_flight:
+            return
+        logger.info(f"Waiting for {len(self.in_flight)} running tasks to finish...")
+        _, pending = await asyncio.wait(list(self.in_flight.values()), timeout=timeout)
+        if pending:
+            logger.warning(f"Cancelling {len(pending)} tasks still running after {timeout}s")
+            for worker in pending:
+                worker.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
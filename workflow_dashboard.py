@@ -3,8 +3,6 @@
 Workflow Dashboard - Unified monitoring for all automated processes
 """
 
-import psycopg2
-from psycopg2.extras import RealDictCursor
 from datetime import datetime, timezone, timedelta
 import subprocess
 import os
@@ -17,84 +15,54 @@ from rich.live import Live
 from rich.text import Text
 import time
 import argparse
+import db
+from task_store import get_task_store
 
 console = Console()
 
 class WorkflowDashboard:
-    def __init__(self):
-        self.db_conn = psycopg2.connect(
-            dbname="claudemini",
-            user="claudemini",
-            host="localhost"
-        )
+    def __init__(self, store=None):
+        self.store = store or get_task_store()
         
     def get_task_status(self):
         """Get current status of all scheduled tasks"""
-        with self.db_conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT 
-                    st.id,
-                    st.task_name,
-                    st.is_active,
-                    st.last_run_at,
-                    st.next_run_at,
-                    st.schedule_type,
-                    te.status as last_status,
-                    te.error as last_error
-                FROM scheduled_tasks st
-                LEFT JOIN LATERAL (
-                    SELECT status, error 
-                    FROM task_executions 
-                    WHERE task_id = st.id 
-                    ORDER BY started_at DESC 
-                    LIMIT 1
-                ) te ON true
-                ORDER BY st.priority DESC, st.created_at
-            """)
-            return cur.fetchall()
+        return self.store.task_status()
     
     def get_recent_executions(self, limit=10):
         """Get recent task executions"""
-        with self.db_conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT 
-                    te.id,
-                    st.task_name,
-                    te.status,
-                    te.started_at,
-                    te.completed_at,
-                    te.execution_time_ms,
-                    te.error
-                FROM task_executions te
-                JOIN scheduled_tasks st ON te.task_id = st.id
-                ORDER BY te.started_at DESC
-                LIMIT %s
-            """, (limit,))
-            return cur.fetchall()
+        return self.store.recent_executions(limit)
     
     def get_system_health(self):
         """Get system health metrics"""
         health = {}
         
-        # Check task daemon
+        # Check task daemon (standalone, or inside the scheduling engine)
         result = subprocess.run(['pgrep', '-f', 'task_daemon.py'], capture_output=True)
-        health['task_daemon'] = 'Running' if result.returncode == 0 else 'Stopped'
+        engine = subprocess.run(['pgrep', '-f', 'scheduling_engine.py run'], capture_output=True)
+        if result.returncode == 0:
+            health['task_daemon'] = 'Running'
+        elif engine.returncode == 0:
+            health['task_daemon'] = 'Running (engine)'
+        else:
+            health['task_daemon'] = 'Stopped'
         
         # Check cron jobs
         result = subprocess.run(['crontab', '-l'], capture_output=True, text=True)
         health['cron_jobs'] = len(result.stdout.strip().split('\n')) if result.stdout.strip() else 0
         
-        # Check memory usage
-        with self.db_conn.cursor() as cur:
-            cur.execute("SELECT COUNT(*) FROM memories")
-            health['total_memories'] = cur.fetchone()[0]
-            
-            cur.execute("""
-                SELECT memory_type, COUNT(*) as count 
-                FROM memories 
-                GROUP BY memory_type
-            """)
-            health['memory_types'] = dict(cur.fetchall())
+        # Check memory usage (memories live in Postgres; the in-memory
+        # task store runs without a database)
+        if self.store.kind == 'postgres':
+            with db.shared_connection().cursor() as cur:
+                cur.execute("SELECT COUNT(*) FROM memories")
+                health['total_memories'] = cur.fetchone()[0]
+                
+                cur.execute("""
+                    SELECT memory_type, COUNT(*) as count 
+                    FROM memories 
+                    GROUP BY memory_type
+                """)
+                health['memory_types'] = dict(cur.fetchall())
         
         # System resources
         result = subprocess.run(['df', '-h', '/'], capture_output=True, text=True)
@@ -109,33 +77,7 @@ class WorkflowDashboard:
     
     def get_workflow_stats(self):
         """Get workflow statistics"""
-        with self.db_conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Success rate
-            cur.execute("""
-                SELECT 
-                    COUNT(CASE WHEN status = 'success' THEN 1 END) as success,
-                    COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed,
-                    COUNT(CASE WHEN status = 'timeout' THEN 1 END) as timeout,
-                    COUNT(*) as total
-                FROM task_executions
-                WHERE started_at > NOW() - INTERVAL '24 hours'
-            """)
-            stats = cur.fetchone()
-            
-            # Average execution time
-            cur.execute("""
-                SELECT 
-                    AVG(execution_time_ms) as avg_time,
-                    MIN(execution_time_ms) as min_time,
-                    MAX(execution_time_ms) as max_time
-                FROM task_executions
-                WHERE status = 'success' 
-                AND started_at > NOW() - INTERVAL '24 hours'
-            """)
-            time_stats = cur.fetchone()
-            
-            stats.update(time_stats)
-            return stats
+        return dict(self.store.execution_stats(hours=24))
     
     def create_dashboard_layout(self):
         """Create rich dashboard layout"""
@@ -178,6 +120,7 @@ class WorkflowDashboard:
         table.add_column("Last Run")
         table.add_column("Next Run")
         table.add_column("Status", justify="center")
+        table.add_column("p95", justify="right")
         
         for task in tasks:
             active = "✓" if task['is_active'] else "✗"
@@ -193,13 +136,15 @@ class WorkflowDashboard:
             
             last_run = task['last_run_at'].strftime('%H:%M:%S') if task['last_run_at'] else "Never"
             next_run = task['next_run_at'].strftime('%H:%M:%S') if task['next_run_at'] else "N/A"
+            p95 = f"{task['p95_execution_time_ms'] / 1000:.0f}s" if task['p95_execution_time_ms'] else "-"
             
             table.add_row(
                 task['task_name'][:30],
                 Text(active, style=active_style),
                 last_run,
                 next_run,
-                Text(status, style=status_style)
+                Text(status, style=status_style),
+                p95
             )
         
         return Panel(table, title="Tasks")
@@ -210,11 +155,12 @@ class WorkflowDashboard:
         lines.append(f"Task Daemon: [{health['task_daemon']}]")
         lines.append(f"Cron Jobs: {health['cron_jobs']}")
         lines.append(f"Disk Usage: {health.get('disk_usage', 'N/A')}")
-        lines.append(f"Total Memories: {health['total_memories']}")
-        lines.append("")
-        lines.append("Memory Types:")
-        for mtype, count in health.get('memory_types', {}).items():
-            lines.append(f"  {mtype}: {count}")
+        lines.append(f"Total Memories: {health.get('total_memories', 'N/A')}")
+        if 'memory_types' in health:
+            lines.append("")
+            lines.append("Memory Types:")
+            for mtype, count in health['memory_types'].items():
+                lines.append(f"  {mtype}: {count}")
         
         return Panel("\n".join(lines), title="System Health")
     
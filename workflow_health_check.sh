@@ -5,8 +5,8 @@ echo "[$(date)] Starting workflow health check..."
 
 ISSUES=0
 
-# Check task daemon
-if ! pgrep -f "task_daemon.py" > /dev/null; then
+# Check task daemon (the scheduling engine runs it in-process)
+if ! pgrep -f "task_daemon.py|scheduling_engine.py run" > /dev/null; then
     echo "ERROR: Task daemon is not running!"
     # Try to restart it
     cd /Users/claudemini/Claude/Code/utils